@@ -0,0 +1,654 @@
+"""
+Benchmark de carga das views principais sobre bancos semeados em várias escalas.
+
+Para cada escala N, semeia um banco SQLite temporário (N clientes, projetos,
+etapas, lançamentos e produtos, com dados gerados a partir de --semente, então
+duas execuções com a mesma semente têm o mesmo banco) e reproduz uma mistura
+de requisições parecida com o tráfego real:
+
+- vitrine (anônimo): produtos:home e produtos:search;
+- clientes logados: produtos:ver_carrinho (com itens na sessão) e
+  crm:cliente_dashboard;
+- equipe do CRM: crm:lista_projetos e crm:dashboard_financeiro, com e sem
+  filtros.
+
+Modos:
+
+- processo (padrão): django.test.Client no próprio processo. Mede também o
+  pico de memória alocada por requisição de cada view (tracemalloc, numa
+  passada separada para não distorcer as latências).
+- http: sobe o gunicorn do projeto (gunicorn.conf.py, --servidor wsgi/asgi)
+  e dispara a mesma mistura com --concorrencia requisições simultâneas.
+  Mede o RSS dos workers ao final.
+
+Queries e tempos de banco, de template e total por requisição vêm do
+cabeçalho Server-Timing da instrumentação (energia_solar/instrumentacao.py),
+igual nos dois modos. Cada requisição é conferida contra o orçamento da view
+em INSTRUMENTACAO_ORCAMENTOS: os estouros aparecem no relatório e no JSON, e
+o script termina com código 1 se alguma view passou do orçamento.
+Cada escala roda num processo filho, com banco e memória próprios.
+
+As escalas padrão são 1000, 50000 e 500000. Semear 500000 linhas de cada
+entidade leva vários minutos; use --pasta para reaproveitar os bancos entre
+execuções, ou --escalas 1000 para uma rodada rápida.
+
+Os resultados (p50/p95/p99, queries, memória, commit atual) podem ser gravados
+em JSON com --json e comparados com uma execução anterior com --comparar.
+
+    python benchmarks/carga.py
+    python benchmarks/carga.py --escalas 1000 --requisicoes 300
+    python benchmarks/carga.py --requisicoes 3000 --json carga.json
+    python benchmarks/carga.py --escalas 500000 --views search lista_projetos dashboard_financeiro
+    python benchmarks/carga.py --comparar base.json --json atual.json
+    python benchmarks/carga.py --modo http --servidor asgi --workers 2 --concorrencia 20
+    python benchmarks/carga.py --pasta /tmp/bancos_carga   # reaproveita os bancos já semeados
+    DATABASE_URL=postgres://... python benchmarks/carga.py --escalas 50000   # banco vazio
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import re
+import resource
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from decimal import Decimal
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+LOTE = 5000
+# Clientes com login (carrinho e dashboard) e pedidos de cada um
+USUARIOS_CLIENTE = 200
+PEDIDOS_POR_USUARIO = 3
+
+PRENOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Fábio', 'Gabriela', 'Hugo', 'Isabel', 'João']
+SOBRENOMES = ['Silva', 'Souza', 'Oliveira', 'Santos', 'Lima', 'Pereira', 'Costa', 'Almeida']
+CIDADES = [('Campinas', 'SP'), ('Belo Horizonte', 'MG'), ('Curitiba', 'PR'), ('Goiânia', 'GO'), ('Recife', 'PE')]
+TIPOS_PRODUTO = [
+    ('Painel Solar', 'paineis_solares'), ('Inversor', 'inversores'), ('Bateria', 'baterias'),
+    ('Kit Fotovoltaico', 'kits_fotovoltaicos'), ('Estrutura de Montagem', 'estruturas_montagem'),
+    ('Cabo Solar', 'acessorios'), ('Nobreak', 'sistemas_backup'), ('Alicate Crimpador', 'ferramentas_instalacao'),
+]
+MARCAS = ['Canadian', 'Jinko', 'Growatt', 'Fronius', 'BYD', 'Deye', 'Risen', 'Trina']
+# Termos da busca: marcas, tipos e alguns sem resultado
+TERMOS_BUSCA = ['painel', 'inversor growatt', 'bateria', 'kit 550', 'jinko', 'estrutura', 'cabo', 'trina 450', 'xyzzy']
+
+
+# --------------------------
+# SEMEADURA
+# --------------------------
+def _em_lotes(modelo, objetos):
+    criados = 0
+    lote = []
+    for objeto in objetos:
+        lote.append(objeto)
+        if len(lote) == LOTE:
+            criados += len(modelo.objects.bulk_create(lote))
+            lote = []
+    if lote:
+        criados += len(modelo.objects.bulk_create(lote))
+    return criados
+
+
+def semear(escala, semente):
+    """Popula o banco vazio com `escala` linhas de cada entidade. Retorna a contagem por modelo."""
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.db import transaction
+
+    from produtos.models import Pedido, Produto
+    from solar import resumo_financeiro
+    from solar.models import Cliente, Etapa, LancamentoFinanceiro, Projeto, Usuario
+
+    rng = random.Random(semente)
+    hoje = datetime.date(2025, 1, 1)
+    status_projeto = [valor for valor, _ in Projeto._meta.get_field('status').choices]
+    linhas = {}
+
+    with transaction.atomic():
+        equipe = Usuario.objects.create_superuser('bench_crm', 'crm@bench.example', None, is_crm_staff=True)
+        total_usuarios = min(escala, USUARIOS_CLIENTE)
+        Usuario.objects.bulk_create([
+            Usuario(username=f'bench_cliente_{i}', email=f'cliente{i}@bench.example', is_customer=True)
+            for i in range(total_usuarios)
+        ])
+        usuarios = list(Usuario.objects.filter(username__startswith='bench_cliente_').order_by('id'))
+
+        def clientes():
+            for i in range(escala):
+                cidade, estado = rng.choice(CIDADES)
+                yield Cliente(
+                    usuario=usuarios[i] if i < total_usuarios else None,
+                    nome=f'{rng.choice(PRENOMES)} {rng.choice(SOBRENOMES)} {i}',
+                    email=f'cliente{i}@bench.example', telefone=f'(11) 9{i:08d}',
+                    cidade=cidade, estado=estado,
+                )
+        linhas['clientes'] = _em_lotes(Cliente, clientes())
+        ids_clientes = list(Cliente.objects.order_by('id').values_list('id', flat=True))
+
+        def projetos():
+            for i in range(escala):
+                # Os clientes com login ficam com alguns projetos cada (dashboard do cliente)
+                if i < total_usuarios * 3:
+                    cliente_id = ids_clientes[i % total_usuarios]
+                else:
+                    cliente_id = rng.choice(ids_clientes)
+                cidade, estado = rng.choice(CIDADES)
+                yield Projeto(
+                    nome=f'Usina {rng.choice(SOBRENOMES)} {i}',
+                    descricao=f'Sistema fotovoltaico de {rng.randint(3, 300)} kWp em {cidade}',
+                    data_inicio=hoje - datetime.timedelta(days=rng.randint(0, 1095)),
+                    status=rng.choice(status_projeto), cliente_id=cliente_id, responsavel=equipe,
+                    cidade=cidade, estado=estado,
+                    potencia_kwp=Decimal(rng.randint(300, 30000)) / 100,
+                    valor_total=Decimal(rng.randint(1_500_000, 90_000_000)) / 100,
+                )
+        linhas['projetos'] = _em_lotes(Projeto, projetos())
+        ids_projetos = list(Projeto.objects.order_by('id').values_list('id', flat=True))
+
+        def etapas():
+            for i in range(escala):
+                inicio = hoje - datetime.timedelta(days=rng.randint(0, 1095))
+                concluida = rng.random() < 0.6
+                yield Etapa(
+                    projeto_id=ids_projetos[i % len(ids_projetos)], nome=f'Etapa {i % 6 + 1}',
+                    data_inicio=inicio, data_fim=inicio + datetime.timedelta(days=rng.randint(1, 30)) if concluida else None,
+                    status='concluida' if concluida else 'pendente',
+                )
+        linhas['etapas'] = _em_lotes(Etapa, etapas())
+
+        tipos = [valor for valor, _ in LancamentoFinanceiro.TIPOS]
+        status_lancamento = [valor for valor, _ in LancamentoFinanceiro.STATUS]
+        linhas['lancamentos'] = _em_lotes(LancamentoFinanceiro, (
+            LancamentoFinanceiro(
+                projeto_id=rng.choice(ids_projetos), tipo=rng.choice(tipos), status=rng.choice(status_lancamento),
+                descricao=f'Parcela {i}', valor=Decimal(rng.randint(10_000, 5_000_000)) / 100,
+                data=hoje - datetime.timedelta(days=rng.randint(0, 1095)),
+            )
+            for i in range(escala)
+        ))
+        # bulk_create não passa pelos signals que mantêm o rollup do dashboard financeiro
+        linhas['resumos_financeiros'] = resumo_financeiro.reconstruir()
+
+        def produtos():
+            for i in range(escala):
+                tipo, categoria = rng.choice(TIPOS_PRODUTO)
+                marca = rng.choice(MARCAS)
+                potencia = rng.choice([330, 450, 550, 600, 3000, 5000, 10000])
+                yield Produto(
+                    name=f'{tipo} {marca} {potencia}W {i}', slug=f'bench-{i}', sku=f'BENCH-{i:07d}',
+                    description=f'{tipo} {marca} de {potencia}W com garantia de {rng.randint(1, 25)} anos.',
+                    categoria_id=categoria, preco=Decimal(rng.randint(5_000, 2_500_000)) / 100,
+                    stock=rng.randint(0, 500), is_active=rng.random() < 0.9,
+                )
+        linhas['produtos'] = _em_lotes(Produto, produtos())
+        ids_produtos = list(Produto.objects.filter(is_active=True).values_list('id', flat=True)[:5000])
+
+        linhas['pedidos'] = _em_lotes(Pedido, (
+            Pedido(
+                usuario=usuario, email_cliente=usuario.email, status=rng.choice(['pago', 'pendente', 'enviado']),
+                total=Decimal(rng.randint(10_000, 5_000_000)) / 100, metodo_pagamento='mercadopago',
+            )
+            for usuario in usuarios for _ in range(PEDIDOS_POR_USUARIO)
+        ))
+
+    # Sessões já autenticadas, cada cliente com 1 a 4 produtos no carrinho
+    sessoes = {'crm': [], 'cliente': []}
+    for perfil, usuario in [('crm', equipe)] + [('cliente', u) for u in usuarios]:
+        sessao = SessionStore()
+        sessao[SESSION_KEY] = str(usuario.pk)
+        sessao[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        sessao[HASH_SESSION_KEY] = usuario.get_session_auth_hash()
+        if perfil == 'cliente':
+            sessao['carrinho'] = {str(pid): rng.randint(1, 3) for pid in rng.sample(ids_produtos, min(len(ids_produtos), rng.randint(1, 4)))}
+        sessao.create()
+        sessoes[perfil].append(sessao.session_key)
+    return linhas, sessoes
+
+
+# --------------------------
+# MISTURA DE REQUISIÇÕES
+# --------------------------
+VIEWS = ['home', 'search', 'ver_carrinho', 'cliente_dashboard', 'lista_projetos', 'dashboard_financeiro']
+
+
+def mistura():
+    """[(view, peso, perfil, gerador de URL)], com as URLs resolvidas pelo nome."""
+    from django.urls import reverse
+    from urllib.parse import urlencode
+
+    from solar.models import Projeto
+
+    status_projeto = [valor for valor, _ in Projeto._meta.get_field('status').choices]
+
+    def com_filtros(url, rng, opcoes):
+        params = rng.choice(opcoes)
+        return f'{url}?{urlencode(params)}' if params else url
+
+    home, busca = reverse('produtos:home'), reverse('produtos:search')
+    carrinho, dashboard = reverse('produtos:ver_carrinho'), reverse('crm:cliente_dashboard')
+    projetos, financeiro = reverse('crm:lista_projetos'), reverse('crm:dashboard_financeiro')
+    return [
+        ('home', 25, 'anonimo', lambda rng: home),
+        ('search', 20, 'anonimo', lambda rng: f'{busca}?{urlencode({"q": rng.choice(TERMOS_BUSCA)})}'),
+        ('ver_carrinho', 15, 'cliente', lambda rng: carrinho),
+        ('cliente_dashboard', 15, 'cliente', lambda rng: dashboard),
+        ('lista_projetos', 15, 'crm', lambda rng: com_filtros(projetos, rng, [
+            {}, {}, {'status': rng.choice(status_projeto)}, {'q': rng.choice(SOBRENOMES)}, {'ordem': 'nome'},
+        ])),
+        ('dashboard_financeiro', 10, 'crm', lambda rng: com_filtros(financeiro, rng, [
+            {}, {'tipo': 'recebimento'}, {'status': 'pendente'},
+            {'data_inicio': '2024-01-01', 'data_fim': '2024-06-30'},
+        ])),
+    ]
+
+
+def planejar(total, sessoes, semente, views=None):
+    """Sequência determinística de (view, url, cookie de sessão ou None)."""
+    rng = random.Random(semente)
+    opcoes = [opcao for opcao in mistura() if not views or opcao[0] in views]
+    pesos = [peso for _, peso, _, _ in opcoes]
+    plano = []
+    for nome, _, perfil, gerar_url in rng.choices(opcoes, weights=pesos, k=total):
+        cookie = rng.choice(sessoes[perfil]) if perfil != 'anonimo' else None
+        plano.append((nome, gerar_url(rng), cookie))
+    return plano
+
+
+# --------------------------
+# EXECUÇÃO
+# --------------------------
+SERVER_TIMING = re.compile(
+    r'db;dur=([\d.]+);desc="(\d+) queries", tpl;dur=([\d.]+), total;dur=([\d.]+)'
+)
+
+
+def _amostra(nome, status, segundos, server_timing):
+    casamento = SERVER_TIMING.search(server_timing or '')
+    return {
+        'view': nome,
+        'ok': status == 200,
+        'ms': segundos * 1000,
+        'queries': int(casamento.group(2)) if casamento else None,
+        'db_ms': float(casamento.group(1)) if casamento else None,
+        'template_ms': float(casamento.group(3)) if casamento else None,
+        'total_ms': float(casamento.group(4)) if casamento else None,
+    }
+
+
+def executar_em_processo(plano, aquecimento):
+    from django.test import Client
+
+    cliente = Client()
+
+    def requisitar(nome, url, cookie):
+        extra = {'HTTP_COOKIE': f'sessionid={cookie}'} if cookie else {}
+        inicio = time.perf_counter()
+        resposta = cliente.get(url, **extra)
+        return _amostra(nome, resposta.status_code, time.perf_counter() - inicio, resposta.get('Server-Timing'))
+
+    for nome, url, cookie in plano[:aquecimento]:
+        requisitar(nome, url, cookie)
+    amostras = [requisitar(nome, url, cookie) for nome, url, cookie in plano]
+
+    # Pico de memória alocada por requisição, numa passada à parte (tracemalloc deixa tudo mais lento)
+    memoria = {}
+    tracemalloc.start()
+    try:
+        for nome, url, cookie in plano:
+            if len(memoria.setdefault(nome, [])) >= 3:
+                continue
+            tracemalloc.reset_peak()
+            atual = tracemalloc.get_traced_memory()[0]
+            requisitar(nome, url, cookie)
+            memoria[nome].append((tracemalloc.get_traced_memory()[1] - atual) / 1024)
+    finally:
+        tracemalloc.stop()
+    extras = {
+        'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'mem_pico_kb': {nome: statistics.median(valores) for nome, valores in memoria.items()},
+    }
+    return amostras, extras
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _rss_dos_workers(pid_master):
+    """RSS (MB) de cada processo filho do gunicorn, lido de /proc (só Linux)."""
+    rss = []
+    for pid in filter(str.isdigit, os.listdir('/proc') if os.path.isdir('/proc') else []):
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            if ppid != pid_master:
+                continue
+            with open(f'/proc/{pid}/status') as f:
+                rss += [int(linha.split()[1]) / 1024 for linha in f if linha.startswith('VmRSS:')]
+        except (OSError, ValueError, IndexError):
+            continue
+    return rss
+
+
+def executar_http(plano, aquecimento, args):
+    import httpx
+
+    porta = _porta_livre()
+    env = dict(os.environ, SERVIDOR_MODO=args.servidor, PORT=str(porta), WEB_CONCURRENCY=str(args.workers))
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--log-level', 'warning', '--access-logfile', '/dev/null'],
+        cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    base = f'http://127.0.0.1:{porta}'
+    try:
+        limite = time.monotonic() + 30
+        while True:
+            if processo.poll() is not None:
+                raise RuntimeError(f"gunicorn não subiu:\n{processo.stderr.read().decode()}")
+            try:
+                socket.create_connection(('127.0.0.1', porta), timeout=0.2).close()
+                break
+            except OSError:
+                if time.monotonic() > limite:
+                    raise RuntimeError(f"gunicorn não respondeu na porta {porta}")
+                time.sleep(0.2)
+
+        async def disparar(lote, concorrencia):
+            semaforo = asyncio.Semaphore(concorrencia)
+            limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+            async with httpx.AsyncClient(base_url=base, limits=limites, timeout=args.timeout) as cliente:
+                async def um(nome, url, cookie):
+                    async with semaforo:
+                        headers = {'Cookie': f'sessionid={cookie}'} if cookie else {}
+                        inicio = time.perf_counter()
+                        try:
+                            resposta = await cliente.get(url, headers=headers)
+                        except httpx.HTTPError:
+                            return _amostra(nome, None, time.perf_counter() - inicio, None)
+                        return _amostra(nome, resposta.status_code, time.perf_counter() - inicio,
+                                        resposta.headers.get('Server-Timing'))
+                return await asyncio.gather(*(um(*requisicao) for requisicao in lote))
+
+        # Aquecimento: o primeiro request de cada worker importa as views e monta o cache da vitrine
+        asyncio.run(disparar(plano[:aquecimento], args.concorrencia))
+        inicio = time.perf_counter()
+        amostras = asyncio.run(disparar(plano, args.concorrencia))
+        duracao = time.perf_counter() - inicio
+        rss = _rss_dos_workers(processo.pid)
+        extras = {
+            'vazao': len(plano) / duracao,
+            'rss_mb': max(rss) if rss else None,
+            'rss_workers_mb': rss,
+        }
+    finally:
+        processo.terminate()
+        processo.wait(timeout=30)
+    return amostras, extras
+
+
+# --------------------------
+# RESULTADOS
+# --------------------------
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+METRICAS_ORCAMENTO = ('queries', 'db_ms', 'template_ms', 'total_ms')
+
+
+def orcamentos_do_plano(plano):
+    """Orçamento de INSTRUMENTACAO_ORCAMENTOS de cada view do plano, resolvido pela URL."""
+    from urllib.parse import urlsplit
+
+    from django.urls import resolve
+
+    from energia_solar.instrumentacao import orcamento_da_view
+
+    orcamentos = {}
+    for nome, url, _ in plano:
+        if nome not in orcamentos:
+            match = resolve(urlsplit(url).path)
+            orcamentos[nome] = orcamento_da_view(match._func_path, match.view_name)
+    return orcamentos
+
+
+def conferir_orcamento(lista, orcamento):
+    """(requisições acima do orçamento, estouros do pior caso de cada métrica)."""
+    from types import SimpleNamespace
+
+    from energia_solar.instrumentacao import verificar_orcamento
+
+    if not orcamento:
+        return 0, []
+    medidas = [a for a in lista if a['queries'] is not None]
+    acima = sum(1 for a in medidas if verificar_orcamento(SimpleNamespace(**a), orcamento))
+    pior = SimpleNamespace(**{m: max((a[m] for a in medidas), default=0) for m in METRICAS_ORCAMENTO})
+    return acima, verificar_orcamento(pior, orcamento)
+
+
+def resumir(amostras, mem_pico_kb, orcamentos):
+    por_view = {}
+    for amostra in amostras:
+        por_view.setdefault(amostra['view'], []).append(amostra)
+    resumo = {}
+    for nome, lista in por_view.items():
+        ok = [a for a in lista if a['ok']]
+        latencias = [a['ms'] for a in ok]
+        queries = [a['queries'] for a in ok if a['queries'] is not None]
+        db_ms = [a['db_ms'] for a in ok if a['db_ms'] is not None]
+        resumo[nome] = {
+            'requisicoes': len(lista),
+            'erros': len(lista) - len(ok),
+            'p50_ms': percentil(latencias, 0.50),
+            'p95_ms': percentil(latencias, 0.95),
+            'p99_ms': percentil(latencias, 0.99),
+            'media_ms': statistics.fmean(latencias) if latencias else None,
+            'queries_p50': percentil(queries, 0.50),
+            'queries_max': max(queries) if queries else None,
+            'db_p50_ms': percentil(db_ms, 0.50),
+            'mem_pico_kb': mem_pico_kb.get(nome),
+        }
+        acima, estouros = conferir_orcamento(ok, orcamentos.get(nome))
+        resumo[nome].update(orcamento=orcamentos.get(nome), acima_do_orcamento=acima, estouros=estouros)
+    return resumo
+
+
+def _fmt(valor, casas=1):
+    return '-' if valor is None else f'{valor:.{casas}f}'
+
+
+def imprimir(escala, resultado):
+    print(f"escala {escala}: semeadura {_fmt(resultado['semeadura_s'])} s "
+          f"({', '.join(f'{k} {v}' for k, v in resultado['linhas'].items())}), RSS {_fmt(resultado['rss_mb'])} MB"
+          + (f", {resultado['vazao']:.1f} req/s" if resultado.get('vazao') else ''))
+    print(f"    {'view':<22} {'n':>5} {'erros':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'queries':>8} {'db p50':>7} {'mem KB':>8}")
+    for nome, r in resultado['views'].items():
+        print(f"    {nome:<22} {r['requisicoes']:>5} {r['erros']:>5} {_fmt(r['p50_ms']):>8} {_fmt(r['p95_ms']):>8} "
+              f"{_fmt(r['p99_ms']):>8} {_fmt(r['queries_p50'], 0):>8} {_fmt(r['db_p50_ms']):>7} "
+              f"{_fmt(r['mem_pico_kb'], 0):>8}")
+    for nome, r in resultado['views'].items():
+        if r.get('estouros'):
+            print(f"    ORÇAMENTO EXCEDIDO em {nome}: {r['acima_do_orcamento']} de {r['requisicoes']} "
+                  f"requisições, pior caso {', '.join(r['estouros'])}")
+    print()
+
+
+def comparar(anterior, atual):
+    """Variação de p95 e queries por escala e view em relação a uma execução anterior."""
+    print(f"comparação com {anterior.get('commit')} ({anterior.get('data')}):")
+    print(f"    {'escala':>8} {'view':<22} {'p95 antes':>10} {'p95 agora':>10} {'var.':>7} {'queries':>10}")
+    for escala, resultado in atual['escalas'].items():
+        base = anterior.get('escalas', {}).get(escala)
+        if not base:
+            continue
+        for nome, r in resultado['views'].items():
+            b = base['views'].get(nome)
+            if not b or not b['p95_ms'] or r['p95_ms'] is None:
+                continue
+            variacao = (r['p95_ms'] - b['p95_ms']) / b['p95_ms'] * 100
+            queries = f"{_fmt(b['queries_p50'], 0)} -> {_fmt(r['queries_p50'], 0)}"
+            print(f"    {escala:>8} {nome:<22} {b['p95_ms']:>10.1f} {r['p95_ms']:>10.1f} {variacao:>+6.0f}% {queries:>10}")
+    print()
+
+
+def _commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        sujo = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f'{commit}-sujo' if sujo else commit
+
+
+# --------------------------
+# PROCESSO FILHO (UMA ESCALA)
+# --------------------------
+def rodar_escala(args):
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.db import connection, connections
+
+    from solar.models import Usuario
+
+    call_command('migrate', verbosity=0)
+    inicio = time.perf_counter()
+    arquivo_sessoes = args.banco_sqlite and f'{args.banco_sqlite}.sessoes.json'
+    if arquivo_sessoes and os.path.exists(arquivo_sessoes) and Usuario.objects.exists():
+        with open(arquivo_sessoes, encoding='utf-8') as f:
+            guardado = json.load(f)
+        linhas, sessoes = guardado['linhas'], guardado['sessoes']
+    else:
+        if Usuario.objects.exists():
+            raise SystemExit("O banco já tem dados; o benchmark precisa de um banco vazio para semear.")
+        linhas, sessoes = semear(args._escala, args.semente)
+        if arquivo_sessoes:
+            with open(arquivo_sessoes, 'w', encoding='utf-8') as f:
+                json.dump({'linhas': linhas, 'sessoes': sessoes}, f)
+    semeadura = time.perf_counter() - inicio
+    vendor = connection.vendor
+    connections.close_all()
+
+    plano = planejar(args.requisicoes, sessoes, args.semente, args.views)
+    aquecimento = min(len(plano), 50)
+    if args.modo == 'http':
+        amostras, extras = executar_http(plano, aquecimento, args)
+    else:
+        amostras, extras = executar_em_processo(plano, aquecimento)
+
+    resultado = {
+        'banco': vendor,
+        'semeadura_s': semeadura,
+        'linhas': linhas,
+        'views': resumir(amostras, extras.pop('mem_pico_kb', {}), orcamentos_do_plano(plano)),
+        **extras,
+    }
+    with open(args._saida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--escalas', type=int, nargs='+', default=[1000, 50000, 500000],
+                        help='Linhas de cada entidade (clientes, projetos, lançamentos, produtos).')
+    parser.add_argument('--views', nargs='+', choices=VIEWS, help='Só estas views da mistura (padrão: todas).')
+    parser.add_argument('--requisicoes', type=int, default=1000, help='Requisições medidas por escala.')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--modo', choices=['processo', 'http'], default='processo')
+    parser.add_argument('--servidor', choices=['wsgi', 'asgi'], default='wsgi', help='SERVIDOR_MODO no modo http.')
+    parser.add_argument('--workers', type=int, default=2, help='Workers do gunicorn no modo http.')
+    parser.add_argument('--concorrencia', type=int, default=10, help='Requisições simultâneas no modo http.')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--pasta', help='Guarda os bancos semeados aqui e os reaproveita nas próximas execuções.')
+    parser.add_argument('--json', help='Grava os resultados neste arquivo.')
+    parser.add_argument('--comparar', help='JSON de uma execução anterior para comparar p95 e queries.')
+    parser.add_argument('--_escala', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--_saida', help=argparse.SUPPRESS)
+    parser.add_argument('--banco-sqlite', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._escala:
+        rodar_escala(args)
+        return
+
+    banco_externo = os.environ.get('DATABASE_URL')
+    if banco_externo and len(args.escalas) > 1:
+        parser.error('com DATABASE_URL rode uma escala por vez, num banco vazio.')
+
+    pasta = args.pasta or tempfile.mkdtemp(prefix='bench_carga_')
+    os.makedirs(pasta, exist_ok=True)
+    relatorio = {
+        'commit': _commit(),
+        'data': datetime.datetime.now().isoformat(timespec='seconds'),
+        'modo': args.modo,
+        'servidor': args.servidor if args.modo == 'http' else None,
+        'workers': args.workers if args.modo == 'http' else None,
+        'concorrencia': args.concorrencia if args.modo == 'http' else 1,
+        'requisicoes': args.requisicoes,
+        'semente': args.semente,
+        'views': args.views,
+        'escalas': {},
+    }
+    try:
+        for escala in args.escalas:
+            banco = os.path.join(pasta, f'carga_{escala}_{args.semente}.sqlite3')
+            saida = os.path.join(pasta, f'resultado_{escala}.json')
+            ambiente = dict(
+                os.environ,
+                DATABASE_URL=banco_externo or f'sqlite:///{banco}',
+                DJANGO_SETTINGS_MODULE='energia_solar.settings',
+                # Server-Timing ligado e sem log por requisição: os orçamentos são
+                # conferidos no relatório, sem derrubar a requisição que estourou
+                INSTRUMENTACAO_ATIVA='True',
+                INSTRUMENTACAO_ESTRITA='False',
+                INSTRUMENTACAO_LOG_NIVEL='ERROR',
+                ALLOWED_HOSTS='testserver,127.0.0.1',
+                DEBUG='False',
+            )
+            comando = [sys.executable, os.path.abspath(__file__), '--_escala', str(escala), '--_saida', saida,
+                       '--requisicoes', str(args.requisicoes), '--semente', str(args.semente),
+                       '--modo', args.modo, '--servidor', args.servidor, '--workers', str(args.workers),
+                       '--concorrencia', str(args.concorrencia), '--timeout', str(args.timeout)]
+            if args.views:
+                comando += ['--views', *args.views]
+            if not banco_externo:
+                comando += ['--banco-sqlite', banco]
+            subprocess.run(comando, cwd=RAIZ, env=ambiente, check=True)
+            with open(saida, encoding='utf-8') as f:
+                resultado = json.load(f)
+            relatorio['escalas'][str(escala)] = resultado
+            imprimir(escala, resultado)
+    finally:
+        if not args.pasta:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            comparar(json.load(f), relatorio)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(relatorio, f, indent=2)
+    if any(r.get('estouros') for resultado in relatorio['escalas'].values() for r in resultado['views'].values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""
+Benchmark de checkouts simultâneos: gunicorn síncrono (WSGI) x workers uvicorn (ASGI).
+
+Sobe um servidor falso do Mercado Pago que demora --latencia segundos para
+criar cada preferência, inicia o gunicorn nos dois modos do gunicorn.conf.py
+(SERVIDOR_MODO=wsgi e asgi) com o mesmo número de workers e dispara
+checkouts (GET /mercadopago/iniciar/) de usuários diferentes, cada um com seu
+carrinho, em níveis crescentes de concorrência. Mostra vazão, latências e
+erros por modo. Usa um banco SQLite temporário; não toca no db.sqlite3.
+
+    python benchmarks/checkout_concorrente.py
+    python benchmarks/checkout_concorrente.py --workers 2 --latencia 0.5 --concorrencia 1 20 100 200
+    DATABASE_URL=postgres://... python benchmarks/checkout_concorrente.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def servidor_gateway(latencia):
+    """Mercado Pago falso: cada POST /checkout/preferences demora `latencia` segundos."""
+    contador = iter(range(1, 10 ** 9))
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            time.sleep(latencia)
+            corpo = json.dumps({'id': f'pref-{next(contador)}'}).encode()
+            self.send_response(201)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def popular(total_sessoes):
+    """Cria usuários com carrinho e devolve os cookies de sessão já autenticados."""
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+    from django.contrib.sessions.backends.db import SessionStore
+    from decimal import Decimal
+
+    from produtos.models import Produto
+    from solar.models import Cliente, Usuario
+
+    produtos = Produto.objects.bulk_create([
+        Produto(name=f'Painel {i}', slug=f'bench-painel-{i}', sku=f'BENCH-{i}', preco=Decimal('900.00'), stock=10 ** 6)
+        for i in range(20)
+    ])
+    Usuario.objects.bulk_create([
+        Usuario(username=f'bench{i}', email=f'bench{i}@example.com', is_customer=True)
+        for i in range(total_sessoes)
+    ])
+    usuarios = list(Usuario.objects.filter(username__startswith='bench').order_by('id'))
+    Cliente.objects.bulk_create([
+        Cliente(usuario=usuario, nome=usuario.username, email=usuario.email, telefone='1')
+        for usuario in usuarios
+    ])
+
+    cookies = []
+    for i, usuario in enumerate(usuarios):
+        sessao = SessionStore()
+        sessao[SESSION_KEY] = str(usuario.pk)
+        sessao[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        sessao[HASH_SESSION_KEY] = usuario.get_session_auth_hash()
+        sessao['carrinho'] = {str(produtos[i % len(produtos)].pk): 1}
+        sessao.create()
+        cookies.append(sessao.session_key)
+    return cookies
+
+
+def iniciar_servidor(modo, porta, workers, ambiente):
+    env = dict(ambiente, SERVIDOR_MODO=modo, PORT=str(porta), WEB_CONCURRENCY=str(workers))
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--log-level', 'warning', '--access-logfile', '/dev/null'],
+        cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    limite = time.monotonic() + 30
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            raise RuntimeError(f"gunicorn ({modo}) não subiu:\n{processo.stderr.read().decode()}")
+        try:
+            socket.create_connection(('127.0.0.1', porta), timeout=0.2).close()
+            break
+        except OSError:
+            time.sleep(0.2)
+    else:
+        processo.kill()
+        raise RuntimeError(f"gunicorn ({modo}) não respondeu na porta {porta}")
+
+    # Aquecimento: o primeiro request de cada worker importa as urls e as views
+    import httpx
+    for _ in range(workers * 4):
+        httpx.get(f'http://127.0.0.1:{porta}/mercadopago/iniciar/', timeout=30)
+    return processo
+
+
+async def disparar(url, cookies, concorrencia, timeout):
+    """Faz um checkout por cookie, com no máximo `concorrencia` em andamento."""
+    import httpx
+
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    latencias, erros = [], 0
+    semaforo = asyncio.Semaphore(concorrencia)
+
+    async with httpx.AsyncClient(limits=limites, timeout=timeout, follow_redirects=False) as cliente:
+        async def um(cookie):
+            nonlocal erros
+            async with semaforo:
+                inicio = time.perf_counter()
+                try:
+                    resposta = await cliente.get(url, headers={'Cookie': f'sessionid={cookie}'})
+                    ok = resposta.status_code == 302 and 'pref_id=' in resposta.headers.get('location', '')
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencias.append(time.perf_counter() - inicio)
+                else:
+                    erros += 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(um(cookie) for cookie in cookies))
+        duracao = time.perf_counter() - inicio
+
+    latencias.sort()
+
+    def percentil(p):
+        return latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000 if latencias else float('nan')
+
+    return {
+        'concorrencia': concorrencia,
+        'requisicoes': len(cookies),
+        'erros': erros,
+        'vazao': len(latencias) / duracao,
+        'p50_ms': percentil(0.50),
+        'p95_ms': percentil(0.95),
+        'media_ms': statistics.fmean(latencias) * 1000 if latencias else float('nan'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=1, help='Workers do gunicorn em cada modo.')
+    parser.add_argument('--latencia', type=float, default=0.3, help='Tempo (s) do gateway falso por preferência.')
+    parser.add_argument('--concorrencia', type=int, nargs='+', default=[1, 10, 50, 100])
+    parser.add_argument('--rodadas', type=int, default=3, help='Checkouts por nível = concorrência x rodadas.')
+    parser.add_argument('--modos', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--json', help='Grava os resultados neste arquivo.')
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix='bench_checkout_')
+    gateway = servidor_gateway(args.latencia)
+    ambiente = dict(
+        os.environ,
+        DATABASE_URL=os.environ.get('DATABASE_URL', f'sqlite:///{pasta}/bench.sqlite3'),
+        DJANGO_SETTINGS_MODULE='energia_solar.settings',
+        MERCADO_PAGO_API_URL=f'http://127.0.0.1:{gateway.server_port}',
+        MERCADO_PAGO_ACCESS_TOKEN='TEST-bench',
+        INSTRUMENTACAO_ATIVA='False',
+        ALLOWED_HOSTS='127.0.0.1',
+        DEBUG='False',
+    )
+    os.environ.update(ambiente)
+
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.db import connections
+
+    call_command('migrate', verbosity=0)
+    if ambiente['DATABASE_URL'].startswith('sqlite'):
+        # WAL: leituras não esperam as escritas dos outros workers
+        with sqlite3.connect(ambiente['DATABASE_URL'][len('sqlite:///'):]) as conexao:
+            conexao.execute('PRAGMA journal_mode=WAL')
+
+    por_modo = sum(nivel * args.rodadas for nivel in args.concorrencia)
+    cookies = popular(por_modo * len(args.modos))
+    connections.close_all()
+    print(f"gateway com {args.latencia * 1000:.0f} ms por preferência, {args.workers} worker(s) por modo, "
+          f"banco {ambiente['DATABASE_URL']}\n")
+
+    resultados = []
+    try:
+        for indice, modo in enumerate(args.modos):
+            porta = porta_livre()
+            processo = iniciar_servidor(modo, porta, args.workers, ambiente)
+            restantes = iter(cookies[indice * por_modo:(indice + 1) * por_modo])
+            try:
+                print(f"{modo.upper():<5} {'concorr.':>9} {'checkouts/s':>12} {'p50 ms':>9} {'p95 ms':>9} {'erros':>6}")
+                for nivel in args.concorrencia:
+                    lote = [next(restantes) for _ in range(nivel * args.rodadas)]
+                    resultado = asyncio.run(disparar(
+                        f'http://127.0.0.1:{porta}/mercadopago/iniciar/', lote, nivel, args.timeout,
+                    ))
+                    resultado['modo'] = modo
+                    resultados.append(resultado)
+                    print(f"{'':<5} {nivel:>9} {resultado['vazao']:>12.1f} {resultado['p50_ms']:>9.0f} "
+                          f"{resultado['p95_ms']:>9.0f} {resultado['erros']:>6}")
+                print()
+            finally:
+                processo.terminate()
+                processo.wait(timeout=30)
+    finally:
+        gateway.shutdown()
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'workers': args.workers, 'latencia': args.latencia, 'resultados': resultados}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
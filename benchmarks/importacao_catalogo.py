@@ -0,0 +1,80 @@
+"""
+Benchmark da importação/exportação do catálogo (produtos/importacao.py).
+
+Gera um CSV sintético com N produtos, importa num banco SQLite temporário
+(criação), reimporta (atualização de todos os SKUs) e exporta, medindo
+tempo e pico de memória do processo. Não toca no db.sqlite3 do projeto.
+
+    python benchmarks/importacao_catalogo.py --produtos 100000
+    DATABASE_URL=postgres://... python benchmarks/importacao_catalogo.py
+"""
+import argparse
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+
+def gerar_csv(caminho, total):
+    with open(caminho, 'w', encoding='utf-8', newline='') as f:
+        f.write('sku,name,description,preco,categoria_id,stock,peso,is_active\n')
+        for i in range(total):
+            f.write(
+                f'BENCH-{i:07d},Painel Solar {i % 700}W Modelo {i},Produto sintético {i},'
+                f'{100 + i % 5000}.90,paineis_solares,{i % 50},{(i % 30) + 1}.5,true\n'
+            )
+
+
+def medir(rotulo, funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    duracao = time.perf_counter() - inicio
+    pico_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{rotulo:<12} {duracao:8.1f}s   pico RSS {pico_mb:7.1f} MB   {resultado}")
+    return duracao
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--produtos', type=int, default=100_000)
+    parser.add_argument('--lote', type=int, default=None)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix='bench_catalogo_')
+    os.environ.setdefault('DATABASE_URL', f'sqlite:///{pasta}/bench.sqlite3')
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'energia_solar.settings')
+    os.environ.setdefault('INSTRUMENTACAO_ATIVA', 'False')
+
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from produtos.importacao import exportar_linhas, importar
+
+    call_command('migrate', verbosity=0)
+    csv_entrada = os.path.join(pasta, 'catalogo.csv')
+    gerar_csv(csv_entrada, args.produtos)
+    print(f"{args.produtos} produtos, banco {os.environ['DATABASE_URL']}")
+
+    def importar_arquivo():
+        with open(csv_entrada, 'rb') as f:
+            return importar(f, 'csv', lote=args.lote)
+
+    def exportar():
+        with open(os.path.join(pasta, 'exportado.csv'), 'w', encoding='utf-8', newline='') as f:
+            return sum(f.write(linha) for linha in exportar_linhas('csv'))
+
+    try:
+        medir('criação', importar_arquivo)
+        medir('atualização', importar_arquivo)
+        medir('exportação', lambda: f"{exportar()} bytes")
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
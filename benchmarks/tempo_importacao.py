@@ -0,0 +1,115 @@
+"""
+Tempo de importação e memória do boot de um worker, com orçamento.
+
+Cada cenário roda num processo novo com `python -X importtime`, como um
+worker do gunicorn recém-criado:
+
+- boot: carrega energia_solar.wsgi (django.setup + middlewares).
+- primeira_requisicao: boot + resolução das URLs, que importa todas as views.
+
+Mostra a mediana do tempo de parede, o pico de RSS e os módulos mais caros
+(tempo acumulado do -X importtime). Sai com código 1 se a mediana passar de
+--orcamento-ms ou se algum SDK que deve ser carregado sob demanda
+(energia_solar/clientes.py) aparecer já importado no boot.
+
+    python benchmarks/tempo_importacao.py
+    python benchmarks/tempo_importacao.py --repeticoes 10 --orcamento-ms 800 --json importacao.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Devem ficar fora do boot: são importados na primeira chamada ao serviço
+PROIBIDOS = ['google.generativeai', 'grpc', 'stripe', 'httpx']
+
+CENARIOS = {
+    'boot': '',
+    'primeira_requisicao': 'from django.urls import get_resolver; get_resolver().url_patterns',
+}
+
+PROCESSO_FILHO = """
+import json, os, resource, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'energia_solar.settings')
+inicio = time.perf_counter()
+from energia_solar.wsgi import application
+{extra}
+ms = (time.perf_counter() - inicio) * 1000
+print(json.dumps({{
+    'ms': ms,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'proibidos': [m for m in {proibidos!r} if m in sys.modules],
+}}))
+"""
+
+LINHA_IMPORTTIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def executar(extra):
+    codigo = PROCESSO_FILHO.format(extra=extra, proibidos=PROIBIDOS)
+    processo = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', codigo],
+        cwd=RAIZ, capture_output=True, text=True, check=True,
+        env=dict(os.environ, INSTRUMENTACAO_ATIVA='False'),
+    )
+    resultado = json.loads(processo.stdout.strip().splitlines()[-1])
+    modulos = []
+    for linha in processo.stderr.splitlines():
+        casamento = LINHA_IMPORTTIME.match(linha)
+        if casamento:
+            _, acumulado, recuo, nome = casamento.groups()
+            modulos.append((int(acumulado) / 1000, len(recuo) // 2, nome))
+    resultado['modulos'] = modulos
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--orcamento-ms', type=float, default=float(os.environ.get('ORCAMENTO_IMPORTACAO_MS', 1000)),
+                        help='Limite para a mediana de primeira_requisicao (ms).')
+    parser.add_argument('--top', type=int, default=15, help='Quantos módulos caros listar.')
+    parser.add_argument('--json', help='Grava os resultados neste arquivo.')
+    args = parser.parse_args()
+
+    resultados, falhas = {}, []
+    for cenario, extra in CENARIOS.items():
+        execucoes = [executar(extra) for _ in range(args.repeticoes)]
+        mediana = statistics.median(e['ms'] for e in execucoes)
+        rss = statistics.median(e['rss_mb'] for e in execucoes)
+        proibidos = sorted({m for e in execucoes for m in e['proibidos']})
+        resultados[cenario] = {'mediana_ms': mediana, 'rss_mb': rss, 'proibidos': proibidos}
+
+        print(f"{cenario}: mediana {mediana:.0f} ms, RSS {rss:.1f} MB ({args.repeticoes} execuções)")
+        # Módulos de primeiro nível do pacote (recuo <= 1) ordenados pelo acumulado
+        caros = sorted((m for m in execucoes[-1]['modulos'] if m[1] <= 1), reverse=True)[:args.top]
+        for acumulado, _, nome in caros:
+            print(f"    {acumulado:8.1f} ms  {nome}")
+        if proibidos:
+            falhas.append(f"{cenario} importou {', '.join(proibidos)} (deveriam carregar sob demanda)")
+        print()
+
+    if resultados['primeira_requisicao']['mediana_ms'] > args.orcamento_ms:
+        falhas.append(
+            f"primeira_requisicao levou {resultados['primeira_requisicao']['mediana_ms']:.0f} ms "
+            f"(orçamento {args.orcamento_ms:.0f} ms)"
+        )
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'orcamento_ms': args.orcamento_ms, 'cenarios': resultados, 'falhas': falhas}, f, indent=2)
+
+    for falha in falhas:
+        print(f"FALHOU: {falha}")
+    if falhas:
+        sys.exit(1)
+    print(f"OK: dentro do orçamento de {args.orcamento_ms:.0f} ms.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# energia_solar/arquivos.py
+"""
+Entrega de arquivos privados depois que a view autorizou o acesso.
+
+Em produção o nginx está na frente do gunicorn: a view só responde com o
+cabeçalho X-Accel-Redirect apontando para uma location `internal` do nginx
+(settings.ARQUIVOS_X_ACCEL_PREFIXO, ver nginx/conf.d/default.conf). O nginx
+então envia o arquivo do disco com sendfile e suporte a Range, e o worker
+Python fica livre logo depois da checagem de permissão.
+
+Sem o prefixo configurado (desenvolvimento, testes) o próprio Django envia
+o arquivo com FileResponse.
+"""
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.http import content_disposition_header
+
+
+def servir_arquivo(campo, nome_download=None, anexo=True):
+    """
+    Resposta de download para um FieldFile (FileField/ImageField) salvo no
+    storage local. `nome_download` é o nome sugerido ao navegador.
+    """
+    if not campo:
+        raise Http404("Arquivo não encontrado.")
+    nome_download = nome_download or os.path.basename(campo.name)
+    prefixo = settings.ARQUIVOS_X_ACCEL_PREFIXO
+
+    if not prefixo:
+        try:
+            arquivo = campo.open('rb')
+        except FileNotFoundError:
+            raise Http404("Arquivo não encontrado.")
+        return _sem_cache(FileResponse(arquivo, as_attachment=anexo, filename=nome_download))
+
+    tipo, codificacao = mimetypes.guess_type(campo.name)
+    # .gz/.bz2 vão como binário: o navegador não deve descompactar sozinho
+    response = HttpResponse(content_type=tipo if tipo and not codificacao else 'application/octet-stream')
+    # O nginx decodifica o caminho: nomes com espaço ou acento precisam ir escapados
+    response['X-Accel-Redirect'] = prefixo.rstrip('/') + '/' + quote(campo.name)
+    response['Content-Disposition'] = content_disposition_header(anexo, nome_download)
+    return _sem_cache(response)
+
+
+def _sem_cache(response):
+    # Documentos pessoais: nenhum proxy intermediário deve guardar cópia
+    response['Cache-Control'] = 'private, no-store'
+    response['X-Content-Type-Options'] = 'nosniff'
+    return response
@@ -3,6 +3,9 @@ ASGI config for energia_solar project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Servido por workers uvicorn sob o gunicorn com SERVIDOR_MODO=asgi
+(ver gunicorn.conf.py).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -0,0 +1,127 @@
+# energia_solar/clientes.py
+"""
+Clientes dos serviços externos (Gemini, Mercado Pago, Stripe), criados no
+primeiro uso.
+
+Importar os SDKs custa caro: google.generativeai carrega gRPC e protobuf e
+stripe carrega centenas de módulos de recursos. Importados no topo das views,
+todo worker do gunicorn pagaria esse custo (tempo de boot e memória) mesmo
+servindo só a vitrine. Aqui o import e a configuração acontecem na primeira
+chamada, uma única vez por processo, sob um lock (as views e as tarefas em
+segundo plano rodam em várias threads).
+
+Mudar as settings de um serviço (override_settings nos testes) descarta o
+cliente correspondente. benchmarks/tempo_importacao.py confere que o boot não
+volta a importar esses SDKs.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+_clientes = {}
+_lock = threading.Lock()
+
+
+def _obter(nome, fabrica):
+    cliente = _clientes.get(nome)
+    if cliente is None:
+        with _lock:
+            cliente = _clientes.get(nome)
+            if cliente is None:
+                cliente = _clientes[nome] = fabrica()
+    return cliente
+
+
+# Prefixo das settings -> clientes que dependem delas
+_DEPENDENCIAS = {
+    'GEMINI_': ('gemini',),
+    'MERCADO_PAGO_': ('mercado_pago',),
+    'STRIPE_': ('stripe',),
+}
+
+
+@receiver(setting_changed)
+def _descartar(setting, **kwargs):
+    for prefixo, nomes in _DEPENDENCIAS.items():
+        if setting.startswith(prefixo):
+            for nome in nomes:
+                _clientes.pop(nome, None)
+
+
+# --------------------------
+# Gemini
+# --------------------------
+def _criar_gemini():
+    import google.generativeai as genai
+
+    if settings.GEMINI_API_KEY:
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+    else:
+        logger.warning("Chave da API do Gemini não encontrada.")
+    return genai
+
+
+def gemini():
+    """Módulo google.generativeai configurado com settings.GEMINI_API_KEY."""
+    return _obter('gemini', _criar_gemini)
+
+
+# --------------------------
+# Mercado Pago
+# --------------------------
+def _criar_mercado_pago():
+    from mercadopago.sdk import SDK
+
+    from mp_integracao.notificacoes import ClienteHttpMercadoPago
+
+    return SDK(
+        settings.MERCADO_PAGO_ACCESS_TOKEN,
+        http_client=ClienteHttpMercadoPago(settings.MERCADO_PAGO_API_URL),
+    )
+
+
+def mercado_pago():
+    """
+    SDK do Mercado Pago compartilhado pelo processo, com o HttpClient de
+    conexões reaproveitadas (mp_integracao/notificacoes.py).
+    """
+    return _obter('mercado_pago', _criar_mercado_pago)
+
+
+# --------------------------
+# Stripe
+# --------------------------
+def _criar_stripe():
+    import stripe as sdk
+
+    sdk.api_key = settings.STRIPE_SECRET_KEY
+    sdk.api_base = settings.STRIPE_API_URL
+    return sdk
+
+
+def stripe():
+    """Módulo stripe com a api_key configurada (webhooks e chamadas síncronas)."""
+    return _obter('stripe', _criar_stripe)
+
+
+def stripe_async():
+    """StripeClient async do event loop corrente (ver energia_solar/http_async.py)."""
+    from .http_async import do_loop
+
+    sdk = stripe()
+    http_client = do_loop(
+        'stripe_http',
+        lambda: sdk.HTTPXClient(timeout=settings.GATEWAYS_TIMEOUT),
+        fechar=lambda cliente: cliente.close_async(),
+    )
+    return do_loop('stripe', lambda: sdk.StripeClient(
+        settings.STRIPE_SECRET_KEY,
+        base_addresses={'api': settings.STRIPE_API_URL},
+        http_client=http_client,
+        max_network_retries=2,
+    ))
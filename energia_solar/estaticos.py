@@ -0,0 +1,38 @@
+# energia_solar/estaticos.py
+"""
+WhiteNoise que também funciona na cadeia async de middlewares (ASGI).
+
+O WhiteNoiseMiddleware original é só síncrono. Sob ASGI, um único middleware
+síncrono faz o Django adaptar todo o resto da cadeia com async_to_sync: cada
+requisição a uma view async passa a ocupar uma thread enquanto espera o
+gateway, e a vantagem do modo async some.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class WhiteNoiseAssincronoMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        # Mesma busca do original; os arquivos são indexados na inicialização
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,84 @@
+# energia_solar/http_async.py
+"""
+Clientes HTTP assíncronos (httpx) das views que dependem de gateways externos
+(checkout do Mercado Pago e do Stripe).
+
+Enquanto a view aguarda o gateway, o event loop do worker atende outras
+requisições; no modo síncrono o worker inteiro fica parado esperando a
+resposta (ver gunicorn.conf.py, SERVIDOR_MODO).
+
+Um AsyncClient reaproveita conexões e sessões TLS, mas fica preso ao event
+loop em que foi usado. Sob ASGI há um loop por worker e o cliente dura o
+processo todo. Sob WSGI o Django roda cada view async num loop próprio, então
+os clientes são guardados por loop e fechados quando o loop termina: o
+asyncio.run e o async_to_sync cancelam as tasks pendentes antes de fechar o
+loop, e uma task de guarda criada no primeiro uso fecha os clientes nesse
+cancelamento, ainda dentro do loop.
+"""
+import asyncio
+import logging
+import weakref
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+_por_loop = weakref.WeakKeyDictionary()
+
+
+async def _fechar_no_fim_do_loop(loop, objetos, fechamentos):
+    try:
+        await asyncio.Event().wait()
+    finally:
+        _por_loop.pop(loop, None)
+        for nome, fechar in fechamentos.items():
+            try:
+                await fechar(objetos[nome])
+            except Exception:
+                logger.exception("Falha ao fechar o cliente %s do event loop", nome)
+
+
+def do_loop(nome, fabrica, fechar=None):
+    """
+    Objeto `nome` do event loop corrente, criado com `fabrica()` no primeiro uso.
+    `fechar(objeto)` (async) é aguardado quando o loop termina.
+    """
+    loop = asyncio.get_running_loop()
+    registro = _por_loop.get(loop)
+    if registro is None:
+        objetos, fechamentos = {}, {}
+        # A task fica no registro: o loop só guarda referências fracas às tasks
+        guarda = loop.create_task(_fechar_no_fim_do_loop(loop, objetos, fechamentos))
+        registro = _por_loop[loop] = (objetos, fechamentos, guarda)
+    objetos, fechamentos, _ = registro
+    if nome not in objetos:
+        objetos[nome] = fabrica()
+        if fechar is not None:
+            fechamentos[nome] = fechar
+    return objetos[nome]
+
+
+def _novo_cliente():
+    import httpx
+
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(settings.GATEWAYS_TIMEOUT, connect=5.0),
+        # retries: só falhas de conexão; um POST que chegou ao gateway não é repetido
+        transport=httpx.AsyncHTTPTransport(
+            retries=2,
+            limits=httpx.Limits(max_connections=settings.GATEWAYS_MAX_CONEXOES, max_keepalive_connections=20),
+        ),
+    )
+
+
+def cliente_http():
+    """httpx.AsyncClient compartilhado pelas views do event loop corrente."""
+    return do_loop('httpx', _novo_cliente, fechar=lambda cliente: cliente.aclose())
+
+
+@receiver(setting_changed)
+def _descartar_clientes(setting, **kwargs):
+    if setting.startswith(('GATEWAYS_', 'STRIPE_')):
+        _por_loop.clear()
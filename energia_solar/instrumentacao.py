@@ -0,0 +1,206 @@
+# energia_solar/instrumentacao.py
+"""
+Instrumentação por requisição: número de queries, tempo de banco, tempo de
+renderização de templates e tempo total.
+
+- InstrumentacaoMiddleware mede cada requisição, devolve os números no
+  cabeçalho Server-Timing (visível no DevTools do navegador). Com o logger
+  'energia_solar.instrumentacao' em INFO (INSTRUMENTACAO_LOG_NIVEL) grava
+  também uma linha JSON por requisição; o padrão é WARNING.
+- DjangoTemplatesInstrumentado é o backend de templates do projeto
+  (settings.TEMPLATES) com o render cronometrado. Queries disparadas durante
+  o render (querysets preguiçosos no template) contam como banco, não template.
+- settings.INSTRUMENTACAO_ORCAMENTOS define limites por view, pelo caminho da
+  função ('solar.views.cliente_dashboard') ou pelo nome da URL
+  ('crm:cliente_dashboard'). Com INSTRUMENTACAO_ESTRITA=True um orçamento
+  estourado levanta OrcamentoExcedido (os testes falham); caso contrário é
+  registrado como warning.
+"""
+import json
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+_medicao_atual = ContextVar('medicao_atual', default=None)
+
+
+class OrcamentoExcedido(AssertionError):
+    """Uma view passou do orçamento configurado em INSTRUMENTACAO_ORCAMENTOS."""
+
+
+class Medicao:
+    __slots__ = ('queries', 'db_ms', 'template_ms', 'total_ms')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+        self.total_ms = 0.0
+
+    def como_dict(self):
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db_ms, 2),
+            'template_ms': round(self.template_ms, 2),
+            'total_ms': round(self.total_ms, 2),
+        }
+
+
+def medicao_atual():
+    return _medicao_atual.get()
+
+
+def _cronometrar_query(execute, sql, params, many, context):
+    medicao = _medicao_atual.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao.db_ms += (time.perf_counter() - inicio) * 1000
+        medicao.queries += 1
+
+
+# --------------------------
+# TEMPLATES
+# --------------------------
+class TemplateInstrumentado(Template):
+
+    def render(self, context=None, request=None):
+        medicao = _medicao_atual.get()
+        if medicao is None:
+            return super().render(context, request)
+        inicio = time.perf_counter()
+        db_antes = medicao.db_ms
+        try:
+            return super().render(context, request)
+        finally:
+            decorrido = (time.perf_counter() - inicio) * 1000
+            medicao.template_ms += decorrido - (medicao.db_ms - db_antes)
+
+
+class DjangoTemplatesInstrumentado(DjangoTemplates):
+
+    def from_string(self, template_code):
+        return TemplateInstrumentado(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TemplateInstrumentado(template.template, self)
+
+
+# --------------------------
+# MIDDLEWARE
+# --------------------------
+def _nomes_da_view(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None, None
+    return match._func_path, match.view_name
+
+
+def orcamento_da_view(caminho, nome_url):
+    orcamentos = getattr(settings, 'INSTRUMENTACAO_ORCAMENTOS', {})
+    return orcamentos.get(caminho) or orcamentos.get(nome_url)
+
+
+def verificar_orcamento(medicao, orcamento):
+    """Devolve a lista de limites estourados, ex.: ['queries 14 > 10']."""
+    estouros = []
+    for metrica, limite in (orcamento or {}).items():
+        valor = getattr(medicao, metrica)
+        if valor > limite:
+            estouros.append(f"{metrica} {valor:g} > {limite:g}")
+    return estouros
+
+
+def _instrumentar_conexoes():
+    """
+    Instala o cronômetro nas conexões da thread corrente. Fica instalado: sem
+    medição ativa ele só repassa a query. Vai no início da lista porque o
+    contexto connection.execute_wrapper() de terceiros remove o último item.
+    """
+    for conexao in connections.all():
+        if _cronometrar_query not in conexao.execute_wrappers:
+            conexao.execute_wrappers.insert(0, _cronometrar_query)
+
+
+class InstrumentacaoMiddleware:
+    """Funciona nos dois modos: síncrono (WSGI) e async (ASGI, views async)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        if not getattr(settings, 'INSTRUMENTACAO_ATIVA', True):
+            return self.get_response(request)
+
+        medicao = Medicao()
+        token = _medicao_atual.set(medicao)
+        inicio = time.perf_counter()
+        try:
+            _instrumentar_conexoes()
+            response = self.get_response(request)
+        finally:
+            medicao.total_ms = (time.perf_counter() - inicio) * 1000
+            _medicao_atual.reset(token)
+        return self._registrar(request, response, medicao)
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'INSTRUMENTACAO_ATIVA', True):
+            return await self.get_response(request)
+
+        # O ORM das views async roda com sync_to_async na thread da requisição
+        # (ThreadSensitiveContext do handler ASGI); sync_to_async copia o
+        # contexto, então as queries daquela thread somam nesta medição
+        medicao = Medicao()
+        token = _medicao_atual.set(medicao)
+        inicio = time.perf_counter()
+        try:
+            await sync_to_async(_instrumentar_conexoes)()
+            response = await self.get_response(request)
+        finally:
+            medicao.total_ms = (time.perf_counter() - inicio) * 1000
+            _medicao_atual.reset(token)
+        return self._registrar(request, response, medicao)
+
+    def _registrar(self, request, response, medicao):
+        caminho, nome_url = _nomes_da_view(request)
+        response['Server-Timing'] = (
+            f'db;dur={medicao.db_ms:.1f};desc="{medicao.queries} queries", '
+            f'tpl;dur={medicao.template_ms:.1f}, '
+            f'total;dur={medicao.total_ms:.1f}'
+        )
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'view': caminho,
+                'url_name': nome_url,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                **medicao.como_dict(),
+            }))
+
+        estouros = verificar_orcamento(medicao, orcamento_da_view(caminho, nome_url))
+        if estouros:
+            mensagem = f"Orçamento excedido em {caminho or request.path}: {', '.join(estouros)}"
+            if getattr(settings, 'INSTRUMENTACAO_ESTRITA', False):
+                raise OrcamentoExcedido(mensagem)
+            logger.warning(mensagem)
+        return response
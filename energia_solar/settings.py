@@ -73,9 +73,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primeiro da lista para medir a requisição inteira (energia_solar/instrumentacao.py)
+    'energia_solar.instrumentacao.InstrumentacaoMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    # WhiteNoise DEVE estar logo após SecurityMiddleware
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise DEVE estar logo após SecurityMiddleware (versão que também
+    # roda na cadeia async sob ASGI, energia_solar/estaticos.py)
+    'energia_solar.estaticos.WhiteNoiseAssincronoMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -90,7 +93,8 @@ ROOT_URLCONF = 'energia_solar.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates com o tempo de render medido pela instrumentação
+        'BACKEND': 'energia_solar.instrumentacao.DjangoTemplatesInstrumentado',
         'DIRS': [
             os.path.join(BASE_DIR, 'templates'),
             os.path.join(BASE_DIR, 'solar', 'templates'),
@@ -110,6 +114,40 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'energia_solar.wsgi.application'
 
+# --- INSTRUMENTAÇÃO (energia_solar/instrumentacao.py) ---
+# Queries, tempo de banco, de template e total por requisição, no cabeçalho
+# Server-Timing e em linhas JSON no logger 'energia_solar.instrumentacao'.
+INSTRUMENTACAO_ATIVA = env.bool('INSTRUMENTACAO_ATIVA', default=True)
+# True: estourar um orçamento levanta OrcamentoExcedido (use no CI)
+INSTRUMENTACAO_ESTRITA = env.bool('INSTRUMENTACAO_ESTRITA', default=False)
+# Limites por view (caminho da função ou nome da URL).
+# Métricas: queries, db_ms, template_ms, total_ms.
+# ver_carrinho: sessão + usuário + um in_bulk para todas as linhas.
+INSTRUMENTACAO_ORCAMENTOS = {
+    'solar.views.cliente_dashboard': {'queries': 8},
+    'produtos.views.ver_carrinho': {'queries': 4},
+    'produtos.views.home': {'queries': 10},
+    'produtos.views.produtos_por_categoria': {'queries': 10},
+    'produtos.views.search': {'queries': 10},
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # Padrão WARNING: só orçamentos estourados. INSTRUMENTACAO_LOG_NIVEL=INFO
+        # liga uma linha JSON por requisição (o Server-Timing sai sempre)
+        'energia_solar.instrumentacao': {
+            'handlers': ['console'],
+            'level': env('INSTRUMENTACAO_LOG_NIVEL', default='WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 # ==============================================================================
 # BANCO DE DADOS (CONFIGURAÇÃO CLOUD RUN / SOCKET)
 # ==============================================================================
@@ -130,7 +168,9 @@ if CLOUD_SQL_CONNECTION_NAME:
             'PASSWORD': env('DB_PASSWORD'),
             # Porta fica vazia ao usar socket
             'PORT': '',
-            'CONN_MAX_AGE': 600,
+            # Sob ASGI (SERVIDOR_MODO=asgi, ver gunicorn.conf.py) cada requisição roda o
+            # ORM numa thread própria: conexões persistentes ficariam presas a threads mortas
+            'CONN_MAX_AGE': 0 if env('SERVIDOR_MODO', default='wsgi') == 'asgi' else 600,
             'CONN_HEALTH_CHECKS': True,
         }
     }
@@ -143,6 +183,69 @@ else:
             default=f'sqlite:///{BASE_DIR}/db.sqlite3'
         )
     }
+    if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+        # Sob ASGI várias threads escrevem ao mesmo tempo: transações IMMEDIATE
+        # esperam o lock (até `timeout` s) em vez de falhar com "database is locked"
+        DATABASES['default'].setdefault('OPTIONS', {}).setdefault('transaction_mode', 'IMMEDIATE')
+        DATABASES['default']['OPTIONS'].setdefault('timeout', 20)
+
+# ==============================================================================
+# CACHE
+# ==============================================================================
+
+# Padrão: memória local de cada worker (locmemcache://).
+# Para compartilhar entre workers use arquivo ou Redis, ex.:
+#   CACHE_URL=filecache:///var/tmp/solarhub_cache
+#   CACHE_URL=rediscache://127.0.0.1:6379/1
+CACHES = {
+    'default': env.cache_url('CACHE_URL', default='locmemcache://'),
+}
+
+# Cache do catálogo da vitrine (produtos/catalogo.py)
+CATALOGO_CACHE_ALIAS = env('CATALOGO_CACHE_ALIAS', default='default')
+CATALOGO_CACHE_TIMEOUT = env.int('CATALOGO_CACHE_TIMEOUT', default=60 * 60)
+# Produtos em destaque na vitrine (os mais recentes); o restante do catálogo
+# fica nas páginas de categoria e de busca, paginadas com CATALOGO_POR_PAGINA
+CATALOGO_HOME_DESTAQUES = env.int('CATALOGO_HOME_DESTAQUES', default=24)
+CATALOGO_POR_PAGINA = env.int('CATALOGO_POR_PAGINA', default=24)
+
+# Índice de regiões de frete (produtos/frete.py): cada worker confere a versão
+# no banco no máximo uma vez a cada N segundos. Alterações feitas em outro
+# worker demoram até N segundos para valer; 0 confere a cada cotação.
+FRETE_VERSAO_INTERVALO = env.float('FRETE_VERSAO_INTERVALO', default=5.0)
+
+# Listas do CRM (solar/listagem.py): paginação por cursor; a contagem de
+# registros para de contar neste limite e mostra "mais de N"
+CRM_LISTAS_POR_PAGINA = env.int('CRM_LISTAS_POR_PAGINA', default=25)
+CRM_LISTAS_LIMITE_CONTAGEM = env.int('CRM_LISTAS_LIMITE_CONTAGEM', default=10000)
+
+# Importação de catálogo (produtos/importacao.py): linhas por upsert em lote
+CATALOGO_IMPORTACAO_LOTE = env.int('CATALOGO_IMPORTACAO_LOTE', default=1000)
+
+# Busca de produtos (produtos/busca.py). Vazio = escolhe pelo banco
+# (PostgreSQL: tsvector + GIN; SQLite: FTS5; outros: icontains).
+PRODUTOS_BUSCA_BACKEND = env('PRODUTOS_BUSCA_BACKEND', default='')
+
+# ==============================================================================
+# TAREFAS EM SEGUNDO PLANO (energia_solar/tarefas.py)
+# ==============================================================================
+# Executadas em threads do próprio processo, após o commit da requisição.
+# TAREFAS_SINCRONAS=True roda tudo na hora (útil em testes e depuração).
+TAREFAS_WORKERS = env.int('TAREFAS_WORKERS', default=2)
+TAREFAS_SINCRONAS = env.bool('TAREFAS_SINCRONAS', default=False)
+
+# Cadastro de produtos por IA (produtos/ingestao.py)
+INGESTAO_IA_WORKERS = env.int('INGESTAO_IA_WORKERS', default=4)
+INGESTAO_IA_LOTE = env.int('INGESTAO_IA_LOTE', default=10)
+
+# Cache das respostas da IA por hash da imagem (produtos/cache_ia.py).
+# Backends: produtos.cache_ia.CacheAnaliseDjango (usa CACHES),
+# produtos.cache_ia.CacheAnaliseSQLite (arquivo local) ou vazio para desligar.
+ANALISE_IA_CACHE_BACKEND = env('ANALISE_IA_CACHE_BACKEND', default='produtos.cache_ia.CacheAnaliseSQLite')
+ANALISE_IA_CACHE_ALIAS = env('ANALISE_IA_CACHE_ALIAS', default='default')
+ANALISE_IA_CACHE_TTL = env.int('ANALISE_IA_CACHE_TTL', default=30 * 24 * 60 * 60)
+ANALISE_IA_CACHE_MAX_ITENS = env.int('ANALISE_IA_CACHE_MAX_ITENS', default=5000)
+ANALISE_IA_CACHE_ARQUIVO = env('ANALISE_IA_CACHE_ARQUIVO', default=os.path.join(BASE_DIR, 'var', 'analise_ia_cache.sqlite3'))
 
 # ==============================================================================
 # ARQUIVOS ESTÁTICOS (WHITENOISE)
@@ -158,6 +261,25 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Downloads protegidos (energia_solar/arquivos.py). Com nginx na frente, a view
+# só autoriza e devolve X-Accel-Redirect para esta location interna, que
+# aponta para MEDIA_ROOT (ex.: '/protegido/'). Vazio = o Django envia o arquivo.
+ARQUIVOS_X_ACCEL_PREFIXO = env('ARQUIVOS_X_ACCEL_PREFIXO', default='')
+
+# Uploads em partes (solar/uploads.py): arquivos em montagem ficam em
+# UPLOADS_DIR; envios parados há mais de UPLOADS_EXPIRACAO_HORAS são
+# apagados pelo comando limpar_uploads
+UPLOADS_DIR = env('UPLOADS_DIR', default=os.path.join(BASE_DIR, 'var', 'uploads'))
+UPLOADS_TAMANHO_PARTE = env.int('UPLOADS_TAMANHO_PARTE', default=5 * 1024 * 1024)
+UPLOADS_TAMANHO_MAXIMO = env.int('UPLOADS_TAMANHO_MAXIMO', default=500 * 1024 * 1024)
+UPLOADS_EXPIRACAO_HORAS = env.int('UPLOADS_EXPIRACAO_HORAS', default=24)
+
+# Variantes das imagens da vitrine (produtos/derivadas.py): larguras geradas
+# em WebP e JPEG, qualidade de compressão e largura usada no src padrão
+IMAGENS_LARGURAS = env.list('IMAGENS_LARGURAS', cast=int, default=[320, 640, 1024, 1600])
+IMAGENS_QUALIDADE = env.int('IMAGENS_QUALIDADE', default=80)
+IMAGENS_LARGURA_PADRAO = env.int('IMAGENS_LARGURA_PADRAO', default=1024)
+
 # --- OUTRAS CONFIGURAÇÕES ---
 
 # Modelo de usuário
@@ -206,10 +328,50 @@ DEFAULT_FROM_EMAIL = env('DEFAULT_FROM_EMAIL', default='')
 
 # API Keys
 GEMINI_API_KEY = env('GEMINI_API_KEY', default=None)
+EMBEDDINGS_MODELO = env('EMBEDDINGS_MODELO', default='models/embedding-001')
+
+# Índice de similaridade de imagens (produtos/similaridade.py): matrizes .npy
+# memory-mapped, compartilhadas pelos workers do mesmo host.
+SIMILARIDADE_INDICE_DIR = env('SIMILARIDADE_INDICE_DIR', default=os.path.join(BASE_DIR, 'var', 'similaridade'))
+
+# Busca por imagem (produtos/views.py busca_por_imagem): cada envio gera uma
+# chamada paga à API de embeddings. Limita o tamanho do arquivo e quantas
+# buscas cada IP faz por janela; a contagem fica em CACHES, então com
+# locmem o limite vale por worker (use Redis para um limite global).
+BUSCA_IMAGEM_TAMANHO_MAXIMO = env.int('BUSCA_IMAGEM_TAMANHO_MAXIMO', default=5 * 1024 * 1024)
+BUSCA_IMAGEM_LIMITE_POR_JANELA = env.int('BUSCA_IMAGEM_LIMITE_POR_JANELA', default=10)
+BUSCA_IMAGEM_JANELA_SEGUNDOS = env.int('BUSCA_IMAGEM_JANELA_SEGUNDOS', default=60)
+BUSCA_IMAGEM_CACHE_ALIAS = env('BUSCA_IMAGEM_CACHE_ALIAS', default='default')
+
+# Pipeline de geração de embeddings (produtos/embeddings.py)
+EMBEDDINGS_PROVEDOR = env('EMBEDDINGS_PROVEDOR', default='produtos.embeddings.ProvedorGemini')
+EMBEDDINGS_WORKERS = env.int('EMBEDDINGS_WORKERS', default=4)
+EMBEDDINGS_REQUISICOES_POR_SEGUNDO = env.float('EMBEDDINGS_REQUISICOES_POR_SEGUNDO', default=1.0)
+EMBEDDINGS_CHECKPOINT = env('EMBEDDINGS_CHECKPOINT', default=os.path.join(BASE_DIR, 'var', 'embeddings-checkpoint.json'))
+
+# Checkout (produtos/checkout.py): por quanto tempo o estoque fica reservado
+# para um pedido pendente. Os links de pagamento expiram no mesmo prazo e o
+# comando expirar_reservas_estoque devolve o estoque depois disso.
+CHECKOUT_RESERVA_MINUTOS = env.int('CHECKOUT_RESERVA_MINUTOS', default=60)
+
 STRIPE_SECRET_KEY = env('SECRET_KEY_STRIPE', default='')
 STRIPE_PUBLIC_KEY = env('STRIPE_PUBLIC_KEY', default='')
+# Segredo de assinatura do endpoint /pagamento/webhook/ (painel do Stripe ou `stripe listen`).
+# Vazio = o webhook recusa todos os eventos (503): sem ele qualquer um assinaria um evento.
+STRIPE_WEBHOOK_SECRET = env('STRIPE_WEBHOOK_SECRET', default='')
+# URL base da API do Stripe (aponte para um servidor falso local em testes/benchmarks)
+STRIPE_API_URL = env('STRIPE_API_URL', default='https://api.stripe.com')
 MERCADO_PAGO_PUBLIC_KEY = env('MERCADO_PAGO_PUBLIC_KEY', default='')
 MERCADO_PAGO_ACCESS_TOKEN = env('MERCADO_PAGO_ACCESS_TOKEN', default='')
 MERCADO_PAGO_CLIENT_ID = env('MERCADO_PAGO_CLIENT_ID', default='')
 MERCADO_PAGO_CLIENT_SECRET = env('MERCADO_PAGO_CLIENT_SECRET', default='')
+# URL base da API (aponte para um servidor falso local em testes/homologação)
+MERCADO_PAGO_API_URL = env('MERCADO_PAGO_API_URL', default='https://api.mercadopago.com')
+# Chave secreta do webhook (painel do Mercado Pago). Vazio = webhook recusado
+# (401), exceto com DEBUG ligado, quando o x-signature não é conferido.
+MERCADO_PAGO_WEBHOOK_SECRET = env('MERCADO_PAGO_WEBHOOK_SECRET', default='')
+# Clientes HTTP async das views de checkout (energia_solar/http_async.py):
+# tempo máximo de cada chamada (s) e conexões simultâneas por worker
+GATEWAYS_TIMEOUT = env.float('GATEWAYS_TIMEOUT', default=20.0)
+GATEWAYS_MAX_CONEXOES = env.int('GATEWAYS_MAX_CONEXOES', default=100)
 NGROK_URL = env('NGROK_URL', default='')
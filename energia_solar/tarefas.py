@@ -0,0 +1,52 @@
+# energia_solar/tarefas.py
+"""
+Execução de tarefas em segundo plano dentro do próprio processo.
+
+As tarefas são agendadas com transaction.on_commit, então só começam depois
+que os dados criados pela requisição estão visíveis para outras conexões.
+Cada tarefa roda num pool de threads limitado (settings.TAREFAS_WORKERS) e
+fecha suas conexões de banco ao terminar.
+
+Não há fila persistente: se o processo morrer, o trabalho pendente deve ser
+retomado pelo comando de manutenção correspondente (ex.: processar_ingestoes).
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _obter_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.TAREFAS_WORKERS,
+                    thread_name_prefix='tarefas',
+                )
+    return _executor
+
+
+def _executar(funcao, args, kwargs):
+    try:
+        funcao(*args, **kwargs)
+    except Exception:
+        logger.exception("Falha na tarefa em segundo plano %s", getattr(funcao, '__name__', funcao))
+    finally:
+        connections.close_all()
+
+
+def enfileirar(funcao, *args, **kwargs):
+    """Agenda `funcao(*args, **kwargs)` para depois do commit da transação corrente."""
+    if settings.TAREFAS_SINCRONAS:
+        transaction.on_commit(lambda: funcao(*args, **kwargs))
+        return
+    transaction.on_commit(lambda: _obter_executor().submit(_executar, funcao, args, kwargs))
@@ -0,0 +1,40 @@
+# gunicorn.conf.py
+"""
+Configuração do gunicorn, lida automaticamente quando ele é iniciado na raiz
+do projeto (Procfile, dockerfile).
+
+SERVIDOR_MODO escolhe como o Django é servido:
+
+- wsgi (padrão): workers síncronos com energia_solar.wsgi. Cada worker
+  atende uma requisição por vez; enquanto espera o Mercado Pago ou o Stripe
+  no checkout, fica parado.
+- asgi: workers uvicorn com energia_solar.asgi. As views de checkout são
+  async (mp_integracao/views.py, pagamento/views.py) e, enquanto aguardam o
+  gateway, o mesmo worker atende outras requisições. O ORM continua
+  síncrono, chamado com sync_to_async.
+
+WEB_CONCURRENCY define o número de workers. Para comparar os dois modos,
+veja benchmarks/checkout_concorrente.py.
+
+Com mais de um worker, o que precisa ser visto por todos fica no banco: as
+sessões e os tokens de versão (produtos/versoes.py) que invalidam o payload
+da vitrine, o índice de frete e o de similaridade. Com o CACHE_URL padrão
+(locmem) continuam por worker só o limite da busca por imagem (cada worker
+conta o seu) e as estatísticas de acerto do cache da vitrine; aponte
+CACHE_URL para o Redis se precisar deles globais.
+"""
+import os
+
+modo = os.environ.get('SERVIDOR_MODO', 'wsgi')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+# O checkout pode esperar o gateway até GATEWAYS_TIMEOUT
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '60'))
+accesslog = '-'
+
+if modo == 'asgi':
+    wsgi_app = 'energia_solar.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'energia_solar.wsgi:application'
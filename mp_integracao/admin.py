@@ -1,3 +1,11 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import NotificacaoMercadoPago
+
+
+@admin.register(NotificacaoMercadoPago)
+class NotificacaoMercadoPagoAdmin(admin.ModelAdmin):
+    list_display = ('payment_id', 'evento', 'status', 'status_pagamento', 'tentativas', 'recebida_em', 'processada_em')
+    list_filter = ('status',)
+    search_fields = ('payment_id', 'evento')
+    readonly_fields = ('payload', 'recebida_em', 'iniciada_em', 'processada_em')
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.2 on 2026-10-18 09:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mp_integracao', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacaoMercadoPago',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_id', models.CharField(max_length=64, verbose_name='ID do Pagamento')),
+                ('evento', models.CharField(max_length=100, verbose_name='Evento')),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('recebida', 'Recebida'), ('processando', 'Processando'), ('processada', 'Processada'), ('ignorada', 'Ignorada'), ('erro', 'Erro')], db_index=True, default='recebida', max_length=20)),
+                ('tentativas', models.PositiveIntegerField(default=0)),
+                ('erro', models.TextField(blank=True, default='')),
+                ('status_pagamento', models.CharField(blank=True, default='', max_length=50, verbose_name='Status no Mercado Pago')),
+                ('recebida_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciada_em', models.DateTimeField(blank=True, null=True)),
+                ('processada_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Notificação do Mercado Pago',
+                'verbose_name_plural': 'Notificações do Mercado Pago',
+                'ordering': ['-recebida_em'],
+                'constraints': [models.UniqueConstraint(fields=('payment_id', 'evento'), name='notificacao_mp_unica')],
+            },
+        ),
+    ]
@@ -29,4 +29,40 @@ class TransacaoMercadoPago(models.Model):
     # ----------------------------------------
 
     def __str__(self):
-        return f"Transação MP {self.payment_id} - Pedido {self.pedido.id} - Status: {self.status}"
\ No newline at end of file
+        return f"Transação MP {self.payment_id} - Pedido {self.pedido.id} - Status: {self.status}"
+
+class NotificacaoMercadoPago(models.Model):
+    """
+    Registro de idempotência dos webhooks do Mercado Pago: uma linha por
+    (payment_id, evento). Reenvios da mesma notificação caem na mesma linha
+    e não são processados de novo.
+    """
+    STATUS_CHOICES = [
+        ('recebida', 'Recebida'),
+        ('processando', 'Processando'),
+        ('processada', 'Processada'),
+        ('ignorada', 'Ignorada'),
+        ('erro', 'Erro'),
+    ]
+
+    payment_id = models.CharField(max_length=64, verbose_name="ID do Pagamento")
+    evento = models.CharField(max_length=100, verbose_name="Evento")
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='recebida', db_index=True)
+    tentativas = models.PositiveIntegerField(default=0)
+    erro = models.TextField(blank=True, default='')
+    status_pagamento = models.CharField(max_length=50, blank=True, default='', verbose_name="Status no Mercado Pago")
+    recebida_em = models.DateTimeField(auto_now_add=True)
+    iniciada_em = models.DateTimeField(null=True, blank=True)
+    processada_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Notificação do Mercado Pago"
+        verbose_name_plural = "Notificações do Mercado Pago"
+        ordering = ['-recebida_em']
+        constraints = [
+            models.UniqueConstraint(fields=['payment_id', 'evento'], name='notificacao_mp_unica'),
+        ]
+
+    def __str__(self):
+        return f"Notificação MP {self.payment_id} ({self.evento}) - {self.status}"
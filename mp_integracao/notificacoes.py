@@ -0,0 +1,293 @@
+# mp_integracao/notificacoes.py
+"""
+Processamento assíncrono e idempotente dos webhooks do Mercado Pago.
+
+1. A view do webhook valida o payload, grava a notificação em
+   NotificacaoMercadoPago (única por payment_id + evento) e responde 200 na
+   hora. Reenvios da mesma notificação não geram trabalho novo.
+2. Uma tarefa em segundo plano (energia_solar/tarefas.py) reserva a
+   notificação com um UPDATE condicional, consulta o pagamento na API com o
+   cliente compartilhado e aplica atualizar_status_pagamento na mesma
+   transação que marca a notificação como processada, então o status do
+   pedido muda uma única vez por notificação.
+3. Notificações com erro (ou presas em 'processando' após um restart) são
+   retomadas pelo comando processar_notificacoes_mp.
+
+A preferência de pagamento do checkout é criada pela versão async
+(criar_preferencia), usada pela view async de mp_integracao/views.py.
+
+settings.MERCADO_PAGO_API_URL permite apontar os clientes para um servidor
+falso local em testes, homologação e benchmarks.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import threading
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from mercadopago.http import HttpClient
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from energia_solar import clientes
+from energia_solar.http_async import cliente_http
+from produtos.checkout import cancelar_pedido, confirmar_pagamento
+from produtos.models import Pedido
+from .models import NotificacaoMercadoPago, TransacaoMercadoPago
+
+logger = logging.getLogger(__name__)
+
+URL_API_PADRAO = 'https://api.mercadopago.com'
+REPROCESSAVEIS = ('recebida', 'erro')
+
+
+# =========================
+# Cliente compartilhado
+# =========================
+class ClienteHttpMercadoPago(HttpClient):
+    """
+    HttpClient do SDK com uma requests.Session por thread (conexões
+    reaproveitadas entre chamadas) e URL base configurável.
+    O HttpClient padrão abre uma sessão nova a cada requisição.
+    """
+
+    def __init__(self, url_base=URL_API_PADRAO, tentativas=3):
+        self.url_base = url_base.rstrip('/')
+        self.tentativas = tentativas
+        self._local = threading.local()
+
+    def _sessao(self):
+        sessao = getattr(self._local, 'sessao', None)
+        if sessao is None:
+            sessao = requests.Session()
+            adaptador = HTTPAdapter(max_retries=Retry(
+                total=self.tentativas, backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+            ))
+            sessao.mount('https://', adaptador)
+            sessao.mount('http://', adaptador)
+            self._local.sessao = sessao
+        return sessao
+
+    def request(self, method, url, maxretries=None, **kwargs):
+        if url.startswith(URL_API_PADRAO):
+            url = self.url_base + url[len(URL_API_PADRAO):]
+        resposta = self._sessao().request(method, url, **kwargs)
+        resultado = {'status': resposta.status_code, 'response': None}
+        if resposta.status_code != 204 and resposta.content:
+            try:
+                resultado['response'] = resposta.json()
+            except ValueError:
+                logger.warning("Resposta não-JSON do Mercado Pago (%s %s)", method, url)
+        return resultado
+
+
+async def criar_preferencia(dados, chave_idempotencia=None):
+    """
+    Versão async de clientes.mercado_pago().preference().create(dados) para as views de
+    checkout: mesmo retorno ({'status', 'response'}), sem bloquear o worker.
+    """
+    cabecalhos = {'Authorization': f'Bearer {settings.MERCADO_PAGO_ACCESS_TOKEN}'}
+    if chave_idempotencia:
+        # Um retry do cliente não cria uma segunda preferência
+        cabecalhos['X-Idempotency-Key'] = chave_idempotencia
+    resposta = await cliente_http().post(
+        settings.MERCADO_PAGO_API_URL.rstrip('/') + '/checkout/preferences', json=dados, headers=cabecalhos,
+    )
+    resultado = {'status': resposta.status_code, 'response': None}
+    if resposta.content:
+        try:
+            resultado['response'] = resposta.json()
+        except ValueError:
+            logger.warning("Resposta não-JSON do Mercado Pago ao criar preferência (%s)", resposta.status_code)
+    return resultado
+
+
+# =========================
+# Atualizar status do pedido
+# =========================
+# Status do pagamento no Mercado Pago -> status registrado na TransacaoMercadoPago
+STATUS_TRANSACAO = {
+    'approved': 'pago',
+    'pending': 'pendente',
+    'rejected': 'cancelado',
+    'cancelled': 'cancelado',
+}
+
+
+def atualizar_status_pagamento(pedido, status_pagamento_mp):
+    """
+    Aplica o status do pagamento ao pedido pelas transições condicionais de
+    produtos/checkout.py. Notificações chegam fora de ordem: um 'rejected'
+    atrasado não cancela um pedido pago, um 'pending' não reabre um pedido
+    cancelado e um 'approved' depois do cancelamento refaz a reserva de
+    estoque (ou marca o pedido para revisão manual).
+    """
+    if status_pagamento_mp == 'approved':
+        confirmar_pagamento(pedido.pk)
+    elif status_pagamento_mp in ('rejected', 'cancelled'):
+        cancelar_pedido(pedido.pk)
+    pedido.refresh_from_db(fields=['status', 'data_pagamento', 'estoque_reservado', 'revisao_manual'])
+
+    TransacaoMercadoPago.objects.filter(pedido=pedido).update(
+        status=STATUS_TRANSACAO.get(status_pagamento_mp, status_pagamento_mp),
+        data_atualizacao=timezone.now()
+    )
+
+
+# =========================
+# Recebimento (webhook)
+# =========================
+def assinatura_valida(request, data_id):
+    """
+    Confere o cabeçalho x-signature (HMAC-SHA256 com a chave secreta do
+    webhook). Sem MERCADO_PAGO_WEBHOOK_SECRET configurado, recusa tudo, a não
+    ser com DEBUG ligado (desenvolvimento local).
+    """
+    segredo = settings.MERCADO_PAGO_WEBHOOK_SECRET
+    if not segredo:
+        if settings.DEBUG:
+            return True
+        logger.error("MERCADO_PAGO_WEBHOOK_SECRET não configurado: webhook do Mercado Pago recusado.")
+        return False
+    partes = dict(
+        parte.strip().split('=', 1)
+        for parte in request.headers.get('x-signature', '').split(',')
+        if '=' in parte
+    )
+    ts, recebida = partes.get('ts'), partes.get('v1')
+    if not ts or not recebida:
+        return False
+    manifesto = f"id:{str(data_id).lower()};"
+    if request.headers.get('x-request-id'):
+        manifesto += f"request-id:{request.headers['x-request-id']};"
+    manifesto += f"ts:{ts};"
+    esperada = hmac.new(segredo.encode(), manifesto.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(esperada, recebida)
+
+
+def extrair_notificacao(request):
+    """
+    Lê a notificação do corpo JSON (webhooks) ou da query string (IPN).
+    Retorna (payment_id, evento, payload) ou None se não for de pagamento.
+
+    O evento combina a ação ('payment.updated') com o id da notificação,
+    quando o Mercado Pago o envia: reenvios repetem o id, mudanças de status
+    do mesmo pagamento chegam com ids novos.
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    if not isinstance(payload, dict):
+        return None
+
+    dados = payload.get('data') if isinstance(payload.get('data'), dict) else {}
+    topico = payload.get('type') or payload.get('topic') or request.GET.get('type') or request.GET.get('topic')
+    payment_id = dados.get('id') or request.GET.get('data.id') or request.GET.get('id')
+    if topico != 'payment' or not payment_id or not str(payment_id).isalnum():
+        return None
+
+    evento = payload.get('action') or topico
+    if payload.get('id'):
+        evento = f"{evento}:{payload['id']}"
+    return str(payment_id), evento[:100], payload
+
+
+def registrar_notificacao(payment_id, evento, payload):
+    """Retorna (notificacao, deve_processar)."""
+    try:
+        with transaction.atomic():
+            notificacao = NotificacaoMercadoPago.objects.create(
+                payment_id=payment_id, evento=evento, payload=payload,
+            )
+        return notificacao, True
+    except IntegrityError:
+        notificacao = NotificacaoMercadoPago.objects.get(payment_id=payment_id, evento=evento)
+        # Reenvio de uma notificação que falhou: tenta de novo
+        return notificacao, notificacao.status == 'erro'
+
+
+# =========================
+# Processamento
+# =========================
+def _finalizar(notificacao_id, status, erro='', status_pagamento=''):
+    NotificacaoMercadoPago.objects.filter(pk=notificacao_id).update(
+        status=status, erro=erro, status_pagamento=status_pagamento,
+        processada_em=timezone.now(),
+    )
+
+
+def processar_notificacao(notificacao_id):
+    """
+    Processa uma notificação reservada por este worker. Retorna o status
+    final, ou None se outra execução já a reservou/concluiu.
+    """
+    reservada = NotificacaoMercadoPago.objects.filter(
+        pk=notificacao_id, status__in=REPROCESSAVEIS,
+    ).update(status='processando', tentativas=F('tentativas') + 1, iniciada_em=timezone.now())
+    if not reservada:
+        return None
+
+    payment_id = NotificacaoMercadoPago.objects.values_list('payment_id', flat=True).get(pk=notificacao_id)
+    try:
+        resultado = clientes.mercado_pago().payment().get(payment_id)
+    except Exception as e:
+        logger.warning("Falha ao consultar pagamento %s no Mercado Pago: %s", payment_id, e)
+        _finalizar(notificacao_id, 'erro', erro=str(e))
+        return 'erro'
+
+    if resultado.get('status') != 200:
+        # Inclui 404: logo após a notificação o pagamento pode ainda não estar
+        # visível na API; o comando processar_notificacoes_mp tenta de novo
+        _finalizar(notificacao_id, 'erro', erro=f"Mercado Pago respondeu {resultado.get('status')}.")
+        return 'erro'
+
+    pagamento = resultado.get('response') or {}
+    status_mp = pagamento.get('status') or ''
+    pedido_id = str(pagamento.get('external_reference') or '')
+
+    with transaction.atomic():
+        pedido = None
+        if pedido_id.isdigit():
+            pedido = Pedido.objects.select_for_update().filter(pk=pedido_id).first()
+        if pedido is None:
+            logger.warning("Pedido %s não encontrado no webhook (payment_id=%s).", pedido_id, payment_id)
+            _finalizar(notificacao_id, 'ignorada', erro=f"Pedido {pedido_id or '-'} não encontrado.", status_pagamento=status_mp)
+            return 'ignorada'
+
+        atualizar_status_pagamento(pedido, status_mp)
+        _finalizar(notificacao_id, 'processada', status_pagamento=status_mp)
+
+    logger.info("Pagamento %s do Pedido %s -> %s", payment_id, pedido.id, status_mp)
+    return 'processada'
+
+
+def processar_pendentes(max_tentativas=5, expirar_apos=timedelta(minutes=10)):
+    """
+    Retoma notificações recebidas, com erro ou presas em 'processando' há
+    mais de `expirar_apos` (worker que morreu no meio). Retorna {status: quantidade}.
+    """
+    limite = timezone.now() - expirar_apos
+    NotificacaoMercadoPago.objects.filter(status='processando', iniciada_em__lt=limite).update(
+        status='erro', erro="Processamento interrompido.",
+    )
+
+    ids = list(
+        NotificacaoMercadoPago.objects
+        .filter(Q(status='recebida') | Q(status='erro', tentativas__lt=max_tentativas))
+        .order_by('recebida_em')
+        .values_list('id', flat=True)
+    )
+    contagem = {}
+    for notificacao_id in ids:
+        status = processar_notificacao(notificacao_id)
+        if status:
+            contagem[status] = contagem.get(status, 0) + 1
+    return contagem
@@ -1,3 +1,273 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import threading
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from produtos.checkout import cancelar_pedido, criar_pedido
+from produtos.models import Pedido, Produto
+from solar.models import Cliente, Usuario
+
+from .models import NotificacaoMercadoPago
+
+
+class ServidorFalsoMercadoPago:
+    """
+    Servidor HTTP local que responde GET /v1/payments/<id> a partir de um dict
+    e POST /checkout/preferences com o status em `status_preferencia`.
+    """
+
+    def __init__(self):
+        self.pagamentos = {}
+        self.consultas = []
+        self.preferencias = []
+        self.status_preferencia = 201
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                servidor.consultas.append(self.path)
+                payment_id = self.path.rsplit('/', 1)[-1]
+                if payment_id not in servidor.pagamentos:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                corpo = json.dumps(servidor.pagamentos[payment_id]).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def do_POST(self):
+                corpo = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                servidor.preferencias.append((dict(self.headers), corpo))
+                if servidor.status_preferencia < 300:
+                    resposta = json.dumps({'id': f'pref-{len(servidor.preferencias)}'}).encode()
+                else:
+                    resposta = json.dumps({'message': 'internal_error', 'status': servidor.status_preferencia}).encode()
+                self.send_response(servidor.status_preferencia)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(resposta)))
+                self.end_headers()
+                self.wfile.write(resposta)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def parar(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class WebhookMercadoPagoTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ServidorFalsoMercadoPago()
+        cls.addClassCleanup(cls.servidor.parar)
+
+    def setUp(self):
+        self.servidor.pagamentos.clear()
+        self.servidor.consultas.clear()
+        configuracao = override_settings(
+            MERCADO_PAGO_API_URL=self.servidor.url, MERCADO_PAGO_ACCESS_TOKEN='TEST-token',
+            MERCADO_PAGO_WEBHOOK_SECRET='segredo', TAREFAS_SINCRONAS=True,
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.pedido = Pedido.objects.create(total=Decimal('300.00'), status='pendente', metodo_pagamento='mercadopago')
+
+    def notificar(self, payment_id='123', notificacao_id=1, **cabecalhos):
+        if 'HTTP_X_SIGNATURE' not in cabecalhos:
+            assinatura = hmac.new(b'segredo', f'id:{payment_id};ts:1;'.encode(), hashlib.sha256).hexdigest()
+            cabecalhos['HTTP_X_SIGNATURE'] = f'ts=1,v1={assinatura}'
+        corpo = {'action': 'payment.updated', 'type': 'payment', 'id': notificacao_id, 'data': {'id': payment_id}}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('mp_integracao:webhook_mercado_pago'), json.dumps(corpo),
+                content_type='application/json', **cabecalhos,
+            )
+
+    def test_processa_pagamento_uma_unica_vez(self):
+        self.servidor.pagamentos['123'] = {'status': 'approved', 'external_reference': str(self.pedido.id)}
+
+        for _ in range(3):
+            self.assertEqual(self.notificar().status_code, 200)
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'pago')
+        self.assertEqual(len(self.servidor.consultas), 1)
+        notificacao = NotificacaoMercadoPago.objects.get()
+        self.assertEqual((notificacao.status, notificacao.tentativas), ('processada', 1))
+
+    def test_payload_invalido(self):
+        response = self.client.post(
+            reverse('mp_integracao:webhook_mercado_pago'), json.dumps({'type': 'merchant_order'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(NotificacaoMercadoPago.objects.exists())
+
+    def test_erro_na_api_e_retomado_pelo_comando(self):
+        # Pagamento ainda não visível na API: a notificação fica com erro
+        self.notificar(payment_id='999')
+        self.assertEqual(NotificacaoMercadoPago.objects.get().status, 'erro')
+
+        self.servidor.pagamentos['999'] = {'status': 'rejected', 'external_reference': str(self.pedido.id)}
+        call_command('processar_notificacoes_mp', stdout=StringIO())
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'cancelado')
+        self.assertEqual(NotificacaoMercadoPago.objects.get().status, 'processada')
+
+    def pedido_com_reserva(self, estoque=5, quantidade=2):
+        produto = Produto.objects.create(name='Inversor', preco=Decimal('150.00'), stock=estoque, sku='INV-1')
+        linhas = [{'produto': produto, 'quantidade': quantidade, 'preco_unitario': produto.preco,
+                   'subtotal': produto.preco * quantidade}]
+        pedido = criar_pedido(usuario=None, email_cliente='', linhas=linhas, metodo_pagamento='mercadopago')
+        return pedido, produto
+
+    def test_aprovacao_depois_do_cancelamento_refaz_a_reserva(self):
+        pedido, produto = self.pedido_com_reserva()
+        cancelar_pedido(pedido.id)
+        self.servidor.pagamentos['123'] = {'status': 'approved', 'external_reference': str(pedido.id)}
+        self.notificar()
+
+        pedido.refresh_from_db()
+        produto.refresh_from_db()
+        self.assertEqual((pedido.status, pedido.estoque_reservado, pedido.revisao_manual), ('pago', True, False))
+        self.assertEqual(produto.stock, 3)
+
+    def test_aprovacao_depois_do_cancelamento_sem_estoque_vai_para_revisao(self):
+        pedido, produto = self.pedido_com_reserva()
+        cancelar_pedido(pedido.id)
+        Produto.objects.filter(pk=produto.pk).update(stock=1)
+        self.servidor.pagamentos['123'] = {'status': 'approved', 'external_reference': str(pedido.id)}
+        self.notificar()
+
+        pedido.refresh_from_db()
+        produto.refresh_from_db()
+        self.assertEqual((pedido.status, pedido.estoque_reservado, pedido.revisao_manual), ('pago', False, True))
+        self.assertEqual(produto.stock, 1)
+
+    def test_recusa_atrasada_nao_cancela_pedido_pago(self):
+        pedido, produto = self.pedido_com_reserva()
+        self.servidor.pagamentos['123'] = {'status': 'approved', 'external_reference': str(pedido.id)}
+        self.servidor.pagamentos['124'] = {'status': 'rejected', 'external_reference': str(pedido.id)}
+        self.notificar(payment_id='123', notificacao_id=1)
+        self.notificar(payment_id='124', notificacao_id=2)
+
+        pedido.refresh_from_db()
+        produto.refresh_from_db()
+        self.assertEqual((pedido.status, pedido.estoque_reservado), ('pago', True))
+        self.assertEqual(produto.stock, 3)
+
+    def test_pendente_atrasado_nao_reabre_pedido_cancelado(self):
+        pedido, produto = self.pedido_com_reserva()
+        self.servidor.pagamentos['124'] = {'status': 'rejected', 'external_reference': str(pedido.id)}
+        self.servidor.pagamentos['123'] = {'status': 'pending', 'external_reference': str(pedido.id)}
+        self.notificar(payment_id='124', notificacao_id=1)
+        self.notificar(payment_id='123', notificacao_id=2)
+
+        pedido.refresh_from_db()
+        produto.refresh_from_db()
+        self.assertEqual((pedido.status, pedido.estoque_reservado), ('cancelado', False))
+        self.assertEqual(produto.stock, 5)
+
+    def test_assinatura_invalida_e_recusada(self):
+        with self.assertLogs('mp_integracao.views', 'WARNING'):
+            self.assertEqual(self.notificar(HTTP_X_SIGNATURE='ts=1,v1=abc').status_code, 401)
+
+        manifesto = 'id:123;request-id:req-1;ts:1;'
+        assinatura = hmac.new(b'segredo', manifesto.encode(), hashlib.sha256).hexdigest()
+        response = self.notificar(HTTP_X_SIGNATURE=f'ts=1,v1={assinatura}', HTTP_X_REQUEST_ID='req-1')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(MERCADO_PAGO_WEBHOOK_SECRET='')
+    def test_sem_segredo_recusa_fora_do_debug(self):
+        self.servidor.pagamentos['123'] = {'status': 'approved', 'external_reference': str(self.pedido.id)}
+        with self.assertLogs('mp_integracao.notificacoes', 'ERROR'):
+            self.assertEqual(self.notificar(HTTP_X_SIGNATURE='').status_code, 401)
+        self.assertFalse(NotificacaoMercadoPago.objects.exists())
+
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.notificar(HTTP_X_SIGNATURE='').status_code, 200)
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'pago')
+
+
+class CheckoutMercadoPagoTests(TestCase):
+    """A view de checkout é async: roda pelo AsyncClient, como sob ASGI."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ServidorFalsoMercadoPago()
+        cls.addClassCleanup(cls.servidor.parar)
+
+    def setUp(self):
+        self.servidor.preferencias.clear()
+        self.servidor.status_preferencia = 201
+        configuracao = override_settings(MERCADO_PAGO_API_URL=self.servidor.url, MERCADO_PAGO_ACCESS_TOKEN='TEST-token')
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.usuario = Usuario.objects.create_user('comprador', 'comprador@example.com', 'senha', is_customer=True)
+        Cliente.objects.create(usuario=self.usuario, nome='Comprador', email='comprador@example.com', telefone='1')
+        self.painel = Produto.objects.create(name='Painel 550W', preco=Decimal('900.00'), stock=5, sku='PNL-550')
+        self.inversor = Produto.objects.create(name='Inversor 5kW', preco=Decimal('3000.00'), stock=5, sku='INV-5K')
+
+    async def pagar(self, *produtos):
+        await self.async_client.aforce_login(self.usuario)
+        sessao = await self.async_client.asession()
+        await sessao.aset('carrinho', {str(self.painel.id): 2, str(self.inversor.id): 1})
+        await sessao.asave()
+        with self.assertLogs('energia_solar.instrumentacao') as logs:
+            response = await self.async_client.post(
+                reverse('mp_integracao:processar_pagamento_selecionado'),
+                {'itens_selecionados': [str(produto.id) for produto in produtos]},
+            )
+        return response, json.loads(logs.records[-1].getMessage())
+
+    async def test_cria_preferencia_so_com_os_itens_marcados(self):
+        response, medicao = await self.pagar(self.painel)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.endswith('pref_id=pref-1'))
+        pedido = await Pedido.objects.aget()
+        self.assertEqual((pedido.status, pedido.total), ('pendente', Decimal('1800.00')))
+        cabecalhos, corpo = self.servidor.preferencias[0]
+        self.assertEqual(cabecalhos['Authorization'], 'Bearer TEST-token')
+        self.assertEqual(cabecalhos['X-Idempotency-Key'], f'pedido-{pedido.id}')
+        self.assertEqual([(item['title'], item['quantity']) for item in corpo['items']], [('Painel 550W', 2)])
+        self.assertEqual(corpo['external_reference'], str(pedido.id))
+        # O ORM roda em sync_to_async e continua medido pela instrumentação
+        self.assertGreater(medicao['queries'], 0)
+
+        sessao = await self.async_client.asession()
+        self.assertEqual(await sessao.aget('carrinho'), {str(self.inversor.id): 1})
+        await self.painel.arefresh_from_db()
+        self.assertEqual(self.painel.stock, 3)
+
+    async def test_falha_no_gateway_cancela_pedido_e_devolve_estoque(self):
+        self.servidor.status_preferencia = 500
+        response, _ = await self.pagar(self.painel, self.inversor)
+
+        self.assertRedirects(response, reverse('produtos:ver_carrinho'), fetch_redirect_response=False)
+        pedido = await Pedido.objects.aget()
+        self.assertEqual(pedido.status, 'cancelado')
+        await self.painel.arefresh_from_db()
+        self.assertEqual(self.painel.stock, 5)
+        sessao = await self.async_client.asession()
+        self.assertEqual(len(await sessao.aget('carrinho')), 2)
@@ -1,10 +1,9 @@
-import json
 import logging
 from decimal import Decimal, InvalidOperation
 
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
@@ -12,19 +11,18 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.http import HttpResponse
 
-from mercadopago.sdk import SDK
-
-from produtos.models import Pedido, Produto
+from produtos.carrinho import Carrinho
+from produtos.checkout import EstoqueInsuficiente, cancelar_pedido, criar_pedido, prazo_reserva
+from produtos.models import Produto
 from solar.models import Cliente
-from .models import TransacaoMercadoPago
+from energia_solar.tarefas import enfileirar
+from .notificacoes import (
+    assinatura_valida, criar_preferencia, extrair_notificacao,
+    processar_notificacao, registrar_notificacao,
+)
 
 logger = logging.getLogger(__name__)
 
-# =========================
-# SDK Mercado Pago
-# =========================
-mp_sdk = SDK(settings.MERCADO_PAGO_ACCESS_TOKEN)
-
 # =========================
 # Utilitários
 # =========================
@@ -48,46 +46,30 @@ def _abs_url(request, route_name):
         return f"https://{host}{path}"
     return request.build_absolute_uri(path)
 
-# =========================
-# Atualizar status do pedido
-# =========================
-def atualizar_status_pagamento(pedido, status_pagamento_mp):
-    if status_pagamento_mp == 'approved':
-        pedido.status = 'pago'
-        pedido.data_pagamento = timezone.now()
-        novo_status = 'pago'
-    elif status_pagamento_mp == 'pending':
-        pedido.status = 'pendente'
-        novo_status = 'pendente'
-    elif status_pagamento_mp == 'rejected':
-        pedido.status = 'cancelado'
-        novo_status = 'cancelado'
-    else:
-        novo_status = status_pagamento_mp
-
-    pedido.save()
-    TransacaoMercadoPago.objects.filter(pedido=pedido).update(
-        status=novo_status,
-        data_atualizacao=timezone.now()
-    )
-
 # =========================
 # Fluxo de Pagamento
 # =========================
-@login_required
-def iniciar_pagamento_selecionado_flow(request):
-    carrinho = request.session.get('carrinho', {})
-    if not carrinho:
+# A view é async: a chamada ao Mercado Pago não prende o worker (sob ASGI,
+# ver gunicorn.conf.py). Sessão, carrinho e pedido continuam no ORM síncrono,
+# isolados em funções chamadas com sync_to_async.
+def _preparar_pagamento(request):
+    """Cria o pedido e monta a preferência. Retorna (pedido, linhas, preferência) ou um redirect."""
+    carrinho = Carrinho(request.session)
+    linhas, _ = carrinho.linhas()
+    # Se o usuário marcou só alguns itens no carrinho, paga apenas esses
+    selecionados = request.session.pop('itens_pagamento_atual', None)
+    if selecionados:
+        linhas = [linha for linha in linhas if str(linha['produto'].pk) in selecionados]
+    if not linhas:
         messages.error(request, "O carrinho está vazio.")
         return redirect('produtos:ver_carrinho')
 
     itens_mp = []
-    total_calculado = Decimal('0.00')
 
-    for produto_id_str, item in carrinho.items():
-        nome = item.get('nome') or item.get('title') or "Produto"
-        preco = _dec_or_none(item.get('preco_unitario') or item.get('unit_price'))
-        qtd = item.get('quantidade') or item.get('quantity') or 1
+    for linha in linhas:
+        nome = linha['produto'].name or "Produto"
+        preco = linha['preco_unitario']
+        qtd = linha['quantidade']
 
         if preco is None or preco <= 0:
             messages.error(request, f"O item '{nome}' tem preço inválido.")
@@ -98,8 +80,22 @@ def iniciar_pagamento_selecionado_flow(request):
             "quantity": int(qtd),
             "unit_price": float(preco),
         })
-        total_calculado += preco * int(qtd)
 
+    perfil = Cliente.objects.filter(usuario=request.user).only('email').first()
+    # Pedido, itens e reserva de estoque numa única transação
+    try:
+        pedido = criar_pedido(
+            usuario=request.user,
+            email_cliente=perfil.email if perfil else request.user.email,
+            linhas=linhas,
+            metodo_pagamento='mercadopago',
+        )
+    except EstoqueInsuficiente as e:
+        messages.error(request, str(e))
+        return redirect('produtos:ver_carrinho')
+
+    # O link de pagamento expira junto com a reserva de estoque
+    agora = timezone.localtime()
     preference_data = {
         "items": itens_mp,
         "back_urls": {
@@ -108,25 +104,44 @@ def iniciar_pagamento_selecionado_flow(request):
             "pending": _abs_url(request, "mp_integracao:pagamento_pendente"),
         },
         "auto_return": "approved",
-        "external_reference": str(request.user.id),
+        "external_reference": str(pedido.id),
+        "expires": True,
+        "expiration_date_from": agora.isoformat(timespec='milliseconds'),
+        "expiration_date_to": (agora + prazo_reserva()).isoformat(timespec='milliseconds'),
     }
     logger.info("Dados de preferência enviados ao Mercado Pago: %s", preference_data)
+    return pedido, linhas, preference_data
+
+
+def _tirar_do_carrinho(request, linhas, preference_id):
+    request.session['mp_preference_id'] = preference_id
+    carrinho = Carrinho(request.session)
+    for linha in linhas:
+        carrinho.remover(linha['produto'].pk)
+
+
+@login_required
+async def iniciar_pagamento_selecionado_flow(request):
+    preparo = await sync_to_async(_preparar_pagamento)(request)
+    if isinstance(preparo, HttpResponse):
+        return preparo
+    pedido, linhas, preference_data = preparo
 
     try:
-        result = mp_sdk.preference().create(preference_data)
+        result = await criar_preferencia(preference_data, chave_idempotencia=f"pedido-{pedido.id}")
 
-        if "response" in result and "id" in result["response"]:
+        if "response" in result and "id" in (result["response"] or {}):
             preference_id = result["response"]["id"]
         else:
+            await sync_to_async(cancelar_pedido)(pedido.id)
             messages.error(request, f"Não foi possível criar a preferência no Mercado Pago. Retorno: {result}")
             return redirect('produtos:ver_carrinho')
 
-        request.session['mp_preference_id'] = preference_id
-        request.session.modified = True
-
+        await sync_to_async(_tirar_do_carrinho)(request, linhas, preference_id)
         return redirect(f"https://www.mercadopago.com.br/checkout/v1/redirect?pref_id={preference_id}")
 
     except Exception as e:
+        await sync_to_async(cancelar_pedido)(pedido.id)
         logger.error("Erro ao criar pagamento no Mercado Pago: %s", e, exc_info=True)
         messages.error(request, f"Erro ao criar pagamento: {e}")
         return redirect('produtos:ver_carrinho')
@@ -135,38 +150,26 @@ def iniciar_pagamento_selecionado_flow(request):
 # Webhook Mercado Pago
 # =========================
 @csrf_exempt
+@require_POST
 def webhook_mercado_pago(request):
-    if request.method != 'POST':
-        return HttpResponse(status=405)
+    """
+    Só registra a notificação e responde; a consulta à API e a atualização do
+    pedido acontecem em segundo plano (mp_integracao/notificacoes.py).
+    """
+    notificacao = extrair_notificacao(request)
+    if notificacao is None:
+        logger.warning("Webhook sem ID de pagamento válido.")
+        return HttpResponse(status=400)
 
-    try:
-        data = json.loads(request.body or "{}")
-        topic = data.get('topic') or data.get('type')
-        payment_id = data.get('data', {}).get('id')
-
-        if topic != 'payment' or not payment_id:
-            logger.warning("Webhook sem ID de pagamento válido.")
-            return HttpResponse(status=400)
-
-        sdk = SDK(settings.MERCADO_PAGO_ACCESS_TOKEN)
-        payment_info = sdk.payment().get(payment_id)
-
-        if payment_info.get('status') == 200:
-            status_pagamento_mp = payment_info['response'].get('status')
-            pedido_id = payment_info['response'].get('external_reference')
-
-            if pedido_id:
-                try:
-                    pedido = Pedido.objects.get(pk=pedido_id)
-                    atualizar_status_pagamento(pedido, status_pagamento_mp)
-                    logger.info("Pagamento %s do Pedido %s -> %s", payment_id, pedido.id, status_pagamento_mp)
-                except Pedido.DoesNotExist:
-                    logger.warning("Pedido %s não encontrado no webhook (payment_id=%s).", pedido_id, payment_id)
-
-        return HttpResponse(status=200)
-    except Exception as e:
-        logger.error("Erro no webhook do Mercado Pago: %s", e, exc_info=True)
-        return HttpResponse(status=500)
+    payment_id, evento, payload = notificacao
+    if not assinatura_valida(request, payment_id):
+        logger.warning("Webhook do Mercado Pago com assinatura inválida (payment_id=%s).", payment_id)
+        return HttpResponse(status=401)
+
+    registro, processar = registrar_notificacao(payment_id, evento, payload)
+    if processar:
+        enfileirar(processar_notificacao, registro.id)
+    return HttpResponse(status=200)
 
 # =========================
 # Callbacks de retorno
@@ -186,15 +189,14 @@ def pagamento_pendente(request):
 # =========================
 # Seleção de itens → inicia fluxo
 # =========================
-@login_required
-@require_POST
-def processar_pagamento_selecionado(request):
+def _selecionar_itens(request):
+    """Guarda na sessão os itens marcados. Retorna um redirect se não houver o que pagar."""
     itens_selecionados_ids = request.POST.getlist('itens_selecionados')
     if not itens_selecionados_ids:
         messages.warning(request, "Nenhum item foi selecionado para pagamento.")
         return redirect('produtos:ver_carrinho')
 
-    carrinho = request.session.get('carrinho', {})
+    carrinho = Carrinho(request.session)
     if not carrinho:
         messages.error(request, "Seu carrinho está vazio.")
         return redirect('produtos:ver_carrinho')
@@ -202,7 +204,7 @@ def processar_pagamento_selecionado(request):
     itens_para_pagamento = {}
     for item_id in itens_selecionados_ids:
         if item_id in carrinho:
-            itens_para_pagamento[item_id] = carrinho[item_id]
+            itens_para_pagamento[item_id] = carrinho.quantidade(item_id)
         else:
             messages.warning(request, f"O item {item_id} não está mais no carrinho.")
 
@@ -212,4 +214,13 @@ def processar_pagamento_selecionado(request):
 
     request.session['itens_pagamento_atual'] = itens_para_pagamento
     request.session.modified = True
-    return iniciar_pagamento_selecionado_flow(request)
+    return None
+
+
+@login_required
+@require_POST
+async def processar_pagamento_selecionado(request):
+    resposta = await sync_to_async(_selecionar_itens)(request)
+    if resposta is not None:
+        return resposta
+    return await iniciar_pagamento_selecionado_flow(request)
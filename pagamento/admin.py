@@ -1,3 +1,11 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import EventoStripe
+
+
+@admin.register(EventoStripe)
+class EventoStripeAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'status', 'tentativas', 'recebido_em', 'processado_em')
+    list_filter = ('status', 'tipo')
+    search_fields = ('id',)
+    readonly_fields = ('payload', 'recebido_em', 'iniciado_em', 'processado_em')
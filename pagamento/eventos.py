@@ -0,0 +1,168 @@
+# pagamento/eventos.py
+"""
+Processamento dos eventos do webhook do Stripe.
+
+A view do webhook confere a assinatura, grava o evento em EventoStripe
+(chave = id do evento, então reenvios são descartados) e responde na hora.
+O processamento roda em segundo plano (energia_solar/tarefas.py): reserva o
+evento com um UPDATE condicional e atualiza o Pedido na mesma transação que
+marca o evento como processado. Eventos com erro, ou que ficaram em
+'processando' quando o processo caiu, são retomados pelo comando
+processar_eventos_stripe.
+
+A página de sucesso só lê o Pedido local; quem confirma o pagamento é o
+webhook, mesmo que o comprador nunca volte do checkout. Antes de marcar um
+pedido como pago a sessão é relida na API do Stripe (checkout.Session.retrieve):
+o status de pagamento vem de lá, não do corpo do evento.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from energia_solar import clientes
+from produtos.checkout import cancelar_pedido, confirmar_pagamento
+from produtos.models import Pedido
+from .models import EventoStripe
+
+logger = logging.getLogger(__name__)
+
+REPROCESSAVEIS = ('recebido', 'erro')
+
+
+# =========================
+# Atualização do pedido
+# =========================
+def _pedido_da_sessao(sessao):
+    """Localiza o Pedido pelo metadata, client_reference_id ou id da sessão."""
+    pedido_id = str((sessao.get('metadata') or {}).get('pedido_id') or sessao.get('client_reference_id') or '')
+    pedidos = Pedido.objects.select_for_update()
+    if pedido_id.isdigit():
+        return pedidos.filter(pk=pedido_id).first()
+    return pedidos.filter(stripe_id=sessao.get('id')).first()
+
+
+def _marcar_pago(pedido, sessao):
+    # Transição condicional: um pedido já cancelado só é pago se a reserva de
+    # estoque puder ser refeita (produtos.checkout.confirmar_pagamento)
+    campos = {'stripe_id': sessao['id']} if sessao.get('id') else {}
+    confirmar_pagamento(pedido.pk, **campos)
+
+
+def _cancelar(pedido, sessao):
+    # Só cancela pedidos pendentes: não desfaz um pagamento já confirmado por outro evento
+    cancelar_pedido(pedido.pk)
+
+
+def sessao_concluida(pedido, sessao):
+    # Meios assíncronos (boleto, pix) concluem o checkout ainda sem pagamento:
+    # a confirmação chega depois em checkout.session.async_payment_succeeded
+    if sessao.get('payment_status') in ('paid', 'no_payment_required'):
+        _marcar_pago(pedido, sessao)
+
+
+TRATADORES = {
+    'checkout.session.completed': sessao_concluida,
+    'checkout.session.async_payment_succeeded': _marcar_pago,
+    'checkout.session.async_payment_failed': _cancelar,
+    'checkout.session.expired': _cancelar,
+}
+
+# Eventos que podem marcar o pedido como pago
+CONFIRMAM_PAGAMENTO = {'checkout.session.completed', 'checkout.session.async_payment_succeeded'}
+
+
+def _sessao_do_stripe(sessao_id):
+    """Sessão atual na API do Stripe; erros de rede deixam o evento em 'erro' para nova tentativa."""
+    if not sessao_id:
+        raise ValueError("Evento sem id de sessão.")
+    return clientes.stripe().checkout.Session.retrieve(sessao_id)
+
+
+# =========================
+# Recebimento
+# =========================
+def registrar_evento(evento):
+    """
+    Grava o evento (dict já verificado). Retorna (registro, deve_processar);
+    deve_processar é False para reenvios de eventos já recebidos.
+    """
+    try:
+        with transaction.atomic():
+            registro = EventoStripe.objects.create(
+                id=evento['id'], tipo=evento.get('type', ''), payload=evento,
+                status='recebido' if evento.get('type') in TRATADORES else 'ignorado',
+            )
+    except IntegrityError:
+        registro = EventoStripe.objects.get(pk=evento['id'])
+        return registro, registro.status == 'erro'
+    return registro, registro.status == 'recebido'
+
+
+# =========================
+# Processamento
+# =========================
+def processar_evento(evento_id):
+    """
+    Processa um evento reservado por este worker. Retorna o status final, ou
+    None se outra execução já o reservou/concluiu.
+    """
+    reservado = EventoStripe.objects.filter(pk=evento_id, status__in=REPROCESSAVEIS).update(
+        status='processando', tentativas=F('tentativas') + 1, iniciado_em=timezone.now(),
+    )
+    if not reservado:
+        return None
+
+    evento = EventoStripe.objects.get(pk=evento_id)
+    sessao = (evento.payload.get('data') or {}).get('object') or {}
+    try:
+        if evento.tipo in CONFIRMAM_PAGAMENTO:
+            # Fora da transação: não segura o lock do pedido durante a chamada
+            sessao = _sessao_do_stripe(sessao.get('id'))
+        with transaction.atomic():
+            pedido = _pedido_da_sessao(sessao)
+            if pedido is None:
+                status, erro = 'ignorado', f"Pedido da sessão {sessao.get('id') or '-'} não encontrado."
+            else:
+                TRATADORES[evento.tipo](pedido, sessao)
+                pedido.refresh_from_db(fields=['status'])
+                status, erro = 'processado', ''
+            EventoStripe.objects.filter(pk=evento_id).update(
+                status=status, erro=erro, processado_em=timezone.now(),
+            )
+    except Exception as e:
+        logger.exception("Falha ao processar evento do Stripe %s", evento_id)
+        EventoStripe.objects.filter(pk=evento_id).update(status='erro', erro=str(e))
+        return 'erro'
+
+    if status == 'processado':
+        logger.info("Evento Stripe %s (%s) aplicado ao Pedido %s -> %s", evento_id, evento.tipo, pedido.id, pedido.status)
+    else:
+        logger.warning("Evento Stripe %s ignorado: %s", evento_id, erro)
+    return status
+
+
+def processar_pendentes(max_tentativas=5, expirar_apos=timedelta(minutes=10)):
+    """
+    Retoma eventos recebidos, com erro ou presos em 'processando' há mais de
+    `expirar_apos`. Retorna {status: quantidade}.
+    """
+    limite = timezone.now() - expirar_apos
+    EventoStripe.objects.filter(status='processando', iniciado_em__lt=limite).update(
+        status='erro', erro="Processamento interrompido.",
+    )
+
+    ids = list(
+        EventoStripe.objects
+        .filter(Q(status='recebido') | Q(status='erro', tentativas__lt=max_tentativas))
+        .order_by('recebido_em')
+        .values_list('id', flat=True)
+    )
+    contagem = {}
+    for evento_id in ids:
+        status = processar_evento(evento_id)
+        if status:
+            contagem[status] = contagem.get(status, 0) + 1
+    return contagem
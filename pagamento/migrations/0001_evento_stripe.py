@@ -0,0 +1,33 @@
+# Generated by Django 5.2.2 on 2026-10-18 09:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoStripe',
+            fields=[
+                ('id', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='ID do Evento')),
+                ('tipo', models.CharField(max_length=100, verbose_name='Tipo')),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('recebido', 'Recebido'), ('processando', 'Processando'), ('processado', 'Processado'), ('ignorado', 'Ignorado'), ('erro', 'Erro')], db_index=True, default='recebido', max_length=20)),
+                ('tentativas', models.PositiveIntegerField(default=0)),
+                ('erro', models.TextField(blank=True, default='')),
+                ('recebido_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('processado_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Evento do Stripe',
+                'verbose_name_plural': 'Eventos do Stripe',
+                'ordering': ['-recebido_em'],
+            },
+        ),
+    ]
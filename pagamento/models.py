@@ -1,7 +1,34 @@
-# mercadopago/models.py
+# pagamento/models.py
 from django.db import models
 
-# Este arquivo não precisa de modelos para a integração básica do Mercado Pago.
-# Você pode adicionar modelos aqui no futuro, se precisar armazenar IDs de transação
-# ou status específicos do Mercado Pago, possivelmente ligando ao seu modelo Pedido principal
-# que está em 'produtos.models'.
\ No newline at end of file
+
+class EventoStripe(models.Model):
+    """
+    Fila durável dos eventos recebidos pelo webhook do Stripe. O id do evento
+    é a chave primária: reenvios do mesmo evento não são processados de novo.
+    """
+    STATUS_CHOICES = [
+        ('recebido', 'Recebido'),
+        ('processando', 'Processando'),
+        ('processado', 'Processado'),
+        ('ignorado', 'Ignorado'),
+        ('erro', 'Erro'),
+    ]
+
+    id = models.CharField(max_length=255, primary_key=True, verbose_name="ID do Evento")
+    tipo = models.CharField(max_length=100, verbose_name="Tipo")
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='recebido', db_index=True)
+    tentativas = models.PositiveIntegerField(default=0)
+    erro = models.TextField(blank=True, default='')
+    recebido_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    processado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Evento do Stripe"
+        verbose_name_plural = "Eventos do Stripe"
+        ordering = ['-recebido_em']
+
+    def __str__(self):
+        return f"Evento Stripe {self.id} ({self.tipo}) - {self.status}"
@@ -1,3 +1,276 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import threading
+import time
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from urllib.parse import parse_qs
 
-# Create your tests here.
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from produtos.models import Item, Pedido, Produto
+from solar.models import Cliente, Usuario
+
+from .eventos import _sessao_do_stripe
+from .models import EventoStripe
+
+SEGREDO = 'whsec_teste'
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=SEGREDO, TAREFAS_SINCRONAS=True)
+class StripeWebhookTests(TestCase):
+
+    def setUp(self):
+        self.pedido = Pedido.objects.create(
+            total=Decimal('500.00'), status='pendente', metodo_pagamento='stripe', stripe_id='cs_test_1',
+        )
+        # A sessão "na API do Stripe": por padrão igual à do último evento montado
+        self.pagamento_no_stripe = 'paid'
+        retrieve = mock.patch('pagamento.eventos._sessao_do_stripe', side_effect=lambda sessao_id: {
+            'id': sessao_id, 'payment_status': self.pagamento_no_stripe,
+            'metadata': {'pedido_id': str(self.pedido.id)},
+        })
+        self.sessao_do_stripe = retrieve.start()
+        self.addCleanup(retrieve.stop)
+
+    def evento(self, tipo='checkout.session.completed', evento_id='evt_1', payment_status='paid'):
+        self.pagamento_no_stripe = payment_status
+        return {
+            'id': evento_id, 'type': tipo,
+            'data': {'object': {
+                'id': 'cs_test_1', 'payment_status': payment_status,
+                'metadata': {'pedido_id': str(self.pedido.id)},
+            }},
+        }
+
+    def enviar(self, evento, segredo=SEGREDO):
+        corpo = json.dumps(evento)
+        ts = int(time.time())
+        assinatura = hmac.new(segredo.encode(), f'{ts}.{corpo}'.encode(), hashlib.sha256).hexdigest()
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('pagamento:stripe_webhook'), corpo, content_type='application/json',
+                HTTP_STRIPE_SIGNATURE=f't={ts},v1={assinatura}',
+            )
+
+    def test_sessao_concluida_marca_pedido_pago_uma_vez(self):
+        for _ in range(2):
+            self.assertEqual(self.enviar(self.evento()).status_code, 200)
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'pago')
+        self.assertIsNotNone(self.pedido.data_pagamento)
+        self.assertEqual(EventoStripe.objects.get().tentativas, 1)
+
+    def test_assinatura_invalida(self):
+        response = self.enviar(self.evento(), segredo='outro')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(EventoStripe.objects.exists())
+
+    @override_settings(STRIPE_WEBHOOK_SECRET='')
+    def test_sem_segredo_configurado_recusa_evento_assinado_com_chave_vazia(self):
+        with self.assertLogs('pagamento.views', 'ERROR'):
+            response = self.enviar(self.evento(), segredo='')
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(EventoStripe.objects.exists())
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'pendente')
+
+    def test_status_de_pagamento_vem_da_api_e_nao_do_evento(self):
+        evento = self.evento()
+        self.pagamento_no_stripe = 'unpaid'
+        self.enviar(evento)
+
+        self.sessao_do_stripe.assert_called_once_with('cs_test_1')
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'pendente')
+
+    def test_falha_ao_consultar_o_stripe_deixa_evento_para_nova_tentativa(self):
+        self.sessao_do_stripe.side_effect = ConnectionError('Stripe indisponível')
+        with self.assertLogs('pagamento.eventos', 'ERROR'):
+            self.enviar(self.evento())
+        self.assertEqual(EventoStripe.objects.get().status, 'erro')
+        self.assertEqual(Pedido.objects.get(pk=self.pedido.pk).status, 'pendente')
+
+    def test_sessao_expirada_cancela_pedido_pendente(self):
+        self.enviar(self.evento(tipo='checkout.session.expired', payment_status='unpaid'))
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'cancelado')
+
+    def test_pagamento_assincrono(self):
+        self.enviar(self.evento(payment_status='unpaid'))
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'pendente')
+
+        self.enviar(self.evento(tipo='checkout.session.async_payment_succeeded', evento_id='evt_2'))
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'pago')
+
+    def reservar(self, estoque):
+        produto = Produto.objects.create(name='Painel', preco=Decimal('250.00'), stock=estoque, sku='PNL-1')
+        Item.objects.create(
+            pedido=self.pedido, produto_id_original=produto.id, nome=produto.name,
+            preco_unitario=produto.preco, quantidade=2, subtotal=Decimal('500.00'),
+        )
+        Pedido.objects.filter(pk=self.pedido.pk).update(estoque_reservado=True)
+        return produto
+
+    def test_pagamento_depois_da_expiracao_refaz_a_reserva(self):
+        produto = self.reservar(estoque=4)
+        self.enviar(self.evento(tipo='checkout.session.expired', payment_status='unpaid'))
+        produto.refresh_from_db()
+        self.assertEqual(produto.stock, 6)
+
+        self.enviar(self.evento(tipo='checkout.session.async_payment_succeeded', evento_id='evt_2'))
+        self.pedido.refresh_from_db()
+        produto.refresh_from_db()
+        self.assertEqual((self.pedido.status, self.pedido.estoque_reservado, self.pedido.revisao_manual), ('pago', True, False))
+        self.assertEqual(produto.stock, 4)
+
+    def test_pagamento_depois_da_expiracao_sem_estoque_vai_para_revisao(self):
+        produto = self.reservar(estoque=4)
+        self.enviar(self.evento(tipo='checkout.session.expired', payment_status='unpaid'))
+        Produto.objects.filter(pk=produto.pk).update(stock=1)
+
+        self.enviar(self.evento(tipo='checkout.session.async_payment_succeeded', evento_id='evt_2'))
+        self.pedido.refresh_from_db()
+        self.assertEqual((self.pedido.status, self.pedido.estoque_reservado, self.pedido.revisao_manual), ('pago', False, True))
+        self.assertEqual(Produto.objects.get(pk=produto.pk).stock, 1)
+
+    def test_falha_atrasada_nao_cancela_pedido_pago(self):
+        produto = self.reservar(estoque=4)
+        self.enviar(self.evento())
+        self.enviar(self.evento(tipo='checkout.session.async_payment_failed', evento_id='evt_2', payment_status='unpaid'))
+
+        self.pedido.refresh_from_db()
+        self.assertEqual((self.pedido.status, self.pedido.estoque_reservado), ('pago', True))
+        self.assertEqual(Produto.objects.get(pk=produto.pk).stock, 4)
+
+    def test_eventos_sem_tratador_sao_ignorados(self):
+        self.enviar(self.evento(tipo='customer.created'))
+        self.assertEqual(EventoStripe.objects.get().status, 'ignorado')
+
+    def test_comando_retoma_eventos_com_erro(self):
+        EventoStripe.objects.create(id='evt_9', tipo='checkout.session.completed', payload=self.evento(), status='erro')
+        call_command('processar_eventos_stripe', stdout=StringIO())
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, 'pago')
+        self.assertEqual(EventoStripe.objects.get().status, 'processado')
+
+    def test_pagina_de_sucesso_le_apenas_o_pedido_local(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('pagamento:compra_sucesso'), {'session_id': 'cs_test_1'})
+        self.assertEqual(response.context['pedido'], self.pedido)
+        self.assertContains(response, 'aguardando a confirmação')
+
+
+class ServidorFalsoStripe:
+    """
+    Servidor HTTP local que responde POST /v1/checkout/sessions com o status em
+    `status` e GET /v1/checkout/sessions/<id> com uma sessão paga.
+    """
+
+    def __init__(self):
+        self.sessoes = []
+        self.status = 200
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                corpo = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())
+                servidor.sessoes.append((dict(self.headers), corpo))
+                if servidor.status == 200:
+                    resposta = {'id': f'cs_test_{len(servidor.sessoes)}', 'object': 'checkout.session',
+                                'url': 'https://checkout.stripe.com/c/pay/cs_test'}
+                else:
+                    resposta = {'error': {'type': 'api_error', 'message': 'Falha no Stripe'}}
+                resposta = json.dumps(resposta).encode()
+                self.send_response(servidor.status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(resposta)))
+                self.end_headers()
+                self.wfile.write(resposta)
+
+            def do_GET(self):
+                sessao_id = self.path.rstrip('/').rsplit('/', 1)[-1]
+                resposta = json.dumps({'id': sessao_id, 'object': 'checkout.session', 'payment_status': 'paid'}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(resposta)))
+                self.end_headers()
+                self.wfile.write(resposta)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def parar(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class CheckoutStripeTests(TestCase):
+    """A view de checkout é async: roda pelo AsyncClient, como sob ASGI."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ServidorFalsoStripe()
+        cls.addClassCleanup(cls.servidor.parar)
+
+    def setUp(self):
+        self.servidor.sessoes.clear()
+        self.servidor.status = 200
+        configuracao = override_settings(STRIPE_API_URL=self.servidor.url, STRIPE_SECRET_KEY='sk_test_x')
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.usuario = Usuario.objects.create_user('comprador', 'comprador@example.com', 'senha', is_customer=True)
+        Cliente.objects.create(usuario=self.usuario, nome='Comprador', email='comprador@example.com', telefone='1')
+        self.painel = Produto.objects.create(name='Painel 550W', preco=Decimal('900.00'), stock=5, sku='PNL-550')
+
+    async def checkout(self):
+        await self.async_client.aforce_login(self.usuario)
+        sessao = await self.async_client.asession()
+        await sessao.aset('carrinho', {str(self.painel.id): 2})
+        await sessao.aset('valor_frete', '50.00')
+        await sessao.asave()
+        with self.assertLogs('energia_solar.instrumentacao'):
+            return await self.async_client.get(reverse('pagamento:criar_checkout_session'))
+
+    async def test_cria_sessao_e_vincula_ao_pedido(self):
+        response = await self.checkout()
+
+        self.assertEqual(response.url, 'https://checkout.stripe.com/c/pay/cs_test')
+        pedido = await Pedido.objects.aget()
+        self.assertEqual((pedido.stripe_id, pedido.total), ('cs_test_1', Decimal('1850.00')))
+        cabecalhos, corpo = self.servidor.sessoes[0]
+        self.assertEqual(cabecalhos['Idempotency-Key'], f'pedido-{pedido.id}')
+        self.assertEqual(corpo['metadata[pedido_id]'], [str(pedido.id)])
+        self.assertEqual(corpo['line_items[0][quantity]'], ['2'])
+        self.assertEqual(corpo['line_items[1][price_data][unit_amount]'], ['5000'])
+        sessao = await self.async_client.asession()
+        self.assertEqual(await sessao.aget('carrinho'), {})
+
+    def test_sessao_relida_na_api_configurada(self):
+        sessao = _sessao_do_stripe('cs_test_7')
+        self.assertEqual((sessao['id'], sessao['payment_status']), ('cs_test_7', 'paid'))
+
+    async def test_falha_no_stripe_cancela_pedido(self):
+        self.servidor.status = 400
+        response = await self.checkout()
+
+        self.assertRedirects(response, reverse('produtos:ver_carrinho'), fetch_redirect_response=False)
+        pedido = await Pedido.objects.aget()
+        self.assertEqual(pedido.status, 'cancelado')
+        await self.painel.arefresh_from_db()
+        self.assertEqual(self.painel.stock, 5)
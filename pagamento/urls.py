@@ -7,4 +7,5 @@ urlpatterns = [
     path('criar-checkout-session/', views.criar_checkout_session, name='criar_checkout_session'),
     path('sucesso/', views.compra_sucesso, name='compra_sucesso'), 
     path('cancelado/', views.pagamento_cancelado, name='pagamento_cancelado'),
+    path('webhook/', views.stripe_webhook, name='stripe_webhook'),
 ]
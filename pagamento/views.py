@@ -1,91 +1,131 @@
+import json
+import logging
+from datetime import timedelta
+
 from django.shortcuts import render, redirect
 from django.http import HttpResponse
 from django.conf import settings
 from django.urls import reverse
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.contrib import messages
-import stripe
-from produtos.models import Pedido, Item
+from asgiref.sync import sync_to_async
+from energia_solar import clientes
+from energia_solar.tarefas import enfileirar
+from produtos.carrinho import Carrinho
+from produtos.checkout import EstoqueInsuficiente, cancelar_pedido, criar_pedido, prazo_reserva
+from produtos.models import Pedido
 from solar.models import Cliente
 from django.contrib.auth.decorators import login_required
 from decimal import Decimal
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
+from .eventos import processar_evento, registrar_evento
 
-@login_required
-def criar_checkout_session(request):
-    if not request.session.get('carrinho'):
+logger = logging.getLogger(__name__)
+
+def _preparar_checkout(request):
+    """Cria o pedido e os itens da sessão do Stripe. Retorna (pedido, line_items) ou um redirect."""
+    carrinho = Carrinho(request.session)
+    linhas, _ = carrinho.linhas()
+    if not linhas:
         messages.error(request, "Seu carrinho está vazio. Adicione produtos para continuar.")
         return redirect('produtos:home')
 
-    carrinho = request.session.get('carrinho', {})
-    line_items = []
-    
     try:
-        try:
-            cliente = request.user.perfil_cliente
-            email_cliente = cliente.email
-        except Cliente.DoesNotExist:
-            messages.error(request, "Seu perfil de cliente não foi encontrado. Por favor, entre em contato com o suporte.")
-            return redirect('produtos:ver_carrinho')
-
-        total_carrinho = sum(Decimal(str(item['subtotal'])) for item in carrinho.values())
-        valor_frete = Decimal(str(request.session.get('valor_frete', '0.00')))
-        
-        pedido = Pedido.objects.create(
+        cliente = request.user.perfil_cliente
+        email_cliente = cliente.email
+    except Cliente.DoesNotExist:
+        messages.error(request, "Seu perfil de cliente não foi encontrado. Por favor, entre em contato com o suporte.")
+        return redirect('produtos:ver_carrinho')
+
+    valor_frete = Decimal(str(request.session.get('valor_frete', '0.00')))
+
+    # Pedido, itens e reserva de estoque numa única transação
+    try:
+        pedido = criar_pedido(
             usuario=request.user,
             email_cliente=email_cliente,
-            total=total_carrinho + valor_frete,
-            status='pendente',
-            metodo_pagamento='stripe'
+            linhas=linhas,
+            metodo_pagamento='stripe',
+            valor_frete=valor_frete,
         )
+    except EstoqueInsuficiente as e:
+        messages.error(request, str(e))
+        return redirect('produtos:ver_carrinho')
 
-        for item_data in carrinho.values():
-            Item.objects.create(
-                pedido=pedido,
-                nome=item_data['nome'],
-                preco_unitario=Decimal(str(item_data['preco_unitario'])),
-                quantidade=item_data['quantidade'],
-                subtotal=Decimal(str(item_data['subtotal']))
-            )
-            line_items.append({
-                'price_data': {
-                    'currency': 'brl',
-                    'product_data': {
-                        'name': item_data['nome'],
-                    },
-                    'unit_amount': int(Decimal(str(item_data['preco_unitario'])) * 100),
+    line_items = [
+        {
+            'price_data': {
+                'currency': 'brl',
+                'product_data': {
+                    'name': linha['produto'].name,
                 },
-                'quantity': item_data['quantidade'],
-            })
-            
-        if valor_frete > 0:
-             line_items.append({
-                'price_data': {
-                    'currency': 'brl',
-                    'product_data': {
-                        'name': 'Frete',
-                    },
-                    'unit_amount': int(valor_frete * 100),
+                'unit_amount': int(linha['preco_unitario'] * 100),
+            },
+            'quantity': linha['quantidade'],
+        }
+        for linha in linhas
+    ]
+
+    if valor_frete > 0:
+        line_items.append({
+            'price_data': {
+                'currency': 'brl',
+                'product_data': {
+                    'name': 'Frete',
                 },
-                'quantity': 1,
-            })
+                'unit_amount': int(valor_frete * 100),
+            },
+            'quantity': 1,
+        })
+    return pedido, line_items
+
+
+def _vincular_sessao(request, pedido, session_id):
+    # Permite achar o pedido pela sessão na página de sucesso e no webhook
+    pedido.stripe_id = session_id
+    pedido.save(update_fields=['stripe_id'])
+    Carrinho(request.session).limpar()
+
+
+@login_required
+async def criar_checkout_session(request):
+    """
+    Async: a criação da sessão no Stripe não prende o worker (sob ASGI, ver
+    gunicorn.conf.py). O acesso ao banco e à sessão roda com sync_to_async.
+    """
+    try:
+        preparo = await sync_to_async(_preparar_checkout)(request)
+        if isinstance(preparo, HttpResponse):
+            return preparo
+        pedido, line_items = preparo
 
         success_url = request.build_absolute_uri(reverse('pagamento:compra_sucesso')) + '?session_id={CHECKOUT_SESSION_ID}'
         cancel_url = request.build_absolute_uri(reverse('pagamento:pagamento_cancelado'))
 
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=line_items,
-            mode='payment',
-            success_url=success_url,
-            cancel_url=cancel_url,
-            metadata={'pedido_id': str(pedido.id)}
-        )
-        
-        request.session['carrinho'] = {}
-        request.session.modified = True
-        
+        # A sessão expira junto com a reserva (o Stripe aceita de 30 min a 24 h)
+        validade = min(max(prazo_reserva(), timedelta(minutes=30)), timedelta(hours=24))
+        try:
+            checkout_session = await clientes.stripe_async().checkout.sessions.create_async(
+                params={
+                    'payment_method_types': ['card'],
+                    'line_items': line_items,
+                    'mode': 'payment',
+                    'success_url': success_url,
+                    'cancel_url': cancel_url,
+                    'client_reference_id': str(pedido.id),
+                    'metadata': {'pedido_id': str(pedido.id)},
+                    'expires_at': int((timezone.now() + validade).timestamp()),
+                },
+                # Um retry de rede não cria uma segunda sessão para o mesmo pedido
+                options={'idempotency_key': f'pedido-{pedido.id}'},
+            )
+        except Exception:
+            await sync_to_async(cancelar_pedido)(pedido.id)
+            raise
+        await sync_to_async(_vincular_sessao)(request, pedido, checkout_session.id)
+
         return redirect(checkout_session.url, code=303)
 
     except Exception as e:
@@ -93,35 +133,51 @@ def criar_checkout_session(request):
         return redirect('produtos:ver_carrinho')
 
 def compra_sucesso(request):
+    """
+    Mostra o pedido a partir do estado local. A confirmação do pagamento vem
+    do webhook (stripe_webhook), não desta página.
+    """
     session_id = request.GET.get('session_id')
-    if session_id:
-        try:
-            checkout_session = stripe.checkout.Session.retrieve(session_id)
-            pedido_id = checkout_session.metadata.get('pedido_id')
-            pedido = Pedido.objects.get(id=pedido_id)
-            
-            if checkout_session.payment_status == 'paid':
-                pedido.status = 'pago'
-                pedido.stripe_id = session_id
-                pedido.save()
-                messages.success(request, "Seu pagamento foi aprovado! Obrigado pela compra.")
-            else:
-                messages.warning(request, "O pagamento ainda está pendente ou não foi concluído.")
-            
-            # NOVO: Passa o pedido para o contexto do template
-            context = {
-                'pedido': pedido,
-                'checkout_session': checkout_session,
-            }
-            return render(request, 'pagamento/compra_sucesso.html', context)
-
-        except Pedido.DoesNotExist:
-            messages.error(request, "O pedido não foi encontrado. Por favor, entre em contato com o suporte.")
-        except stripe.error.StripeError as e:
-            messages.error(request, f"Erro ao processar o pagamento: {e}")
-
-    messages.error(request, "Não foi possível confirmar o status do pagamento. Por favor, entre em contato com o suporte.")
-    return redirect('produtos:home')
+    pedido = Pedido.objects.filter(stripe_id=session_id).first() if session_id else None
+    if pedido is None:
+        messages.error(request, "Não foi possível confirmar o status do pagamento. Por favor, entre em contato com o suporte.")
+        return redirect('produtos:home')
+
+    if pedido.status == 'pago':
+        messages.success(request, "Seu pagamento foi aprovado! Obrigado pela compra.")
+    elif pedido.status == 'cancelado':
+        messages.error(request, "O pagamento deste pedido não foi concluído.")
+    else:
+        messages.info(request, "Estamos aguardando a confirmação do pagamento. O status do pedido será atualizado automaticamente.")
+
+    return render(request, 'pagamento/compra_sucesso.html', {'pedido': pedido})
+
+
+@csrf_exempt
+@require_POST
+def stripe_webhook(request):
+    """
+    Confere a assinatura, grava o evento (deduplicado pelo id) e responde.
+    O pedido é atualizado em segundo plano (pagamento/eventos.py).
+    """
+    if not settings.STRIPE_WEBHOOK_SECRET:
+        # construct_event aceitaria um payload assinado com chave vazia
+        logger.error("Webhook do Stripe recusado: STRIPE_WEBHOOK_SECRET não configurado.")
+        return HttpResponse(status=503)
+
+    stripe = clientes.stripe()
+    try:
+        stripe.Webhook.construct_event(
+            request.body, request.headers.get('Stripe-Signature', ''), settings.STRIPE_WEBHOOK_SECRET,
+        )
+    except (ValueError, stripe.error.SignatureVerificationError) as e:
+        logger.warning("Webhook do Stripe recusado: %s", e)
+        return HttpResponse(status=400)
+
+    evento, processar = registrar_evento(json.loads(request.body))
+    if processar:
+        enfileirar(processar_evento, evento.id)
+    return HttpResponse(status=200)
 
 def pagamento_cancelado(request):
     messages.info(request, "O pagamento foi cancelado. Você pode tentar novamente.")
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Produto, CarouselImage, Pedido, Item, ProdutoImage, RegiaoFrete
+from .models import Produto, CarouselImage, Pedido, Item, ProdutoImage, RegiaoFrete, IngestaoProdutos, IngestaoProdutosImagem, ImportacaoCatalogo
 from django import forms # NOVO: Importa forms para usar forms.ModelForm
 
 # Inline para ProdutoImage
@@ -36,9 +36,9 @@ class ItemPedidoInline(admin.TabularInline):
 @admin.register(Pedido)
 class PedidoAdmin(admin.ModelAdmin):
     list_display = ('id', 'usuario', 'email_cliente', 'total', 'status', 'criado_em', 'data_pagamento')
-    list_filter = ('status', 'criado_em')
+    list_filter = ('status', 'revisao_manual', 'criado_em')
     search_fields = ('id', 'email_cliente', 'stripe_id')
-    readonly_fields = ('criado_em', 'data_pagamento', 'stripe_id')
+    readonly_fields = ('criado_em', 'data_pagamento', 'stripe_id', 'estoque_reservado')
     inlines = [ItemPedidoInline] # Mostra os itens do pedido dentro do formulário de pedido
 
 @admin.register(Item)
@@ -49,5 +49,26 @@ class ItemAdmin(admin.ModelAdmin):
 
 @admin.register(RegiaoFrete)
 class RegiaoFreteAdmin(admin.ModelAdmin):
-    list_display = ('prefixo_cep', 'cidade', 'valor_frete', 'prazo_entrega')
-    search_fields = ('prefixo_cep', 'cidade')
\ No newline at end of file
+    list_display = ('abrangencia', 'cidade', 'valor_frete', 'prazo_entrega')
+    search_fields = ('prefixo_cep', 'cep_inicial', 'cep_final', 'cidade')
+class IngestaoProdutosImagemInline(admin.TabularInline):
+    model = IngestaoProdutosImagem
+    extra = 0
+    readonly_fields = ('nome_original', 'status', 'erro', 'produto', 'atualizado_em')
+    exclude = ('arquivo',)
+
+@admin.register(IngestaoProdutos)
+class IngestaoProdutosAdmin(admin.ModelAdmin):
+    list_display = ('id', 'criado_por', 'status', 'total', 'criado_em', 'concluido_em')
+    list_filter = ('status', 'criado_em')
+    readonly_fields = ('criado_por', 'status', 'total', 'criado_em', 'iniciado_em', 'concluido_em')
+    inlines = [IngestaoProdutosImagemInline]
+
+@admin.register(ImportacaoCatalogo)
+class ImportacaoCatalogoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'criado_por', 'status', 'linhas', 'criados', 'atualizados', 'erros', 'criado_em')
+    list_filter = ('status', 'criado_em')
+    readonly_fields = (
+        'criado_por', 'status', 'linhas', 'criados', 'atualizados', 'imagens', 'erros',
+        'mensagem', 'criado_em', 'iniciado_em', 'concluido_em',
+    )
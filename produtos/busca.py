@@ -0,0 +1,186 @@
+# produtos/busca.py
+"""
+Busca textual de produtos com backend plugável.
+
+- PostgreSQL: coluna gerada `search_vector` (tsvector, dicionário portuguese;
+  nome e SKU com peso maior que a descrição) com índice GIN, ranqueada com
+  ts_rank.
+- SQLite: tabela virtual FTS5 `produtos_produto_fts` mantida por triggers,
+  ranqueada com bm25.
+- Demais bancos: icontains em nome/descrição (sem ranking).
+
+O backend é escolhido pelo vendor da conexão, ou forçado com
+settings.PRODUTOS_BUSCA_BACKEND (caminho pontuado da classe).
+Todos devolvem um objeto fatiável aceito pelo Paginator do Django.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .imagens import com_imagem_card
+from .models import Produto
+
+TABELA_FTS = 'produtos_produto_fts'
+INDICE_GIN = 'produtos_produto_search_vector_gin'
+
+# Triggers e tabela FTS5 do SQLite, criados pela migration 0007_indice_busca.
+# Repetidos aqui para o reindexar(): o Django recria a tabela produtos_produto
+# em algumas migrations no SQLite e os triggers se perdem.
+SQL_SQLITE = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} USING fts5(
+        name, description, sku,
+        content='produtos_produto', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ai AFTER INSERT ON produtos_produto BEGIN
+        INSERT INTO {TABELA_FTS}(rowid, name, description, sku)
+        VALUES (new.id, new.name, new.description, new.sku);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ad AFTER DELETE ON produtos_produto BEGIN
+        INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, name, description, sku)
+        VALUES ('delete', old.id, old.name, old.description, old.sku);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_au AFTER UPDATE ON produtos_produto BEGIN
+        INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, name, description, sku)
+        VALUES ('delete', old.id, old.name, old.description, old.sku);
+        INSERT INTO {TABELA_FTS}(rowid, name, description, sku)
+        VALUES (new.id, new.name, new.description, new.sku);
+    END
+    """,
+]
+
+
+def _comandos_instalacao(vendor):
+    if vendor == 'sqlite':
+        return SQL_SQLITE + [f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')"]
+    return []
+
+
+# --------------------------
+# BACKENDS
+# --------------------------
+class BuscaSimples:
+    """Fallback sem índice textual: icontains em nome/descrição."""
+    nome = 'simples'
+
+    def buscar(self, termo):
+        return com_imagem_card(Produto.objects.filter(
+            Q(name__icontains=termo) | Q(description__icontains=termo),
+            is_active=True,
+        )).order_by('name', 'id')
+
+    def reindexar(self):
+        return "Backend simples não possui índice para reconstruir."
+
+
+class BuscaPostgres(BuscaSimples):
+    nome = 'postgres'
+
+    def buscar(self, termo):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+        from django.db.models.expressions import RawSQL
+
+        # A coluna é gerada pelo banco e não existe no model; expomos via RawSQL
+        vetor = RawSQL('"produtos_produto"."search_vector"', [], output_field=SearchVectorField())
+        consulta = SearchQuery(termo, config='portuguese', search_type='websearch')
+
+        return com_imagem_card(
+            Produto.objects.filter(is_active=True)
+            .alias(vetor=vetor)
+            .filter(vetor=consulta)
+            .annotate(rank=SearchRank(vetor, consulta))
+        ).order_by('-rank', 'name', 'id')
+
+    def reindexar(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"REINDEX INDEX {INDICE_GIN}")
+        return f"Índice {INDICE_GIN} reconstruído."
+
+
+class _ResultadoFTS:
+    """
+    Sequência preguiçosa de resultados FTS5: count() e fatias viram SQL com
+    COUNT / LIMIT-OFFSET, então o Paginator nunca carrega todos os ids.
+    """
+
+    def __init__(self, expressao):
+        self.expressao = expressao
+        self._total = None
+
+    def _sql(self, colunas):
+        return (
+            f"SELECT {colunas} FROM {TABELA_FTS} "
+            f"JOIN produtos_produto p ON p.id = {TABELA_FTS}.rowid "
+            f"WHERE {TABELA_FTS} MATCH %s AND p.is_active"
+        )
+
+    def count(self):
+        if self._total is None:
+            with connection.cursor() as cursor:
+                cursor.execute(self._sql('COUNT(*)'), [self.expressao])
+                self._total = cursor.fetchone()[0]
+        return self._total
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, fatia):
+        if not isinstance(fatia, slice):
+            return self[fatia:fatia + 1][0]
+        inicio = fatia.start or 0
+        limite = (fatia.stop - inicio) if fatia.stop is not None else -1
+        with connection.cursor() as cursor:
+            cursor.execute(
+                self._sql('p.id') + f" ORDER BY bm25({TABELA_FTS}, 10.0, 3.0, 10.0), p.name LIMIT %s OFFSET %s",
+                [self.expressao, limite, inicio],
+            )
+            ids = [linha[0] for linha in cursor.fetchall()]
+        por_id = com_imagem_card(Produto.objects).in_bulk(ids)
+        return [por_id[i] for i in ids if i in por_id]
+
+
+class BuscaSQLiteFTS(BuscaSimples):
+    nome = 'sqlite_fts'
+
+    @staticmethod
+    def expressao_fts(termo):
+        # Cada palavra vira um termo com prefixo ("painel"*); o FTS5 faz AND implícito
+        palavras = re.findall(r'\w+', termo)
+        return ' '.join(f'"{p}"*' for p in palavras)
+
+    def buscar(self, termo):
+        expressao = self.expressao_fts(termo)
+        if not expressao:
+            return Produto.objects.none()
+        return _ResultadoFTS(expressao)
+
+    def reindexar(self):
+        # Recria triggers que possam ter sido perdidos quando o Django recria
+        # a tabela produtos_produto em migrations no SQLite
+        with connection.cursor() as cursor:
+            for sql in _comandos_instalacao('sqlite'):
+                cursor.execute(sql)
+        return f"Tabela {TABELA_FTS} reconstruída."
+
+
+BACKENDS_POR_VENDOR = {
+    'postgresql': BuscaPostgres,
+    'sqlite': BuscaSQLiteFTS,
+}
+
+
+def obter_backend_busca():
+    caminho = getattr(settings, 'PRODUTOS_BUSCA_BACKEND', '')
+    if caminho:
+        return import_string(caminho)()
+    return BACKENDS_POR_VENDOR.get(connection.vendor, BuscaSimples)()
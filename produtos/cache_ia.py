@@ -0,0 +1,163 @@
+# produtos/cache_ia.py
+"""
+Cache endereçado por conteúdo para a análise de imagens por IA.
+
+A chave é o SHA-256 dos bytes da imagem + a versão do prompt + o modelo, de
+modo que reenviar a mesma foto (caso comum ao reprocessar lotes com falha)
+devolve o JSON já interpretado sem nova chamada à API. Só respostas bem
+sucedidas são guardadas.
+
+Backends (settings.ANALISE_IA_CACHE_BACKEND, caminho pontuado da classe):
+- CacheAnaliseDjango: usa um alias de settings.CACHES. A política de despejo
+  é a do backend (LocMemCache é LRU limitado por MAX_ENTRIES; no Redis use
+  maxmemory-policy allkeys-lru).
+- CacheAnaliseSQLite: arquivo SQLite local, compartilhado pelos workers do
+  host, com TTL e despejo LRU por número máximo de itens.
+- SemCacheAnalise: desliga o cache.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def chave_analise(conteudo, versao_prompt, modelo):
+    digest = hashlib.sha256(conteudo).hexdigest()
+    return f'analise-ia:v{versao_prompt}:{modelo}:{digest}'
+
+
+class SemCacheAnalise:
+    nome = 'desligado'
+
+    def obter(self, chave):
+        return None
+
+    def guardar(self, chave, valor):
+        pass
+
+    def limpar(self):
+        return 0
+
+
+class CacheAnaliseDjango(SemCacheAnalise):
+    nome = 'django'
+
+    def __init__(self):
+        self.cache = caches[settings.ANALISE_IA_CACHE_ALIAS]
+        self.ttl = settings.ANALISE_IA_CACHE_TTL
+
+    def obter(self, chave):
+        return self.cache.get(chave)
+
+    def guardar(self, chave, valor):
+        self.cache.set(chave, valor, timeout=self.ttl)
+
+    def limpar(self):
+        # Sem listagem de chaves no cache do Django; trocar PROMPT_VERSAO invalida tudo
+        return 0
+
+
+class CacheAnaliseSQLite(SemCacheAnalise):
+    nome = 'sqlite'
+
+    def __init__(self, caminho=None, ttl=None, max_itens=None):
+        self.caminho = caminho or settings.ANALISE_IA_CACHE_ARQUIVO
+        self.ttl = settings.ANALISE_IA_CACHE_TTL if ttl is None else ttl
+        self.max_itens = max_itens or settings.ANALISE_IA_CACHE_MAX_ITENS
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.caminho) or '.', exist_ok=True)
+        with self._conexao() as conexao:
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS analise (chave TEXT PRIMARY KEY, valor TEXT NOT NULL,"
+                " expira_em REAL NOT NULL, acessado_em REAL NOT NULL)"
+            )
+            conexao.execute("CREATE INDEX IF NOT EXISTS analise_acessado_em ON analise (acessado_em)")
+
+    @contextmanager
+    def _conexao(self):
+        # Uma conexão por thread; WAL permite leituras concorrentes entre processos
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None:
+            conexao = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            self._local.conexao = conexao
+        yield conexao
+
+    def obter(self, chave):
+        agora = time.time()
+        with self._conexao() as conexao:
+            linha = conexao.execute(
+                "SELECT valor, expira_em FROM analise WHERE chave = ?", [chave]
+            ).fetchone()
+            if linha is None:
+                return None
+            if linha[1] < agora:
+                conexao.execute("DELETE FROM analise WHERE chave = ?", [chave])
+                return None
+            conexao.execute("UPDATE analise SET acessado_em = ? WHERE chave = ?", [agora, chave])
+        return json.loads(linha[0])
+
+    def guardar(self, chave, valor):
+        agora = time.time()
+        with self._conexao() as conexao:
+            conexao.execute(
+                "INSERT OR REPLACE INTO analise (chave, valor, expira_em, acessado_em) VALUES (?, ?, ?, ?)",
+                [chave, json.dumps(valor), agora + self.ttl, agora],
+            )
+            # Despejo LRU: mantém só os max_itens acessados mais recentemente
+            conexao.execute(
+                "DELETE FROM analise WHERE chave IN ("
+                " SELECT chave FROM analise ORDER BY acessado_em DESC LIMIT -1 OFFSET ?)",
+                [self.max_itens],
+            )
+
+    def limpar(self):
+        with self._conexao() as conexao:
+            return conexao.execute("DELETE FROM analise").rowcount
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def obter_cache_analise():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                caminho = settings.ANALISE_IA_CACHE_BACKEND
+                _backend = import_string(caminho)() if caminho else SemCacheAnalise()
+    return _backend
+
+
+# Evita que duas threads do mesmo processo analisem a mesma imagem ao mesmo
+# tempo (ex.: a mesma foto duas vezes no mesmo lote): a segunda espera e lê o cache.
+_travas_por_chave = {}
+_travas_lock = threading.Lock()
+
+
+@contextmanager
+def trava_da_chave(chave):
+    with _travas_lock:
+        trava, usos = _travas_por_chave.get(chave, (threading.Lock(), 0))
+        _travas_por_chave[chave] = (trava, usos + 1)
+    try:
+        with trava:
+            yield
+    finally:
+        with _travas_lock:
+            trava, usos = _travas_por_chave[chave]
+            if usos == 1:
+                del _travas_por_chave[chave]
+            else:
+                _travas_por_chave[chave] = (trava, usos - 1)
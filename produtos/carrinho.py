@@ -0,0 +1,147 @@
+# produtos/carrinho.py
+"""
+Carrinho de compras guardado na sessão.
+
+A sessão guarda só {'<produto_id>': quantidade}; nome, preço e imagem vêm do
+banco na hora de exibir, com um único in_bulk (mais o JOIN da imagem do card)
+para todas as linhas. A sessão só é regravada quando o carrinho muda, então
+abrir a página do carrinho não gera escrita no backend de sessão.
+"""
+from decimal import Decimal
+
+from .imagens import com_imagem_card, url_imagem_card
+from .models import Produto
+
+CHAVE_SESSAO = 'carrinho'
+
+
+def _quantidade_valida(valor):
+    try:
+        quantidade = int(valor)
+    except (TypeError, ValueError):
+        return None
+    return quantidade if quantidade > 0 else None
+
+
+def _normalizar(bruto):
+    """
+    Converte o conteúdo da sessão para {'<id>': quantidade}. Aceita o formato
+    antigo, em que cada item era um dict com nome, preço, subtotal etc.
+    """
+    itens = {}
+    if not isinstance(bruto, dict):
+        return itens
+    for produto_id, valor in bruto.items():
+        if not str(produto_id).isdigit():
+            continue
+        if isinstance(valor, dict):
+            valor = valor.get('quantidade')
+        quantidade = _quantidade_valida(valor)
+        if quantidade:
+            itens[str(produto_id)] = quantidade
+    return itens
+
+
+class Carrinho:
+
+    def __init__(self, session):
+        self.session = session
+        bruto = session.get(CHAVE_SESSAO) or {}
+        self._itens = _normalizar(bruto)
+        if self._itens != bruto:
+            # Sessões antigas (ou corrompidas) são migradas uma única vez
+            self._salvar()
+
+    def __len__(self):
+        return len(self._itens)
+
+    def __bool__(self):
+        return bool(self._itens)
+
+    def __contains__(self, produto_id):
+        return str(produto_id) in self._itens
+
+    def _salvar(self):
+        self.session[CHAVE_SESSAO] = dict(self._itens)
+
+    def ids(self):
+        return [int(produto_id) for produto_id in self._itens]
+
+    def quantidade(self, produto_id):
+        return self._itens.get(str(produto_id), 0)
+
+    def total_itens(self):
+        return sum(self._itens.values())
+
+    # --------------------------
+    # ALTERAÇÕES
+    # --------------------------
+    def adicionar(self, produto_id, quantidade=1):
+        quantidade = _quantidade_valida(quantidade) or 1
+        chave = str(produto_id)
+        self._itens[chave] = self._itens.get(chave, 0) + quantidade
+        self._salvar()
+
+    def decrementar(self, produto_id):
+        """Tira uma unidade; remove a linha quando chega a zero. Retorna a quantidade restante."""
+        chave = str(produto_id)
+        restante = self._itens.get(chave, 0) - 1
+        if restante > 0:
+            self._itens[chave] = restante
+        else:
+            self._itens.pop(chave, None)
+            restante = 0
+        self._salvar()
+        return restante
+
+    def remover(self, produto_id):
+        if self._itens.pop(str(produto_id), None) is not None:
+            self._salvar()
+
+    def manter_apenas(self, produto_ids):
+        """Descarta da sessão os ids fora de produto_ids (ex.: produtos excluídos)."""
+        validos = {str(produto_id) for produto_id in produto_ids}
+        removidos = [chave for chave in self._itens if chave not in validos]
+        for chave in removidos:
+            del self._itens[chave]
+        if removidos:
+            self._salvar()
+        return len(removidos)
+
+    def limpar(self):
+        if self._itens:
+            self._itens = {}
+            self._salvar()
+
+    # --------------------------
+    # HIDRATAÇÃO
+    # --------------------------
+    def linhas(self):
+        """
+        Monta as linhas do carrinho com os produtos do banco (uma query para
+        todos os itens). Produtos que não existem mais são retirados do
+        carrinho. Retorna (linhas, quantidade_de_itens_removidos).
+        """
+        if not self._itens:
+            return [], 0
+
+        produtos = com_imagem_card(Produto.objects).in_bulk(self.ids())
+        linhas = []
+        for chave, quantidade in self._itens.items():
+            produto = produtos.get(int(chave))
+            if produto is None:
+                continue
+            preco_unitario = produto.preco or Decimal('0.00')
+            linhas.append({
+                'produto': produto,
+                'quantidade': quantidade,
+                'preco_unitario': preco_unitario,
+                'subtotal': preco_unitario * quantidade,
+                'imagem': url_imagem_card(produto),
+            })
+        removidos = self.manter_apenas(produtos)
+        return linhas, removidos
+
+
+def total_das_linhas(linhas):
+    return sum((linha['subtotal'] for linha in linhas), Decimal('0.00'))
@@ -0,0 +1,129 @@
+# produtos/catalogo.py
+"""
+Cache do catálogo da vitrine (produtos.views.home).
+
+O payload da página inicial (os settings.CATALOGO_HOME_DESTAQUES produtos
+ativos mais recentes + carrossel) é montado uma única vez, serializado em estruturas simples (dicts e strings) e guardado no backend
+definido em settings.CACHES, numa chave que inclui a versão 'catalogo'.
+Os signals de Produto, ProdutoImage e CarouselImage (produtos/signals.py)
+trocam essa versão, que fica no banco (produtos/versoes.py): mesmo com o
+locmem, em que cada worker tem o próprio payload, todos passam a montar a
+vitrine nova na requisição seguinte.
+
+A vitrine tem tamanho fixo: o tempo de montagem e de renderização não cresce
+com o catálogo. Os demais produtos são listados pelas páginas de categoria e
+de busca, paginadas.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import versoes
+from .imagens import com_imagem_card, fontes_responsivas, resolver_imagens_card, url_imagem_card
+from .models import CarouselImage, Produto
+
+logger = logging.getLogger(__name__)
+
+VERSAO = 'catalogo'
+CHAVE_HITS = 'catalogo:home:hits'
+CHAVE_MISSES = 'catalogo:home:misses'
+
+
+def _cache():
+    return caches[getattr(settings, 'CATALOGO_CACHE_ALIAS', 'default')]
+
+
+def _incrementar(cache, chave):
+    try:
+        cache.incr(chave)
+    except ValueError:
+        cache.add(chave, 0, timeout=None)
+        try:
+            cache.incr(chave)
+        except ValueError:
+            pass
+
+
+def _url_imagem(campo):
+    """Retorna a URL de um ImageField, ou string vazia se não houver arquivo."""
+    if not campo:
+        return ''
+    try:
+        return campo.url
+    except ValueError:
+        return ''
+
+
+def montar_payload_home():
+    """
+    Consulta o banco e devolve o payload serializável da vitrine.
+    """
+    # JOIN da imagem antes do fatiamento: resolver_imagens_card não altera querysets fatiados
+    destaques = com_imagem_card(Produto.objects.filter(is_active=True)).order_by('-created_at', '-id')
+    produtos = []
+    for produto in resolver_imagens_card(destaques[:settings.CATALOGO_HOME_DESTAQUES]):
+        produtos.append({
+            'id': produto.id,
+            'name': produto.name,
+            'preco': str(produto.preco),
+            'categoria_exibicao': produto.categoria_exibicao,
+            'imagem_url': url_imagem_card(produto),
+            'imagem': fontes_responsivas(produto.imagem_principal),
+        })
+
+    carousel = []
+    try:
+        for imagem in CarouselImage.objects.filter(is_active=True):
+            carousel.append({
+                'url': _url_imagem(imagem.image),
+                'fontes': fontes_responsivas(imagem),
+                'title': imagem.title or '',
+                'description': imagem.description or '',
+            })
+    except Exception as e:
+        logger.error("Erro ao carregar imagens do carrossel: %s", e, exc_info=True)
+
+    return {'produtos': produtos, 'carousel_images': carousel}
+
+
+def obter_payload_home():
+    """
+    Retorna (payload, hit). Em caso de miss, monta o payload e grava no cache.
+    """
+    cache = _cache()
+    chave = f'catalogo:home:{versoes.versao(VERSAO)}'
+
+    payload = cache.get(chave)
+    if payload is not None:
+        _incrementar(cache, CHAVE_HITS)
+        return payload, True
+
+    _incrementar(cache, CHAVE_MISSES)
+    payload = montar_payload_home()
+    cache.set(chave, payload, timeout=getattr(settings, 'CATALOGO_CACHE_TIMEOUT', 3600))
+    return payload, False
+
+
+def invalidar_catalogo():
+    """
+    Troca a versão quando a transação for confirmada; o payload antigo deixa
+    de ser lido e expira sozinho.
+    """
+    versoes.trocar(VERSAO)
+
+
+def estatisticas_cache():
+    cache = _cache()
+    hits = cache.get(CHAVE_HITS) or 0
+    misses = cache.get(CHAVE_MISSES) or 0
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'taxa_acerto': round(hits / total, 4) if total else 0.0,
+    }
+
+
+def zerar_estatisticas():
+    _cache().delete_many([CHAVE_HITS, CHAVE_MISSES])
@@ -0,0 +1,184 @@
+# produtos/checkout.py
+"""
+Criação de pedidos com reserva de estoque, compartilhada pelos fluxos do
+Stripe (pagamento) e do Mercado Pago (mp_integracao).
+
+- criar_pedido() roda numa única transação: baixa o estoque de cada produto
+  com um UPDATE condicional (stock >= quantidade, decremento via F()), cria
+  o Pedido e grava todos os Itens com um bulk_create. Se algum produto não
+  tiver estoque, nada é gravado. Não há SELECT ... FOR UPDATE: checkouts
+  concorrentes só disputam a linha do produto durante o próprio UPDATE.
+- liberar_reserva() devolve o estoque de um pedido pendente que foi
+  cancelado (pagamento recusado/expirado) e é idempotente.
+- expirar_reservas() cancela pedidos pendentes mais antigos que
+  settings.CHECKOUT_RESERVA_MINUTOS e devolve o estoque deles (comando
+  expirar_reservas_estoque). Os links de pagamento expiram no mesmo prazo.
+- confirmar_pagamento() e cancelar_pedido() são as únicas transições vindas
+  dos gateways (webhooks do Stripe e do Mercado Pago). Ambas são UPDATEs
+  condicionais no status atual, então eventos fora de ordem (um 'pending'
+  ou 'rejected' atrasado) não desfazem um pagamento nem reabrem um pedido
+  cancelado.
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Item, Pedido, Produto
+
+logger = logging.getLogger(__name__)
+
+
+class EstoqueInsuficiente(Exception):
+
+    def __init__(self, produto):
+        self.produto = produto
+        super().__init__(f'Estoque insuficiente para "{produto.name}".')
+
+
+def prazo_reserva():
+    return timedelta(minutes=settings.CHECKOUT_RESERVA_MINUTOS)
+
+
+def _quantidades_por_produto(linhas):
+    quantidades = Counter()
+    for linha in linhas:
+        quantidades[linha['produto'].pk] += linha['quantidade']
+    return quantidades
+
+
+def reservar_estoque(linhas):
+    """
+    Baixa o estoque das linhas do carrinho. Deve rodar dentro de uma
+    transação: se um produto não tiver estoque, levanta EstoqueInsuficiente
+    e as baixas anteriores são desfeitas pelo rollback.
+    """
+    produtos = {linha['produto'].pk: linha['produto'] for linha in linhas}
+    # Ordem fixa por id: duas transações concorrentes travam as linhas na mesma ordem
+    for produto_id, quantidade in sorted(_quantidades_por_produto(linhas).items()):
+        baixado = Produto.objects.filter(pk=produto_id, stock__gte=quantidade).update(
+            stock=F('stock') - quantidade,
+        )
+        if not baixado:
+            raise EstoqueInsuficiente(produtos[produto_id])
+
+
+def criar_pedido(*, usuario, email_cliente, linhas, metodo_pagamento, valor_frete=None):
+    """
+    Cria o Pedido pendente com seus Itens e reserva o estoque, tudo ou nada.
+    `linhas` são as linhas hidratadas de produtos.carrinho.Carrinho.linhas().
+    """
+    valor_frete = valor_frete or 0
+    total = sum(linha['subtotal'] for linha in linhas) + valor_frete
+
+    with transaction.atomic():
+        reservar_estoque(linhas)
+        pedido = Pedido.objects.create(
+            usuario=usuario,
+            email_cliente=email_cliente,
+            total=total,
+            status='pendente',
+            metodo_pagamento=metodo_pagamento,
+            estoque_reservado=True,
+        )
+        Item.objects.bulk_create([
+            Item(
+                pedido=pedido,
+                produto_id_original=linha['produto'].pk,
+                nome=linha['produto'].name,
+                preco_unitario=linha['preco_unitario'],
+                quantidade=linha['quantidade'],
+                subtotal=linha['subtotal'],
+            )
+            for linha in linhas
+        ])
+    return pedido
+
+
+def liberar_reserva(pedido_id):
+    """
+    Devolve ao estoque as quantidades do pedido. Só a primeira chamada tem
+    efeito (a flag estoque_reservado é trocada com um UPDATE condicional).
+    """
+    with transaction.atomic():
+        if not Pedido.objects.filter(pk=pedido_id, estoque_reservado=True).update(estoque_reservado=False):
+            return False
+        quantidades = Counter()
+        for produto_id, quantidade in Item.objects.filter(
+            pedido_id=pedido_id, produto_id_original__isnull=False,
+        ).values_list('produto_id_original', 'quantidade'):
+            quantidades[produto_id] += quantidade
+        for produto_id, quantidade in sorted(quantidades.items()):
+            Produto.objects.filter(pk=produto_id).update(stock=F('stock') + quantidade)
+    logger.info("Reserva de estoque do Pedido %s liberada.", pedido_id)
+    return True
+
+
+def cancelar_pedido(pedido_id):
+    """Cancela um pedido ainda pendente e devolve o estoque. Retorna True se cancelou."""
+    with transaction.atomic():
+        if not Pedido.objects.filter(pk=pedido_id, status='pendente').update(status='cancelado'):
+            return False
+        liberar_reserva(pedido_id)
+    return True
+
+
+def expirar_reservas(agora=None):
+    """Cancela pedidos pendentes com reserva vencida. Retorna quantos foram cancelados."""
+    limite = (agora or timezone.now()) - prazo_reserva()
+    ids = list(
+        Pedido.objects.filter(status='pendente', estoque_reservado=True, criado_em__lt=limite)
+        .values_list('id', flat=True)
+    )
+    return sum(1 for pedido_id in ids if cancelar_pedido(pedido_id))
+
+
+def _reservar_itens_do_pedido(pedido_id):
+    """Reserva de novo o estoque dos itens de um pedido cancelado. Retorna False se faltar estoque."""
+    itens = list(Item.objects.filter(pedido_id=pedido_id).values_list('produto_id_original', 'quantidade'))
+    produtos = Produto.objects.in_bulk([produto_id for produto_id, _ in itens if produto_id])
+    if any(produto_id not in produtos for produto_id, _ in itens):
+        return False
+    linhas = [{'produto': produtos[produto_id], 'quantidade': quantidade} for produto_id, quantidade in itens]
+    try:
+        with transaction.atomic():
+            reservar_estoque(linhas)
+    except EstoqueInsuficiente:
+        return False
+    return True
+
+
+def confirmar_pagamento(pedido_id, **campos):
+    """
+    Marca o pedido como pago (com `campos` extras, ex.: stripe_id). Retorna
+    True se o status mudou.
+
+    Um pedido pendente passa direto para 'pago'. Um pagamento aprovado
+    depois do cancelamento (reserva expirada, tentativa recusada) já não tem
+    estoque reservado: a reserva é refeita e, se faltar estoque, o pedido
+    fica pago com revisao_manual=True. Pedidos pagos, enviados ou
+    reembolsados não mudam.
+    """
+    agora = timezone.now()
+    with transaction.atomic():
+        if Pedido.objects.filter(pk=pedido_id, status='pendente').update(
+            status='pago', data_pagamento=agora, **campos,
+        ):
+            return True
+
+        pedido = Pedido.objects.select_for_update().filter(pk=pedido_id, status='cancelado').first()
+        if pedido is None:
+            return False
+        reservado = pedido.estoque_reservado or _reservar_itens_do_pedido(pedido_id)
+        Pedido.objects.filter(pk=pedido_id).update(
+            status='pago', data_pagamento=agora, estoque_reservado=reservado, revisao_manual=not reservado, **campos,
+        )
+    if reservado:
+        logger.info("Pedido %s cancelado foi pago depois; estoque reservado de novo.", pedido_id)
+    else:
+        logger.warning("Pedido %s cancelado foi pago sem estoque disponível; marcado para revisão manual.", pedido_id)
+    return True
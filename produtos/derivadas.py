@@ -0,0 +1,158 @@
+# produtos/derivadas.py
+"""
+Variantes redimensionadas das imagens da vitrine (ProdutoImage e CarouselImage).
+
+Cada upload gera versões em larguras fixas (settings.IMAGENS_LARGURAS) em
+WebP e JPEG, gravadas ao lado do original no mesmo storage:
+produtos/painel.jpg -> produtos/painel_640w.webp, produtos/painel_640w.jpg, ...
+
+O resultado fica no campo JSON `derivadas` do modelo, então montar o srcset
+não toca no storage:
+
+    {'origem': 'produtos/painel.jpg', 'largura': 3000, 'altura': 2000,
+     'webp': {'320': 'produtos/painel_320w.webp', ...}, 'jpeg': {...}}
+
+Originais menores que uma largura não são ampliados. A geração roda em
+segundo plano depois do upload (produtos/signals.py); o acervo existente é
+processado pelo comando gerar_derivadas_imagens. O srcset dos templates sai
+de produtos/imagens.py.
+"""
+import io
+import logging
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .catalogo import invalidar_catalogo
+
+logger = logging.getLogger(__name__)
+
+# Extensão das variantes por formato
+FORMATOS = {'webp': '.webp', 'jpeg': '.jpg'}
+
+
+def _larguras(largura_original):
+    return sorted({min(largura, largura_original) for largura in settings.IMAGENS_LARGURAS})
+
+
+def _nome_variante(nome, largura, formato):
+    base, _ = os.path.splitext(nome)
+    return f'{base}_{largura}w{FORMATOS[formato]}'
+
+
+def _codificar(imagem, formato):
+    saida = io.BytesIO()
+    if formato == 'jpeg':
+        if imagem.mode in ('RGBA', 'LA', 'P'):
+            # JPEG não tem transparência: aplica sobre fundo branco
+            fundo = Image.new('RGB', imagem.size, (255, 255, 255))
+            rgba = imagem.convert('RGBA')
+            fundo.paste(rgba, mask=rgba.getchannel('A'))
+            imagem = fundo
+        elif imagem.mode != 'RGB':
+            imagem = imagem.convert('RGB')
+        imagem.save(saida, 'JPEG', quality=settings.IMAGENS_QUALIDADE, optimize=True, progressive=True)
+    else:
+        if imagem.mode not in ('RGB', 'RGBA'):
+            imagem = imagem.convert('RGBA' if 'A' in imagem.getbands() or imagem.mode == 'P' else 'RGB')
+        imagem.save(saida, 'WEBP', quality=settings.IMAGENS_QUALIDADE, method=4)
+    return saida.getvalue()
+
+
+def gerar(nome, storage=None):
+    """
+    Gera as variantes do arquivo `nome` e retorna o dicionário de `derivadas`.
+    Não acessa o banco, então pode rodar em outro processo.
+    """
+    storage = storage or default_storage
+    with storage.open(nome, 'rb') as arquivo:
+        imagem = Image.open(arquivo)
+        # JPEG pode decodificar já reduzido (escala 1/2, 1/4, 1/8), desde
+        # que continue maior que a maior variante
+        maior = max(settings.IMAGENS_LARGURAS)
+        if imagem.width > maior:
+            imagem.draft('RGB', (maior, round(imagem.height * maior / imagem.width)))
+        imagem = ImageOps.exif_transpose(imagem)
+        imagem.load()
+
+    largura, altura = imagem.size
+    derivadas = {'origem': nome, 'largura': largura, 'altura': altura}
+    for formato in FORMATOS:
+        derivadas[formato] = {}
+    # Da maior para a menor, cada redução parte da anterior
+    atual = imagem
+    for alvo in reversed(_larguras(largura)):
+        if alvo != atual.width:
+            atual = atual.resize((alvo, max(1, round(altura * alvo / largura))), Image.LANCZOS, reducing_gap=3.0)
+        for formato in FORMATOS:
+            destino = _nome_variante(nome, alvo, formato)
+            if storage.exists(destino):
+                storage.delete(destino)
+            derivadas[formato][str(alvo)] = storage.save(destino, ContentFile(_codificar(atual, formato)))
+    return derivadas
+
+
+def remover(derivadas, storage=None):
+    """Apaga do storage os arquivos listados em `derivadas`."""
+    storage = storage or default_storage
+    for formato in FORMATOS:
+        for nome in (derivadas or {}).get(formato, {}).values():
+            try:
+                storage.delete(nome)
+            except OSError:
+                logger.warning("Não foi possível apagar a variante %s", nome)
+
+
+def pendente(instancia):
+    """True se a imagem atual ainda não tem variantes geradas."""
+    return bool(instancia.image) and (instancia.derivadas or {}).get('origem') != instancia.image.name
+
+
+def processar(modelo, pk):
+    """
+    Gera as variantes de uma imagem (`modelo` = 'produtos.ProdutoImage' ou
+    'produtos.CarouselImage') e grava o resultado sem disparar save().
+    """
+    Modelo = apps.get_model(modelo)
+    instancia = Modelo.objects.filter(pk=pk).first()
+    if instancia is None or not pendente(instancia):
+        return None
+    nome = instancia.image.name
+    return gravar(Modelo, pk, nome, gerar_ou_marcar(nome), anteriores=instancia.derivadas)
+
+
+def processar_lote(modelo, pks):
+    for pk in pks:
+        processar(modelo, pk)
+
+
+def gerar_ou_marcar(nome):
+    """
+    Como gerar(), mas um arquivo ilegível vira {'origem': nome}: fica marcado
+    para não ser tentado de novo e os templates usam o original.
+    """
+    try:
+        return gerar(nome)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        logger.warning("Imagem %s não pôde ser processada: %s", nome, e)
+        return {'origem': nome}
+
+
+def gravar(Modelo, pk, nome, derivadas, anteriores=None):
+    """
+    Grava `derivadas` se a imagem ainda for `nome` (pode ter sido trocada
+    enquanto as variantes eram geradas) e apaga as variantes antigas.
+    """
+    if not Modelo.objects.filter(pk=pk, image=nome).update(derivadas=derivadas):
+        remover(derivadas)
+        return None
+    if anteriores and anteriores.get('origem') != nome:
+        remover(anteriores)
+    # O payload em cache da vitrine guarda os srcset
+    invalidar_catalogo()
+    return derivadas
+
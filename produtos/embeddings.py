@@ -0,0 +1,293 @@
+# produtos/embeddings.py
+"""
+Pipeline de geração de embeddings das imagens de produtos.
+
+- Provedor plugável (settings.EMBEDDINGS_PROVEDOR): Gemini em produção e um
+  provedor falso determinístico para testes e benchmarks sem rede.
+- Pool de threads com concorrência limitada, controlado por um token bucket
+  (requisições por segundo) compartilhado entre os workers.
+- Erros transitórios são refeitos com backoff exponencial + jitter.
+- Resultados são gravados em lote (um upsert por lote) na thread principal.
+- Um checkpoint em disco guarda até qual id tudo já foi gravado, de modo que
+  uma execução interrompida continua de onde parou. As imagens que falharam
+  ficam registradas à parte no checkpoint e são tentadas de novo em toda
+  execução seguinte, até gerarem o embedding.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import ProdutoImage, ProdutoImageEmbedding
+from .similaridade import marcar_indice_desatualizado
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------
+# PROVEDORES
+# --------------------------
+class ProvedorGemini:
+    """Embeddings de imagem via API do Gemini (settings.EMBEDDINGS_MODELO)."""
+
+    def __init__(self):
+        self.modelo = settings.EMBEDDINGS_MODELO
+
+    def gerar(self, produto_image):
+        from .services import gerar_embedding_imagem
+        return gerar_embedding_imagem(produto_image.image.path)
+
+
+class ProvedorFalso:
+    """
+    Provedor local e determinístico: o vetor é derivado do hash do nome do
+    arquivo, então não precisa de rede nem do arquivo em disco.
+    `latencia` (segundos) e `taxa_erro` simulam a API para benchmarks.
+    """
+
+    def __init__(self, dimensao=768, latencia=0.0, taxa_erro=0.0):
+        self.dimensao = dimensao
+        self.latencia = latencia
+        self.taxa_erro = taxa_erro
+        self.modelo = f'falso-{dimensao}'
+
+    def gerar(self, produto_image):
+        if self.latencia:
+            time.sleep(self.latencia)
+        if self.taxa_erro and random.random() < self.taxa_erro:
+            raise ConnectionError("Falha simulada do provedor falso.")
+        semente = hashlib.sha256(produto_image.image.name.encode()).digest()
+        rng = np.random.default_rng(int.from_bytes(semente[:8], 'big'))
+        return rng.standard_normal(self.dimensao).astype(np.float32).tolist()
+
+
+def obter_provedor(caminho=None, **opcoes):
+    return import_string(caminho or settings.EMBEDDINGS_PROVEDOR)(**opcoes)
+
+
+# --------------------------
+# CONTROLE DE TAXA E RETRY
+# --------------------------
+class LimitadorTaxa:
+    """Token bucket thread-safe: até `capacidade` requisições em rajada, `taxa` por segundo em regime."""
+
+    def __init__(self, taxa, capacidade=None):
+        self.taxa = float(taxa)
+        self.capacidade = float(capacidade or max(1.0, self.taxa))
+        self._tokens = self.capacidade
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        if self.taxa <= 0:
+            return
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._tokens = min(self.capacidade, self._tokens + (agora - self._ultimo) * self.taxa)
+                self._ultimo = agora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                espera = (1 - self._tokens) / self.taxa
+            time.sleep(espera)
+
+
+# Erros que não adianta repetir
+ERROS_PERMANENTES = (FileNotFoundError, IsADirectoryError, ValueError)
+
+
+def com_retry(funcao, tentativas=5, base=1.0, teto=60.0, limitador=None, dormir=time.sleep):
+    """
+    Executa `funcao` refazendo erros transitórios com backoff exponencial e
+    jitter completo (espera aleatória entre 0 e base * 2^n, limitada ao teto).
+    """
+    for tentativa in range(tentativas):
+        if limitador is not None:
+            limitador.adquirir()
+        try:
+            return funcao()
+        except ERROS_PERMANENTES:
+            raise
+        except Exception as e:
+            if tentativa == tentativas - 1:
+                raise
+            espera = random.uniform(0, min(teto, base * (2 ** tentativa)))
+            logger.warning("Tentativa %s falhou (%s); nova tentativa em %.1fs.", tentativa + 1, e, espera)
+            dormir(espera)
+
+
+# --------------------------
+# CHECKPOINT
+# --------------------------
+class Checkpoint:
+    """
+    Arquivo JSON com o último id gravado e as imagens que falharam, por modelo.
+    `falhas` mapeia o id da imagem para {'erro': ..., 'execucoes': n}.
+    """
+
+    def __init__(self, caminho, modelo):
+        self.caminho = caminho
+        self.modelo = modelo
+        self.ultimo_id = 0
+        self.falhas = {}
+
+    def carregar(self):
+        try:
+            with open(self.caminho) as f:
+                dados = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return self
+        if dados.get('modelo') == self.modelo:
+            self.ultimo_id = dados.get('ultimo_id', 0)
+            # Formato antigo: id -> mensagem de erro
+            self.falhas = {
+                imagem_id: falha if isinstance(falha, dict) else {'erro': falha, 'execucoes': 1}
+                for imagem_id, falha in dados.get('falhas', {}).items()
+            }
+        return self
+
+    def registrar_falha(self, imagem_id, erro):
+        anterior = self.falhas.get(str(imagem_id), {})
+        self.falhas[str(imagem_id)] = {'erro': str(erro)[:200], 'execucoes': anterior.get('execucoes', 0) + 1}
+
+    def registrar_sucesso(self, imagem_id):
+        self.falhas.pop(str(imagem_id), None)
+
+    def salvar(self):
+        os.makedirs(os.path.dirname(self.caminho) or '.', exist_ok=True)
+        temporario = f'{self.caminho}.tmp'
+        with open(temporario, 'w') as f:
+            json.dump({
+                'modelo': self.modelo,
+                'ultimo_id': self.ultimo_id,
+                'falhas': self.falhas,
+                'salvo_em': timezone.now().isoformat(),
+            }, f)
+        os.replace(temporario, self.caminho)
+
+    def apagar(self):
+        try:
+            os.remove(self.caminho)
+        except FileNotFoundError:
+            pass
+
+
+# --------------------------
+# PIPELINE
+# --------------------------
+class PipelineEmbeddings:
+
+    def __init__(self, provedor, workers=4, requisicoes_por_segundo=1.0, lote=100,
+                 tentativas=5, checkpoint=None, refazer=False, limite=None, progresso=None):
+        self.provedor = provedor
+        self.workers = max(1, workers)
+        self.limitador = LimitadorTaxa(requisicoes_por_segundo, capacidade=self.workers)
+        self.lote = max(1, lote)
+        self.tentativas = tentativas
+        self.checkpoint = checkpoint
+        self.refazer = refazer
+        self.limite = limite
+        self.progresso = progresso or (lambda mensagem: None)
+        self.estatisticas = {'gravados': 0, 'falhas': 0, 'segundos': 0.0}
+
+    def imagens_pendentes(self):
+        if self.refazer:
+            qs = ProdutoImage.objects.exclude(embedding__modelo=self.provedor.modelo)
+        else:
+            qs = ProdutoImage.objects.filter(embedding__isnull=True)
+        if self.checkpoint is not None:
+            # Falhas de execuções anteriores (abaixo de ultimo_id) entram de novo
+            qs = qs.filter(Q(id__gt=self.checkpoint.ultimo_id) | Q(id__in=[int(i) for i in self.checkpoint.falhas]))
+        qs = qs.order_by('id').only('id', 'image')
+        return qs[:self.limite] if self.limite else qs
+
+    def _gerar(self, produto_image):
+        return com_retry(
+            lambda: self.provedor.gerar(produto_image),
+            tentativas=self.tentativas,
+            limitador=self.limitador,
+        )
+
+    def _gravar(self, resultados):
+        """Um upsert por lote; signals não disparam em operações em lote, então o índice é avisado aqui."""
+        agora = timezone.now()
+        embeddings = []
+        for imagem_id, valores in resultados:
+            embedding = ProdutoImageEmbedding(imagem_id=imagem_id, modelo=self.provedor.modelo, atualizado_em=agora)
+            embedding.definir_valores(valores)
+            embeddings.append(embedding)
+        ProdutoImageEmbedding.objects.bulk_create(
+            embeddings,
+            batch_size=self.lote,
+            update_conflicts=True,
+            unique_fields=['imagem'],
+            update_fields=['modelo', 'dimensao', 'vetor', 'atualizado_em'],
+        )
+        marcar_indice_desatualizado()
+
+    def executar(self):
+        inicio = time.monotonic()
+        ultimo_enviado = None  # ids são enviados em ordem crescente
+        pendentes = set()      # ids enviados e ainda não gravados
+        resultados = []
+
+        def descarregar():
+            if resultados:
+                self._gravar(resultados)
+                self.estatisticas['gravados'] += len(resultados)
+                for imagem_id, _ in resultados:
+                    pendentes.discard(imagem_id)
+                    if self.checkpoint is not None:
+                        self.checkpoint.registrar_sucesso(imagem_id)
+                resultados.clear()
+            if self.checkpoint is not None and ultimo_enviado is not None:
+                # Tudo abaixo do menor id ainda pendente já está no banco ou
+                # nas falhas; uma falha antiga refeita não faz a marca recuar
+                marca = (min(pendentes) - 1) if pendentes else ultimo_enviado
+                self.checkpoint.ultimo_id = max(self.checkpoint.ultimo_id, marca)
+                self.checkpoint.salvar()
+
+        def coletar(futuros):
+            for futuro in futuros:
+                produto_image = em_voo.pop(futuro)
+                try:
+                    resultados.append((produto_image.id, futuro.result()))
+                except Exception as e:
+                    pendentes.discard(produto_image.id)
+                    self.estatisticas['falhas'] += 1
+                    if self.checkpoint is not None:
+                        self.checkpoint.registrar_falha(produto_image.id, e)
+                    self.progresso(f"ERRO na imagem ID {produto_image.id} ({produto_image.image.name}): {e}")
+            if len(resultados) >= self.lote:
+                descarregar()
+                self.progresso(f"{self.estatisticas['gravados']} embeddings gravados...")
+
+        em_voo = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='embeddings') as executor:
+            for produto_image in self.imagens_pendentes().iterator(chunk_size=500):
+                # Limita a fila para não materializar o catálogo inteiro em futures
+                while len(em_voo) >= self.workers * 2:
+                    concluidos, _ = wait(em_voo, return_when=FIRST_COMPLETED)
+                    coletar(concluidos)
+                ultimo_enviado = produto_image.id
+                pendentes.add(produto_image.id)
+                em_voo[executor.submit(self._gerar, produto_image)] = produto_image
+
+            while em_voo:
+                concluidos, _ = wait(em_voo, return_when=FIRST_COMPLETED)
+                coletar(concluidos)
+        descarregar()
+
+        self.estatisticas['segundos'] = time.monotonic() - inicio
+        return self.estatisticas
@@ -0,0 +1,137 @@
+# produtos/frete.py
+"""
+Índice em memória das regiões de frete (RegiaoFrete).
+
+Cada região cobre um intervalo de CEPs: um prefixo de 1 a 8 dígitos
+('010' cobre 01000000..01099999) ou uma faixa explícita. Na carga, os
+intervalos são achatados em segmentos disjuntos ordenados; cada segmento
+aponta para a região mais estreita que o cobre, então um prefixo mais longo
+(ou uma faixa menor) vence um mais curto, como em longest-prefix match.
+A consulta é um bisect na lista de inícios, sem varrer as regiões no banco.
+
+O índice é carregado uma vez por worker e recarregado quando a versão
+'frete' (produtos/versoes.py, guardada no banco) muda; os signals de
+RegiaoFrete (produtos/signals.py) trocam a versão. O worker confere essa
+linha no máximo uma vez a cada settings.FRETE_VERSAO_INTERVALO segundos, então
+a cotação com o índice quente não vai ao banco; a alteração chega aos outros
+workers dentro desse intervalo, e ao worker que a gravou logo após o commit.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_right
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+
+from . import versoes
+from .models import RegiaoFrete
+
+VERSAO = 'frete'
+
+CotacaoFrete = namedtuple('CotacaoFrete', 'regiao_id cidade valor_frete prazo_entrega')
+
+
+def normalizar_cep(cep):
+    """
+    Mantém só os dígitos. CEPs incompletos (mínimo 3 dígitos) são completados
+    com zeros, como a busca por prefixo fazia antes. Retorna int ou None.
+    """
+    digitos = ''.join(c for c in str(cep or '') if c.isdigit())
+    if len(digitos) < 3 or len(digitos) > 8:
+        return None
+    return int(digitos.ljust(8, '0'))
+
+
+class IndiceFrete:
+
+    def __init__(self, intervalos):
+        """
+        intervalos: iterável de (inicio, fim, CotacaoFrete), com limites inclusivos.
+        """
+        intervalos = sorted(intervalos, key=lambda item: item[0])
+        fronteiras = sorted({inicio for inicio, _, _ in intervalos} | {fim + 1 for _, fim, _ in intervalos})
+
+        inicios, cotacoes = [], []
+        ativos = []  # heap de (largura, desempate, fim, cotacao)
+        proximo = 0
+        for posicao, fronteira in enumerate(fronteiras):
+            while proximo < len(intervalos) and intervalos[proximo][0] <= fronteira:
+                inicio, fim, cotacao = intervalos[proximo]
+                heapq.heappush(ativos, (fim - inicio, proximo, fim, cotacao))
+                proximo += 1
+            # Remoção preguiçosa dos intervalos que já terminaram
+            while ativos and ativos[0][2] < fronteira:
+                heapq.heappop(ativos)
+            vencedora = ativos[0][3] if ativos else None
+            if cotacoes and cotacoes[-1] is vencedora:
+                continue  # segmento contíguo com a mesma região: funde
+            inicios.append(fronteira)
+            cotacoes.append(vencedora)
+
+        self._inicios = inicios
+        self._cotacoes = cotacoes
+
+    @classmethod
+    def do_banco(cls):
+        intervalos = []
+        for regiao in RegiaoFrete.objects.all():
+            if not regiao.prefixo_cep and not (regiao.cep_inicial and regiao.cep_final):
+                continue
+            inicio, fim = regiao.limites()
+            intervalos.append((inicio, fim, CotacaoFrete(
+                regiao.id, regiao.cidade, regiao.valor_frete, regiao.prazo_entrega,
+            )))
+        return cls(intervalos)
+
+    def __len__(self):
+        return sum(1 for cotacao in self._cotacoes if cotacao is not None)
+
+    def buscar(self, cep):
+        """Retorna a CotacaoFrete do CEP, ou None se nenhuma região o cobre."""
+        numero = normalizar_cep(cep)
+        if numero is None:
+            return None
+        posicao = bisect_right(self._inicios, numero) - 1
+        if posicao < 0:
+            return None
+        return self._cotacoes[posicao]
+
+
+_indice = None
+_versao_indice = None
+_versao_conferida_em = None  # time.monotonic() da última leitura da versão
+_indice_lock = threading.Lock()
+
+
+def obter_indice_frete():
+    """Índice do worker, recarregado se a versão no banco mudou desde a última conferência."""
+    global _indice, _versao_indice, _versao_conferida_em
+    agora = time.monotonic()
+    conferida_em = _versao_conferida_em
+    if _indice is not None and conferida_em is not None and agora - conferida_em < settings.FRETE_VERSAO_INTERVALO:
+        return _indice
+    versao = versoes.versao(VERSAO)
+    if _indice is None or _versao_indice != versao:
+        with _indice_lock:
+            if _indice is None or _versao_indice != versao:
+                _indice = IndiceFrete.do_banco()
+                _versao_indice = versao
+    _versao_conferida_em = agora
+    return _indice
+
+
+def cotar_frete(cep):
+    return obter_indice_frete().buscar(cep)
+
+
+def _reconferir_versao():
+    global _versao_conferida_em
+    _versao_conferida_em = None
+
+
+def invalidar_indice_frete():
+    versoes.trocar(VERSAO)
+    # O worker que gravou não espera o intervalo: a próxima cotação relê a versão
+    transaction.on_commit(_reconferir_versao)
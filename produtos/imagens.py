@@ -0,0 +1,81 @@
+# produtos/imagens.py
+"""
+Resolução da imagem de card dos produtos.
+
+A imagem do card fica desnormalizada em Produto.imagem_principal, então basta
+um select_related para resolver a imagem de todos os produtos de uma listagem
+na mesma consulta que busca os produtos.
+
+fontes_responsivas() monta src/srcset a partir das variantes já gravadas em
+`derivadas` (produtos/derivadas.py), sem consultar o storage.
+"""
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import QuerySet
+
+
+def com_imagem_card(queryset):
+    """Acrescenta o JOIN da imagem do card ao queryset de Produto."""
+    return queryset.select_related('imagem_principal')
+
+
+def resolver_imagens_card(produtos):
+    """
+    Avalia o queryset (com o JOIN da imagem) e anexa `imagem_do_card`
+    a cada produto. Retorna a lista de produtos.
+    """
+    if isinstance(produtos, QuerySet) and not produtos.query.is_sliced:
+        produtos = com_imagem_card(produtos)
+    produtos = list(produtos)
+    for produto in produtos:
+        produto.imagem_do_card = produto.imagem_principal
+    return produtos
+
+
+def url_imagem_card(produto):
+    """Retorna a URL da imagem do card do produto, ou string vazia."""
+    imagem = produto.imagem_principal if produto else None
+    if not imagem or not imagem.image:
+        return ''
+    try:
+        return imagem.image.url
+    except ValueError:
+        return ''
+
+
+def _url(nome):
+    try:
+        return default_storage.url(nome)
+    except ValueError:
+        return ''
+
+
+def _srcset(variantes):
+    return ', '.join(
+        f'{_url(nome)} {largura}w'
+        for largura, nome in sorted(variantes.items(), key=lambda item: int(item[0]))
+    )
+
+
+def fontes_responsivas(imagem):
+    """
+    Dados de <picture>/<img srcset> de uma ProdutoImage ou CarouselImage, em
+    estruturas simples (vão também para o cache da vitrine). `src` é o JPEG
+    mais próximo de settings.IMAGENS_LARGURA_PADRAO; sem variantes, é o
+    próprio original.
+    """
+    if imagem is None or not imagem.image:
+        return {}
+    derivadas = imagem.derivadas or {}
+    jpeg = derivadas.get('jpeg') or {}
+    if not jpeg:
+        return {'src': _url(imagem.image.name)}
+    larguras = sorted(int(largura) for largura in jpeg)
+    padrao = [largura for largura in larguras if largura <= settings.IMAGENS_LARGURA_PADRAO] or larguras[:1]
+    return {
+        'src': _url(jpeg[str(padrao[-1])]),
+        'srcset': _srcset(jpeg),
+        'srcset_webp': _srcset(derivadas.get('webp') or {}),
+        'largura': derivadas.get('largura'),
+        'altura': derivadas.get('altura'),
+    }
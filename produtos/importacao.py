@@ -0,0 +1,483 @@
+# produtos/importacao.py
+"""
+Importação e exportação do catálogo (Produto + ProdutoImage) em CSV ou
+JSONL, em memória constante.
+
+- exportar_linhas(): gerador de texto (cabeçalho + uma linha por produto).
+  Lê o banco com iterator(chunk_size), com as imagens pré-carregadas por
+  bloco. Usado pelo comando export_catalogo e pela exportação do CRM
+  (StreamingHttpResponse). No CSV, textos que começam com =, +, - ou @ saem
+  com um apóstrofo na frente, como nas exportações do CRM; a importação
+  remove esse apóstrofo, então o arquivo exportado reimporta sem alterações.
+- importar(): lê o arquivo linha a linha e faz upsert por SKU em lotes de
+  settings.CATALOGO_IMPORTACAO_LOTE linhas: um bulk_create(update_conflicts)
+  por lote, com os slugs dos produtos novos alocados em lote
+  (produtos/slugs.py). Só as colunas presentes no arquivo são atualizadas,
+  então um arquivo 'sku,stock' apenas sincroniza o estoque.
+- Linhas inválidas não interrompem a importação: vão para o relatório de
+  erros (CSV com linha, sku e erro).
+- A coluna 'imagens' lista arquivos separados por '|', lidos de um diretório
+  local ou de um .zip. Cada arquivo é anexado uma única vez por produto, então
+  reimportar o mesmo arquivo não duplica imagens.
+
+bulk_create não dispara signals: o cache da home é invalidado uma vez ao
+final e a imagem do card é recalculada com um UPDATE por lote. A busca FTS é
+mantida pelos triggers do banco (produtos/busca.py).
+"""
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+import tempfile
+import zipfile
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, transaction
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.utils import timezone
+from django.utils.text import get_valid_filename, slugify
+
+from energia_solar.tarefas import enfileirar
+from solar.exportacao import PREFIXOS_FORMULA, neutralizar_formula
+
+from .catalogo import invalidar_catalogo
+from .derivadas import processar_lote
+from .models import ImportacaoCatalogo, Produto, ProdutoImage
+from .slugs import criar_em_lote
+
+logger = logging.getLogger(__name__)
+
+CAMPOS = [
+    'sku', 'name', 'description', 'preco', 'categoria_id', 'stock',
+    'peso', 'dimensoes', 'garantia', 'is_active',
+]
+COLUNAS = CAMPOS + ['imagens']
+# Campos exigidos para criar um produto que ainda não existe
+OBRIGATORIOS_NOVO = ('name', 'preco')
+SEPARADOR_IMAGENS = '|'
+EXTENSOES_IMAGEM = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+BLOCO_EXPORTACAO = 2000
+
+VERDADEIROS = {'1', 'true', 't', 'sim', 's', 'yes', 'y'}
+FALSOS = {'0', 'false', 'f', 'nao', 'não', 'n', 'no'}
+
+
+class ArquivoInvalido(Exception):
+    """O arquivo inteiro não pode ser importado (ex.: sem coluna sku)."""
+
+
+class LinhaInvalida(Exception):
+    pass
+
+
+def formato_do_nome(nome):
+    return 'jsonl' if os.path.splitext(nome or '')[1].lower() in ('.jsonl', '.ndjson', '.json') else 'csv'
+
+
+# --------------------------
+# Exportação
+# --------------------------
+class _Eco:
+    """Pseudo-arquivo para csv.writer: devolve a linha em vez de guardá-la."""
+
+    def write(self, valor):
+        return valor
+
+
+def _valor_exportado(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'true' if valor else 'false'
+    if isinstance(valor, str):
+        return neutralizar_formula(valor)
+    return str(valor)
+
+
+def exportar_linhas(formato='csv', produtos=None, chunk_size=BLOCO_EXPORTACAO):
+    """
+    Gera o catálogo em texto, uma linha por vez. `produtos` permite filtrar
+    (ex.: só ativos); por padrão exporta todos, em ordem de id.
+    """
+    produtos = Produto.objects.all() if produtos is None else produtos
+    produtos = produtos.order_by('pk').only(*CAMPOS).prefetch_related(
+        Prefetch('images', queryset=ProdutoImage.objects.only('id', 'produto_id', 'image', 'is_main'))
+    )
+
+    escritor = csv.writer(_Eco())
+    if formato == 'csv':
+        yield escritor.writerow(COLUNAS)
+
+    for produto in produtos.iterator(chunk_size=chunk_size):
+        dados = {campo: getattr(produto, campo) for campo in CAMPOS}
+        dados['imagens'] = [imagem.image.name for imagem in produto.images.all()]
+        if formato == 'csv':
+            dados['imagens'] = SEPARADOR_IMAGENS.join(dados['imagens'])
+            yield escritor.writerow([_valor_exportado(dados[coluna]) for coluna in COLUNAS])
+        else:
+            yield json.dumps(dados, ensure_ascii=False, default=str) + '\n'
+
+
+# --------------------------
+# Leitura do arquivo
+# --------------------------
+def _valor_lido(valor):
+    # Desfaz o apóstrofo que a exportação põe antes de textos que parecem fórmula
+    if isinstance(valor, str) and valor[:1] == "'" and valor[1:2] in PREFIXOS_FORMULA:
+        return valor[1:]
+    return valor
+
+
+def ler_linhas(arquivo, formato='csv'):
+    """
+    Lê um arquivo binário aberto. Gera (numero_linha, dados, erro): `dados`
+    é um dict coluna -> valor, ou None quando a linha não pôde ser lida.
+    """
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+    try:
+        if formato == 'jsonl':
+            for numero, conteudo in enumerate(texto, start=1):
+                if not conteudo.strip():
+                    continue
+                try:
+                    dados = json.loads(conteudo)
+                except ValueError as e:
+                    yield numero, None, f"JSON inválido: {e}"
+                    continue
+                if not isinstance(dados, dict):
+                    yield numero, None, "A linha deve ser um objeto JSON."
+                    continue
+                yield numero, dados, None
+            return
+
+        primeira = texto.readline()
+        if not primeira.strip():
+            return
+        # Planilhas exportadas em pt-BR costumam usar ';'
+        delimitador = ';' if primeira.count(';') > primeira.count(',') else ','
+        leitor = csv.DictReader(itertools.chain([primeira], texto), delimiter=delimitador)
+        for dados in leitor:
+            if not any((valor or '').strip() for valor in dados.values() if isinstance(valor, str)):
+                continue
+            yield leitor.line_num, {coluna: _valor_lido(valor) for coluna, valor in dados.items()}, None
+    finally:
+        # Não fecha o arquivo de quem chamou junto com o wrapper
+        texto.detach()
+
+
+def _converter(campo, valor):
+    """Converte e valida um valor com as regras do próprio campo do modelo."""
+    field = Produto._meta.get_field(campo)
+    if isinstance(valor, str):
+        valor = valor.strip()
+        if campo == 'is_active':
+            if valor.lower() in VERDADEIROS:
+                return True
+            if valor.lower() in FALSOS:
+                return False
+        if campo in ('preco', 'peso') and ',' in valor and '.' not in valor:
+            valor = valor.replace(',', '.')
+    if valor in ('', None):
+        if field.null:
+            return None
+        if field.has_default():
+            return field.get_default()
+        if field.blank:
+            return ''
+    if isinstance(valor, float):
+        valor = Decimal(str(valor)) if campo in ('preco', 'peso') else valor
+    try:
+        return field.clean(valor, None)
+    except ValidationError as e:
+        raise LinhaInvalida(f"{campo}: {' '.join(e.messages)}")
+
+
+def converter_linha(dados, colunas):
+    """Retorna (campos, imagens) de uma linha lida, ou levanta LinhaInvalida."""
+    sku = str(dados.get('sku') or '').strip()
+    if not sku:
+        raise LinhaInvalida("sku: obrigatório.")
+    campos = {'sku': _converter('sku', sku)}
+    for campo in colunas:
+        if campo != 'sku':
+            campos[campo] = _converter(campo, dados.get(campo))
+
+    imagens = dados.get('imagens') or []
+    if isinstance(imagens, str):
+        imagens = imagens.split(SEPARADOR_IMAGENS)
+    imagens = [str(nome).strip() for nome in imagens if str(nome).strip()]
+    for nome in imagens:
+        if not nome.lower().endswith(EXTENSOES_IMAGEM):
+            raise LinhaInvalida(f"imagens: '{nome}' não é um arquivo de imagem.")
+    return campos, imagens
+
+
+# --------------------------
+# Origem das imagens
+# --------------------------
+class ImagensDiretorio:
+
+    def __init__(self, caminho):
+        self.raiz = os.path.realpath(caminho)
+
+    def ler(self, nome):
+        caminho = os.path.realpath(os.path.join(self.raiz, nome))
+        # Impede '../' e caminhos absolutos fora do diretório informado
+        if not caminho.startswith(self.raiz + os.sep) or not os.path.isfile(caminho):
+            raise LinhaInvalida(f"imagens: '{nome}' não encontrada.")
+        with open(caminho, 'rb') as f:
+            return f.read()
+
+    def fechar(self):
+        pass
+
+
+class ImagensZip:
+
+    def __init__(self, arquivo):
+        self.zip = zipfile.ZipFile(arquivo)
+
+    def ler(self, nome):
+        try:
+            return self.zip.read(nome.lstrip('/'))
+        except KeyError:
+            raise LinhaInvalida(f"imagens: '{nome}' não encontrada no .zip.")
+
+    def fechar(self):
+        self.zip.close()
+
+
+def abrir_imagens(origem):
+    """`origem` é um diretório, o caminho de um .zip ou um .zip já aberto."""
+    if origem is None:
+        return None
+    if isinstance(origem, (str, os.PathLike)) and os.path.isdir(origem):
+        return ImagensDiretorio(origem)
+    try:
+        return ImagensZip(origem)
+    except (OSError, zipfile.BadZipFile) as e:
+        raise ArquivoInvalido(f"Origem de imagens inválida: {e}")
+
+
+def _nome_importado(sku, nome):
+    return f"produtos/{slugify(sku) or 'produto'}-{get_valid_filename(os.path.basename(nome))}"
+
+
+# --------------------------
+# Gravação
+# --------------------------
+class _Importador:
+
+    def __init__(self, imagens, relatorio):
+        self.imagens = imagens
+        # Colunas conhecidas presentes no arquivo: são as que o upsert atualiza
+        self.colunas = None
+        self.relatorio = csv.writer(relatorio) if relatorio is not None else None
+        if self.relatorio:
+            self.relatorio.writerow(['linha', 'sku', 'erro'])
+        self.resumo = {'linhas': 0, 'criados': 0, 'atualizados': 0, 'imagens': 0, 'erros': 0}
+
+    def definir_colunas(self, colunas):
+        if 'sku' not in colunas:
+            raise ArquivoInvalido("O arquivo precisa de uma coluna 'sku'.")
+        self.colunas = [campo for campo in CAMPOS if campo in colunas]
+
+    def erro(self, numero, sku, mensagem):
+        self.resumo['erros'] += 1
+        if self.relatorio:
+            self.relatorio.writerow([numero, sku or '', mensagem])
+
+    def _upsert(self, produtos):
+        atualizar = [campo for campo in self.colunas if campo != 'sku'] + ['updated_at']
+        return criar_em_lote(
+            produtos, batch_size=len(produtos),
+            update_conflicts=True, unique_fields=['sku'], update_fields=atualizar,
+        )
+
+    def gravar_lote(self, lote):
+        """`lote` é uma lista de (numero, campos, imagens)."""
+        # O mesmo SKU repetido no lote: vale a última linha
+        por_sku = {campos['sku']: (numero, campos, imagens) for numero, campos, imagens in lote}
+        existentes = dict(Produto.objects.filter(sku__in=list(por_sku)).values_list('sku', 'slug'))
+
+        linhas = {}
+        for sku, (numero, campos, imagens) in por_sku.items():
+            produto = Produto(**campos)
+            if sku in existentes:
+                # Mantém o slug; o preço só completa o INSERT (NOT NULL), o
+                # upsert não atualiza colunas ausentes do arquivo
+                produto.slug = existentes[sku]
+                if produto.preco is None:
+                    produto.preco = 0
+            else:
+                faltando = [campo for campo in OBRIGATORIOS_NOVO if campos.get(campo) in (None, '')]
+                if faltando:
+                    self.erro(numero, sku, f"Produto novo sem {', '.join(faltando)}.")
+                    continue
+            linhas[sku] = (numero, produto, imagens)
+
+        gravados = self._gravar_produtos(linhas, existentes)
+        for sku in gravados:
+            self.resumo['atualizados' if sku in existentes else 'criados'] += 1
+
+        if self.imagens is not None:
+            self._anexar_imagens({sku: linhas[sku] for sku in gravados if linhas[sku][2]})
+
+    def _gravar_produtos(self, linhas, existentes):
+        """Um upsert para o lote; se falhar, grava linha a linha para isolar o erro."""
+        if not linhas:
+            return []
+        try:
+            self._upsert([produto for _, produto, _ in linhas.values()])
+            return list(linhas)
+        except DatabaseError:
+            logger.warning("Lote de importação falhou; gravando linha a linha.", exc_info=True)
+
+        gravados = []
+        for sku, (numero, produto, _) in linhas.items():
+            if sku not in existentes:
+                produto.slug = ''
+            try:
+                self._upsert([produto])
+                gravados.append(sku)
+            except DatabaseError as e:
+                self.erro(numero, sku, f"Erro ao gravar: {e}")
+        return gravados
+
+    def _anexar_imagens(self, linhas):
+        if not linhas:
+            return
+        ids = dict(Produto.objects.filter(sku__in=list(linhas)).values_list('sku', 'id'))
+        existentes = {}
+        for produto_id, nome in ProdutoImage.objects.filter(produto_id__in=ids.values()).values_list('produto_id', 'image'):
+            existentes.setdefault(produto_id, set()).add(nome)
+
+        novas = []
+        for sku, (numero, _, imagens) in linhas.items():
+            produto_id = ids[sku]
+            ja_anexadas = existentes.setdefault(produto_id, set())
+            tinha_imagem = bool(ja_anexadas)
+            for nome in imagens:
+                destino = _nome_importado(sku, nome)
+                # Aceita também o nome já gravado (arquivo vindo do export_catalogo)
+                if nome in ja_anexadas or destino in ja_anexadas:
+                    continue
+                try:
+                    conteudo = self.imagens.ler(nome)
+                except LinhaInvalida as e:
+                    self.erro(numero, sku, str(e))
+                    continue
+                salvo = default_storage.save(destino, ContentFile(conteudo))
+                ja_anexadas.update((destino, salvo))
+                novas.append(ProdutoImage(produto_id=produto_id, image=salvo, is_main=not tinha_imagem))
+                tinha_imagem = True
+
+        if not novas:
+            return
+        with transaction.atomic():
+            ProdutoImage.objects.bulk_create(novas)
+            # Mesmo critério de Produto.atualizar_imagem_principal(), num só UPDATE
+            Produto.objects.filter(pk__in={imagem.produto_id for imagem in novas}).update(imagem_principal=Subquery(
+                ProdutoImage.objects.filter(produto=OuterRef('pk')).order_by('-is_main', 'id').values('pk')[:1]
+            ))
+        enfileirar(processar_lote, 'produtos.ProdutoImage', [imagem.pk for imagem in novas])
+        self.resumo['imagens'] += len(novas)
+
+
+def importar(arquivo, formato='csv', imagens=None, relatorio=None, lote=None):
+    """
+    Importa um arquivo binário aberto. `imagens`: diretório ou .zip com os
+    arquivos citados na coluna 'imagens'. `relatorio`: arquivo texto que
+    recebe os erros em CSV. Retorna o resumo com as contagens.
+    """
+    lote = lote or settings.CATALOGO_IMPORTACAO_LOTE
+    fonte = abrir_imagens(imagens)
+    importador = _Importador(fonte, relatorio)
+    pendentes = []
+    try:
+        for numero, dados, erro in ler_linhas(arquivo, formato):
+            importador.resumo['linhas'] += 1
+            if dados is None:
+                importador.erro(numero, '', erro)
+                continue
+            if importador.colunas is None:
+                # Cabeçalho do CSV, ou chaves da primeira linha do JSONL
+                importador.definir_colunas(dados)
+            try:
+                campos, nomes_imagens = converter_linha(dados, importador.colunas)
+            except LinhaInvalida as e:
+                importador.erro(numero, dados.get('sku'), str(e))
+                continue
+            pendentes.append((numero, campos, nomes_imagens))
+            if len(pendentes) >= lote:
+                importador.gravar_lote(pendentes)
+                pendentes = []
+        importador.gravar_lote(pendentes)
+    finally:
+        if fonte is not None:
+            fonte.fechar()
+        resumo = importador.resumo
+        if resumo['criados'] or resumo['atualizados'] or resumo['imagens']:
+            invalidar_catalogo()
+
+    logger.info("Importação de catálogo concluída: %s", resumo)
+    return resumo
+
+
+# --------------------------
+# Importações enviadas pelo CRM
+# --------------------------
+def criar_importacao(arquivo, arquivo_imagens=None, usuario=None):
+    """Salva os arquivos enviados e agenda a importação. Retorna a ImportacaoCatalogo."""
+    with transaction.atomic():
+        importacao = ImportacaoCatalogo(criado_por=usuario if usuario and usuario.is_authenticated else None)
+        importacao.arquivo.save(arquivo.name, arquivo, save=False)
+        if arquivo_imagens:
+            importacao.arquivo_imagens.save(arquivo_imagens.name, arquivo_imagens, save=False)
+        importacao.save()
+        enfileirar(processar_importacao, importacao.id)
+    return importacao
+
+
+def processar_importacao(importacao_id):
+    """Roda uma importação pendente. Retorna o status final, ou None se já reservada."""
+    reservada = ImportacaoCatalogo.objects.filter(pk=importacao_id, status='pendente').update(
+        status='processando', iniciado_em=timezone.now(),
+    )
+    if not reservada:
+        return None
+
+    importacao = ImportacaoCatalogo.objects.get(pk=importacao_id)
+    imagens = importacao.arquivo_imagens.open('rb') if importacao.arquivo_imagens else None
+    # O relatório vai para um temporário em disco: o volume de erros não pesa na memória
+    with tempfile.TemporaryFile('w+', encoding='utf-8', newline='') as relatorio:
+        try:
+            with importacao.arquivo.open('rb') as arquivo:
+                resumo = importar(arquivo, formato_do_nome(importacao.arquivo.name), imagens=imagens, relatorio=relatorio)
+        except Exception as e:
+            if not isinstance(e, ArquivoInvalido):
+                logger.exception("Falha na importação de catálogo %s", importacao_id)
+            ImportacaoCatalogo.objects.filter(pk=importacao_id).update(
+                status='falhou', mensagem=str(e), concluido_em=timezone.now(),
+            )
+            return 'falhou'
+        finally:
+            if imagens is not None:
+                imagens.close()
+
+        if resumo['erros']:
+            relatorio.seek(0)
+            importacao.relatorio.save(
+                f'erros_importacao_{importacao.id}.csv', ContentFile(relatorio.read().encode('utf-8')), save=False,
+            )
+
+    ImportacaoCatalogo.objects.filter(pk=importacao_id).update(
+        status='concluida', relatorio=importacao.relatorio.name or '', concluido_em=timezone.now(), **resumo,
+    )
+    return 'concluida'
@@ -0,0 +1,226 @@
+# produtos/ingestao.py
+"""
+Cadastro de produtos por IA em segundo plano.
+
+O upload (solar.views.adicionar_produto_ia) só grava os arquivos e cria uma
+IngestaoProdutos; a análise roda depois do commit via energia_solar.tarefas.
+As chamadas ao Gemini são feitas em paralelo por um pool limitado
+(settings.INGESTAO_IA_WORKERS) e os produtos criados são gravados em lotes
+(settings.INGESTAO_IA_LOTE), um transaction.atomic por lote.
+
+Cada execução reserva a ingestão com um UPDATE condicional (pendente ->
+processando), como processar_importacao: duas tarefas (ou a tarefa e o
+comando processar_ingestoes) nunca analisam as mesmas imagens. Se a
+execução falhar, a ingestão fica como 'falhou' e os arquivos das imagens
+que não viraram produto são apagados do storage.
+"""
+import logging
+import mimetypes
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.db.models import Count, DateTimeField, Q, Value
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+from django.utils import timezone
+
+from energia_solar.tarefas import enfileirar
+from solar.forms import ProdutoEcommerceForm
+
+from .models import IngestaoProdutos, IngestaoProdutosImagem, ProdutoImage
+from .services import analisar_imagem_produto
+
+logger = logging.getLogger(__name__)
+
+# Grava um lote parcial se ficar este tempo sem completar (mantém o progresso visível)
+INTERVALO_MAXIMO_LOTE = 2.0
+
+
+def criar_ingestao(arquivos, usuario=None):
+    """Salva os arquivos enviados e agenda a análise. Retorna a IngestaoProdutos."""
+    with transaction.atomic():
+        ingestao = IngestaoProdutos.objects.create(
+            criado_por=usuario if usuario and usuario.is_authenticated else None,
+            total=len(arquivos),
+        )
+        itens = []
+        for arquivo in arquivos:
+            item = IngestaoProdutosImagem(ingestao=ingestao, nome_original=arquivo.name[:255])
+            item.arquivo.save(arquivo.name, arquivo, save=False)
+            itens.append(item)
+        IngestaoProdutosImagem.objects.bulk_create(itens)
+        enfileirar(processar_ingestao, ingestao.id)
+    return ingestao
+
+
+def reprocessar_falhas(ingestao):
+    """
+    Volta as imagens que falharam (e ainda têm arquivo) para a fila e agenda
+    nova execução. Só reabre ingestões encerradas: uma em andamento já
+    escolheu as imagens que vai analisar.
+    """
+    with transaction.atomic():
+        reaberta = IngestaoProdutos.objects.filter(pk=ingestao.pk, status__in=['concluida', 'falhou']).update(
+            status='pendente', concluido_em=None,
+        )
+        if not reaberta:
+            return 0
+        reabertas = ingestao.imagens.filter(status='falhou').exclude(arquivo='').update(
+            status='pendente', erro='', atualizado_em=timezone.now()
+        )
+        if reabertas:
+            enfileirar(processar_ingestao, ingestao.id)
+        else:
+            transaction.set_rollback(True)
+    return reabertas
+
+
+def _analisar(nome_arquivo, nome_original):
+    """Roda numa thread do pool: lê o arquivo e chama a IA (sem acessar o banco)."""
+    with default_storage.open(nome_arquivo, 'rb') as f:
+        conteudo = f.read()
+    tipo = mimetypes.guess_type(nome_original)[0] or 'image/jpeg'
+    return analisar_imagem_produto(SimpleUploadedFile(nome_original, conteudo, content_type=tipo))
+
+
+def _gravar_lote(itens, resultados):
+    """Cria os produtos de um lote numa única transação; cada linha tem seu savepoint."""
+    agora = timezone.now()
+    atualizados = []
+    with transaction.atomic():
+        for item_id, dados in resultados:
+            item = itens[item_id]
+            item.atualizado_em = agora
+            atualizados.append(item)
+
+            if 'error' in dados:
+                item.status, item.erro = 'falhou', str(dados['error'])
+                continue
+
+            form = ProdutoEcommerceForm(dados)
+            if not form.is_valid():
+                item.status, item.erro = 'falhou', f"Dados da IA inválidos: {form.errors.as_text()}"
+                continue
+
+            try:
+                with transaction.atomic():
+                    produto = form.save()
+                    # Reaproveita o arquivo já salvo em produtos/ no upload
+                    ProdutoImage.objects.create(produto=produto, image=item.arquivo.name, is_main=True)
+            except Exception as e:
+                logger.exception("Erro ao salvar produto da imagem %s", item.nome_original)
+                item.status, item.erro = 'falhou', f"Erro ao salvar: {e}"
+                continue
+
+            item.status, item.erro, item.produto = 'criado', '', produto
+
+        IngestaoProdutosImagem.objects.bulk_update(atualizados, ['status', 'erro', 'produto', 'atualizado_em'])
+
+
+def _encerrar_com_falha(ingestao_id, erro):
+    """Marca a ingestão como falha e apaga os arquivos das imagens que não viraram produto."""
+    agora = timezone.now()
+    imagens = IngestaoProdutosImagem.objects.filter(ingestao_id=ingestao_id)
+    with transaction.atomic():
+        imagens.filter(status='pendente').update(
+            status='falhou', erro=f'Ingestão interrompida: {erro}', atualizado_em=agora,
+        )
+        falhas = imagens.filter(status='falhou').exclude(arquivo='')
+        arquivos = list(falhas.values_list('arquivo', flat=True))
+        falhas.update(arquivo='', atualizado_em=agora)
+        IngestaoProdutos.objects.filter(pk=ingestao_id).update(status='falhou', concluido_em=agora)
+
+    for nome in arquivos:
+        try:
+            default_storage.delete(nome)
+        except OSError:
+            logger.warning("Não foi possível apagar o arquivo %s da ingestão %s", nome, ingestao_id)
+
+
+def processar_ingestao(ingestao_id):
+    """Analisa as imagens pendentes. Retorna o status final, ou None se já reservada."""
+    reservada = IngestaoProdutos.objects.filter(pk=ingestao_id, status='pendente').update(
+        status='processando',
+        iniciado_em=Coalesce('iniciado_em', Value(timezone.now(), output_field=DateTimeField())),
+    )
+    if not reservada:
+        return None
+
+    try:
+        total = _analisar_pendentes(ingestao_id)
+    except Exception as e:
+        logger.exception("Falha na ingestão %s", ingestao_id)
+        _encerrar_com_falha(ingestao_id, e)
+        return 'falhou'
+
+    IngestaoProdutos.objects.filter(pk=ingestao_id).update(status='concluida', concluido_em=timezone.now())
+    logger.info("Ingestão %s concluída (%s imagens).", ingestao_id, total)
+    return 'concluida'
+
+
+def _analisar_pendentes(ingestao_id):
+    itens = {
+        item.id: item
+        for item in IngestaoProdutosImagem.objects.filter(ingestao_id=ingestao_id, status='pendente')
+        .only('id', 'arquivo', 'nome_original')
+    }
+
+    resultados = []
+    ultimo_lote = time.monotonic()
+    with ThreadPoolExecutor(max_workers=settings.INGESTAO_IA_WORKERS, thread_name_prefix='ingestao-ia') as executor:
+        futuros = {
+            executor.submit(_analisar, item.arquivo.name, item.nome_original): item.id
+            for item in itens.values()
+        }
+        for futuro in as_completed(futuros):
+            try:
+                dados = futuro.result()
+            except Exception as e:
+                logger.exception("Falha ao analisar imagem da ingestão %s", ingestao_id)
+                dados = {'error': f'Falha ao processar a imagem: {e}'}
+            resultados.append((futuros[futuro], dados))
+
+            if len(resultados) >= settings.INGESTAO_IA_LOTE or time.monotonic() - ultimo_lote >= INTERVALO_MAXIMO_LOTE:
+                _gravar_lote(itens, resultados)
+                resultados = []
+                ultimo_lote = time.monotonic()
+
+    if resultados:
+        _gravar_lote(itens, resultados)
+    return len(itens)
+
+
+def resumo_ingestao(ingestao):
+    """Payload do endpoint de status: contadores e progresso de cada imagem."""
+    contagem = ingestao.imagens.aggregate(
+        pendentes=Count('id', filter=Q(status='pendente')),
+        criados=Count('id', filter=Q(status='criado')),
+        falhas=Count('id', filter=Q(status='falhou')),
+    )
+    imagens = [
+        {
+            'id': item['id'],
+            'nome': item['nome_original'],
+            'status': item['status'],
+            'erro': item['erro'],
+            'produto_id': item['produto_id'],
+            'produto_url': (
+                reverse('crm:editar_produto_ecommerce', args=[item['produto_id']])
+                if item['produto_id'] else None
+            ),
+        }
+        for item in ingestao.imagens.values('id', 'nome_original', 'status', 'erro', 'produto_id')
+    ]
+    return {
+        'id': ingestao.id,
+        'status': ingestao.status,
+        'total': ingestao.total,
+        'processadas': contagem['criados'] + contagem['falhas'],
+        **contagem,
+        'concluida': ingestao.status in ('concluida', 'falhou'),
+        'imagens': imagens,
+    }
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.2 on 2026-10-18 09:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def preencher_imagem_principal(apps, schema_editor):
+    Produto = apps.get_model('produtos', 'Produto')
+    ProdutoImage = apps.get_model('produtos', 'ProdutoImage')
+
+    # Uma passada ordenada: a primeira imagem de cada produto é a do card
+    escolhidas = {}
+    for imagem_id, produto_id in ProdutoImage.objects.order_by('produto_id', '-is_main', 'id').values_list('id', 'produto_id'):
+        escolhidas.setdefault(produto_id, imagem_id)
+
+    produtos = [
+        Produto(pk=produto_id, imagem_principal_id=imagem_id)
+        for produto_id, imagem_id in escolhidas.items()
+    ]
+    Produto.objects.bulk_update(produtos, ['imagem_principal'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0005_remove_produtoimage_embedding_produto_revisado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='imagem_principal',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='produtos.produtoimage', verbose_name='Imagem do Card'),
+        ),
+        migrations.RunPython(preencher_imagem_principal, migrations.RunPython.noop),
+    ]
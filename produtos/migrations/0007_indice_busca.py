@@ -0,0 +1,94 @@
+from django.db import migrations
+
+# Estrutura da busca textual (produtos/busca.py). O DDL fica copiado aqui, sem
+# importar o app: a migration precisa continuar reproduzindo este estado
+# mesmo que o módulo de busca mude depois.
+
+
+class RunSQLDoVendor(migrations.RunSQL):
+    """RunSQL aplicado só quando a conexão é do vendor indicado."""
+
+    def __init__(self, vendor, *args, **kwargs):
+        self.vendor = vendor
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        nome, args, kwargs = super().deconstruct()
+        return nome, args, {'vendor': self.vendor, **kwargs}
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0006_produto_imagem_principal'),
+    ]
+
+    operations = [
+        # PostgreSQL: coluna tsvector gerada + índice GIN
+        RunSQLDoVendor(
+            'postgresql',
+            sql=[
+                """
+                ALTER TABLE produtos_produto ADD COLUMN IF NOT EXISTS search_vector tsvector
+                GENERATED ALWAYS AS (
+                    setweight(to_tsvector('portuguese', coalesce(name, '')), 'A') ||
+                    setweight(to_tsvector('simple', coalesce(sku, '')), 'A') ||
+                    setweight(to_tsvector('portuguese', coalesce(description, '')), 'B')
+                ) STORED
+                """,
+                "CREATE INDEX IF NOT EXISTS produtos_produto_search_vector_gin ON produtos_produto USING GIN (search_vector)",
+            ],
+            reverse_sql=[
+                "DROP INDEX IF EXISTS produtos_produto_search_vector_gin",
+                "ALTER TABLE produtos_produto DROP COLUMN IF EXISTS search_vector",
+            ],
+        ),
+        # SQLite: tabela FTS5 de conteúdo externo mantida por triggers
+        RunSQLDoVendor(
+            'sqlite',
+            sql=[
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS produtos_produto_fts USING fts5(
+                    name, description, sku,
+                    content='produtos_produto', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+                """,
+                """
+                CREATE TRIGGER IF NOT EXISTS produtos_produto_fts_ai AFTER INSERT ON produtos_produto BEGIN
+                    INSERT INTO produtos_produto_fts(rowid, name, description, sku)
+                    VALUES (new.id, new.name, new.description, new.sku);
+                END
+                """,
+                """
+                CREATE TRIGGER IF NOT EXISTS produtos_produto_fts_ad AFTER DELETE ON produtos_produto BEGIN
+                    INSERT INTO produtos_produto_fts(produtos_produto_fts, rowid, name, description, sku)
+                    VALUES ('delete', old.id, old.name, old.description, old.sku);
+                END
+                """,
+                """
+                CREATE TRIGGER IF NOT EXISTS produtos_produto_fts_au AFTER UPDATE ON produtos_produto BEGIN
+                    INSERT INTO produtos_produto_fts(produtos_produto_fts, rowid, name, description, sku)
+                    VALUES ('delete', old.id, old.name, old.description, old.sku);
+                    INSERT INTO produtos_produto_fts(rowid, name, description, sku)
+                    VALUES (new.id, new.name, new.description, new.sku);
+                END
+                """,
+                "INSERT INTO produtos_produto_fts(produtos_produto_fts) VALUES ('rebuild')",
+            ],
+            reverse_sql=[
+                "DROP TRIGGER IF EXISTS produtos_produto_fts_ai",
+                "DROP TRIGGER IF EXISTS produtos_produto_fts_ad",
+                "DROP TRIGGER IF EXISTS produtos_produto_fts_au",
+                "DROP TABLE IF EXISTS produtos_produto_fts",
+            ],
+        ),
+    ]
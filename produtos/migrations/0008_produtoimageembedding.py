@@ -0,0 +1,28 @@
+# Generated by Django 5.2.2 on 2026-10-18 09:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0007_indice_busca'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProdutoImageEmbedding',
+            fields=[
+                ('imagem', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='embedding', serialize=False, to='produtos.produtoimage', verbose_name='Imagem')),
+                ('modelo', models.CharField(max_length=100, verbose_name='Modelo de Embedding')),
+                ('dimensao', models.PositiveIntegerField(verbose_name='Dimensão')),
+                ('vetor', models.BinaryField(verbose_name='Vetor (float32)')),
+                ('atualizado_em', models.DateTimeField(auto_now=True, db_index=True, verbose_name='Atualizado Em')),
+            ],
+            options={
+                'verbose_name': 'Embedding de Imagem',
+                'verbose_name_plural': 'Embeddings de Imagens',
+            },
+        ),
+    ]
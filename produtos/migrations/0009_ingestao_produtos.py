@@ -0,0 +1,51 @@
+# Generated by Django 5.2.2 on 2026-10-18 09:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0008_produtoimageembedding'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestaoProdutos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('concluida', 'Concluída')], default='pendente', max_length=20, verbose_name='Status')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Total de Imagens')),
+                ('criado_em', models.DateTimeField(auto_now_add=True, verbose_name='Criado Em')),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado Em')),
+                ('concluido_em', models.DateTimeField(blank=True, null=True, verbose_name='Concluído Em')),
+                ('criado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ingestoes_produtos', to=settings.AUTH_USER_MODEL, verbose_name='Criado Por')),
+            ],
+            options={
+                'verbose_name': 'Ingestão de Produtos por IA',
+                'verbose_name_plural': 'Ingestões de Produtos por IA',
+                'ordering': ['-criado_em'],
+            },
+        ),
+        migrations.CreateModel(
+            name='IngestaoProdutosImagem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('arquivo', models.ImageField(upload_to='produtos/', verbose_name='Arquivo')),
+                ('nome_original', models.CharField(max_length=255, verbose_name='Nome Original')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('criado', 'Produto Criado'), ('falhou', 'Falhou')], default='pendente', max_length=20, verbose_name='Status')),
+                ('erro', models.TextField(blank=True, verbose_name='Erro')),
+                ('atualizado_em', models.DateTimeField(auto_now=True, verbose_name='Atualizado Em')),
+                ('ingestao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='imagens', to='produtos.ingestaoprodutos', verbose_name='Ingestão')),
+                ('produto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='produtos.produto', verbose_name='Produto Criado')),
+            ],
+            options={
+                'verbose_name': 'Imagem da Ingestão',
+                'verbose_name_plural': 'Imagens da Ingestão',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.2 on 2026-10-18 09:48
+
+import produtos.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0009_ingestao_produtos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='regiaofrete',
+            name='cep_final',
+            field=models.CharField(blank=True, max_length=8, null=True, validators=[produtos.models.validar_digitos_cep], verbose_name='CEP Final da Faixa'),
+        ),
+        migrations.AddField(
+            model_name='regiaofrete',
+            name='cep_inicial',
+            field=models.CharField(blank=True, max_length=8, null=True, validators=[produtos.models.validar_digitos_cep], verbose_name='CEP Inicial da Faixa'),
+        ),
+        migrations.AlterField(
+            model_name='regiaofrete',
+            name='prefixo_cep',
+            field=models.CharField(blank=True, max_length=8, null=True, unique=True, validators=[produtos.models.validar_digitos_cep], verbose_name='Prefixo do CEP'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-18 09:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0010_regiao_frete_faixas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='estoque_reservado',
+            field=models.BooleanField(default=False, verbose_name='Estoque Reservado'),
+        ),
+    ]
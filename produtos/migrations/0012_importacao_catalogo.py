@@ -0,0 +1,41 @@
+# Generated by Django 5.2.2 on 2026-10-18 09:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0011_pedido_estoque_reservado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportacaoCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('arquivo', models.FileField(upload_to='importacoes/catalogo/', verbose_name='Arquivo')),
+                ('arquivo_imagens', models.FileField(blank=True, upload_to='importacoes/catalogo/', verbose_name='Imagens (.zip)')),
+                ('relatorio', models.FileField(blank=True, upload_to='importacoes/catalogo/', verbose_name='Relatório de Erros')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('concluida', 'Concluída'), ('falhou', 'Falhou')], default='pendente', max_length=20, verbose_name='Status')),
+                ('linhas', models.PositiveIntegerField(default=0, verbose_name='Linhas Lidas')),
+                ('criados', models.PositiveIntegerField(default=0, verbose_name='Produtos Criados')),
+                ('atualizados', models.PositiveIntegerField(default=0, verbose_name='Produtos Atualizados')),
+                ('imagens', models.PositiveIntegerField(default=0, verbose_name='Imagens Anexadas')),
+                ('erros', models.PositiveIntegerField(default=0, verbose_name='Linhas com Erro')),
+                ('mensagem', models.TextField(blank=True, verbose_name='Mensagem')),
+                ('criado_em', models.DateTimeField(auto_now_add=True, verbose_name='Criado Em')),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado Em')),
+                ('concluido_em', models.DateTimeField(blank=True, null=True, verbose_name='Concluído Em')),
+                ('criado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='importacoes_catalogo', to=settings.AUTH_USER_MODEL, verbose_name='Criado Por')),
+            ],
+            options={
+                'verbose_name': 'Importação de Catálogo',
+                'verbose_name_plural': 'Importações de Catálogo',
+                'ordering': ['-criado_em'],
+            },
+        ),
+    ]
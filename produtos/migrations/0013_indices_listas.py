@@ -0,0 +1,21 @@
+# Generated by Django 5.2.2 on 2026-10-18 10:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0012_importacao_catalogo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['name', 'id'], name='produto_nome_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['created_at', 'id'], name='produto_criado_id_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.2 on 2026-10-18 10:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0013_indices_listas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carouselimage',
+            name='derivadas',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variantes Redimensionadas'),
+        ),
+        migrations.AddField(
+            model_name='produtoimage',
+            name='derivadas',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variantes Redimensionadas'),
+        ),
+    ]
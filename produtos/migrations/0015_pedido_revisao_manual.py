@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0014_derivadas_imagens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='revisao_manual',
+            field=models.BooleanField(default=False, verbose_name='Revisão Manual'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-18 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0016_versao_cache'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingestaoprodutos',
+            name='status',
+            field=models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('concluida', 'Concluída'), ('falhou', 'Falhou')], default='pendente', max_length=20, verbose_name='Status'),
+        ),
+    ]
@@ -1,15 +1,20 @@
 # produtos/models.py
 
+from django.core.exceptions import ValidationError
 from django.db import models
-from django.utils.text import slugify
 from django.conf import settings
+from array import array
 from decimal import Decimal
 
+from .slugs import salvar_com_slug
+
 class CarouselImage(models.Model):
     image = models.ImageField(upload_to='carousel/')
     title = models.CharField(max_length=100, blank=True, null=True)
     description = models.TextField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
+    # Variantes WebP/JPEG geradas por produtos/derivadas.py
+    derivadas = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Variantes Redimensionadas")
 
     def __str__(self):
         return self.title or "Carousel Image"
@@ -60,6 +65,12 @@ class Pedido(models.Model):
         default='pendente',
         verbose_name="Status do Pedido"
     )
+    # True enquanto o estoque dos itens está reservado e pode ser devolvido
+    # (ver produtos/checkout.py)
+    estoque_reservado = models.BooleanField(default=False, verbose_name="Estoque Reservado")
+    # Pago depois de cancelado sem estoque para refazer a reserva
+    # (produtos.checkout.confirmar_pagamento): precisa de atendimento manual
+    revisao_manual = models.BooleanField(default=False, verbose_name="Revisão Manual")
 
     class Meta:
         verbose_name = "Pedido"
@@ -113,25 +124,47 @@ class Produto(models.Model):
     dimensoes = models.CharField(max_length=100, null=True, blank=True, verbose_name="Dimensões (AxLxP)")
     garantia = models.CharField(max_length=100, null=True, blank=True, verbose_name="Garantia")
     revisado = models.BooleanField(default=False, verbose_name="Revisado por Humano")
+    # Imagem exibida nos cards (principal ou, na falta, a primeira cadastrada).
+    # Mantida pelos signals de ProdutoImage — ver atualizar_imagem_principal().
+    imagem_principal = models.ForeignKey(
+        'ProdutoImage',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+',
+        verbose_name="Imagem do Card"
+    )
 
     class Meta:
         verbose_name = "Produto"
         verbose_name_plural = "Produtos"
         ordering = ['name']
+        # Chaves da paginação por cursor da lista do CRM (solar/listagem.py)
+        indexes = [
+            models.Index(fields=['name', 'id'], name='produto_nome_id_idx'),
+            models.Index(fields=['created_at', 'id'], name='produto_criado_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            base_slug = slugify(self.name)
-            self.slug = base_slug
-            counter = 1
-            while Produto.objects.filter(slug=self.slug).exclude(pk=self.pk).exists():
-                self.slug = f"{base_slug}-{counter}"
-                counter += 1
+            # Uma consulta para achar o sufixo livre, com nova tentativa se
+            # outro processo gravar o mesmo slug antes (ver produtos/slugs.py)
+            return salvar_com_slug(self, lambda: super(Produto, self).save(*args, **kwargs))
         super().save(*args, **kwargs)
 
+    def atualizar_imagem_principal(self):
+        """
+        Recalcula a imagem do card e grava só essa coluna (sem disparar save()).
+        """
+        imagem = self.images.order_by('-is_main', 'id').first()
+        Produto.objects.filter(pk=self.pk).update(imagem_principal=imagem)
+        self.imagem_principal = imagem
+        return imagem
+
     @property
     def categoria_exibicao(self):
         if self.categoria_id:
@@ -143,6 +176,8 @@ class ProdutoImage(models.Model):
     image = models.ImageField(upload_to='produtos/')
     alt_text = models.CharField(max_length=255, blank=True, null=True, verbose_name="Texto Alternativo")
     is_main = models.BooleanField(default=False, verbose_name="Imagem Principal")
+    # Variantes WebP/JPEG geradas por produtos/derivadas.py
+    derivadas = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Variantes Redimensionadas")
 
     class Meta:
         verbose_name = "Imagem do Produto"
@@ -152,11 +187,215 @@ class ProdutoImage(models.Model):
     def __str__(self):
         return f"Imagem para {self.produto.name} ({self.id})"
     
+class ProdutoImageEmbedding(models.Model):
+    """
+    Vetor de embedding de uma ProdutoImage, guardado como float32 compacto
+    (4 bytes por dimensão) em vez de JSON.
+    """
+    imagem = models.OneToOneField(
+        ProdutoImage,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='embedding',
+        verbose_name="Imagem"
+    )
+    modelo = models.CharField(max_length=100, verbose_name="Modelo de Embedding")
+    dimensao = models.PositiveIntegerField(verbose_name="Dimensão")
+    vetor = models.BinaryField(verbose_name="Vetor (float32)")
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Atualizado Em")
+
+    class Meta:
+        verbose_name = "Embedding de Imagem"
+        verbose_name_plural = "Embeddings de Imagens"
+
+    def __str__(self):
+        return f"Embedding {self.modelo} ({self.dimensao}d) da imagem {self.imagem_id}"
+
+    @staticmethod
+    def codificar(valores):
+        return array('f', valores).tobytes()
+
+    def definir_valores(self, valores):
+        self.vetor = self.codificar(valores)
+        self.dimensao = len(valores)
+
+    @property
+    def valores(self):
+        vetor = array('f')
+        vetor.frombytes(bytes(self.vetor))
+        return vetor
+
+
+class IngestaoProdutos(models.Model):
+    """
+    Lote de imagens enviado ao cadastro por IA (CRM). As imagens são
+    analisadas em segundo plano por produtos/ingestao.py.
+    """
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('processando', 'Processando'),
+        ('concluida', 'Concluída'),
+        ('falhou', 'Falhou'),
+    ]
+
+    criado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ingestoes_produtos',
+        verbose_name="Criado Por"
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente', verbose_name="Status")
+    total = models.PositiveIntegerField(default=0, verbose_name="Total de Imagens")
+    criado_em = models.DateTimeField(auto_now_add=True, verbose_name="Criado Em")
+    iniciado_em = models.DateTimeField(null=True, blank=True, verbose_name="Iniciado Em")
+    concluido_em = models.DateTimeField(null=True, blank=True, verbose_name="Concluído Em")
+
+    class Meta:
+        verbose_name = "Ingestão de Produtos por IA"
+        verbose_name_plural = "Ingestões de Produtos por IA"
+        ordering = ['-criado_em']
+
+    def __str__(self):
+        return f"Ingestão {self.id} ({self.total} imagens, {self.get_status_display()})"
+
+
+class IngestaoProdutosImagem(models.Model):
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('criado', 'Produto Criado'),
+        ('falhou', 'Falhou'),
+    ]
+
+    ingestao = models.ForeignKey(IngestaoProdutos, on_delete=models.CASCADE, related_name='imagens', verbose_name="Ingestão")
+    # Salvo direto em produtos/: a ProdutoImage criada reaproveita o mesmo arquivo
+    arquivo = models.ImageField(upload_to='produtos/', verbose_name="Arquivo")
+    nome_original = models.CharField(max_length=255, verbose_name="Nome Original")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente', verbose_name="Status")
+    erro = models.TextField(blank=True, verbose_name="Erro")
+    produto = models.ForeignKey(Produto, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Produto Criado")
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name="Atualizado Em")
+
+    class Meta:
+        verbose_name = "Imagem da Ingestão"
+        verbose_name_plural = "Imagens da Ingestão"
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.nome_original} ({self.get_status_display()})"
+
+
+class ImportacaoCatalogo(models.Model):
+    """
+    Arquivo CSV/JSONL de produtos enviado pelo CRM. Processado em segundo
+    plano por produtos/importacao.py (upsert por SKU).
+    """
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('processando', 'Processando'),
+        ('concluida', 'Concluída'),
+        ('falhou', 'Falhou'),
+    ]
+
+    criado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='importacoes_catalogo',
+        verbose_name="Criado Por"
+    )
+    arquivo = models.FileField(upload_to='importacoes/catalogo/', verbose_name="Arquivo")
+    arquivo_imagens = models.FileField(upload_to='importacoes/catalogo/', blank=True, verbose_name="Imagens (.zip)")
+    relatorio = models.FileField(upload_to='importacoes/catalogo/', blank=True, verbose_name="Relatório de Erros")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente', verbose_name="Status")
+    linhas = models.PositiveIntegerField(default=0, verbose_name="Linhas Lidas")
+    criados = models.PositiveIntegerField(default=0, verbose_name="Produtos Criados")
+    atualizados = models.PositiveIntegerField(default=0, verbose_name="Produtos Atualizados")
+    imagens = models.PositiveIntegerField(default=0, verbose_name="Imagens Anexadas")
+    erros = models.PositiveIntegerField(default=0, verbose_name="Linhas com Erro")
+    mensagem = models.TextField(blank=True, verbose_name="Mensagem")
+    criado_em = models.DateTimeField(auto_now_add=True, verbose_name="Criado Em")
+    iniciado_em = models.DateTimeField(null=True, blank=True, verbose_name="Iniciado Em")
+    concluido_em = models.DateTimeField(null=True, blank=True, verbose_name="Concluído Em")
+
+    class Meta:
+        verbose_name = "Importação de Catálogo"
+        verbose_name_plural = "Importações de Catálogo"
+        ordering = ['-criado_em']
+
+    def __str__(self):
+        return f"Importação {self.id} ({self.get_status_display()})"
+
+
+def validar_digitos_cep(valor):
+    if valor and not valor.isdigit():
+        raise ValidationError("Use apenas dígitos (sem hífen).")
+
+
 class RegiaoFrete(models.Model):
-    prefixo_cep = models.CharField(max_length=3, unique=True, verbose_name="Prefixo do CEP")
+    """
+    Região de frete definida por um prefixo de CEP (1 a 8 dígitos) ou por uma
+    faixa cep_inicial..cep_final. Quando várias regiões cobrem o mesmo CEP,
+    vale a mais específica (ver produtos/frete.py).
+    """
+    prefixo_cep = models.CharField(
+        max_length=8, unique=True, null=True, blank=True,
+        validators=[validar_digitos_cep], verbose_name="Prefixo do CEP",
+    )
+    cep_inicial = models.CharField(
+        max_length=8, null=True, blank=True,
+        validators=[validar_digitos_cep], verbose_name="CEP Inicial da Faixa",
+    )
+    cep_final = models.CharField(
+        max_length=8, null=True, blank=True,
+        validators=[validar_digitos_cep], verbose_name="CEP Final da Faixa",
+    )
     cidade = models.CharField(max_length=100)
     valor_frete = models.DecimalField(max_digits=7, decimal_places=2)
     prazo_entrega = models.PositiveIntegerField(verbose_name="Prazo (dias úteis)")
 
+    def clean(self):
+        faixa = (self.cep_inicial, self.cep_final)
+        if self.prefixo_cep and any(faixa):
+            raise ValidationError("Informe um prefixo de CEP ou uma faixa, não os dois.")
+        if not self.prefixo_cep:
+            if not all(faixa):
+                raise ValidationError("Informe o prefixo do CEP ou a faixa completa (inicial e final).")
+            if any(len(cep) != 8 for cep in faixa):
+                raise ValidationError("CEPs da faixa devem ter 8 dígitos.")
+            if self.cep_inicial > self.cep_final:
+                raise ValidationError("O CEP inicial deve ser menor ou igual ao final.")
+
+    def limites(self):
+        """Retorna (inicio, fim) como inteiros de 8 dígitos, inclusivos."""
+        if self.prefixo_cep:
+            return int(self.prefixo_cep.ljust(8, '0')), int(self.prefixo_cep.ljust(8, '9'))
+        return int(self.cep_inicial), int(self.cep_final)
+
+    @property
+    def abrangencia(self):
+        if self.prefixo_cep:
+            return self.prefixo_cep
+        return f"{self.cep_inicial}-{self.cep_final}"
+
+    def __str__(self):
+        return f"{self.abrangencia} - {self.cidade} (R$ {self.valor_frete:.2f}, {self.prazo_entrega} dias)"
+
+
+class VersaoCache(models.Model):
+    """
+    Token de versão de um cache ou índice mantido em memória por worker
+    (produtos/versoes.py). Fica no banco para que todos os processos vejam
+    a mesma versão, qualquer que seja o backend de cache.
+    """
+    nome = models.CharField(max_length=50, primary_key=True, verbose_name="Nome")
+    versao = models.BigIntegerField(default=0, verbose_name="Versão")
+
+    class Meta:
+        verbose_name = "Versão de Cache"
+        verbose_name_plural = "Versões de Cache"
+
     def __str__(self):
-        return f"{self.prefixo_cep} - {self.cidade} (R$ {self.valor_frete:.2f}, {self.prazo_entrega} dias)"
+        return f"{self.nome} (v{self.versao})"
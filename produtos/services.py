@@ -1,36 +1,25 @@
 
         
 import json
+import logging
 import re
 from django.conf import settings
-import google.generativeai as genai
 
-# Configuração da API do Gemini (deixe como está)
-try:
-    if settings.GEMINI_API_KEY:
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-    else:
-        print("AVISO: Chave da API do Gemini não encontrada.")
-except Exception as e:
-    print(f"ERRO ao configurar a API do Gemini: {e}")
+from energia_solar import clientes
 
+from .cache_ia import chave_analise, obter_cache_analise, trava_da_chave
 
-# SUBSTITUA A FUNÇÃO INTEIRA POR ESTA VERSÃO CORRIGIDA:
-def analisar_imagem_produto(imagem_ia):
-    """
-    Esta função usa a API real do Google Gemini para analisar a imagem.
-    """
-    if not settings.GEMINI_API_KEY:
-        return {'error': 'A chave da API do Gemini não foi configurada no servidor.'}
+logger = logging.getLogger(__name__)
 
-    # A estrutura try...except começa aqui
-    try:
-        model = genai.GenerativeModel('models/gemini-2.5-flash-image-preview')
+# O SDK do Gemini só é importado e configurado na primeira chamada
+# (energia_solar/clientes.py)
 
-        imagem_bytes = imagem_ia.read()
-        imagem_parts = [{"mime_type": imagem_ia.content_type, "data": imagem_bytes}]
+MODELO_ANALISE = 'models/gemini-2.5-flash-image-preview'
 
-        prompt = """
+# Incremente ao alterar o prompt: invalida as respostas guardadas em cache
+PROMPT_VERSAO = 1
+
+PROMPT_ANALISE = """
         Você é um especialista em catalogar produtos de energia solar.
         Analise a imagem deste produto e me retorne APENAS um objeto JSON com as seguintes chaves:
         - "name": O nome comercial completo e técnico do produto.
@@ -47,17 +36,74 @@ def analisar_imagem_produto(imagem_ia):
         NÃO inclua nenhuma formatação de markdown (como ```json) na sua resposta.
         """
 
-        print("Enviando imagem para a API do Gemini...")
-        response = model.generate_content([prompt, *imagem_parts])
-        print("Resposta recebida da IA.")
+
+def analisar_imagem_produto(imagem_ia):
+    """
+    Esta função usa a API real do Google Gemini para analisar a imagem.
+    Respostas bem sucedidas ficam em cache pelo hash do conteúdo (produtos/cache_ia.py).
+    """
+    if not settings.GEMINI_API_KEY:
+        return {'error': 'A chave da API do Gemini não foi configurada no servidor.'}
+
+    imagem_bytes = imagem_ia.read()
+    cache = obter_cache_analise()
+    chave = chave_analise(imagem_bytes, PROMPT_VERSAO, MODELO_ANALISE)
+
+    with trava_da_chave(chave):
+        try:
+            dados_em_cache = cache.obter(chave)
+        except Exception as e:
+            logger.warning("Cache de análise indisponível: %s", e)
+            dados_em_cache = None
+        if dados_em_cache is not None:
+            logger.info("Análise de %s servida do cache.", getattr(imagem_ia, 'name', 'imagem'))
+            return dados_em_cache
+
+        dados_encontrados = _chamar_gemini(imagem_bytes, imagem_ia.content_type)
+        if 'error' not in dados_encontrados:
+            try:
+                cache.guardar(chave, dados_encontrados)
+            except Exception as e:
+                logger.warning("Não foi possível guardar a análise no cache: %s", e)
+        return dados_encontrados
+
+
+def _chamar_gemini(imagem_bytes, content_type):
+    # A estrutura try...except começa aqui
+    try:
+        model = clientes.gemini().GenerativeModel(MODELO_ANALISE)
+
+        imagem_parts = [{"mime_type": content_type, "data": imagem_bytes}]
+
+        logger.debug("Enviando imagem para a API do Gemini...")
+        response = model.generate_content([PROMPT_ANALISE, *imagem_parts])
+        logger.debug("Resposta recebida da IA.")
         
         json_str = response.text
         dados_encontrados = json.loads(json_str)
         
-        print("Dados extraídos com sucesso:", dados_encontrados)
+        logger.debug("Dados extraídos com sucesso: %s", dados_encontrados)
         return dados_encontrados
 
     # O bloco 'except' obrigatório vem logo após o 'try'
     except Exception as e:
-        print(f"ERRO CRÍTICO ao chamar a API do Gemini: {e}")
-        return {'error': f'Falha na comunicação com a IA: {e}'}
\ No newline at end of file
+        logger.exception("Erro ao chamar a API do Gemini")
+        return {'error': f'Falha na comunicação com a IA: {e}'}
+
+def gerar_embedding_imagem(imagem):
+    """
+    Gera o vetor de embedding de uma imagem (PIL.Image, caminho ou arquivo enviado)
+    com o modelo configurado em settings.EMBEDDINGS_MODELO.
+    """
+    from PIL import Image
+
+    if not isinstance(imagem, Image.Image):
+        imagem = Image.open(imagem)
+    imagem = imagem.convert("RGB")
+
+    response = clientes.gemini().embed_content(
+        model=settings.EMBEDDINGS_MODELO,
+        content=imagem,
+        task_type="retrieval_document"
+    )
+    return response['embedding']
@@ -0,0 +1,55 @@
+# produtos/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from energia_solar.tarefas import enfileirar
+
+from . import derivadas
+from .catalogo import invalidar_catalogo
+from .frete import invalidar_indice_frete
+from .models import CarouselImage, Produto, ProdutoImage, ProdutoImageEmbedding, RegiaoFrete
+from .similaridade import marcar_indice_desatualizado
+
+
+@receiver(post_save, sender=Produto)
+@receiver(post_delete, sender=Produto)
+@receiver(post_save, sender=ProdutoImage)
+@receiver(post_delete, sender=ProdutoImage)
+@receiver(post_save, sender=CarouselImage)
+@receiver(post_delete, sender=CarouselImage)
+def invalidar_catalogo_home(sender, **kwargs):
+    invalidar_catalogo()
+
+
+@receiver(post_save, sender=ProdutoImage)
+@receiver(post_delete, sender=ProdutoImage)
+def sincronizar_imagem_principal(sender, instance, **kwargs):
+    produto = Produto(pk=instance.produto_id)
+    produto.atualizar_imagem_principal()
+
+
+@receiver(post_save, sender=ProdutoImage)
+@receiver(post_save, sender=CarouselImage)
+def gerar_derivadas(sender, instance, **kwargs):
+    if derivadas.pendente(instance):
+        enfileirar(derivadas.processar, sender._meta.label, instance.pk)
+
+
+@receiver(post_delete, sender=ProdutoImage)
+@receiver(post_delete, sender=CarouselImage)
+def remover_derivadas(sender, instance, **kwargs):
+    if instance.derivadas:
+        transaction.on_commit(lambda: derivadas.remover(instance.derivadas))
+
+
+@receiver(post_save, sender=ProdutoImageEmbedding)
+@receiver(post_delete, sender=ProdutoImageEmbedding)
+def invalidar_indice_similaridade(sender, **kwargs):
+    marcar_indice_desatualizado()
+
+
+@receiver(post_save, sender=RegiaoFrete)
+@receiver(post_delete, sender=RegiaoFrete)
+def invalidar_regioes_frete(sender, **kwargs):
+    invalidar_indice_frete()
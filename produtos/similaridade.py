@@ -0,0 +1,264 @@
+# produtos/similaridade.py
+"""
+Índice de similaridade visual entre produtos.
+
+Os embeddings de ProdutoImageEmbedding são normalizados e gravados em disco
+como uma matriz float32 (.npy) aberta com memory-map, de modo que todos os
+workers do host compartilham as mesmas páginas de memória. Uma busca top-k
+por cosseno é um único produto matriz × vetor.
+
+Gerações do índice ficam em SIMILARIDADE_INDICE_DIR:
+    vetores-<geracao>.npy   matriz N x D normalizada
+    ids-<geracao>.npy       N x 2 (imagem_id, produto_id)
+    atual.json              geração vigente + marca d'água (atualizado_em)
+
+Quando novos embeddings são gravados, o signal troca a versão 'similaridade'
+(produtos/versoes.py, no banco, depois do commit); na próxima busca cada
+worker aplica apenas o delta. A marca d'água é o maior atualizado_em entre
+as linhas lidas, e o delta relê MARGEM_MARCA antes dela: atualizado_em é
+preenchido antes do commit, então uma transação mais lenta pode tornar
+visível uma linha com data anterior à marca de um delta já aplicado.
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+from . import versoes
+from .models import ProdutoImageEmbedding
+
+logger = logging.getLogger(__name__)
+
+VERSAO = 'similaridade'
+GERACOES_MANTIDAS = 2
+# Quanto o delta relê antes da marca d'água (transações que demoram a commitar)
+MARGEM_MARCA = timedelta(minutes=5)
+_NUNCA_SINCRONIZADO = object()
+
+
+def marcar_indice_desatualizado():
+    """Troca a versão quando a transação que gravou os embeddings for confirmada."""
+    versoes.trocar(VERSAO)
+
+
+def _normalizar(matriz):
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return (matriz / normas).astype(np.float32, copy=False)
+
+
+class IndiceSimilaridade:
+
+    def __init__(self, diretorio, modelo):
+        self.diretorio = diretorio
+        self.modelo = modelo
+        self.vetores = np.zeros((0, 0), dtype=np.float32)
+        self.ids = np.zeros((0, 2), dtype=np.int64)
+        self.geracao = None
+        self.marca = None
+        self.versao_vista = _NUNCA_SINCRONIZADO
+        self._lock = threading.Lock()
+
+    # --------------------------
+    # Persistência
+    # --------------------------
+    def _caminho(self, nome):
+        return os.path.join(self.diretorio, nome)
+
+    def _ler_atual(self):
+        try:
+            with open(self._caminho('atual.json')) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _carregar_do_disco(self):
+        atual = self._ler_atual()
+        if not atual or atual.get('modelo') != self.modelo or atual['geracao'] == self.geracao:
+            return
+        geracao = atual['geracao']
+        self.vetores = np.load(self._caminho(f'vetores-{geracao}.npy'), mmap_mode='r')
+        self.ids = np.load(self._caminho(f'ids-{geracao}.npy'))
+        self.geracao = geracao
+        self.marca = parse_datetime(atual['marca']) if atual.get('marca') else None
+
+    def _gravar(self, vetores, ids, marca):
+        geracao = f'{time.time_ns()}'
+        np.save(self._caminho(f'vetores-{geracao}.npy'), vetores)
+        np.save(self._caminho(f'ids-{geracao}.npy'), ids)
+
+        temporario = self._caminho('atual.json.tmp')
+        with open(temporario, 'w') as f:
+            json.dump({
+                'geracao': geracao,
+                'modelo': self.modelo,
+                'marca': marca.isoformat() if marca else None,
+            }, f)
+        os.replace(temporario, self._caminho('atual.json'))
+        self._limpar_geracoes_antigas()
+
+    def _limpar_geracoes_antigas(self):
+        geracoes = sorted({
+            nome.split('-', 1)[1].rsplit('.', 1)[0]
+            for nome in os.listdir(self.diretorio)
+            if nome.startswith('vetores-') and nome.endswith('.npy')
+        })
+        for geracao in geracoes[:-GERACOES_MANTIDAS]:
+            for prefixo in ('vetores', 'ids'):
+                try:
+                    os.remove(self._caminho(f'{prefixo}-{geracao}.npy'))
+                except FileNotFoundError:
+                    pass
+
+    # --------------------------
+    # Atualização
+    # --------------------------
+    def _embeddings(self, desde=None):
+        qs = ProdutoImageEmbedding.objects.filter(modelo=self.modelo)
+        if desde is not None:
+            qs = qs.filter(atualizado_em__gte=desde)
+        return qs.values_list('imagem_id', 'imagem__produto_id', 'vetor', 'atualizado_em').order_by('imagem_id')
+
+    def _aplicar(self, linhas, base_vetores, base_ids, marca, existentes=None):
+        """
+        Gera uma nova geração a partir da atual: linhas novas/regravadas entram,
+        e imagens que não estão mais em `existentes` (removidas) saem.
+        """
+        manter = np.ones(len(base_ids), dtype=bool)
+        if existentes is not None and len(base_ids):
+            manter &= np.isin(base_ids[:, 0], existentes)
+
+        if not linhas:
+            if manter.all():
+                return False
+            self._gravar(np.asarray(base_vetores)[manter], base_ids[manter], marca)
+            return True
+
+        novos_ids = np.array([(l[0], l[1]) for l in linhas], dtype=np.int64)
+        novos_vetores = _normalizar(np.vstack([np.frombuffer(bytes(l[2]), dtype=np.float32) for l in linhas]))
+        marca_nova = max([l[3] for l in linhas] + ([marca] if marca else []))
+
+        if len(base_ids):
+            # Embeddings regravados substituem a linha antiga da mesma imagem
+            manter &= ~np.isin(base_ids[:, 0], novos_ids[:, 0])
+            vetores = np.vstack([np.asarray(base_vetores)[manter], novos_vetores])
+            ids = np.vstack([base_ids[manter], novos_ids])
+        else:
+            vetores, ids = novos_vetores, novos_ids
+
+        self._gravar(vetores, ids, marca_nova)
+        return True
+
+    def _com_trava_de_escrita(self, funcao):
+        os.makedirs(self.diretorio, exist_ok=True)
+        with open(self._caminho('.lock'), 'w') as trava:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+            try:
+                # Outro worker pode ter gravado uma geração enquanto esperávamos
+                self._carregar_do_disco()
+                funcao()
+                self._carregar_do_disco()
+            finally:
+                fcntl.flock(trava, fcntl.LOCK_UN)
+
+    def reconstruir(self):
+        """Reconstrói o índice do zero a partir do banco."""
+        with self._lock:
+            def _executar():
+                linhas = list(self._embeddings())
+                if linhas:
+                    self._aplicar(linhas, np.zeros((0, 0), dtype=np.float32), np.zeros((0, 2), dtype=np.int64), None)
+                else:
+                    self._gravar(np.zeros((0, 0), dtype=np.float32), np.zeros((0, 2), dtype=np.int64), None)
+            self._com_trava_de_escrita(_executar)
+            return len(self.ids)
+
+    def sincronizar(self):
+        """Carrega a geração vigente e aplica os embeddings novos desde a marca d'água."""
+        versao = versoes.versao(VERSAO)
+        if versao == self.versao_vista:
+            return
+
+        def _delta():
+            # Sem geração em disco, a marca é None e o delta é a tabela inteira
+            desde = self.marca if self.geracao is not None else None
+            existentes = np.fromiter(
+                ProdutoImageEmbedding.objects.filter(modelo=self.modelo).values_list('imagem_id', flat=True),
+                dtype=np.int64,
+            )
+            # Linhas relidas dentro da margem só substituem a mesma imagem; a
+            # marca nunca recua (_aplicar parte de `desde`)
+            linhas = list(self._embeddings(desde=desde - MARGEM_MARCA if desde else None))
+            self._aplicar(linhas, self.vetores, self.ids, desde, existentes)
+
+        with self._lock:
+            self._com_trava_de_escrita(_delta)
+            self.versao_vista = versao
+
+    # --------------------------
+    # Consulta
+    # --------------------------
+    def vetor_do_produto(self, produto_id):
+        """Média dos embeddings (já normalizados) das imagens do produto, ou None."""
+        self.sincronizar()
+        linhas = np.flatnonzero(self.ids[:, 1] == produto_id) if len(self.ids) else []
+        if len(linhas) == 0:
+            return None
+        return np.asarray(self.vetores[linhas]).mean(axis=0)
+
+    def buscar(self, vetor, k=8, excluir_produto=None):
+        """
+        Retorna [(produto_id, score)] dos k produtos mais próximos por cosseno,
+        usando a melhor imagem de cada produto.
+        """
+        self.sincronizar()
+        if len(self.ids) == 0:
+            return []
+
+        consulta = np.asarray(vetor, dtype=np.float32)
+        if consulta.shape[0] != self.vetores.shape[1]:
+            logger.warning("Dimensão do vetor (%s) difere do índice (%s).", consulta.shape[0], self.vetores.shape[1])
+            return []
+        norma = np.linalg.norm(consulta)
+        if norma == 0:
+            return []
+        scores = self.vetores @ (consulta / norma)
+
+        if excluir_produto is not None:
+            scores = np.where(self.ids[:, 1] == excluir_produto, -np.inf, scores)
+
+        # Pega folga de candidatos, pois várias imagens podem ser do mesmo produto
+        n = min(len(scores), k * 4)
+        candidatos = np.argpartition(-scores, n - 1)[:n]
+        candidatos = candidatos[np.argsort(-scores[candidatos])]
+
+        resultado = {}
+        for linha in candidatos:
+            if not np.isfinite(scores[linha]):
+                continue
+            produto_id = int(self.ids[linha, 1])
+            if produto_id not in resultado:
+                resultado[produto_id] = float(scores[linha])
+            if len(resultado) == k:
+                break
+        return list(resultado.items())
+
+
+_indice = None
+_indice_lock = threading.Lock()
+
+
+def obter_indice():
+    global _indice
+    if _indice is None:
+        with _indice_lock:
+            if _indice is None:
+                _indice = IndiceSimilaridade(settings.SIMILARIDADE_INDICE_DIR, settings.EMBEDDINGS_MODELO)
+    return _indice
@@ -0,0 +1,151 @@
+# produtos/slugs.py
+"""
+Alocação de slugs únicos para Produto.
+
+Os slugs de um mesmo nome seguem o padrão 'base', 'base-1', 'base-2', ...
+Em vez de testar um sufixo por vez, uma única consulta por prefixo no índice
+único de slug (slug = base OU slug LIKE 'base-%') traz todos os sufixos já
+usados: o slug novo é a própria base, se livre, ou o maior sufixo + 1. No
+Postgres o Django cria o índice varchar_pattern_ops (_like) para o slug, que
+atende o LIKE por prefixo em qualquer collation.
+
+- alocar_slug(): para um objeto; usado por Produto.save(), que repete a
+  alocação se outro processo gravar o mesmo slug entre a consulta e o INSERT.
+- atribuir_slugs(): modo em lote, antes de um bulk_create. Uma consulta por
+  bloco de bases distintas; colisões dentro do próprio lote são resolvidas
+  em memória.
+- criar_em_lote(): bulk_create com nova tentativa em caso de conflito. Aceita
+  as opções do bulk_create (ex.: upsert por sku em produtos/importacao.py).
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+# Espaço reservado para o sufixo '-<n>' dentro do max_length do campo
+TAMANHO_SUFIXO = 11
+BASES_POR_CONSULTA = 200
+
+
+def slug_base(nome, max_length=255):
+    base = slugify(nome or '')[:max_length - TAMANHO_SUFIXO].strip('-')
+    return base or 'produto'
+
+
+def _filtro_base(base):
+    # Prefixo em vez de faixa base- <= slug < base.: a ordem da faixa depende
+    # da collation do banco, e fora da ordem ASCII ela perde sufixos
+    return Q(slug=base) | Q(slug__startswith=f'{base}-')
+
+
+def _sufixos_usados(modelo, bases, excluir_pk=None):
+    """
+    Retorna {base: (base_ocupada, maior_sufixo)} para as bases com algum slug
+    no banco. Uma consulta a cada BASES_POR_CONSULTA bases.
+    """
+    bases = list(bases)
+    usados = {}
+    for inicio in range(0, len(bases), BASES_POR_CONSULTA):
+        bloco = bases[inicio:inicio + BASES_POR_CONSULTA]
+        filtro = Q()
+        for base in bloco:
+            filtro |= _filtro_base(base)
+        consulta = modelo._default_manager.filter(filtro)
+        if excluir_pk is not None:
+            consulta = consulta.exclude(pk=excluir_pk)
+        no_bloco = set(bloco)
+        for slug in consulta.values_list('slug', flat=True):
+            # 'painel-1' é sufixo 1 de 'painel' e também a base de "Painel 1"
+            if slug in no_bloco:
+                usados[slug] = (True, usados.get(slug, (False, 0))[1])
+            prefixo, _, sufixo = slug.rpartition('-')
+            if sufixo.isdigit() and prefixo in no_bloco:
+                ocupada, maior = usados.get(prefixo, (False, 0))
+                usados[prefixo] = (ocupada, max(maior, int(sufixo)))
+    return usados
+
+
+def _com_sufixo(base, numero):
+    return base if numero == 0 else f'{base}-{numero}'
+
+
+def _proximo(ocupada, maior):
+    """Usa a base se estiver livre; senão o sufixo seguinte ao maior já usado."""
+    return 0 if not ocupada else maior + 1
+
+
+def alocar_slug(instancia):
+    """Define instancia.slug com o próximo slug livre para o nome. Uma consulta."""
+    modelo = type(instancia)
+    base = slug_base(instancia.name, modelo._meta.get_field('slug').max_length)
+    ocupada, maior = _sufixos_usados(modelo, [base], excluir_pk=instancia.pk).get(base, (False, 0))
+    instancia.slug = _com_sufixo(base, _proximo(ocupada, maior))
+    return instancia.slug
+
+
+def salvar_com_slug(instancia, salvar, tentativas=5):
+    """
+    Aloca o slug e chama salvar() num savepoint. Se o INSERT/UPDATE bater no
+    índice único de slug (outro processo gravou o mesmo slug entre a consulta
+    e a escrita), aloca de novo e repete.
+    """
+    for tentativa in range(tentativas):
+        alocar_slug(instancia)
+        try:
+            with transaction.atomic():
+                return salvar()
+        except IntegrityError:
+            ocupado = type(instancia)._default_manager.filter(slug=instancia.slug).exclude(pk=instancia.pk).exists()
+            if not ocupado or tentativa == tentativas - 1:
+                raise
+            instancia.slug = ''
+
+
+def atribuir_slugs(produtos):
+    """
+    Preenche o slug dos produtos sem slug, sem repetir slugs do banco nem do
+    próprio lote. Retorna a lista de produtos que receberam slug.
+    """
+    produtos = list(produtos)
+    if not produtos:
+        return []
+    modelo = type(produtos[0])
+    max_length = modelo._meta.get_field('slug').max_length
+
+    usados = {p.slug for p in produtos if p.slug}
+    sem_slug = [p for p in produtos if not p.slug]
+    bases = {id(p): slug_base(p.name, max_length) for p in sem_slug}
+    no_banco = _sufixos_usados(modelo, set(bases.values()))
+
+    for produto in sem_slug:
+        base = bases[id(produto)]
+        ocupada, maior = no_banco.get(base, (False, 0))
+        numero = _proximo(ocupada, maior)
+        # Slugs explícitos do próprio lote também contam como ocupados
+        while _com_sufixo(base, numero) in usados:
+            numero += 1
+        produto.slug = _com_sufixo(base, numero)
+        no_banco[base] = (True, max(maior, numero))
+        usados.add(produto.slug)
+    return sem_slug
+
+
+def criar_em_lote(produtos, batch_size=500, tentativas=3, **opcoes):
+    """
+    bulk_create com slugs alocados em lote. Em caso de conflito de slug com
+    uma gravação concorrente, recalcula os slugs gerados e tenta de novo.
+    `opcoes` vão direto para o bulk_create (update_conflicts, unique_fields...).
+    """
+    produtos = list(produtos)
+    if not produtos:
+        return []
+    modelo = type(produtos[0])
+    for tentativa in range(tentativas):
+        gerados = atribuir_slugs(produtos)
+        try:
+            with transaction.atomic():
+                return modelo._default_manager.bulk_create(produtos, batch_size=batch_size, **opcoes)
+        except IntegrityError:
+            if not gerados or tentativa == tentativas - 1:
+                raise
+            for produto in gerados:
+                produto.slug = ''
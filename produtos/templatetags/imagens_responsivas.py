@@ -0,0 +1,40 @@
+# produtos/templatetags/imagens_responsivas.py
+"""
+{% imagem_responsiva %}: <picture> com as variantes WebP/JPEG de uma imagem
+da vitrine (produtos/derivadas.py). Aceita uma ProdutoImage/CarouselImage
+ou o dict já pronto de fontes_responsivas() (payload em cache da home).
+
+    {% load imagens_responsivas %}
+    {% imagem_responsiva produto.imagem_do_card alt=produto.name sizes="(min-width: 768px) 33vw, 100vw" classe="img-fluid" %}
+"""
+from django import template
+from django.utils.html import format_html
+
+from produtos.imagens import fontes_responsivas
+
+register = template.Library()
+
+
+@register.simple_tag
+def imagem_responsiva(imagem, alt='', sizes='100vw', classe='', estilo='', prioridade=False):
+    fontes = imagem if isinstance(imagem, dict) else fontes_responsivas(imagem)
+    if not fontes or not fontes.get('src'):
+        return ''
+
+    webp = ''
+    if fontes.get('srcset_webp'):
+        webp = format_html('<source type="image/webp" srcset="{}" sizes="{}">', fontes['srcset_webp'], sizes)
+    srcset = ''
+    if fontes.get('srcset'):
+        srcset = format_html(' srcset="{}" sizes="{}"', fontes['srcset'], sizes)
+    dimensoes = ''
+    if fontes.get('largura') and fontes.get('altura'):
+        # Reserva o espaço da imagem antes do download (sem salto de layout)
+        dimensoes = format_html(' width="{}" height="{}"', fontes['largura'], fontes['altura'])
+    # A imagem principal da página (LCP) não deve esperar o lazy loading
+    carregamento = ('fetchpriority', 'high') if prioridade else ('loading', 'lazy')
+
+    return format_html(
+        '<picture>{}<img src="{}"{}{} alt="{}" class="{}" style="{}" decoding="async" {}="{}"></picture>',
+        webp, fontes['src'], srcset, dimensoes, alt, classe, estilo, *carregamento,
+    )
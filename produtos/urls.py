@@ -9,6 +9,8 @@ urlpatterns = [
     path('contact/', views.contact, name='contact'),
     path('search/', views.search, name='search'),
     path('produto/<int:produto_id>/', views.produto_detalhe, name='produto_detalhe'),
+    path('produtos/<int:produto_id>/similares/', views.produtos_similares, name='produtos_similares'),
+    path('produtos/busca-por-imagem/', views.busca_por_imagem, name='busca_por_imagem'),
     path('categoria/<slug:categoria_slug>/', views.produtos_por_categoria, name='produtos_por_categoria'),
     path('produto/<int:produto_id>/frete/', views.calcular_frete, name='calcular_frete'),
     path('register/', views.register, name='register'),
@@ -0,0 +1,44 @@
+# produtos/versoes.py
+"""
+Tokens de versão compartilhados por todos os workers, guardados no banco
+(VersaoCache).
+
+Índices e caches montados em memória por processo (regiões de frete,
+vitrine, similaridade) guardam a versão com que foram montados e se
+reconstroem quando versao() devolve outra. A versão é um time_ns(), como
+os tokens que ficavam no cache: só a igualdade importa, e um valor nunca se
+repete depois de um rollback. Com o token no cache do Django,
+o locmem padrão daria a cada worker o próprio token e só o processo que
+salvou a alteração a veria.
+
+trocar() roda no on_commit da transação que alterou os dados: um
+worker que lê o token novo já enxerga as linhas gravadas, e um rollback não
+troca a versão.
+"""
+import time
+
+from django.db import IntegrityError, transaction
+
+from .models import VersaoCache
+
+
+def versao(nome):
+    """Versão atual de `nome` (0 se nunca foi trocada). Uma query pela chave primária."""
+    return VersaoCache.objects.filter(nome=nome).values_list('versao', flat=True).first() or 0
+
+
+def _trocar(nome):
+    nova = time.time_ns()
+    if VersaoCache.objects.filter(nome=nome).update(versao=nova):
+        return
+    try:
+        with transaction.atomic():
+            VersaoCache.objects.create(nome=nome, versao=nova)
+    except IntegrityError:
+        # Outro worker criou a linha entre o update e o create
+        VersaoCache.objects.filter(nome=nome).update(versao=nova)
+
+
+def trocar(nome):
+    """Troca a versão de `nome` quando a transação corrente for confirmada."""
+    transaction.on_commit(lambda: _trocar(nome))
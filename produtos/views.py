@@ -1,4 +1,5 @@
 # produtos/views.py
+import logging
 from decimal import Decimal, InvalidOperation
 from django.db import IntegrityError
 from django.shortcuts import render, redirect, get_object_or_404
@@ -6,15 +7,25 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
 from django.conf import settings
+from django.core.cache import caches
 from django.utils import timezone
 from django.contrib.auth import login
 from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.http import require_POST
-from django.db.models import Q
+from django.core.paginator import Paginator
 
-from .models import CarouselImage, Pedido, Item, Produto, ProdutoImage, RegiaoFrete
+from .models import Pedido, Item, Produto, ProdutoImage
 from .forms import CustomRegisterForm
+from .busca import obter_backend_busca
+from .carrinho import Carrinho, total_das_linhas
+from .catalogo import obter_payload_home
+from .frete import cotar_frete, normalizar_cep
+from .imagens import com_imagem_card, resolver_imagens_card, url_imagem_card
+from .services import gerar_embedding_imagem
+from .similaridade import obter_indice
+
+logger = logging.getLogger(__name__)
 
 # se você tem um modelo Cliente em outro app:
 try:
@@ -31,7 +42,8 @@ User = get_user_model()
 # --------------------------
 def home(request):
     """
-    Exibe todos os produtos ativos e carrossel.
+    Exibe os produtos em destaque e o carrossel.
+    O payload vem do cache do catálogo (produtos/catalogo.py).
     """
     categorias_esperadas = [
         'paineis_solares', 'inversores', 'baterias', 'kits_fotovoltaicos',
@@ -39,25 +51,21 @@ def home(request):
         'sistemas_backup', 'ferramentas_instalacao',
     ]
 
-    all_products = Produto.objects.filter(is_active=True).prefetch_related('images')
+    payload, hit = obter_payload_home()
 
     categorias_para_template = [
         {'nome_url': cat, 'nome_exibicao': cat.replace('_', ' ').title()}
         for cat in categorias_esperadas
     ]
 
-    carousel_images = []
-    try:
-        carousel_images = CarouselImage.objects.filter(is_active=True)
-    except Exception as e:
-        messages.error(request, f"Erro ao carregar imagens do carrossel: {e}")
-
     context = {
-        'produtos': all_products,
-        'carousel_images': carousel_images,
+        'produtos': payload['produtos'],
+        'carousel_images': payload['carousel_images'],
         'categorias_ativas': categorias_para_template,
     }
-    return render(request, 'produtos/home.html', context)
+    response = render(request, 'produtos/home.html', context)
+    response['X-Catalogo-Cache'] = 'HIT' if hit else 'MISS'
+    return response
 
 
 def produtos_por_categoria(request, categoria_slug):
@@ -71,13 +79,13 @@ def produtos_por_categoria(request, categoria_slug):
         messages.error(request, "Categoria inválida.")
         return redirect('produtos:home')
 
-    produtos_da_categoria = Produto.objects.filter(categoria_id=categoria_slug, is_active=True).prefetch_related('images')
-
-    for produto in produtos_da_categoria:
-        imagem_selecionada = produto.images.filter(is_main=True).first()
-        if not imagem_selecionada:
-            imagem_selecionada = produto.images.first()
-        produto.imagem_do_card = imagem_selecionada
+    paginador = Paginator(
+        com_imagem_card(Produto.objects.filter(categoria_id=categoria_slug, is_active=True)).order_by('name', 'id'),
+        settings.CATALOGO_POR_PAGINA,
+    )
+    page_obj = paginador.get_page(request.GET.get('page'))
+    # A imagem do card vem no mesmo SELECT (JOIN em imagem_principal)
+    produtos_da_categoria = resolver_imagens_card(page_obj.object_list)
 
     nome_categoria_exibicao = categoria_slug.replace('_', ' ').title()
 
@@ -89,17 +97,15 @@ def produtos_por_categoria(request, categoria_slug):
     context = {
         'categoria_atual': nome_categoria_exibicao,
         'produtos': produtos_da_categoria,
+        'page_obj': page_obj,
         'categorias_ativas': categorias_para_template,
     }
     return render(request, 'produtos/produtos_por_categoria.html', context)
 
 
 def produto_detalhe(request, produto_id):
-    produto = get_object_or_404(Produto, id=produto_id, is_active=True)
-
-    imagem_para_exibir = produto.images.filter(is_main=True).first()
-    if not imagem_para_exibir:
-        imagem_para_exibir = produto.images.first()
+    produto = get_object_or_404(com_imagem_card(Produto.objects), id=produto_id, is_active=True)
+    imagem_para_exibir = produto.imagem_principal
 
     preco_com_desconto = produto.preco or Decimal('0.00')
     preco_original = preco_com_desconto * Decimal('1.2')
@@ -182,60 +188,15 @@ def register(request):
 # --------------------------
 # CARRINHO
 # --------------------------
-def _get_first_image_url(produto):
-    """Retorna URL da imagem principal ou primeira, ou string vazia."""
-    if not produto:
-        return ''
-    main_image = produto.images.filter(is_main=True).first()
-    if main_image and getattr(main_image, 'image', None):
-        return main_image.image.url
-    first = produto.images.first()
-    if first and getattr(first, 'image', None):
-        return first.image.url
-    return ''
-
-
 def adicionar_ao_carrinho(request, produto_id):
-    produto = get_object_or_404(Produto, pk=produto_id)
-
-    # Pega imagem principal ou primeira
-    first_image_url = _get_first_image_url(produto)
-
-    carrinho = request.session.get('carrinho', {})
-    produto_id_str = str(produto_id)
+    produto = get_object_or_404(Produto.objects.only('id', 'name', 'preco'), pk=produto_id)
 
     if not produto.preco or produto.preco <= 0:
         messages.error(request, f'O produto "{produto.name}" está sem preço válido.')
         return redirect('produtos:home')
 
-    # Armazenar preços como string para evitar problemas com float na sessão
-    preco_str = str(produto.preco)
-
-    if produto_id_str in carrinho:
-        # incrementa quantidade
-        try:
-            carrinho[produto_id_str]['quantidade'] = int(carrinho[produto_id_str].get('quantidade', 0)) + 1
-        except Exception:
-            carrinho[produto_id_str]['quantidade'] = 1
-        # recalcula subtotal usando Decimal
-        qtd = int(carrinho[produto_id_str]['quantidade'])
-        subtotal = (Decimal(carrinho[produto_id_str]['preco_unitario']) * qtd) if isinstance(carrinho[produto_id_str]['preco_unitario'], str) or isinstance(carrinho[produto_id_str]['preco_unitario'], Decimal) else Decimal(preco_str) * qtd
-        # sempre armazenar como string
-        carrinho[produto_id_str]['preco_unitario'] = str(preco_str)
-        carrinho[produto_id_str]['subtotal'] = str(subtotal)
-    else:
-        carrinho[produto_id_str] = {
-            'produto_id': produto.id,
-            'nome': produto.name,
-            'preco_unitario': str(preco_str),
-            'quantidade': 1,
-            'imagem': first_image_url,
-            'description': produto.description or '',
-            'subtotal': str(Decimal(preco_str)),
-        }
-
-    request.session['carrinho'] = carrinho
-    request.session.modified = True
+    # O formulário da página do produto envia a quantidade; os links dos cards, não
+    Carrinho(request.session).adicionar(produto.id, request.POST.get('quantidade', 1))
     messages.success(request, f'Produto "{produto.name}" adicionado ao carrinho.')
 
     return redirect('produtos:ver_carrinho')
@@ -247,132 +208,46 @@ def remover_do_carrinho(request, produto_id):
     Se 'acao' == 'menos' e quantidade > 1 => decrementa quantidade.
     Caso contrário remove o item do carrinho.
     """
-    carrinho = request.session.get('carrinho', {})
-    produto_id_str = str(produto_id)
+    carrinho = Carrinho(request.session)
     acao = request.POST.get('acao', 'remover')
 
-    if produto_id_str in carrinho:
-        if acao == 'menos':
-            try:
-                quantidade_atual = int(carrinho[produto_id_str].get('quantidade', 1))
-            except Exception:
-                quantidade_atual = 1
-
-            if quantidade_atual > 1:
-                quantidade_atual -= 1
-                carrinho[produto_id_str]['quantidade'] = quantidade_atual
-                try:
-                    pu = Decimal(str(carrinho[produto_id_str]['preco_unitario']))
-                except Exception:
-                    pu = Decimal('0.00')
-                carrinho[produto_id_str]['subtotal'] = str(pu * quantidade_atual)
-                messages.success(request, "Uma unidade foi removida do carrinho.")
-            else:
-                # se for 1 e pediu 'menos', remove tudo
-                del carrinho[produto_id_str]
-                messages.success(request, "Produto removido do carrinho.")
-        else:
-            # remover tudo
-            del carrinho[produto_id_str]
-            messages.success(request, "Produto removido do carrinho.")
-
-        request.session['carrinho'] = carrinho
-        request.session.modified = True
-    else:
+    if produto_id not in carrinho:
         messages.error(request, "Item não encontrado no carrinho.")
+    elif acao == 'menos' and carrinho.decrementar(produto_id):
+        messages.success(request, "Uma unidade foi removida do carrinho.")
+    else:
+        carrinho.remover(produto_id)
+        messages.success(request, "Produto removido do carrinho.")
 
     return redirect('produtos:ver_carrinho')
 
 
 def ver_carrinho(request):
     """
-    Monta itens_carrinho com objetos Produto do DB e calcula totais com Decimal.
-    Não levanta 404 para itens removidos, apenas os ignora.
+    Hidrata as linhas do carrinho com uma única query (ver produtos/carrinho.py).
+    Não levanta 404 para itens removidos do catálogo, apenas os tira do carrinho.
     """
-    carrinho_atual = request.session.get('carrinho', {})
-    itens_carrinho = []
-    total_carrinho = Decimal('0.00')
-    novo_carrinho_sessao = {}
-
-    for produto_id_str, dados_item in list(carrinho_atual.items()):
-        try:
-            # valida campos essenciais
-            if 'quantidade' not in dados_item or 'preco_unitario' not in dados_item or 'nome' not in dados_item:
-                messages.error(request, f"Dados incompletos no carrinho (ID: {produto_id_str}). Item ignorado.")
-                continue
-
-            # busca produto no banco, mas não 404: apenas ignora se não existir
-            try:
-                produto_db = Produto.objects.filter(pk=int(produto_id_str)).first()
-            except Exception:
-                produto_db = None
+    carrinho = Carrinho(request.session)
+    itens_carrinho, removidos = carrinho.linhas()
+    if removidos:
+        messages.warning(request, "Alguns produtos do seu carrinho não estão mais disponíveis e foram removidos.")
 
-            if not produto_db:
-                messages.warning(request, f"Produto '{dados_item.get('nome', produto_id_str)}' não encontrado e foi removido.")
-                continue
-
-            quantidade = int(dados_item.get('quantidade', 0))
-            if quantidade <= 0:
-                continue
-
-            # converte preco_unitario vindo da sessão (string) para Decimal
-            try:
-                preco_unitario_item = Decimal(str(dados_item['preco_unitario']))
-            except Exception:
-                preco_unitario_item = Decimal('0.00')
-
-            subtotal_item = preco_unitario_item * quantidade
-            total_carrinho += subtotal_item
-
-            itens_carrinho.append({
-                'produto': produto_db,
-                'quantidade': quantidade,
-                'preco_unitario': preco_unitario_item,
-                'subtotal': subtotal_item,
-                'imagem': dados_item.get('imagem', _get_first_image_url(produto_db)),
-            })
-
-            # mantemos o item no novo carrinho (serialized) atualizando subtotal/quantidade como strings
-            novo_item = {
-                'produto_id': dados_item.get('produto_id', produto_id_str),
-                'nome': dados_item.get('nome', produto_db.name),
-                'preco_unitario': str(preco_unitario_item),
-                'quantidade': quantidade,
-                'imagem': dados_item.get('imagem', _get_first_image_url(produto_db)),
-                'description': dados_item.get('description', produto_db.description or ''),
-                'subtotal': str(subtotal_item),
-            }
-            novo_carrinho_sessao[produto_id_str] = novo_item
-
-        except (ValueError, InvalidOperation) as e:
-            messages.warning(request, f"Erro ao processar item {produto_id_str}: {e}")
-            continue
-        except Exception as e:
-            messages.error(request, f"Erro inesperado no item {produto_id_str}: {e}")
-            continue
-
-    # atualiza sessão com itens válidos
-    request.session['carrinho'] = novo_carrinho_sessao
-    request.session.modified = True
+    total_carrinho = total_das_linhas(itens_carrinho)
 
     # Frete
     valor_frete = request.session.get('valor_frete')
     try:
         frete_decimal = Decimal(str(valor_frete)) if valor_frete is not None else Decimal("0.00")
-    except Exception:
+    except InvalidOperation:
         messages.warning(request, "Erro ao carregar valor do frete. Será recalculado.")
         frete_decimal = Decimal("0.00")
 
-    total_com_frete = total_carrinho + frete_decimal
-
-    total_itens = sum(item['quantidade'] for item in itens_carrinho)
-
     context = {
         'itens_carrinho': itens_carrinho,
         'total_carrinho': total_carrinho,
         'frete': frete_decimal,
-        'total_com_frete': total_com_frete,
-        'total_itens': total_itens,
+        'total_com_frete': total_carrinho + frete_decimal,
+        'total_itens': sum(item['quantidade'] for item in itens_carrinho),
     }
 
     return render(request, 'produtos/ver_carrinho.html', context)
@@ -382,49 +257,114 @@ def ver_carrinho(request):
 # BUSCA
 # --------------------------
 def search(request):
-    query = request.GET.get('q')
+    query = (request.GET.get('q') or '').strip()
     produtos_encontrados = []
+    page_obj = None
 
     if query:
-        produtos_encontrados = Produto.objects.filter(
-            Q(name__icontains=query) | Q(description__icontains=query),
-            is_active=True
-        ).distinct().prefetch_related('images')
+        resultados = obter_backend_busca().buscar(query)
+        paginador = Paginator(resultados, settings.CATALOGO_POR_PAGINA)
+        page_obj = paginador.get_page(request.GET.get('page'))
+        produtos_encontrados = resolver_imagens_card(page_obj.object_list)
+
+    return render(request, 'produtos/search_results.html', {
+        'query': query,
+        'produtos': produtos_encontrados,
+        'page_obj': page_obj,
+    })
 
-        # opcional: log para debug
-        for p in produtos_encontrados:
-            # print pode ajudar ao debugar nos logs do container
-            print(f"   - ID: {p.id}, Nome: {p.name}, Ativo: {p.is_active}, Descrição: {p.description}")
 
-    return render(request, 'produtos/search_results.html', {'query': query, 'produtos': produtos_encontrados})
+# --------------------------
+# PRODUTOS SIMILARES (EMBEDDINGS)
+# --------------------------
+def _serializar_similares(resultados):
+    """Converte [(produto_id, score)] do índice em dicts, mantendo a ordem do ranking."""
+    por_id = com_imagem_card(Produto.objects.filter(is_active=True)).in_bulk([pid for pid, _ in resultados])
+    similares = []
+    for produto_id, score in resultados:
+        produto = por_id.get(produto_id)
+        if produto is None:
+            continue
+        similares.append({
+            'id': produto.id,
+            'name': produto.name,
+            'preco': str(produto.preco) if produto.preco is not None else None,
+            'url': reverse('produtos:produto_detalhe', args=[produto.id]),
+            'imagem_url': url_imagem_card(produto),
+            'score': round(score, 4),
+        })
+    return similares
+
+
+def _limite_similares(request):
+    try:
+        return max(1, min(int(request.GET.get('k', 8)), 50))
+    except ValueError:
+        return 8
+
+
+def produtos_similares(request, produto_id):
+    produto = get_object_or_404(Produto, id=produto_id, is_active=True)
+    indice = obter_indice()
+
+    vetor = indice.vetor_do_produto(produto.id)
+    if vetor is None:
+        return JsonResponse({'produto': produto.id, 'similares': []})
+
+    resultados = indice.buscar(vetor, k=_limite_similares(request), excluir_produto=produto.id)
+    return JsonResponse({'produto': produto.id, 'similares': _serializar_similares(resultados)})
+
+
+def _excedeu_limite_busca_imagem(request):
+    """Janela fixa por IP: conta as buscas em CACHES e expira com a janela."""
+    cache = caches[settings.BUSCA_IMAGEM_CACHE_ALIAS]
+    chave = f"busca_imagem:{request.META.get('REMOTE_ADDR', '')}"
+    cache.add(chave, 0, timeout=settings.BUSCA_IMAGEM_JANELA_SEGUNDOS)
+    try:
+        tentativas = cache.incr(chave)
+    except ValueError:
+        # Expirou entre o add e o incr: começa uma nova janela
+        cache.set(chave, 1, timeout=settings.BUSCA_IMAGEM_JANELA_SEGUNDOS)
+        tentativas = 1
+    return tentativas > settings.BUSCA_IMAGEM_LIMITE_POR_JANELA
+
+
+@require_POST
+def busca_por_imagem(request):
+    arquivo = request.FILES.get('imagem')
+    if not arquivo:
+        return JsonResponse({'error': "Envie uma imagem no campo 'imagem'."}, status=400)
+
+    if arquivo.size > settings.BUSCA_IMAGEM_TAMANHO_MAXIMO:
+        limite_mb = settings.BUSCA_IMAGEM_TAMANHO_MAXIMO / (1024 * 1024)
+        return JsonResponse({'error': f'Imagem maior que o limite de {limite_mb:.0f} MB.'}, status=413)
+
+    if _excedeu_limite_busca_imagem(request):
+        return JsonResponse({'error': 'Muitas buscas por imagem. Tente novamente em instantes.'}, status=429)
+
+    try:
+        vetor = gerar_embedding_imagem(arquivo)
+    except Exception as e:
+        logger.exception("Falha ao gerar embedding da imagem enviada")
+        return JsonResponse({'error': f'Não foi possível processar a imagem: {e}'}, status=502)
+
+    resultados = obter_indice().buscar(vetor, k=_limite_similares(request))
+    return JsonResponse({'similares': _serializar_similares(resultados)})
 
 
 # --------------------------
 # CÁLCULO DE FRETE
 # --------------------------
 def calcular_frete(request, produto_id):
-    produto = get_object_or_404(Produto, id=produto_id)
-    imagem_para_exibir = produto.images.filter(is_main=True).first()
-    if not imagem_para_exibir:
-        imagem_para_exibir = produto.images.first()
+    produto = get_object_or_404(com_imagem_card(Produto.objects), id=produto_id)
+    imagem_para_exibir = produto.imagem_principal
 
     preco_com_desconto = produto.preco or Decimal('0.00')
     preco_original = preco_com_desconto * Decimal('1.2')
 
     if request.method == 'POST':
-        cep = request.POST.get('cep', '').replace('-', '').strip()
-
-        if len(cep) < 3:
-            return render(request, 'produtos/produto_detalhe.html', {
-                'produto': produto,
-                'imagem_para_exibir': imagem_para_exibir,
-                'preco_original': preco_original,
-                'preco_com_desconto': preco_com_desconto,
-                'frete_indisponivel': True,
-            })
-
-        prefixo = cep[:3]
-        regiao = RegiaoFrete.objects.filter(prefixo_cep=prefixo).first()
+        # Índice em memória (produtos/frete.py): a cotação não consulta o banco
+        regiao = cotar_frete(request.POST.get('cep', ''))
 
         if regiao:
             request.session['valor_frete'] = float(regiao.valor_frete)
@@ -458,12 +398,11 @@ def calcular_frete(request, produto_id):
 @require_POST
 def calcular_frete_carrinho(request):
     cep = request.POST.get('cep', '').replace('-', '').strip()
-    if len(cep) < 3:
+    if normalizar_cep(cep) is None:
         messages.error(request, "CEP inválido para cálculo do frete.")
         return redirect('produtos:ver_carrinho')
 
-    prefixo = cep[:3]
-    regiao = RegiaoFrete.objects.filter(prefixo_cep=prefixo).first()
+    regiao = cotar_frete(cep)
 
     if regiao:
         request.session['valor_frete'] = float(regiao.valor_frete)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cliente, Projeto, Usuario, Departamento, MenuPermissao
+from .models import Cliente, Projeto, Usuario, Departamento, MenuPermissao, UploadEmPartes
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django import forms
 from .forms import ClienteForm # Importa ClienteForm
@@ -45,3 +45,10 @@ class DepartamentoAdmin(admin.ModelAdmin):
 class MenuPermissaoAdmin(admin.ModelAdmin):
     list_display = ('nome', 'rota')
     search_fields = ('nome', 'rota')
+
+@admin.register(UploadEmPartes)
+class UploadEmPartesAdmin(admin.ModelAdmin):
+    list_display = ('nome_arquivo', 'usuario', 'destino', 'destino_id', 'tamanho', 'status', 'atualizado_em')
+    list_filter = ('status', 'destino')
+    search_fields = ('nome_arquivo', 'usuario__username')
+    readonly_fields = ('partes_recebidas', 'resultado_id', 'criado_em', 'atualizado_em')
@@ -0,0 +1,275 @@
+# solar/exportacao.py
+"""
+Exportação das listas do CRM em CSV ou XLSX, em streaming.
+
+Cada Exportacao lê o banco com values_list(...).iterator(chunk_size), sem
+instanciar modelos, aplicando o mesmo filtro da tela (solar/filtros.py).
+Os geradores abaixo devolvem o arquivo em pedaços para um
+StreamingHttpResponse: o download começa na primeira linha e a memória do
+worker não cresce com o tamanho da tabela.
+
+O XLSX é montado aqui mesmo (zip em streaming com uma planilha de strings
+inline), sem openpyxl: bibliotecas de planilha montam o arquivo inteiro em
+memória antes de gravar.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from produtos.models import Pedido
+
+from .filtros import buscar_lancamentos, filtrar_clientes, filtrar_materiais, filtrar_pedidos, filtrar_projetos
+from .models import Cliente, LancamentoFinanceiro, Material, Projeto
+
+BLOCO = 2000
+# Envia o XLSX em pedaços de ~64 KB comprimidos
+TAMANHO_PEDACO = 64 * 1024
+
+
+# --------------------------
+# Definições
+# --------------------------
+class Exportacao:
+    """
+    `colunas` é uma lista de (título, lookup do values_list). Campos com
+    choices saem com o rótulo de exibição.
+    """
+
+    def __init__(self, nome, modelo, permissao, colunas, filtrar, ordem):
+        self.nome = nome
+        self.modelo = modelo
+        self.permissao = permissao
+        self.colunas = colunas
+        self.filtrar = filtrar
+        self.ordem = ordem
+
+    @property
+    def cabecalho(self):
+        return [titulo for titulo, _ in self.colunas]
+
+    def _rotulos(self):
+        """{posição da coluna: {valor: rótulo}} para os campos com choices."""
+        rotulos = {}
+        for posicao, (_, lookup) in enumerate(self.colunas):
+            if '__' in lookup:
+                continue
+            campo = self.modelo._meta.get_field(lookup)
+            if campo.choices:
+                rotulos[posicao] = dict(campo.flatchoices)
+        return rotulos
+
+    def linhas(self, params):
+        consulta = self.filtrar(self.modelo.objects.all(), params).order_by(*self.ordem)
+        rotulos = self._rotulos()
+        for linha in consulta.values_list(*[lookup for _, lookup in self.colunas]).iterator(chunk_size=BLOCO):
+            if rotulos:
+                linha = list(linha)
+                for posicao, mapa in rotulos.items():
+                    linha[posicao] = mapa.get(linha[posicao], linha[posicao])
+            yield linha
+
+
+EXPORTACOES = {exportacao.nome: exportacao for exportacao in [
+    Exportacao('clientes', Cliente, 'solar.view_cliente', [
+        ('ID', 'id'), ('Nome', 'nome'), ('E-mail', 'email'), ('Telefone', 'telefone'),
+        ('CPF', 'cpf'), ('CNPJ', 'cnpj'), ('Rua', 'rua'), ('Número', 'numero'), ('Bairro', 'bairro'),
+        ('Cidade', 'cidade'), ('Estado', 'estado'), ('CEP', 'cep'), ('WhatsApp', 'possui_whatsapp'),
+        ('Cadastro', 'data_cadastro'),
+    ], filtrar_clientes, ['nome', 'id']),
+    Exportacao('projetos', Projeto, 'solar.view_projeto', [
+        ('ID', 'id'), ('Nome', 'nome'), ('Status', 'status'), ('Cliente', 'cliente__nome'),
+        ('Responsável', 'responsavel__username'), ('Início', 'data_inicio'), ('Fim', 'data_fim'),
+        ('Cidade', 'cidade'), ('Estado', 'estado'), ('Potência (kWp)', 'potencia_kwp'),
+        ('Módulos', 'quantidade_modulos'), ('Inversor', 'inversor'), ('Fornecedor', 'fornecedor__nome'),
+        ('Valor Total (R$)', 'valor_total'), ('Forma de Pagamento', 'forma_pagamento'),
+    ], filtrar_projetos, ['-data_inicio', '-id']),
+    Exportacao('lancamentos', LancamentoFinanceiro, 'solar.view_lancamentofinanceiro', [
+        ('ID', 'id'), ('Data', 'data'), ('Projeto', 'projeto__nome'), ('Tipo', 'tipo'),
+        ('Descrição', 'descricao'), ('Valor (R$)', 'valor'), ('Status', 'status'),
+    ], buscar_lancamentos, ['-data', '-id']),
+    Exportacao('materiais', Material, 'solar.view_material', [
+        ('ID', 'id'), ('Nome', 'nome'), ('Código', 'codigo'), ('Fabricante', 'fabricante'),
+        ('Modelo', 'modelo'), ('Unidade', 'unidade_medida'), ('Estoque', 'quantidade_estoque'),
+        ('Estoque Mínimo', 'estoque_minimo'), ('Localização', 'localizacao'),
+        ('Preço de Compra', 'preco_compra'), ('Preço de Venda', 'preco_venda'),
+        ('Fornecedor', 'fornecedor__nome'), ('Garantia Até', 'garantia_ate'),
+    ], filtrar_materiais, ['nome', 'id']),
+    Exportacao('pedidos', Pedido, 'produtos.view_pedido', [
+        ('ID', 'id'), ('Criado Em', 'criado_em'), ('Status', 'status'), ('E-mail', 'email_cliente'),
+        ('Usuário', 'usuario__username'), ('Total (R$)', 'total'), ('Método', 'metodo_pagamento'),
+        ('Pago Em', 'data_pagamento'),
+    ], filtrar_pedidos, ['-criado_em', '-id']),
+]}
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'Sim' if valor else 'Não'
+    if isinstance(valor, datetime):
+        if timezone.is_aware(valor):
+            valor = timezone.localtime(valor)
+        return valor.strftime('%Y-%m-%d %H:%M')
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return str(valor)
+
+
+# --------------------------
+# CSV
+# --------------------------
+class _Eco:
+    """Pseudo-arquivo para csv.writer: devolve a linha em vez de guardá-la."""
+
+    def write(self, valor):
+        return valor
+
+
+PREFIXOS_FORMULA = ('=', '+', '-', '@')
+
+
+def neutralizar_formula(texto):
+    """Evita que planilhas interpretem o texto como fórmula (CSV injection)."""
+    if texto[:1] in PREFIXOS_FORMULA:
+        return "'" + texto
+    return texto
+
+
+def _celula_csv(valor):
+    texto = _texto(valor)
+    return neutralizar_formula(texto) if isinstance(valor, str) else texto
+
+
+def gerar_csv(cabecalho, linhas):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(cabecalho)
+    for linha in linhas:
+        yield escritor.writerow([_celula_csv(valor) for valor in linha])
+
+
+# --------------------------
+# XLSX
+# --------------------------
+class _Fluxo(io.RawIOBase):
+    """
+    Destino do zip sem seek(): o zipfile grava os tamanhos em data
+    descriptors e o conteúdo pode ser repassado à medida que é gerado.
+    """
+
+    def __init__(self):
+        self._partes = []
+        self._posicao = 0
+        self.pendente = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        dados = bytes(dados)
+        self._partes.append(dados)
+        self._posicao += len(dados)
+        self.pendente += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def drenar(self):
+        dados = b''.join(self._partes)
+        self._partes = []
+        self.pendente = 0
+        return dados
+
+
+_PARTES_XLSX = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{aba}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+_INICIO_PLANILHA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_FIM_PLANILHA = '</sheetData></worksheet>'
+# Caracteres de controle não são permitidos em XML 1.0
+_INVALIDOS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _celula_xlsx(valor):
+    if valor is None:
+        return '<c/>'
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float, Decimal)):
+        return f'<c><v>{valor}</v></c>'
+    texto = escape(_INVALIDOS_XML.sub('', _texto(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _linha_xlsx(valores):
+    return ('<row>' + ''.join(_celula_xlsx(valor) for valor in valores) + '</row>').encode('utf-8')
+
+
+def gerar_xlsx(cabecalho, linhas, aba='Dados'):
+    fluxo = _Fluxo()
+    with zipfile.ZipFile(fluxo, 'w', compression=zipfile.ZIP_DEFLATED) as pacote:
+        for nome, conteudo in _PARTES_XLSX.items():
+            pacote.writestr(nome, conteudo.replace('{aba}', escape(aba[:31])))
+        with pacote.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as planilha:
+            planilha.write(_INICIO_PLANILHA.encode('utf-8'))
+            planilha.write(_linha_xlsx(cabecalho))
+            for linha in linhas:
+                planilha.write(_linha_xlsx(linha))
+                if fluxo.pendente >= TAMANHO_PEDACO:
+                    yield fluxo.drenar()
+            planilha.write(_FIM_PLANILHA.encode('utf-8'))
+    yield fluxo.drenar()
+
+
+# --------------------------
+# Resposta HTTP
+# --------------------------
+FORMATOS = {
+    'csv': (gerar_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (gerar_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+
+def resposta_exportacao(exportacao, params, formato='csv'):
+    gerar, content_type = FORMATOS[formato]
+    response = StreamingHttpResponse(gerar(exportacao.cabecalho, exportacao.linhas(params)), content_type=content_type)
+    nome_arquivo = f"{exportacao.nome}_{timezone.localdate():%Y%m%d}.{formato}"
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    return response
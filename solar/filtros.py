@@ -0,0 +1,92 @@
+# solar/filtros.py
+"""
+Filtros das listas e dashboards do CRM, lidos da query string.
+
+A tela e a exportação (solar/exportacao.py) chamam a mesma função, então o
+arquivo exportado traz exatamente as linhas filtradas na tela. Parâmetros
+vazios ou inválidos são ignorados.
+"""
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+
+
+def _data(params, nome):
+    try:
+        return parse_date(params.get(nome) or '')
+    except ValueError:
+        return None
+
+
+def _busca(queryset, params, campos):
+    termo = (params.get('q') or '').strip()
+    if not termo:
+        return queryset
+    filtro = Q()
+    for campo in campos:
+        filtro |= Q(**{f'{campo}__icontains': termo})
+    return queryset.filter(filtro)
+
+
+def filtrar_clientes(queryset, params):
+    return _busca(queryset, params, ('nome', 'email', 'cpf', 'cnpj', 'cidade'))
+
+
+def filtrar_projetos(queryset, params):
+    if params.get('status'):
+        queryset = queryset.filter(status=params['status'])
+    return _busca(queryset, params, ('nome', 'descricao'))
+
+
+def filtrar_materiais(queryset, params):
+    return _busca(queryset, params, ('nome', 'codigo', 'fabricante', 'modelo'))
+
+
+def filtrar_fornecedores(queryset, params):
+    return _busca(queryset, params, ('nome', 'cnpj', 'email'))
+
+
+def filtrar_usuarios(queryset, params):
+    return _busca(queryset, params, ('username', 'first_name', 'last_name', 'email'))
+
+
+def filtrar_produtos(queryset, params):
+    if params.get('categoria'):
+        queryset = queryset.filter(categoria_id=params['categoria'])
+    if params.get('ativo') in ('1', '0'):
+        queryset = queryset.filter(is_active=params['ativo'] == '1')
+    return _busca(queryset, params, ('name', 'sku'))
+
+
+def filtrar_lancamentos(queryset, params):
+    """Vale para LancamentoFinanceiro e ResumoFinanceiroDiario (mesmos campos)."""
+    projeto_id = params.get('projeto') or ''
+    if projeto_id.isdigit():
+        queryset = queryset.filter(projeto_id=projeto_id)
+    if params.get('tipo'):
+        queryset = queryset.filter(tipo=params['tipo'])
+    if params.get('status'):
+        queryset = queryset.filter(status=params['status'])
+    data_inicio, data_fim = _data(params, 'data_inicio'), _data(params, 'data_fim')
+    if data_inicio:
+        queryset = queryset.filter(data__gte=data_inicio)
+    if data_fim:
+        queryset = queryset.filter(data__lte=data_fim)
+    return queryset
+
+
+def buscar_lancamentos(queryset, params):
+    """Filtros acima + busca textual, só para LancamentoFinanceiro (lista e exportação)."""
+    return _busca(filtrar_lancamentos(queryset, params), params, ('descricao', 'projeto__nome'))
+
+
+def filtrar_pedidos(queryset, params):
+    if params.get('status'):
+        queryset = queryset.filter(status=params['status'])
+    if params.get('metodo_pagamento'):
+        queryset = queryset.filter(metodo_pagamento=params['metodo_pagamento'])
+    data_inicio, data_fim = _data(params, 'data_inicio'), _data(params, 'data_fim')
+    if data_inicio:
+        queryset = queryset.filter(criado_em__date__gte=data_inicio)
+    if data_fim:
+        queryset = queryset.filter(criado_em__date__lte=data_fim)
+    return _busca(queryset, params, ('email_cliente',))
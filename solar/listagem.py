@@ -0,0 +1,188 @@
+# solar/listagem.py
+"""
+Paginação por cursor (keyset) das listas do CRM.
+
+Em vez de OFFSET + COUNT (custo proporcional à página e ao tamanho da
+tabela), cada página começa depois da última linha da anterior:
+WHERE (nome, id) > (:nome, :id) ORDER BY nome, id LIMIT n + 1. Com um
+índice nas chaves de ordenação, toda página custa o mesmo.
+
+- As ordenações aceitas são fixas por lista e sempre terminam no id, para
+  que o cursor seja único.
+- O cursor (?cursor=) guarda a direção e os valores das chaves da linha de
+  referência, codificados em base64.
+- A contagem é opcional e limitada: até settings.CRM_LISTAS_LIMITE_CONTAGEM
+  é exata; acima disso mostra "mais de N" (no PostgreSQL, sem filtros, usa
+  a estimativa do planner em pg_class).
+
+Os filtros e a busca vêm de solar/filtros.py, os mesmos da exportação.
+"""
+import base64
+import json
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+
+
+class Pagina:
+
+    def __init__(self, itens, params, ordem, opcoes_ordem, proximo=None, anterior=None, total=None, total_exato=True):
+        self.itens = itens
+        self.ordem = ordem
+        self.opcoes_ordem = opcoes_ordem
+        self.cursor_proximo = proximo
+        self.cursor_anterior = anterior
+        self.total = total
+        self.total_exato = total_exato
+        self._params = params
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+    @property
+    def tem_proxima(self):
+        return self.cursor_proximo is not None
+
+    @property
+    def tem_anterior(self):
+        return self.cursor_anterior is not None
+
+    def _query(self, cursor):
+        params = self._params.copy()
+        params.pop('cursor', None)
+        if cursor:
+            params['cursor'] = cursor
+        return params.urlencode()
+
+    @property
+    def query_proxima(self):
+        return self._query(self.cursor_proximo)
+
+    @property
+    def query_anterior(self):
+        return self._query(self.cursor_anterior)
+
+    @property
+    def query_filtros(self):
+        """Query string atual sem o cursor (para exportar ou voltar ao início)."""
+        return self._query(None)
+
+    @property
+    def filtros_ocultos(self):
+        """Filtros da URL que o formulário de busca deve repassar."""
+        return [
+            (chave, valor)
+            for chave, valores in self._params.lists() if chave not in ('q', 'ordem', 'cursor')
+            for valor in valores
+        ]
+
+
+def _serializar(valor):
+    # isoformat completo: o DjangoJSONEncoder corta os microssegundos
+    if isinstance(valor, date):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    raise TypeError(f"Valor de cursor não suportado: {valor!r}")
+
+
+def codificar_cursor(direcao, valores):
+    dados = json.dumps([direcao, valores], default=_serializar, separators=(',', ':'))
+    return base64.urlsafe_b64encode(dados.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, modelo, campos):
+    """Retorna (direcao, valores) ou None se o cursor for inválido."""
+    if not cursor:
+        return None
+    try:
+        direcao, valores = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if direcao not in ('>', '<') or len(valores) != len(campos):
+            return None
+        return direcao, [
+            modelo._meta.get_field(campo.lstrip('-')).to_python(valor)
+            for campo, valor in zip(campos, valores)
+        ]
+    except Exception:
+        return None
+
+
+def _depois_de(campos, valores, para_tras=False):
+    """(a, b) > (x, y) expandido em a > x OR (a = x AND b > y), por direção de cada chave."""
+    filtro = Q()
+    iguais = {}
+    for campo, valor in zip(campos, valores):
+        nome = campo.lstrip('-')
+        decrescente = campo.startswith('-')
+        operador = 'lt' if decrescente != para_tras else 'gt'
+        filtro |= Q(**iguais, **{f'{nome}__{operador}': valor})
+        iguais[nome] = valor
+    return filtro
+
+
+def _invertidos(campos):
+    return [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in campos]
+
+
+def _valores(objeto, campos):
+    return [getattr(objeto, campo.lstrip('-')) for campo in campos]
+
+
+def contar(queryset, limite=None):
+    """Retorna (total, exato). Nunca conta além de `limite` linhas."""
+    limite = limite or settings.CRM_LISTAS_LIMITE_CONTAGEM
+    conexao = connections[queryset.db]
+    if conexao.vendor == 'postgresql' and not queryset.query.where:
+        with conexao.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+            linha = cursor.fetchone()
+        if linha and linha[0] > limite:
+            return int(linha[0]), False
+    total = queryset.order_by()[:limite + 1].count()
+    return min(total, limite), total <= limite
+
+
+def paginar(queryset, params, ordens, por_pagina=None, contagem=True):
+    """
+    `ordens` é uma lista de (chave, rótulo, campos) — a primeira é a padrão;
+    `campos` deve terminar numa chave única (id). Retorna uma Pagina.
+    """
+    por_pagina = por_pagina or settings.CRM_LISTAS_POR_PAGINA
+    opcoes = {chave: campos for chave, _, campos in ordens}
+    ordem = params.get('ordem') if params.get('ordem') in opcoes else ordens[0][0]
+    campos = list(opcoes[ordem])
+
+    total, exato = contar(queryset) if contagem else (None, True)
+
+    cursor = decodificar_cursor(params.get('cursor'), queryset.model, campos)
+    para_tras = cursor is not None and cursor[0] == '<'
+    consulta = queryset
+    if cursor:
+        consulta = consulta.filter(_depois_de(campos, cursor[1], para_tras))
+    consulta = consulta.order_by(*(_invertidos(campos) if para_tras else campos))
+
+    itens = list(consulta[:por_pagina + 1])
+    mais = len(itens) > por_pagina
+    itens = itens[:por_pagina]
+    if para_tras:
+        itens.reverse()
+
+    proximo = anterior = None
+    if itens:
+        # Voltando, a página de onde viemos vem depois desta; avançando a
+        # partir de um cursor, existe a página anterior
+        if mais or para_tras:
+            proximo = codificar_cursor('>', _valores(itens[-1], campos))
+        if cursor is not None and (mais or not para_tras):
+            anterior = codificar_cursor('<', _valores(itens[0], campos))
+
+    return Pagina(
+        itens, params, ordem, [(chave, rotulo) for chave, rotulo, _ in ordens],
+        proximo=proximo, anterior=anterior, total=total, total_exato=exato,
+    )
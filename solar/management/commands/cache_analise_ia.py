@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from produtos.cache_ia import obter_cache_analise
+
+
+class Command(BaseCommand):
+    help = 'Mostra o backend do cache de análises de imagem por IA e permite limpá-lo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limpar', action='store_true', help='Remove todas as análises guardadas.')
+
+    def handle(self, *args, **options):
+        cache = obter_cache_analise()
+        self.stdout.write(f"Backend do cache de análises: {cache.nome}")
+
+        if options['limpar']:
+            removidas = cache.limpar()
+            self.stdout.write(self.style.SUCCESS(f"{removidas} análise(s) removida(s) do cache."))
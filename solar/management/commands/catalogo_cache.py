@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from produtos.catalogo import estatisticas_cache, invalidar_catalogo, zerar_estatisticas
+
+
+class Command(BaseCommand):
+    help = 'Mostra os contadores de hit/miss do cache da vitrine e permite invalidá-lo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invalidar', action='store_true',
+                            help='Força a reconstrução do payload da home na próxima requisição.')
+        parser.add_argument('--zerar', action='store_true',
+                            help='Zera os contadores de hit/miss.')
+
+    def handle(self, *args, **options):
+        stats = estatisticas_cache()
+        self.stdout.write(
+            f"Hits: {stats['hits']} | Misses: {stats['misses']} | "
+            f"Taxa de acerto: {stats['taxa_acerto'] * 100:.1f}%"
+        )
+
+        if options['invalidar']:
+            invalidar_catalogo()
+            self.stdout.write(self.style.SUCCESS('Cache da vitrine invalidado.'))
+        if options['zerar']:
+            zerar_estatisticas()
+            self.stdout.write(self.style.SUCCESS('Contadores zerados.'))
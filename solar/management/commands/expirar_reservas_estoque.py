@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from produtos.checkout import expirar_reservas
+
+
+class Command(BaseCommand):
+    help = (
+        'Cancela pedidos pendentes cuja reserva de estoque venceu '
+        '(settings.CHECKOUT_RESERVA_MINUTOS) e devolve o estoque. Agende periodicamente (cron).'
+    )
+
+    def handle(self, *args, **options):
+        cancelados = expirar_reservas()
+        if not cancelados:
+            self.stdout.write(self.style.WARNING("Nenhuma reserva vencida."))
+            return
+        self.stdout.write(self.style.SUCCESS(f"{cancelados} pedido(s) cancelado(s) e estoque devolvido."))
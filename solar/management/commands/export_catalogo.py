@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from produtos.importacao import exportar_linhas, formato_do_nome
+from produtos.models import Produto
+
+
+class Command(BaseCommand):
+    help = 'Exporta o catálogo de produtos (com as imagens) em CSV ou JSONL, lendo o banco em blocos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--saida', default='-', help="Arquivo de saída ('-' = saída padrão).")
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], default=None, help='Padrão: pela extensão da saída.')
+        parser.add_argument('--apenas-ativos', action='store_true', help='Exporta só os produtos ativos.')
+
+    def handle(self, *args, **options):
+        saida = options['saida']
+        formato = options['formato'] or formato_do_nome(saida)
+        produtos = Produto.objects.filter(is_active=True) if options['apenas_ativos'] else Produto.objects.all()
+
+        if saida == '-':
+            for linha in exportar_linhas(formato, produtos):
+                self.stdout.write(linha, ending='')
+            return
+
+        total = 0
+        with open(saida, 'w', encoding='utf-8', newline='') as destino:
+            for linha in exportar_linhas(formato, produtos):
+                destino.write(linha)
+                total += 1
+        # No CSV a primeira linha é o cabeçalho
+        total -= 1 if formato == 'csv' else 0
+        self.stdout.write(self.style.SUCCESS(f"{total} produto(s) exportado(s) para {saida}."))
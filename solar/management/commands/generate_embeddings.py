@@ -1,62 +1,75 @@
-# em produtos/management/commands/generate_embeddings.py
+# em solar/management/commands/generate_embeddings.py
 
-import time
-import google.generativeai as genai
 from django.conf import settings
-from django.core.management.base import BaseCommand
-from django.db.models import Q
-from PIL import Image
+from django.core.management.base import BaseCommand, CommandError
 
-from produtos.models import ProdutoImage
+from produtos.embeddings import Checkpoint, PipelineEmbeddings, obter_provedor
 
-try:
-    genai.configure(api_key=settings.GEMINI_API_KEY)
-    GEMINI_CONFIGURED = True
-except AttributeError:
-    GEMINI_CONFIGURED = False
 
 class Command(BaseCommand):
-    help = 'Gera e salva os embeddings vetoriais para imagens de produtos usando a API do Gemini.'
+    help = (
+        'Gera e salva os embeddings vetoriais das imagens de produtos em paralelo, '
+        'com limite de requisições por segundo, retry com backoff e checkpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--provedor', default=None,
+                            help='Caminho da classe do provedor (padrão: settings.EMBEDDINGS_PROVEDOR). '
+                                 'Use produtos.embeddings.ProvedorFalso para rodar sem rede.')
+        parser.add_argument('--workers', type=int, default=settings.EMBEDDINGS_WORKERS,
+                            help='Requisições simultâneas ao provedor.')
+        parser.add_argument('--rps', type=float, default=settings.EMBEDDINGS_REQUISICOES_POR_SEGUNDO,
+                            help='Limite de requisições por segundo (0 = sem limite).')
+        parser.add_argument('--lote', type=int, default=100, help='Embeddings por gravação no banco.')
+        parser.add_argument('--tentativas', type=int, default=5, help='Tentativas por imagem em erros transitórios.')
+        parser.add_argument('--limite', type=int, default=None, help='Processa no máximo N imagens.')
+        parser.add_argument('--refazer', action='store_true',
+                            help='Regera também imagens com embedding de outro modelo.')
+        parser.add_argument('--reiniciar', action='store_true',
+                            help='Ignora o checkpoint e começa do primeiro id.')
+        parser.add_argument('--latencia-simulada', type=float, default=0.0,
+                            help='Apenas com o provedor falso: segundos de latência por requisição.')
 
     def handle(self, *args, **options):
-        if not GEMINI_CONFIGURED:
-            self.stdout.write(self.style.ERROR("ERRO: A variável GEMINI_API_KEY não foi configurada ou não foi lida corretamente de settings.py."))
-            return
-
-        self.stdout.write(self.style.SUCCESS("Iniciando a geração de embeddings com a API do Gemini..."))
-
-        images_to_process = ProdutoImage.objects.filter(Q(embedding__isnull=True) | Q(embedding__exact=''))
-
-        if not images_to_process.exists():
-            self.stdout.write(self.style.WARNING("Nenhuma imagem nova para processar."))
-            return
-
-        count = 0
-        total = images_to_process.count()
-
-        for produto_image in images_to_process:
-            try:
-                pil_image = Image.open(produto_image.image.path).convert("RGB")
-
-                response = genai.embed_content(
-                    model="models/embedding-001",
-                    content=pil_image,
-                    task_type="retrieval_document"
-                )
-
-                produto_image.embedding = response['embedding']
-                produto_image.save(update_fields=['embedding'])
-
-                count += 1
-                self.stdout.write(self.style.SUCCESS(f"({count}/{total}) Embedding gerado para: {produto_image.image.name}"))
-
-            except FileNotFoundError:
-                self.stdout.write(self.style.ERROR(f"ARQUIVO NÃO ENCONTRADO para a imagem ID {produto_image.id}: {produto_image.image.name}"))
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"Erro ao processar imagem ID {produto_image.id} com a API do Gemini: {e}"))
-                self.stdout.write(self.style.WARNING("Pausando por 5 segundos antes de tentar novamente..."))
-                time.sleep(5) 
-
-            time.sleep(1.1) 
-
-        self.stdout.write(self.style.SUCCESS(f"\nProcesso concluído! {count} embeddings foram gerados com sucesso."))
\ No newline at end of file
+        caminho = options['provedor'] or settings.EMBEDDINGS_PROVEDOR
+        opcoes_provedor = {}
+        if caminho.endswith('ProvedorFalso'):
+            opcoes_provedor['latencia'] = options['latencia_simulada']
+        elif not settings.GEMINI_API_KEY:
+            raise CommandError("A variável GEMINI_API_KEY não foi configurada ou não foi lida corretamente de settings.py.")
+
+        provedor = obter_provedor(caminho, **opcoes_provedor)
+
+        checkpoint = Checkpoint(settings.EMBEDDINGS_CHECKPOINT, provedor.modelo)
+        if options['reiniciar']:
+            checkpoint.apagar()
+        else:
+            checkpoint.carregar()
+            if checkpoint.ultimo_id:
+                self.stdout.write(f"Retomando a partir da imagem ID {checkpoint.ultimo_id} "
+                                  f"({len(checkpoint.falhas)} falhas anteriores serão tentadas de novo).")
+
+        pipeline = PipelineEmbeddings(
+            provedor,
+            workers=options['workers'],
+            requisicoes_por_segundo=options['rps'],
+            lote=options['lote'],
+            tentativas=options['tentativas'],
+            checkpoint=checkpoint,
+            refazer=options['refazer'],
+            limite=options['limite'],
+            progresso=self.stdout.write,
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Gerando embeddings ({provedor.modelo}) com {pipeline.workers} workers, "
+            f"até {options['rps'] or '∞'} req/s..."
+        ))
+        estatisticas = pipeline.executar()
+
+        segundos = estatisticas['segundos'] or 1e-9
+        self.stdout.write(self.style.SUCCESS(
+            f"\nProcesso concluído! {estatisticas['gravados']} embeddings gravados, "
+            f"{estatisticas['falhas']} falhas, em {estatisticas['segundos']:.1f}s "
+            f"({estatisticas['gravados'] / segundos:.1f} imagens/s)."
+        ))
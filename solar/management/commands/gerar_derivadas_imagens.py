@@ -0,0 +1,88 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from produtos.derivadas import gerar_ou_marcar, gravar, pendente
+from produtos.models import CarouselImage, ProdutoImage
+
+MODELOS = {'produtos': ProdutoImage, 'carrossel': CarouselImage}
+
+
+def _iniciar_worker():
+    # Com o método 'spawn' (macOS/Windows) o processo filho começa sem o Django
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera as variantes WebP/JPEG (produtos/derivadas.py) das imagens de produtos e do carrossel '
+        'que ainda não têm, decodificando as imagens num pool de processos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modelo', choices=[*MODELOS, 'todos'], default='todos',
+                            help='Quais imagens processar.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processos simultâneos (0 = no próprio processo).')
+        parser.add_argument('--refazer', action='store_true',
+                            help='Regera também as imagens que já têm variantes (ex.: após mudar IMAGENS_LARGURAS).')
+        parser.add_argument('--limite', type=int, default=None, help='Processa no máximo N imagens.')
+
+    def handle(self, *args, **options):
+        pendentes = []
+        for chave, Modelo in MODELOS.items():
+            if options['modelo'] not in (chave, 'todos'):
+                continue
+            for imagem in Modelo.objects.exclude(image='').only('id', 'image', 'derivadas').iterator(chunk_size=2000):
+                if options['refazer'] or pendente(imagem):
+                    pendentes.append((Modelo, imagem.pk, imagem.image.name, imagem.derivadas))
+        if options['limite'] is not None:
+            pendentes = pendentes[:options['limite']]
+
+        self.stdout.write(f"{len(pendentes)} imagens para processar com {options['workers']} workers...")
+        inicio = time.monotonic()
+        gravadas = ilegiveis = 0
+        for (Modelo, pk, nome, anteriores), derivadas in self._gerar(pendentes, options['workers']):
+            if gravar(Modelo, pk, nome, derivadas, anteriores=anteriores) is None:
+                continue
+            if 'jpeg' in derivadas:
+                gravadas += 1
+            else:
+                ilegiveis += 1
+            if (gravadas + ilegiveis) % 100 == 0:
+                self.stdout.write(f"  {gravadas + ilegiveis}/{len(pendentes)}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Concluído: {gravadas} imagens com variantes, {ilegiveis} ilegíveis, "
+            f"em {time.monotonic() - inicio:.1f}s."
+        ))
+
+    def _gerar(self, pendentes, workers):
+        """Gera (item, derivadas) na ordem em que os workers terminam."""
+        if workers <= 0:
+            for item in pendentes:
+                yield item, gerar_ou_marcar(item[2])
+            return
+
+        # O fork não pode herdar conexões abertas com o banco
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_worker) as pool:
+            # Janela limitada: não enfileira o acervo inteiro de uma vez
+            em_andamento = {}
+            fila = iter(pendentes)
+            for item in fila:
+                em_andamento[pool.submit(gerar_ou_marcar, item[2])] = item
+                if len(em_andamento) >= workers * 4:
+                    break
+            while em_andamento:
+                prontos, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    item = em_andamento.pop(futuro)
+                    yield item, futuro.result()
+                    proximo = next(fila, None)
+                    if proximo is not None:
+                        em_andamento[pool.submit(gerar_ou_marcar, proximo[2])] = proximo
@@ -0,0 +1,59 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from produtos.importacao import ArquivoInvalido, formato_do_nome, importar, processar_importacao
+from produtos.models import ImportacaoCatalogo
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa produtos de um CSV/JSONL com upsert por SKU, em lotes. '
+        'Com --pendentes, processa as importações enviadas pelo CRM que ficaram na fila.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', nargs='?', help="Arquivo CSV ou JSONL ('-' lê da entrada padrão).")
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], default=None, help='Padrão: pela extensão do arquivo.')
+        parser.add_argument('--imagens', default=None, help="Diretório ou .zip com os arquivos da coluna 'imagens'.")
+        parser.add_argument('--relatorio', default=None, help='Grava as linhas com erro neste CSV.')
+        parser.add_argument('--lote', type=int, default=None, help='Linhas por upsert (padrão: CATALOGO_IMPORTACAO_LOTE).')
+        parser.add_argument('--pendentes', action='store_true', help='Processa as importações pendentes do CRM.')
+
+    def handle(self, *args, **options):
+        if options['pendentes']:
+            return self._processar_pendentes()
+        if not options['arquivo']:
+            raise CommandError("Informe o arquivo a importar ou use --pendentes.")
+
+        caminho = options['arquivo']
+        formato = options['formato'] or formato_do_nome(caminho)
+        relatorio = open(options['relatorio'], 'w', encoding='utf-8', newline='') if options['relatorio'] else None
+        inicio = time.perf_counter()
+        try:
+            arquivo = sys.stdin.buffer if caminho == '-' else open(caminho, 'rb')
+            with arquivo:
+                resumo = importar(arquivo, formato, imagens=options['imagens'], relatorio=relatorio, lote=options['lote'])
+        except (OSError, ArquivoInvalido) as e:
+            raise CommandError(str(e))
+        finally:
+            if relatorio is not None:
+                relatorio.close()
+
+        duracao = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumo['linhas']} linha(s) em {duracao:.1f}s: {resumo['criados']} criado(s), "
+            f"{resumo['atualizados']} atualizado(s), {resumo['imagens']} imagem(ns) anexada(s)."
+        ))
+        if resumo['erros']:
+            destino = f" (ver {options['relatorio']})" if options['relatorio'] else ''
+            self.stdout.write(self.style.WARNING(f"{resumo['erros']} linha(s) com erro{destino}."))
+
+    def _processar_pendentes(self):
+        ids = list(ImportacaoCatalogo.objects.filter(status='pendente').order_by('id').values_list('id', flat=True))
+        if not ids:
+            self.stdout.write(self.style.WARNING("Nenhuma importação pendente."))
+            return
+        for importacao_id in ids:
+            self.stdout.write(f"Importação {importacao_id}: {processar_importacao(importacao_id)}")
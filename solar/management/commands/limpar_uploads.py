@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from solar.uploads import limpar_expirados
+
+
+class Command(BaseCommand):
+    help = 'Apaga os uploads em partes parados (solar/uploads.py) e os seus arquivos temporários.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=int, default=settings.UPLOADS_EXPIRACAO_HORAS,
+                            help='Idade mínima, em horas sem receber partes, para apagar.')
+
+    def handle(self, *args, **options):
+        total = limpar_expirados(options['horas'])
+        self.stdout.write(self.style.SUCCESS(f"{total} uploads incompletos apagados."))
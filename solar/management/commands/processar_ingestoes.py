@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from produtos.ingestao import processar_ingestao
+from produtos.models import IngestaoProdutos
+
+
+class Command(BaseCommand):
+    help = (
+        'Processa ingestões de produtos por IA com imagens pendentes. '
+        'Use após reiniciar o servidor, já que as tarefas em segundo plano não sobrevivem ao processo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ingestao', type=int, default=None, help='Processa apenas a ingestão com este id.')
+        parser.add_argument(
+            '--retomar', action='store_true',
+            help="Devolve à fila as ingestões que ficaram 'processando' porque o processo morreu. "
+                 "Não use com o servidor analisando ingestões.",
+        )
+
+    def handle(self, *args, **options):
+        ingestoes = IngestaoProdutos.objects.filter(imagens__status='pendente').distinct().order_by('id')
+        if options['ingestao']:
+            ingestoes = ingestoes.filter(id=options['ingestao'])
+
+        if options['retomar']:
+            interrompidas = IngestaoProdutos.objects.filter(
+                id__in=ingestoes.filter(status='processando').values('id'),
+            ).update(status='pendente')
+            if interrompidas:
+                self.stdout.write(f"{interrompidas} ingestão(ões) interrompida(s) devolvida(s) à fila.")
+
+        ids = list(ingestoes.filter(status='pendente').values_list('id', flat=True))
+        if not ids:
+            self.stdout.write(self.style.WARNING("Nenhuma ingestão com imagens pendentes."))
+            return
+
+        processadas = 0
+        for ingestao_id in ids:
+            self.stdout.write(f"Processando ingestão {ingestao_id}...")
+            status = processar_ingestao(ingestao_id)
+            if status is None:
+                self.stdout.write(f"Ingestão {ingestao_id} já reservada por outro processo.")
+                continue
+            processadas += 1
+            if status == 'falhou':
+                self.stdout.write(self.style.ERROR(f"Ingestão {ingestao_id} falhou."))
+        self.stdout.write(self.style.SUCCESS(f"{processadas} ingestão(ões) processada(s)."))
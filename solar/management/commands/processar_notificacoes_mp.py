@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from mp_integracao.notificacoes import processar_pendentes
+
+
+class Command(BaseCommand):
+    help = (
+        'Processa notificações do Mercado Pago pendentes ou com erro. '
+        'Use após reiniciar o servidor, já que as tarefas em segundo plano não sobrevivem ao processo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tentativas', type=int, default=5, help='Desiste de notificações com este número de tentativas.')
+        parser.add_argument(
+            '--expirar-minutos', type=int, default=10,
+            help="Considera interrompidas as notificações em 'processando' há mais que isso.",
+        )
+
+    def handle(self, *args, **options):
+        contagem = processar_pendentes(
+            max_tentativas=options['tentativas'],
+            expirar_apos=timedelta(minutes=options['expirar_minutos']),
+        )
+        if not contagem:
+            self.stdout.write(self.style.WARNING("Nenhuma notificação pendente."))
+            return
+        resumo = ', '.join(f"{quantidade} {status}" for status, quantidade in sorted(contagem.items()))
+        self.stdout.write(self.style.SUCCESS(f"Notificações: {resumo}."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from produtos.similaridade import marcar_indice_desatualizado, obter_indice
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói do zero o índice de similaridade visual (matriz de embeddings em SIMILARIDADE_INDICE_DIR).'
+
+    def handle(self, *args, **options):
+        indice = obter_indice()
+        total = indice.reconstruir()
+        # Faz os workers em execução recarregarem a nova geração
+        marcar_indice_desatualizado()
+        self.stdout.write(self.style.SUCCESS(
+            f"Índice de similaridade reconstruído com {total} vetores ({indice.modelo}) em {indice.diretorio}."
+        ))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from solar.resumo_financeiro import reconstruir
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula o resumo financeiro diário (ResumoFinanceiroDiario) a partir de todos os lançamentos. '
+        'Necessário após alterações em massa que não disparam signals (queryset.update, bulk_create, loaddata).'
+    )
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        linhas = reconstruir()
+        self.stdout.write(self.style.SUCCESS(
+            f"Resumo financeiro reconstruído: {linhas} linha(s) em {time.monotonic() - inicio:.2f}s."
+        ))
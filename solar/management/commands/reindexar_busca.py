@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from produtos.busca import obter_backend_busca
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice de busca textual de produtos (tsvector/GIN no PostgreSQL, FTS5 no SQLite).'
+
+    def handle(self, *args, **options):
+        backend = obter_backend_busca()
+        self.stdout.write(f"Backend de busca: {backend.nome}")
+        mensagem = backend.reindexar()
+        self.stdout.write(self.style.SUCCESS(mensagem))
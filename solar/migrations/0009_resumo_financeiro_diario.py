@@ -0,0 +1,56 @@
+# Generated by Django 5.2.2 on 2026-10-18 09:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def preencher_resumo(apps, schema_editor):
+    LancamentoFinanceiro = apps.get_model('solar', 'LancamentoFinanceiro')
+    ResumoFinanceiroDiario = apps.get_model('solar', 'ResumoFinanceiroDiario')
+
+    agregados = (
+        LancamentoFinanceiro.objects
+        .values('data', 'projeto_id', 'tipo', 'status')
+        .annotate(soma=Sum('valor'), contagem=Count('id'))
+        .order_by()
+    )
+    ResumoFinanceiroDiario.objects.bulk_create(
+        [
+            ResumoFinanceiroDiario(
+                data=linha['data'], projeto_id=linha['projeto_id'], tipo=linha['tipo'],
+                status=linha['status'], total=linha['soma'], quantidade=linha['contagem'],
+            )
+            for linha in agregados
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solar', '0008_alter_cliente_cpf'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoFinanceiroDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('tipo', models.CharField(choices=[('recebimento', 'Recebimento'), ('pagamento', 'Pagamento')], max_length=20)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('pago', 'Pago'), ('atrasado', 'Atrasado'), ('cancelado', 'Cancelado')], max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('quantidade', models.IntegerField(default=0)),
+                ('projeto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='solar.projeto')),
+            ],
+            options={
+                'verbose_name': 'Resumo Financeiro Diário',
+                'verbose_name_plural': 'Resumos Financeiros Diários',
+                'indexes': [models.Index(fields=['tipo', 'status', 'data'], name='resumo_fin_tipo_status_data')],
+                'constraints': [models.UniqueConstraint(fields=('data', 'projeto', 'tipo', 'status'), name='resumo_financeiro_diario_unico')],
+            },
+        ),
+        migrations.RunPython(preencher_resumo, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.2 on 2026-10-18 10:16
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solar', '0010_indices_listas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadEmPartes',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('destino', models.CharField(choices=[('documento_projeto', 'Documento de Projeto'), ('imagem_produto', 'Imagem de Produto')], max_length=30, verbose_name='Destino')),
+                ('destino_id', models.PositiveIntegerField(verbose_name='ID do Destino')),
+                ('nome_arquivo', models.CharField(max_length=255, verbose_name='Nome do Arquivo')),
+                ('tamanho', models.BigIntegerField(verbose_name='Tamanho (bytes)')),
+                ('tamanho_parte', models.PositiveIntegerField(verbose_name='Tamanho da Parte (bytes)')),
+                ('sha256', models.CharField(blank=True, max_length=64, verbose_name='SHA-256')),
+                ('metadados', models.JSONField(blank=True, default=dict)),
+                ('partes_recebidas', models.JSONField(blank=True, default=list)),
+                ('status', models.CharField(choices=[('recebendo', 'Recebendo'), ('concluido', 'Concluído'), ('cancelado', 'Cancelado')], default='recebendo', max_length=20)),
+                ('resultado_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='ID do Registro Criado')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True, db_index=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads_em_partes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Upload em Partes',
+                'verbose_name_plural': 'Uploads em Partes',
+            },
+        ),
+    ]
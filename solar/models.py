@@ -1,4 +1,6 @@
+import os
 import re
+import uuid
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import AbstractUser, Group, Permission
@@ -78,6 +80,13 @@ class Cliente(models.Model):
     possui_whatsapp = models.BooleanField(default=False)
     data_cadastro = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Chaves da paginação por cursor da lista (solar/listagem.py)
+        indexes = [
+            models.Index(fields=['nome', 'id'], name='cliente_nome_id_idx'),
+            models.Index(fields=['data_cadastro', 'id'], name='cliente_cadastro_id_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         
         super().save(*args, **kwargs)
@@ -118,6 +127,12 @@ class Projeto(models.Model):
     forma_pagamento = models.CharField('Forma de Pagamento', max_length=100, blank=True, null=True)
     observacoes = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['data_inicio', 'id'], name='projeto_inicio_id_idx'),
+            models.Index(fields=['nome', 'id'], name='projeto_nome_id_idx'),
+        ]
+
     def __str__(self):
         return self.nome
 
@@ -132,7 +147,67 @@ class DocumentoProjeto(models.Model):
 
     def __str__(self):
         return f'{self.nome} ({self.projeto.nome})'
-    
+
+
+class UploadEmPartes(models.Model):
+    """
+    Arquivo enviado em partes pela API de solar/uploads.py. As partes são
+    gravadas num arquivo temporário em settings.UPLOADS_DIR e, ao concluir,
+    o arquivo montado vira um DocumentoProjeto ou uma ProdutoImage.
+    """
+    DESTINO_CHOICES = [
+        ('documento_projeto', 'Documento de Projeto'),
+        ('imagem_produto', 'Imagem de Produto'),
+    ]
+    STATUS_CHOICES = [
+        ('recebendo', 'Recebendo'),
+        ('concluido', 'Concluído'),
+        ('cancelado', 'Cancelado'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='uploads_em_partes')
+    destino = models.CharField('Destino', max_length=30, choices=DESTINO_CHOICES)
+    # Projeto (documento_projeto) ou Produto (imagem_produto)
+    destino_id = models.PositiveIntegerField('ID do Destino')
+    nome_arquivo = models.CharField('Nome do Arquivo', max_length=255)
+    tamanho = models.BigIntegerField('Tamanho (bytes)')
+    tamanho_parte = models.PositiveIntegerField('Tamanho da Parte (bytes)')
+    # SHA-256 do arquivo inteiro, conferido ao concluir (opcional)
+    sha256 = models.CharField('SHA-256', max_length=64, blank=True)
+    # Campos do registro criado ao concluir (nome, visivel_cliente, alt_text, is_main)
+    metadados = models.JSONField(default=dict, blank=True)
+    partes_recebidas = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='recebendo')
+    resultado_id = models.PositiveIntegerField('ID do Registro Criado', null=True, blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Upload em Partes'
+        verbose_name_plural = 'Uploads em Partes'
+
+    def __str__(self):
+        return f'{self.nome_arquivo} ({self.get_status_display()})'
+
+    @property
+    def total_partes(self):
+        return max(1, -(-self.tamanho // self.tamanho_parte))
+
+    def tamanho_da_parte(self, indice):
+        """Bytes esperados na parte `indice` (a última pode ser menor)."""
+        return min(self.tamanho_parte, self.tamanho - indice * self.tamanho_parte)
+
+    @property
+    def partes_faltando(self):
+        recebidas = set(self.partes_recebidas)
+        return [indice for indice in range(self.total_partes) if indice not in recebidas]
+
+    @property
+    def caminho_temporario(self):
+        return os.path.join(settings.UPLOADS_DIR, f'{self.id}.parte')
+
+
 class Etapa(models.Model):
     projeto = models.ForeignKey(Projeto, on_delete=models.CASCADE, related_name='etapas')
     nome = models.CharField(max_length=100)
@@ -167,6 +242,11 @@ class Material(models.Model):
     fornecedor = models.ForeignKey('Fornecedor', on_delete=models.SET_NULL, null=True, blank=True)
     peso = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['nome', 'id'], name='material_nome_id_idx'),
+        ]
+
     def __str__(self):
         return self.nome
 
@@ -177,6 +257,11 @@ class Fornecedor(models.Model):
     email = models.EmailField(blank=True)
     endereco = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['nome', 'id'], name='fornecedor_nome_id_idx'),
+        ]
+
     def __str__(self):
         return self.nome
 
@@ -199,12 +284,45 @@ class LancamentoFinanceiro(models.Model):
     data = models.DateField()
     status = models.CharField(max_length=20, choices=STATUS)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['data', 'id'], name='lancamento_data_id_idx'),
+        ]
+
     def __str__(self):
         return f'{self.tipo.title()} - {self.valor} ({self.projeto.nome})'
 
 
 
 
+class ResumoFinanceiroDiario(models.Model):
+    """
+    Rollup de LancamentoFinanceiro por dia x projeto x tipo x status, mantido
+    incrementalmente pelos signals (solar/resumo_financeiro.py) e usado pelo
+    dashboard financeiro. Reconstrua com `manage.py reconstruir_resumo_financeiro`
+    após alterações em massa (queryset.update, bulk_create) que não disparam signals.
+    """
+    data = models.DateField()
+    projeto = models.ForeignKey(Projeto, on_delete=models.CASCADE, related_name='+')
+    tipo = models.CharField(max_length=20, choices=LancamentoFinanceiro.TIPOS)
+    status = models.CharField(max_length=20, choices=LancamentoFinanceiro.STATUS)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantidade = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Resumo Financeiro Diário"
+        verbose_name_plural = "Resumos Financeiros Diários"
+        constraints = [
+            models.UniqueConstraint(fields=['data', 'projeto', 'tipo', 'status'], name='resumo_financeiro_diario_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['tipo', 'status', 'data'], name='resumo_fin_tipo_status_data'),
+        ]
+
+    def __str__(self):
+        return f'{self.data} {self.projeto_id} {self.tipo}/{self.status}: {self.total} ({self.quantidade})'
+
+
 class Financeiro(models.Model):
     projeto = models.ForeignKey(Projeto, on_delete=models.CASCADE)
     valor = models.DecimalField(max_digits=10, decimal_places=2)
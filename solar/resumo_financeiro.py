@@ -0,0 +1,72 @@
+# solar/resumo_financeiro.py
+"""
+Manutenção do rollup ResumoFinanceiroDiario.
+
+Cada save/delete de LancamentoFinanceiro vira um delta (valor, quantidade)
+aplicado com F() na linha (data, projeto, tipo, status) correspondente. O
+dashboard financeiro soma poucas linhas por dia em vez de varrer todos os
+lançamentos.
+
+Os deltas de um mesmo save (sair da chave antiga e entrar na nova) rodam num
+transaction.atomic() próprio, e o delete já roda na transação do Django. Já o
+save, em autocommit, grava o lançamento antes do post_save: se o delta falhar
+depois disso, o lançamento fica gravado e o rollup, defasado. Nesse caso rode
+`manage.py reconstruir_resumo_financeiro` para recalcular tudo. Quem grava
+lançamentos dentro de um transaction.atomic() não tem esse problema.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .models import LancamentoFinanceiro, ResumoFinanceiroDiario
+
+CAMPOS_CHAVE = ('data', 'projeto_id', 'tipo', 'status')
+
+
+def chave_do_lancamento(lancamento):
+    return tuple(getattr(lancamento, campo) for campo in CAMPOS_CHAVE)
+
+
+def aplicar_delta(chave, valor, quantidade):
+    """Soma (valor, quantidade) à linha da chave, criando-a se necessário."""
+    filtro = dict(zip(CAMPOS_CHAVE, chave))
+    atualizadas = ResumoFinanceiroDiario.objects.filter(**filtro).update(
+        total=F('total') + valor,
+        quantidade=F('quantidade') + quantidade,
+    )
+    if quantidade < 0 and atualizadas:
+        ResumoFinanceiroDiario.objects.filter(**filtro, quantidade__lte=0).delete()
+    if atualizadas or quantidade <= 0:
+        # Remoções e ajustes de valor só afetam linhas existentes (a linha pode
+        # já ter sumido junto com o projeto, no delete em cascata)
+        return
+
+    try:
+        with transaction.atomic():
+            ResumoFinanceiroDiario.objects.create(**filtro, total=valor, quantidade=quantidade)
+    except IntegrityError:
+        # Outra transação criou a linha entre o update e o create
+        ResumoFinanceiroDiario.objects.filter(**filtro).update(
+            total=F('total') + valor,
+            quantidade=F('quantidade') + quantidade,
+        )
+
+
+def reconstruir(tamanho_lote=1000):
+    """Recalcula o rollup inteiro a partir dos lançamentos. Retorna o número de linhas."""
+    agregados = (
+        LancamentoFinanceiro.objects
+        .values(*CAMPOS_CHAVE)
+        .annotate(soma=Sum('valor'), contagem=Count('id'))
+        .order_by()
+    )
+    linhas = (
+        ResumoFinanceiroDiario(
+            data=linha['data'], projeto_id=linha['projeto_id'], tipo=linha['tipo'],
+            status=linha['status'], total=linha['soma'], quantidade=linha['contagem'],
+        )
+        for linha in agregados.iterator(chunk_size=tamanho_lote)
+    )
+    with transaction.atomic():
+        ResumoFinanceiroDiario.objects.all().delete()
+        criadas = ResumoFinanceiroDiario.objects.bulk_create(linhas, batch_size=tamanho_lote)
+    return len(criadas)
@@ -0,0 +1,45 @@
+# solar/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import LancamentoFinanceiro
+from .resumo_financeiro import aplicar_delta, chave_do_lancamento
+
+
+@receiver(pre_save, sender=LancamentoFinanceiro)
+def guardar_lancamento_anterior(sender, instance, raw=False, **kwargs):
+    # Valores gravados antes da edição, para desfazer a contribuição antiga no rollup
+    instance._resumo_anterior = None
+    if raw or instance.pk is None:
+        return
+    anterior = (
+        LancamentoFinanceiro.objects.filter(pk=instance.pk)
+        .values_list('data', 'projeto_id', 'tipo', 'status', 'valor')
+        .first()
+    )
+    if anterior is not None:
+        instance._resumo_anterior = (anterior[:4], anterior[4])
+
+
+@receiver(post_save, sender=LancamentoFinanceiro)
+def atualizar_resumo_financeiro(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_resumo_anterior', None)
+    chave = chave_do_lancamento(instance)
+    # Os dois deltas de uma troca de chave entram juntos ou nenhum entra
+    with transaction.atomic():
+        if anterior is not None:
+            chave_anterior, valor_anterior = anterior
+            if chave_anterior == chave:
+                if valor_anterior != instance.valor:
+                    aplicar_delta(chave, instance.valor - valor_anterior, 0)
+                return
+            aplicar_delta(chave_anterior, -valor_anterior, -1)
+        aplicar_delta(chave, instance.valor, 1)
+
+
+@receiver(post_delete, sender=LancamentoFinanceiro)
+def remover_do_resumo_financeiro(sender, instance, **kwargs):
+    aplicar_delta(chave_do_lancamento(instance), -instance.valor, -1)
@@ -0,0 +1,180 @@
+// solar/static/solar/js/upload_em_partes.js
+// Cliente da API de upload em partes (solar/uploads.py).
+//
+// Em formulários, marque o campo de arquivo:
+//   <input type="file" data-upload-em-partes data-destino="imagem_produto" data-destino-id="12"
+//          data-metadados-campos="nome,visivel_cliente" data-apos-concluir="/crm/projetos/3/">
+// No submit, cada arquivo do campo é enviado em partes, com checksum por parte
+// e retomada (inclusive depois de recarregar a página). Depois o campo é
+// esvaziado e o formulário segue normalmente ou, com data-apos-concluir, a
+// página vai para essa URL. Um arquivo que falhar não desfaz os já enviados.
+(function () {
+    'use strict';
+
+    const URL_BASE = document.currentScript.dataset.url;
+    const TENTATIVAS = 5;
+    const enviados = new WeakSet();
+
+    function espera(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    async function requisicao(url, token, opcoes) {
+        const resposta = await fetch(url, Object.assign({credentials: 'same-origin'}, opcoes, {
+            headers: Object.assign({'X-CSRFToken': token}, opcoes.headers || {}),
+        }));
+        const dados = await resposta.json().catch(() => ({}));
+        if (!resposta.ok) {
+            const erro = new Error(dados.erro || resposta.statusText);
+            erro.status = resposta.status;
+            throw erro;
+        }
+        return dados;
+    }
+
+    async function comRetentativas(funcao) {
+        for (let tentativa = 1; ; tentativa++) {
+            try {
+                return await funcao();
+            } catch (erro) {
+                // Erros 4xx não melhoram com nova tentativa, exceto parte corrompida
+                // no caminho (422), timeout (408) e limite de taxa (429)
+                const definitivo = erro.status && erro.status < 500 && ![408, 422, 429].includes(erro.status);
+                if (definitivo || tentativa >= TENTATIVAS) {
+                    throw erro;
+                }
+                await espera(Math.min(30000, 1000 * 2 ** tentativa));
+            }
+        }
+    }
+
+    async function sha256(blob) {
+        // crypto.subtle só existe em HTTPS (ou localhost); sem ele a parte vai sem checksum
+        if (!window.crypto || !window.crypto.subtle) {
+            return '';
+        }
+        const hash = await window.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+        return Array.from(new Uint8Array(hash), byte => byte.toString(16).padStart(2, '0')).join('');
+    }
+
+    async function enviarEmPartes(arquivo, opcoes) {
+        const token = opcoes.token;
+        const chave = ['upload-em-partes', opcoes.destino, opcoes.destinoId, arquivo.name, arquivo.size, arquivo.lastModified].join(':');
+
+        // Retoma o envio interrompido do mesmo arquivo, se ainda existir no servidor
+        let upload = null;
+        const salvo = window.localStorage.getItem(chave);
+        if (salvo) {
+            upload = await requisicao(URL_BASE + salvo + '/', token, {method: 'GET'}).catch(() => null);
+            if (upload && upload.status !== 'recebendo') {
+                upload = null;
+            }
+        }
+        if (!upload) {
+            upload = await comRetentativas(() => requisicao(URL_BASE, token, {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({
+                    nome: arquivo.name,
+                    tamanho: arquivo.size,
+                    destino: opcoes.destino,
+                    destino_id: opcoes.destinoId,
+                    metadados: opcoes.metadados || {},
+                }),
+            }));
+            window.localStorage.setItem(chave, upload.id);
+        }
+
+        const url = URL_BASE + upload.id + '/';
+        let recebidas = upload.partes_recebidas.length;
+        for (const indice of upload.partes_faltando) {
+            const parte = arquivo.slice(indice * upload.tamanho_parte, (indice + 1) * upload.tamanho_parte);
+            const checksum = await sha256(parte);
+            await comRetentativas(() => requisicao(url + 'partes/' + indice + '/', token, {
+                method: 'PUT',
+                body: parte,
+                headers: Object.assign({'Content-Type': 'application/octet-stream'}, checksum ? {'X-Checksum-SHA256': checksum} : {}),
+            }));
+            recebidas += 1;
+            if (opcoes.progresso) {
+                opcoes.progresso(recebidas / upload.total_partes);
+            }
+        }
+
+        const final = await comRetentativas(() => requisicao(url + 'concluir/', token, {method: 'POST'}));
+        window.localStorage.removeItem(chave);
+        return final;
+    }
+
+    function metadadosDoFormulario(form, campos) {
+        const metadados = {};
+        (campos || '').split(',').filter(Boolean).forEach(function (nome) {
+            const elemento = form.elements[nome];
+            if (elemento) {
+                metadados[nome] = elemento.type === 'checkbox' ? elemento.checked : elemento.value;
+            }
+        });
+        return metadados;
+    }
+
+    function ligarCampo(campo) {
+        const form = campo.form;
+        const barra = document.createElement('div');
+        barra.className = 'progress my-2 d-none';
+        barra.innerHTML = '<div class="progress-bar" role="progressbar" style="width: 0%"></div>';
+        const aviso = document.createElement('div');
+        aviso.className = 'text-danger small';
+        campo.insertAdjacentElement('afterend', aviso);
+        campo.insertAdjacentElement('afterend', barra);
+
+        form.addEventListener('submit', async function (evento) {
+            const arquivos = Array.from(campo.files).filter(arquivo => !enviados.has(arquivo));
+            if (!arquivos.length) {
+                return;
+            }
+            evento.preventDefault();
+            const botoes = form.querySelectorAll('[type=submit]');
+            botoes.forEach(botao => botao.disabled = true);
+            barra.classList.remove('d-none');
+            aviso.textContent = '';
+
+            const token = form.elements.csrfmiddlewaretoken.value;
+            const metadados = metadadosDoFormulario(form, campo.dataset.metadadosCampos);
+            let atual = '';
+            try {
+                for (const [posicao, arquivo] of arquivos.entries()) {
+                    atual = arquivo.name;
+                    await enviarEmPartes(arquivo, {
+                        token: token,
+                        destino: campo.dataset.destino,
+                        destinoId: campo.dataset.destinoId,
+                        metadados: metadados,
+                        progresso: fracao => {
+                            barra.firstChild.style.width = ((posicao + fracao) / arquivos.length * 100).toFixed(1) + '%';
+                        },
+                    });
+                    enviados.add(arquivo);
+                }
+            } catch (erro) {
+                aviso.textContent = 'Falha ao enviar "' + atual + '": ' + erro.message +
+                    '. Os arquivos já enviados foram salvos; envie novamente para continuar.';
+                botoes.forEach(botao => botao.disabled = false);
+                return;
+            }
+
+            if (campo.dataset.aposConcluir) {
+                window.location.href = campo.dataset.aposConcluir;
+                return;
+            }
+            // Os arquivos já estão no servidor: o formulário segue só com os outros campos
+            campo.value = '';
+            campo.required = false;
+            form.submit();
+        });
+    }
+
+    window.enviarEmPartes = enviarEmPartes;
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('input[type=file][data-upload-em-partes]').forEach(ligarCampo);
+    });
+})();
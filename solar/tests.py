@@ -1,3 +1,1615 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.models import Count, Sum
+from django.http import QueryDict
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from energia_solar import clientes
+from energia_solar.http_async import cliente_http
+from energia_solar.instrumentacao import OrcamentoExcedido
+from produtos import services, versoes
+from produtos.busca import BuscaSQLiteFTS
+from produtos.cache_ia import CacheAnaliseSQLite
+from produtos.carrinho import Carrinho
+from produtos.catalogo import obter_payload_home
+from produtos.checkout import EstoqueInsuficiente, criar_pedido, expirar_reservas, liberar_reserva
+from produtos.derivadas import pendente
+from produtos.embeddings import Checkpoint, PipelineEmbeddings, ProvedorFalso, com_retry
+from produtos.frete import IndiceFrete, cotar_frete, invalidar_indice_frete
+from produtos.imagens import fontes_responsivas
+from produtos.importacao import exportar_linhas, importar
+from produtos.ingestao import criar_ingestao, processar_ingestao, reprocessar_falhas
+from produtos.models import CarouselImage, ImportacaoCatalogo, IngestaoProdutos, Item, Pedido, Produto, ProdutoImage, \
+    ProdutoImageEmbedding, RegiaoFrete, VersaoCache
+from produtos.similaridade import IndiceSimilaridade, marcar_indice_desatualizado
+from produtos.slugs import alocar_slug, criar_em_lote
+
+from .exportacao import EXPORTACOES
+from .listagem import codificar_cursor, contar, paginar
+from .models import Cliente, DocumentoProjeto, Etapa, LancamentoFinanceiro, Projeto, ResumoFinanceiroDiario, UploadEmPartes, \
+    Usuario
+from .resumo_financeiro import aplicar_delta, reconstruir as reconstruir_resumo
+
+
+# ------------------------------------------------------------------
+# INSTRUMENTAÇÃO E ORÇAMENTOS DE QUERIES
+# ------------------------------------------------------------------
+class InstrumentacaoMiddlewareTests(TestCase):
+
+    def test_server_timing_no_cabecalho(self):
+        with self.assertLogs('energia_solar.instrumentacao', level='INFO') as logs:
+            response = self.client.get(reverse('produtos:home'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=[\d.]+$')
+        self.assertIn('"view": "produtos.views.home"', logs.output[0])
+
+    def test_linha_por_requisicao_desligada_por_padrao(self):
+        # INSTRUMENTACAO_LOG_NIVEL padrão (WARNING): só o cabeçalho
+        with mock.patch('energia_solar.instrumentacao.logger.info') as info:
+            response = self.client.get(reverse('produtos:home'))
+        info.assert_not_called()
+        self.assertIn('Server-Timing', response)
+
+    @override_settings(INSTRUMENTACAO_ESTRITA=True, INSTRUMENTACAO_ORCAMENTOS={'produtos:home': {'total_ms': 0}})
+    def test_orcamento_estourado_falha_em_modo_estrito(self):
+        with self.assertLogs('energia_solar.instrumentacao'), self.assertRaises(OrcamentoExcedido):
+            self.client.get(reverse('produtos:home'))
+
+    @override_settings(INSTRUMENTACAO_ESTRITA=False, INSTRUMENTACAO_ORCAMENTOS={'produtos.views.home': {'total_ms': 0}})
+    def test_orcamento_estourado_gera_warning_fora_do_modo_estrito(self):
+        with self.assertLogs('energia_solar.instrumentacao', level='WARNING') as logs:
+            response = self.client.get(reverse('produtos:home'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any('Orçamento excedido' in linha for linha in logs.output))
+
+
+@override_settings(INSTRUMENTACAO_ESTRITA=True)
+class OrcamentoViewsTests(TestCase):
+    """
+    Roda as views com os orçamentos de settings.INSTRUMENTACAO_ORCAMENTOS em
+    modo estrito: um N+1 novo faz estes testes falharem com OrcamentoExcedido.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user('cliente', 'cliente@example.com', 'senha', is_customer=True)
+        cliente = Cliente.objects.create(usuario=cls.usuario, nome='Cliente', email='cliente@example.com', telefone='1')
+        for i in range(5):
+            projeto = Projeto.objects.create(nome=f'Projeto {i}', data_inicio=date(2025, 1, i + 1), cliente=cliente)
+            for j in range(3):
+                Etapa.objects.create(
+                    projeto=projeto, nome=f'Etapa {j}', data_inicio=date(2025, 1, j + 1),
+                    data_fim=date(2025, 2, 1) if j == 0 else None,
+                )
+            LancamentoFinanceiro.objects.create(projeto=projeto, tipo='recebimento', descricao='Entrada', valor=Decimal('100'), data=date(2025, 1, 1), status='pago')
+            LancamentoFinanceiro.objects.create(projeto=projeto, tipo='recebimento', descricao='Parcela', valor=Decimal('50'), data=date(2025, 2, 1), status='pendente')
+
+        cls.produtos = [
+            Produto.objects.create(name=f'Painel {i}', preco=Decimal('100.00'), stock=10, sku=f'PNL-{i}')
+            for i in range(5)
+        ]
+
+    def test_cliente_dashboard(self):
+        self.client.force_login(self.usuario)
+        with self.assertLogs('energia_solar.instrumentacao'):
+            response = self.client.get(reverse('crm:cliente_dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_ver_carrinho(self):
+        for produto in self.produtos:
+            self.client.get(reverse('produtos:adicionar_ao_carrinho', args=[produto.id]))
+
+        with self.assertLogs('energia_solar.instrumentacao'):
+            response = self.client.get(reverse('produtos:ver_carrinho'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['itens_carrinho']), 5)
+
+
+# ------------------------------------------------------------------
+# CLIENTES EXTERNOS SOB DEMANDA
+# ------------------------------------------------------------------
+class ClientesExternosTests(TestCase):
+
+    def test_boot_e_urls_nao_importam_os_sdks(self):
+        codigo = (
+            "import django, sys; django.setup(); "
+            "from django.urls import get_resolver; get_resolver().url_patterns; "
+            "print(','.join(m for m in ('google.generativeai', 'grpc', 'stripe') if m in sys.modules))"
+        )
+        processo = subprocess.run(
+            [sys.executable, '-c', codigo], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            env=dict(os.environ, DJANGO_SETTINGS_MODULE='energia_solar.settings'),
+        )
+        self.assertEqual(processo.stdout.strip(), '')
+
+    def test_cliente_criado_uma_vez_e_recriado_ao_mudar_settings(self):
+        with override_settings(STRIPE_SECRET_KEY='sk_test_a'):
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                instancias = set(map(id, executor.map(lambda _: clientes.stripe(), range(16))))
+            self.assertEqual(len(instancias), 1)
+            self.assertEqual(clientes.stripe().api_key, 'sk_test_a')
+        with override_settings(STRIPE_SECRET_KEY='sk_test_b'):
+            self.assertEqual(clientes.stripe().api_key, 'sk_test_b')
+
+    def test_clientes_async_fechados_quando_o_loop_da_view_termina(self):
+        # Sob WSGI cada view async roda num loop próprio do async_to_sync
+        async def view():
+            return cliente_http(), clientes.stripe_async()
+
+        with mock.patch.object(clientes.stripe().HTTPXClient, 'close_async', new_callable=mock.AsyncMock) as fechar_stripe:
+            httpx_cliente, _ = async_to_sync(view)()
+        self.assertTrue(httpx_cliente.is_closed)
+        fechar_stripe.assert_awaited_once()
+
+    def test_cliente_http_reaproveitado_no_mesmo_loop(self):
+        async def duas_chamadas():
+            return cliente_http() is cliente_http()
+
+        self.assertTrue(asyncio.run(duas_chamadas()))
+
+
+# ------------------------------------------------------------------
+# CARRINHO
+# ------------------------------------------------------------------
+class CarrinhoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.produtos = [
+            Produto.objects.create(name=f'Inversor {i}', preco=Decimal('250.00'), stock=10, sku=f'INV-{i}')
+            for i in range(12)
+        ]
+
+    def adicionar(self, produtos):
+        for produto in produtos:
+            self.client.get(reverse('produtos:adicionar_ao_carrinho', args=[produto.id]))
+
+    def contar_queries_do_carrinho(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('produtos:ver_carrinho'))
+        self.assertEqual(response.status_code, 200)
+        return queries, response
+
+    def test_sessao_guarda_apenas_ids_e_quantidades(self):
+        self.adicionar(self.produtos[:2] + self.produtos[:1])
+        self.client.post(
+            reverse('produtos:adicionar_ao_carrinho', args=[self.produtos[2].id]), {'quantidade': '3'},
+        )
+
+        self.assertEqual(self.client.session['carrinho'], {
+            str(self.produtos[0].id): 2, str(self.produtos[1].id): 1, str(self.produtos[2].id): 3,
+        })
+
+    def test_numero_de_queries_nao_depende_do_numero_de_itens(self):
+        self.adicionar(self.produtos[:1])
+        com_um_item, _ = self.contar_queries_do_carrinho()
+
+        self.adicionar(self.produtos[1:])
+        queries, response = self.contar_queries_do_carrinho()
+        self.assertEqual(len(queries), len(com_um_item))
+        self.assertEqual(len(response.context['itens_carrinho']), 12)
+        self.assertEqual(response.context['total_carrinho'], Decimal('3000.00'))
+
+    def test_ver_carrinho_nao_regrava_a_sessao(self):
+        self.adicionar(self.produtos[:3])
+        queries, _ = self.contar_queries_do_carrinho()
+        self.assertFalse(any('django_session' in q['sql'] and 'UPDATE' in q['sql'] for q in queries))
+
+    def test_migra_formato_antigo_e_descarta_produtos_excluidos(self):
+        sessao = self.client.session
+        sessao['carrinho'] = {
+            str(self.produtos[0].id): {'produto_id': self.produtos[0].id, 'nome': 'Inversor 0', 'preco_unitario': '1.00', 'quantidade': 2, 'subtotal': '2.00'},
+            '999999': {'nome': 'Excluído', 'preco_unitario': '1.00', 'quantidade': 1},
+        }
+        sessao.save()
+
+        _, response = self.contar_queries_do_carrinho()
+        self.assertEqual(self.client.session['carrinho'], {str(self.produtos[0].id): 2})
+        # Preço vem do cadastro, não do valor antigo guardado na sessão
+        self.assertEqual(response.context['total_carrinho'], Decimal('500.00'))
+
+    def test_remover_uma_unidade_e_depois_o_item(self):
+        self.adicionar(self.produtos[:1] * 2)
+        url = reverse('produtos:remover_do_carrinho', args=[self.produtos[0].id])
+
+        self.client.post(url, {'acao': 'menos'})
+        self.assertEqual(self.client.session['carrinho'], {str(self.produtos[0].id): 1})
+        self.client.post(url, {'acao': 'menos'})
+        self.assertEqual(self.client.session['carrinho'], {})
+
+
+# ------------------------------------------------------------------
+# CHECKOUT E RESERVA DE ESTOQUE
+# ------------------------------------------------------------------
+class CheckoutTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user('comprador', 'comprador@example.com', 'senha')
+        cls.produtos = [
+            Produto.objects.create(name=f'Bateria {i}', preco=Decimal('80.00'), stock=5, sku=f'BAT-{i}')
+            for i in range(10)
+        ]
+
+    def linhas(self, quantidades):
+        sessao = self.client.session
+        carrinho = Carrinho(sessao)
+        for produto, quantidade in zip(self.produtos, quantidades):
+            carrinho.adicionar(produto.id, quantidade)
+        return carrinho.linhas()[0]
+
+    def criar(self, quantidades):
+        return criar_pedido(
+            usuario=self.usuario, email_cliente='comprador@example.com',
+            linhas=self.linhas(quantidades), metodo_pagamento='stripe', valor_frete=Decimal('10.00'),
+        )
+
+    def estoques(self):
+        return list(Produto.objects.order_by('id').values_list('stock', flat=True))
+
+    def test_cria_pedido_itens_e_reserva_estoque(self):
+        pedido = self.criar([2, 1, 5])
+
+        self.assertEqual(pedido.total, Decimal('650.00'))
+        self.assertTrue(pedido.estoque_reservado)
+        self.assertEqual(pedido.itens.count(), 3)
+        self.assertEqual(self.estoques()[:4], [3, 4, 0, 5])
+
+    def test_numero_de_queries_nao_depende_do_numero_de_itens(self):
+        linhas = self.linhas([1] * 10)
+        with CaptureQueriesContext(connection) as queries:
+            criar_pedido(usuario=self.usuario, email_cliente='', linhas=linhas, metodo_pagamento='stripe')
+        # Um UPDATE condicional por produto e um único INSERT para os itens
+        self.assertEqual(sum('INSERT INTO "produtos_item"' in q['sql'] for q in queries), 1)
+        self.assertEqual(sum('SELECT' in q['sql'] for q in queries), 0)
+
+    def test_estoque_insuficiente_nao_grava_nada(self):
+        with self.assertRaises(EstoqueInsuficiente):
+            self.criar([2, 6])
+
+        self.assertEqual(self.estoques()[:2], [5, 5])
+        self.assertFalse(Pedido.objects.exists())
+        self.assertFalse(Item.objects.exists())
+
+    def test_liberar_reserva_uma_unica_vez(self):
+        pedido = self.criar([2, 3])
+
+        self.assertTrue(liberar_reserva(pedido.id))
+        self.assertFalse(liberar_reserva(pedido.id))
+        self.assertEqual(self.estoques()[:2], [5, 5])
+
+    def test_expirar_reservas_vencidas(self):
+        vencido = self.criar([1])
+        recente = self.criar([2])
+        Pedido.objects.filter(pk=vencido.pk).update(criado_em=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(expirar_reservas(), 1)
+        self.assertEqual(Pedido.objects.get(pk=vencido.pk).status, 'cancelado')
+        self.assertEqual(Pedido.objects.get(pk=recente.pk).status, 'pendente')
+        self.assertEqual(self.estoques()[0], 3)
+
+
+# ------------------------------------------------------------------
+# SLUGS DE PRODUTO
+# ------------------------------------------------------------------
+class SlugProdutoTests(TestCase):
+
+    def criar(self, nome):
+        return Produto.objects.create(name=nome, preco=Decimal('10.00'))
+
+    def test_sufixos_sequenciais_com_uma_consulta(self):
+        for _ in range(15):
+            self.criar('Painel Solar 550W')
+        self.criar('Painel Solar 550W Bifacial')
+
+        with CaptureQueriesContext(connection) as queries:
+            produto = self.criar('Painel Solar 550W')
+        self.assertEqual(produto.slug, 'painel-solar-550w-15')
+        self.assertEqual(sum(q['sql'].startswith('SELECT') for q in queries), 1)
+
+    def test_slug_existente_com_sufixo_numerico_no_nome(self):
+        self.criar('Inversor 5')  # inversor-5
+        self.criar('Inversor')
+        self.assertEqual(self.criar('Inversor').slug, 'inversor-6')
+
+    def test_curinga_do_like_no_slug_nao_casa_outras_bases(self):
+        Produto.objects.bulk_create([Produto(name='Outro', preco=Decimal('1.00'), slug='kitxa-7')])
+        self.assertEqual(self.criar('kit_a').slug, 'kit_a')
+        self.assertEqual(self.criar('kit_a').slug, 'kit_a-1')
+
+    def test_tenta_de_novo_quando_outro_processo_grava_o_mesmo_slug(self):
+        self.criar('Bateria Lítio')
+        chamadas = []
+
+        def alocar_desatualizado(instancia):
+            # Primeira alocação "não vê" o registro concorrente
+            chamadas.append(instancia)
+            if len(chamadas) == 1:
+                instancia.slug = 'bateria-litio'
+                return instancia.slug
+            return alocar_slug(instancia)
+
+        with mock.patch('produtos.slugs.alocar_slug', alocar_desatualizado):
+            produto = self.criar('Bateria Lítio')
+        self.assertEqual(produto.slug, 'bateria-litio-1')
+        self.assertEqual(len(chamadas), 2)
+
+    def test_lote_com_nomes_repetidos(self):
+        self.criar('Kit 3kWp')
+        novos = [Produto(name='Kit 3kWp', preco=Decimal('1.00')) for _ in range(3)]
+        novos.append(Produto(name='Kit 3kWp', preco=Decimal('1.00'), slug='kit-3kwp-2'))
+
+        with CaptureQueriesContext(connection) as queries:
+            criar_em_lote(novos)
+        self.assertEqual(sum(q['sql'].startswith('SELECT') for q in queries), 1)
+        self.assertEqual(
+            sorted(Produto.objects.values_list('slug', flat=True)),
+            ['kit-3kwp', 'kit-3kwp-1', 'kit-3kwp-2', 'kit-3kwp-3', 'kit-3kwp-4'],
+        )
+
+    def test_lote_com_conflito_de_sku_nao_e_mascarado(self):
+        Produto.objects.create(name='Cabo', preco=Decimal('1.00'), sku='CB-1')
+        with self.assertRaises(IntegrityError):
+            criar_em_lote([Produto(name='Cabo Novo', preco=Decimal('1.00'), sku='CB-1')])
+
+
+# ------------------------------------------------------------------
+# IMPORTAÇÃO / EXPORTAÇÃO DO CATÁLOGO
+# ------------------------------------------------------------------
+class CatalogoImportacaoTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=media, TAREFAS_SINCRONAS=True)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def importar_texto(self, texto, formato='csv', **opcoes):
+        relatorio = io.StringIO()
+        resumo = importar(io.BytesIO(texto.encode()), formato, relatorio=relatorio, **opcoes)
+        return resumo, relatorio.getvalue().splitlines()[1:]
+
+    def zip_imagens(self, *nomes):
+        conteudo = io.BytesIO()
+        with zipfile.ZipFile(conteudo, 'w') as arquivo:
+            for nome in nomes:
+                arquivo.writestr(nome, b'imagem')
+        conteudo.seek(0)
+        return conteudo
+
+    def test_upsert_por_sku_em_lotes(self):
+        existente = Produto.objects.create(name='Painel 550W', preco=Decimal('900.00'), sku='PNL-550', stock=1)
+        texto = (
+            'sku;name;preco;stock;is_active\n'
+            'PNL-550;Painel 550W Mono;950,00;7;sim\n'
+            'INV-5K;Inversor 5kW;4200.00;3;true\n'
+            ';Sem SKU;10;1;true\n'
+            'BAT-1;Bateria;abc;2;true\n'
+            'CB-6;Cabo 6mm;12.5;;não\n'
+        )
+        with CaptureQueriesContext(connection) as queries:
+            resumo, erros = self.importar_texto(texto, lote=2)
+
+        self.assertEqual(resumo, {'linhas': 5, 'criados': 2, 'atualizados': 1, 'imagens': 0, 'erros': 2})
+        self.assertEqual([linha.split(',')[:2] for linha in erros], [['4', ''], ['5', 'BAT-1']])
+        existente.refresh_from_db()
+        self.assertEqual((existente.name, existente.preco, existente.stock, existente.slug), ('Painel 550W Mono', Decimal('950.00'), 7, 'painel-550w'))
+        cabo = Produto.objects.get(sku='CB-6')
+        self.assertEqual((cabo.stock, cabo.is_active, cabo.slug), (0, False, 'cabo-6mm'))
+        # Dois lotes: por lote, um SELECT de SKUs, um de slugs e um upsert
+        self.assertEqual(sum(q['sql'].startswith('INSERT') for q in queries), 2)
+
+    def test_arquivo_parcial_atualiza_so_as_colunas_presentes(self):
+        Produto.objects.create(name='Painel', preco=Decimal('900.00'), sku='PNL-1', description='Original')
+        resumo, erros = self.importar_texto('sku,stock\nPNL-1,40\nNOVO-1,5\n')
+
+        self.assertEqual((resumo['atualizados'], resumo['criados']), (1, 0))
+        self.assertEqual(erros, ['3,NOVO-1,"Produto novo sem name, preco."'])
+        produto = Produto.objects.get(sku='PNL-1')
+        self.assertEqual((produto.stock, produto.preco, produto.description), (40, Decimal('900.00'), 'Original'))
+
+    def test_imagens_do_zip_sao_anexadas_uma_vez(self):
+        texto = '{"sku": "KIT-1", "name": "Kit 3kWp", "preco": "9000.00", "imagens": ["kit.jpg", "kit-2.jpg", "falta.jpg"]}\n'
+        resumo, erros = self.importar_texto(texto, 'jsonl', imagens=self.zip_imagens('kit.jpg', 'kit-2.jpg'))
+        self.assertEqual((resumo['imagens'], resumo['erros']), (2, 1))
+        self.assertIn('falta.jpg', erros[0])
+
+        resumo, _ = self.importar_texto(texto, 'jsonl', imagens=self.zip_imagens('kit.jpg', 'kit-2.jpg'))
+        self.assertEqual(resumo['imagens'], 0)
+        produto = Produto.objects.get(sku='KIT-1')
+        principal = ProdutoImage.objects.get(produto=produto, is_main=True)
+        self.assertEqual(produto.imagem_principal_id, principal.id)
+        self.assertEqual(produto.images.count(), 2)
+
+    def test_exportacao_reimportada_nao_altera_o_catalogo(self):
+        Produto.objects.create(name='Painel, "bifacial"', preco=Decimal('1.50'), sku='PNL-B', peso=Decimal('2.10'))
+        Produto.objects.create(name='Inativo', preco=Decimal('3.00'), sku='INA', is_active=False)
+        csv_exportado = ''.join(exportar_linhas('csv'))
+        jsonl_exportado = ''.join(exportar_linhas('jsonl'))
+
+        self.assertEqual(len(csv_exportado.splitlines()), 3)
+        self.assertEqual(json.loads(jsonl_exportado.splitlines()[0])['peso'], '2.10')
+        for texto, formato in ((csv_exportado, 'csv'), (jsonl_exportado, 'jsonl')):
+            resumo, erros = self.importar_texto(texto, formato)
+            self.assertEqual((resumo['atualizados'], resumo['criados'], erros), (2, 0, []))
+        self.assertEqual(Produto.objects.get(sku='PNL-B').name, 'Painel, "bifacial"')
+        self.assertFalse(Produto.objects.get(sku='INA').is_active)
+
+    def test_csv_exportado_neutraliza_formulas_e_reimporta_igual(self):
+        Produto.objects.create(
+            name='=HYPERLINK("http://x")', description='-10% à vista', preco=Decimal('5.00'), sku='PNL-F',
+        )
+        csv_exportado = ''.join(exportar_linhas('csv'))
+        self.assertIn('"\'=HYPERLINK(""http://x"")"', csv_exportado)
+        self.assertIn(",'-10% à vista,", csv_exportado)
+
+        resumo, erros = self.importar_texto(csv_exportado, 'csv')
+        self.assertEqual((resumo['atualizados'], erros), (1, []))
+        produto = Produto.objects.get(sku='PNL-F')
+        self.assertEqual((produto.name, produto.description), ('=HYPERLINK("http://x")', '-10% à vista'))
+
+    def test_comandos(self):
+        Produto.objects.create(name='Painel', preco=Decimal('10.00'), sku='PNL-1')
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta, ignore_errors=True)
+        saida = f'{pasta}/catalogo.csv'
+
+        call_command('export_catalogo', saida=saida, stdout=io.StringIO())
+        Produto.objects.update(name='Alterado')
+        call_command('import_catalogo', saida, stdout=io.StringIO())
+        self.assertEqual(Produto.objects.get().name, 'Painel')
+
+    def test_views_do_crm(self):
+        usuario = Usuario.objects.create_user('gestor', 'gestor@example.com', 'senha', is_staff=True, is_superuser=True)
+        self.client.force_login(usuario)
+        Produto.objects.create(name='Painel', preco=Decimal('10.00'), sku='PNL-1')
+
+        arquivo = io.BytesIO(b'sku,name,preco\nPNL-1,Painel 2,11\nINV-1,,5\n')
+        arquivo.name = 'catalogo.csv'
+        with self.assertLogs('energia_solar.instrumentacao'):
+            response = self.client.get(reverse('crm:exportar_catalogo'), {'formato': 'jsonl'})
+            self.assertTrue(response.streaming)
+            self.assertEqual(json.loads(b''.join(response.streaming_content))['sku'], 'PNL-1')
+
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('crm:importar_catalogo'), {'arquivo': arquivo})
+            self.assertRedirects(response, reverse('crm:importar_catalogo'))
+
+        importacao = ImportacaoCatalogo.objects.get()
+        self.assertEqual((importacao.status, importacao.atualizados, importacao.erros), ('concluida', 1, 1))
+        self.assertTrue(importacao.relatorio.name.endswith('.csv'))
+        self.assertEqual(Produto.objects.get(sku='PNL-1').name, 'Painel 2')
+
+
+# ------------------------------------------------------------------
+# CADASTRO DE PRODUTOS POR IA
+# ------------------------------------------------------------------
+class IngestaoProdutosTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=media, TAREFAS_SINCRONAS=True, INGESTAO_IA_WORKERS=2)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        analise = mock.patch('produtos.ingestao.analisar_imagem_produto', return_value={'error': 'Imagem ilegível'})
+        self.analisar = analise.start()
+        self.addCleanup(analise.stop)
+        # Sem executar o on_commit: a tarefa agendada não roda
+        self.ingestao = criar_ingestao([SimpleUploadedFile(f'foto{i}.jpg', b'jpeg', 'image/jpeg') for i in range(3)])
+        self.arquivos = list(self.ingestao.imagens.values_list('arquivo', flat=True))
+
+    def test_ingestao_ja_reservada_nao_e_processada_de_novo(self):
+        IngestaoProdutos.objects.filter(pk=self.ingestao.pk).update(status='processando')
+        self.assertIsNone(processar_ingestao(self.ingestao.pk))
+        self.analisar.assert_not_called()
+        self.assertEqual(self.ingestao.imagens.filter(status='pendente').count(), 3)
+
+    def test_falha_da_execucao_apaga_os_arquivos_das_imagens(self):
+        with mock.patch('produtos.ingestao._gravar_lote', side_effect=RuntimeError('banco indisponível')):
+            self.assertEqual(processar_ingestao(self.ingestao.pk), 'falhou')
+
+        self.ingestao.refresh_from_db()
+        self.assertEqual(self.ingestao.status, 'falhou')
+        self.assertEqual(set(self.ingestao.imagens.values_list('status', 'arquivo')), {('falhou', '')})
+        self.assertFalse(any(default_storage.exists(nome) for nome in self.arquivos))
+        # Sem arquivo não há o que reprocessar
+        self.assertEqual(reprocessar_falhas(self.ingestao), 0)
+        self.assertEqual(IngestaoProdutos.objects.get(pk=self.ingestao.pk).status, 'falhou')
+
+    def test_falhas_de_imagem_mantem_os_arquivos_para_reprocessar(self):
+        self.assertEqual(processar_ingestao(self.ingestao.pk), 'concluida')
+        self.assertTrue(all(default_storage.exists(nome) for nome in self.arquivos))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(reprocessar_falhas(self.ingestao), 3)
+        self.assertEqual(self.analisar.call_count, 6)
+
+    def test_reprocessar_nao_reabre_ingestao_em_andamento(self):
+        IngestaoProdutos.objects.filter(pk=self.ingestao.pk).update(status='processando')
+        self.ingestao.imagens.update(status='falhou')
+        self.assertEqual(reprocessar_falhas(self.ingestao), 0)
+        self.assertEqual(self.ingestao.imagens.filter(status='falhou').count(), 3)
+
+
+# ------------------------------------------------------------------
+# EXPORTAÇÕES DAS LISTAS DO CRM
+# ------------------------------------------------------------------
+class ExportacaoListasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gestor = Usuario.objects.create_user('gestor', 'gestor@example.com', 'senha', is_staff=True, is_superuser=True)
+        cliente = Cliente.objects.create(nome='=HYPERLINK("x")', email='c@example.com', telefone='1')
+        cls.projeto = Projeto.objects.create(nome='Usina Norte', data_inicio=date(2025, 1, 1), cliente=cliente)
+        outro = Projeto.objects.create(nome='Usina Sul', data_inicio=date(2025, 1, 1))
+        for dia in range(1, 11):
+            LancamentoFinanceiro.objects.create(
+                projeto=cls.projeto, tipo='recebimento', descricao=f'Parcela {dia}', valor=Decimal('10.50'),
+                data=date(2025, 1, dia), status='pago' if dia % 2 else 'pendente',
+            )
+        LancamentoFinanceiro.objects.create(projeto=outro, tipo='pagamento', descricao='Outro', valor=Decimal('1'), data=date(2025, 1, 5), status='pago')
+
+    def exportar(self, nome, **params):
+        self.client.force_login(self.gestor)
+        with self.assertLogs('energia_solar.instrumentacao'):
+            response = self.client.get(reverse('crm:exportar_lista', args=[nome]), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_aplica_os_filtros_do_dashboard(self):
+        _, conteudo = self.exportar(
+            'lancamentos', projeto=self.projeto.id, status='pago', data_inicio='2025-01-03', data_fim='2025-01-09',
+        )
+        linhas = conteudo.decode().splitlines()
+        self.assertEqual(linhas[0], 'ID,Data,Projeto,Tipo,Descrição,Valor (R$),Status')
+        self.assertEqual([linha.split(',')[1] for linha in linhas[1:]], ['2025-01-09', '2025-01-07', '2025-01-05', '2025-01-03'])
+        self.assertTrue(linhas[1].endswith(',Usina Norte,Recebimento,Parcela 9,10.50,Pago'))
+
+    def test_csv_neutraliza_formulas(self):
+        _, conteudo = self.exportar('clientes')
+        self.assertIn('"\'=HYPERLINK(""x"")"', conteudo.decode())
+
+    def test_xlsx_em_streaming(self):
+        response, conteudo = self.exportar('projetos', formato='xlsx', q='norte')
+        self.assertIn('projetos_', response['Content-Disposition'])
+        with zipfile.ZipFile(io.BytesIO(conteudo)) as pacote:
+            planilha = pacote.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(planilha.count('<row>'), 2)
+        self.assertIn('<t xml:space="preserve">Usina Norte</t>', planilha)
+
+    def test_linhas_lidas_em_uma_consulta(self):
+        with CaptureQueriesContext(connection) as queries:
+            linhas = list(EXPORTACOES['lancamentos'].linhas({}))
+        self.assertEqual((len(linhas), len(queries)), (11, 1))
+
+    def test_permissoes(self):
+        usuario = Usuario.objects.create_user('equipe', 'e@example.com', 'senha', is_crm_staff=True)
+        self.client.force_login(usuario)
+        with self.assertLogs('energia_solar.instrumentacao'):
+            self.assertEqual(self.client.get(reverse('crm:exportar_lista', args=['pedidos'])).status_code, 403)
+        self.client.force_login(self.gestor)
+        with self.assertLogs('energia_solar.instrumentacao'):
+            self.assertEqual(self.client.get(reverse('crm:exportar_lista', args=['senhas'])).status_code, 404)
+
+
+# ------------------------------------------------------------------
+# LISTAS COM CURSOR
+# ------------------------------------------------------------------
+@override_settings(CRM_LISTAS_POR_PAGINA=4)
+class ListagemCursorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gestor = Usuario.objects.create_user('gestor', 'gestor@example.com', 'senha', is_staff=True, is_superuser=True)
+        # Nomes repetidos: o desempate pelo id mantém a ordem estável
+        for indice in range(10):
+            Cliente.objects.create(nome=f'Cliente {indice // 2}', email=f'c{indice}@example.com', telefone='1')
+        cls.ordens = [('nome', 'Nome', ['nome', 'id']), ('recentes', 'Mais recentes', ['-data_cadastro', '-id'])]
+
+    def pagina(self, query=''):
+        return paginar(Cliente.objects.all(), QueryDict(query), self.ordens)
+
+    def ids(self, pagina):
+        return [cliente.id for cliente in pagina]
+
+    def test_avanca_e_volta_sem_repetir_linhas(self):
+        esperado = list(Cliente.objects.order_by('nome', 'id').values_list('id', flat=True))
+        paginas = [self.pagina()]
+        while paginas[-1].tem_proxima:
+            paginas.append(self.pagina(paginas[-1].query_proxima))
+        self.assertEqual([len(pagina) for pagina in paginas], [4, 4, 2])
+        self.assertEqual(sum((self.ids(pagina) for pagina in paginas), []), esperado)
+        self.assertFalse(paginas[0].tem_anterior)
+
+        voltando = self.pagina(paginas[2].query_anterior)
+        self.assertEqual(self.ids(voltando), self.ids(paginas[1]))
+        voltando = self.pagina(voltando.query_anterior)
+        self.assertEqual(self.ids(voltando), self.ids(paginas[0]))
+        self.assertFalse(voltando.tem_anterior)
+        self.assertTrue(voltando.tem_proxima)
+
+    def test_ordem_decrescente_e_filtros_preservados(self):
+        primeira = self.pagina('ordem=recentes&q=cliente')
+        segunda = self.pagina(primeira.query_proxima)
+        esperado = list(Cliente.objects.order_by('-data_cadastro', '-id').values_list('id', flat=True))
+        self.assertEqual(self.ids(primeira) + self.ids(segunda), esperado[:8])
+        self.assertEqual(segunda.ordem, 'recentes')
+        self.assertIn('q=cliente', segunda.query_filtros)
+        self.assertNotIn('cursor', segunda.query_filtros)
+
+    def test_cursor_invalido_volta_ao_inicio(self):
+        for cursor in ('lixo', codificar_cursor('>', ['a'])):
+            self.assertEqual(self.ids(self.pagina(f'cursor={cursor}')), self.ids(self.pagina()))
+
+    def test_contagem_limitada(self):
+        self.assertEqual(contar(Cliente.objects.all(), limite=5), (5, False))
+        self.assertEqual(contar(Cliente.objects.all(), limite=50), (10, True))
+
+    def test_views_custam_o_mesmo_em_qualquer_pagina(self):
+        self.client.force_login(self.gestor)
+        url = reverse('crm:lista_clientes')
+        with self.assertLogs('energia_solar.instrumentacao'), CaptureQueriesContext(connection) as primeira:
+            response = self.client.get(url)
+        self.assertContains(response, '10 registro(s)')
+        with self.assertLogs('energia_solar.instrumentacao'), CaptureQueriesContext(connection) as segunda:
+            response = self.client.get(url + '?' + response.context['pagina'].query_proxima)
+        self.assertEqual(len(response.context['clientes']), 4)
+        self.assertEqual(len(primeira), len(segunda))
+
+        for nome in ('lista_projetos', 'lista_materiais', 'lista_fornecedores', 'lista_financeiro',
+                     'lista_usuarios', 'lista_produtos_ecommerce'):
+            with self.assertLogs('energia_solar.instrumentacao'):
+                self.assertEqual(self.client.get(reverse(f'crm:{nome}'), {'q': 'x'}).status_code, 200)
+
+
+# ------------------------------------------------------------------
+# BUSCA TEXTUAL (FTS5)
+# ------------------------------------------------------------------
+@skipUnless(connection.vendor == 'sqlite', 'Backend FTS5 do SQLite')
+class BuscaTextualTests(TestCase):
+
+    def criar(self, nome, descricao='', **campos):
+        return Produto.objects.create(name=nome, description=descricao, preco=Decimal('10.00'), **campos)
+
+    def buscar(self, termo):
+        return [produto.name for produto in BuscaSQLiteFTS().buscar(termo)[:20]]
+
+    def test_nome_ranqueado_acima_da_descricao(self):
+        self.criar('Cabo Solar 6mm', 'Compatível com o inversor híbrido')
+        self.criar('Inversor Híbrido 5kW', 'Saída monofásica')
+        self.criar('Inversor Desativado', is_active=False)
+        self.assertEqual(self.buscar('inversor'), ['Inversor Híbrido 5kW', 'Cabo Solar 6mm'])
+        # Sem acento e por prefixo
+        self.assertEqual(self.buscar('hibri'), ['Inversor Híbrido 5kW', 'Cabo Solar 6mm'])
+
+    def test_triggers_acompanham_update_e_delete(self):
+        produto = self.criar('Bateria de Lítio')
+        self.assertEqual(self.buscar('litio'), ['Bateria de Lítio'])
+
+        produto.name = 'Bateria Estacionária'
+        produto.save()
+        self.assertEqual(self.buscar('litio'), [])
+        self.assertEqual(self.buscar('estacionaria'), ['Bateria Estacionária'])
+        self.assertEqual(BuscaSQLiteFTS().buscar('estacionaria').count(), 1)
+
+        produto.delete()
+        self.assertEqual(self.buscar('estacionaria'), [])
+
+    def test_reindexar_busca_recria_triggers_perdidos(self):
+        # Como acontece quando uma migration recria produtos_produto no SQLite
+        with connection.cursor() as cursor:
+            for sufixo in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER produtos_produto_fts_{sufixo}')
+        self.criar('Estrutura de Solo')
+        self.assertEqual(self.buscar('estrutura'), [])
+
+        saida = io.StringIO()
+        call_command('reindexar_busca', stdout=saida)
+        self.assertIn('sqlite_fts', saida.getvalue())
+        self.assertEqual(self.buscar('estrutura'), ['Estrutura de Solo'])
+        self.criar('Estrutura de Telhado')
+        self.assertEqual(self.buscar('telhado'), ['Estrutura de Telhado'])
+
+
+# ------------------------------------------------------------------
+# CACHE DA ANÁLISE POR IA
+# ------------------------------------------------------------------
+@override_settings(GEMINI_API_KEY='chave-de-teste')
+class CacheAnaliseIATests(TestCase):
+
+    def setUp(self):
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio, ignore_errors=True)
+        self.cache = CacheAnaliseSQLite(caminho=os.path.join(diretorio, 'analise.sqlite3'), ttl=60, max_itens=10)
+        for alvo, valor in [
+            ('produtos.services.obter_cache_analise', mock.Mock(return_value=self.cache)),
+            ('produtos.services._chamar_gemini', mock.Mock(return_value={'name': 'Painel 550W'})),
+        ]:
+            patcher = mock.patch(alvo, valor)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.gemini = services._chamar_gemini
+
+    def analisar(self, conteudo, nome='foto.jpg'):
+        return services.analisar_imagem_produto(SimpleUploadedFile(nome, conteudo, 'image/jpeg'))
+
+    def test_mesmo_conteudo_servido_do_cache(self):
+        self.assertEqual(self.analisar(b'imagem-1'), {'name': 'Painel 550W'})
+        # Outro nome, mesmos bytes: acerto
+        self.assertEqual(self.analisar(b'imagem-1', nome='copia.jpg'), {'name': 'Painel 550W'})
+        self.assertEqual(self.gemini.call_count, 1)
+
+        self.analisar(b'imagem-2')
+        self.assertEqual(self.gemini.call_count, 2)
+
+    def test_nova_versao_do_prompt_invalida_as_entradas(self):
+        self.analisar(b'imagem-1')
+        with mock.patch('produtos.services.PROMPT_VERSAO', services.PROMPT_VERSAO + 1):
+            self.analisar(b'imagem-1')
+            self.analisar(b'imagem-1')
+        self.assertEqual(self.gemini.call_count, 2)
+
+    def test_erros_nao_sao_guardados(self):
+        self.gemini.return_value = {'error': 'Falha na comunicação com a IA'}
+        self.analisar(b'imagem-1')
+        self.gemini.return_value = {'name': 'Painel 550W'}
+        self.assertEqual(self.analisar(b'imagem-1'), {'name': 'Painel 550W'})
+        self.assertEqual(self.gemini.call_count, 2)
+
+    def test_despejo_lru_por_numero_de_itens(self):
+        self.cache.max_itens = 2
+        self.analisar(b'a')
+        self.analisar(b'b')
+        self.analisar(b'a')  # 'a' passa a ser o mais recente
+        self.analisar(b'c')  # despeja 'b'
+        self.assertEqual(self.gemini.call_count, 3)
+        self.analisar(b'a')
+        self.assertEqual(self.gemini.call_count, 3)
+        self.analisar(b'b')
+        self.assertEqual(self.gemini.call_count, 4)
+
+
+# ------------------------------------------------------------------
+# IMAGEM DO CARD
+# ------------------------------------------------------------------
+class ImagemPrincipalTests(TestCase):
+
+    def criar_produtos(self, quantidade, inicio=0):
+        for i in range(inicio, inicio + quantidade):
+            produto = Produto.objects.create(name=f'Inversor {i}', preco=Decimal('10.00'), categoria_id='inversores')
+            ProdutoImage.objects.create(produto=produto, image=f'produtos/inversor{i}.png', is_main=True)
+
+    def consultas_da_categoria(self):
+        with CaptureQueriesContext(connection) as queries:
+            resposta = self.client.get(reverse('produtos:produtos_por_categoria', args=['inversores']))
+        self.assertEqual(resposta.status_code, 200)
+        return len(queries)
+
+    def test_pagina_da_categoria_com_consultas_constantes(self):
+        self.criar_produtos(2)
+        self.consultas_da_categoria()  # aquece o cache do Site
+        poucos = self.consultas_da_categoria()
+        self.criar_produtos(10, inicio=2)
+        self.assertEqual(self.consultas_da_categoria(), poucos)
+
+    def test_imagem_principal_recalculada_ao_incluir_e_remover_imagens(self):
+        produto = Produto.objects.create(name='Bateria', preco=Decimal('10.00'))
+        self.assertIsNone(produto.imagem_principal)
+
+        primeira = ProdutoImage.objects.create(produto=produto, image='produtos/bateria1.png')
+        produto.refresh_from_db()
+        self.assertEqual(produto.imagem_principal, primeira)
+
+        principal = ProdutoImage.objects.create(produto=produto, image='produtos/bateria2.png', is_main=True)
+        produto.refresh_from_db()
+        self.assertEqual(produto.imagem_principal, principal)
+
+        principal.delete()
+        produto.refresh_from_db()
+        self.assertEqual(produto.imagem_principal, primeira)
+
+        primeira.delete()
+        produto.refresh_from_db()
+        self.assertIsNone(produto.imagem_principal)
+
+
+# ------------------------------------------------------------------
+# CACHE DA VITRINE
+# ------------------------------------------------------------------
+class CatalogoHomeTests(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=self.media, TAREFAS_SINCRONAS=True)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.produto = Produto.objects.create(name='Painel 550W', preco=Decimal('900.00'))
+
+    def nomes_na_vitrine(self):
+        payload, _ = obter_payload_home()
+        return [produto['name'] for produto in payload['produtos']]
+
+    def alterar(self, funcao):
+        """Aplica a alteração e confirma a transação (roda os on_commit dos signals)."""
+        with self.captureOnCommitCallbacks(execute=True):
+            return funcao()
+
+    def png(self):
+        conteudo = io.BytesIO()
+        Image.new('RGB', (20, 10), (255, 200, 0)).save(conteudo, 'PNG')
+        return SimpleUploadedFile('foto.png', conteudo.getvalue(), content_type='image/png')
+
+    @override_settings(CATALOGO_HOME_DESTAQUES=3)
+    def test_vitrine_nao_cresce_com_o_catalogo(self):
+        def cards_renderizados():
+            resposta = self.client.get(reverse('produtos:home'))
+            return resposta.content.decode().count('Ver Detalhes')
+
+        self.alterar(lambda: [Produto.objects.create(name=f'Inversor {i}', preco=Decimal('10.00')) for i in range(3)])
+        self.assertEqual(cards_renderizados(), 3)
+
+        self.alterar(lambda: Produto.objects.bulk_create(
+            [Produto(name=f'Cabo {i}', preco=Decimal('1.00'), slug=f'cabo-{i}') for i in range(50)]
+        ))
+        self.alterar(lambda: Produto.objects.create(name='Bateria Nova', preco=Decimal('10.00')))
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(cards_renderizados(), 3)
+        # Miss: versão, produtos com a imagem no JOIN, carrossel e o cache do Site
+        self.assertLessEqual(len(queries), 4)
+        # Os destaques são os mais recentes
+        self.assertEqual(self.nomes_na_vitrine()[0], 'Bateria Nova')
+
+    @override_settings(CATALOGO_POR_PAGINA=2)
+    def test_pagina_da_categoria_paginada(self):
+        self.alterar(lambda: [
+            Produto.objects.create(name=f'Inversor {i}', preco=Decimal('10.00'), categoria_id='inversores') for i in range(5)
+        ])
+        resposta = self.client.get(reverse('produtos:produtos_por_categoria', args=['inversores']), {'page': 3})
+        self.assertEqual([produto.name for produto in resposta.context['produtos']], ['Inversor 4'])
+        self.assertEqual(resposta.context['page_obj'].paginator.num_pages, 3)
+
+    def test_segunda_requisicao_vem_do_cache(self):
+        self.assertEqual(obter_payload_home()[1], False)
+        # Só a leitura da versão no banco
+        with self.assertNumQueries(1):
+            payload, hit = obter_payload_home()
+        self.assertTrue(hit)
+        self.assertEqual([p['name'] for p in payload['produtos']], ['Painel 550W'])
+
+    def test_salvar_e_excluir_produto_invalida(self):
+        self.nomes_na_vitrine()
+        self.alterar(lambda: Produto.objects.create(name='Inversor 5kW', preco=Decimal('3000.00')))
+        self.assertEqual(sorted(self.nomes_na_vitrine()), ['Inversor 5kW', 'Painel 550W'])
+
+        self.produto.name = 'Painel 600W'
+        self.alterar(self.produto.save)
+        self.assertIn('Painel 600W', self.nomes_na_vitrine())
+
+        self.alterar(self.produto.delete)
+        self.assertEqual(self.nomes_na_vitrine(), ['Inversor 5kW'])
+
+    def test_salvar_e_excluir_imagem_do_produto_invalida(self):
+        self.nomes_na_vitrine()
+        imagem = self.alterar(lambda: ProdutoImage.objects.create(produto=self.produto, image=self.png(), is_main=True))
+        payload, hit = obter_payload_home()
+        self.assertFalse(hit)
+        self.assertTrue(payload['produtos'][0]['imagem_url'])
+
+        self.alterar(imagem.delete)
+        payload, hit = obter_payload_home()
+        self.assertFalse(hit)
+        self.assertFalse(payload['produtos'][0]['imagem_url'])
+
+    def test_salvar_e_excluir_carrossel_invalida(self):
+        self.assertEqual(obter_payload_home()[0]['carousel_images'], [])
+        banner = self.alterar(lambda: CarouselImage.objects.create(image=self.png(), title='Promoção'))
+        self.assertEqual([c['title'] for c in obter_payload_home()[0]['carousel_images']], ['Promoção'])
+
+        self.alterar(banner.delete)
+        self.assertEqual(obter_payload_home()[0]['carousel_images'], [])
+
+    def test_alteracao_sem_commit_nao_invalida(self):
+        self.nomes_na_vitrine()
+        with self.captureOnCommitCallbacks(execute=False):
+            Produto.objects.create(name='Bateria 10kWh', preco=Decimal('8000.00'))
+            self.assertTrue(obter_payload_home()[1])
+
+    def test_outro_worker_ve_a_troca_de_versao(self):
+        self.nomes_na_vitrine()
+        # Outro processo alterou o catálogo e trocou a versão no banco
+        Produto.objects.filter(pk=self.produto.pk).update(name='Painel 700W')
+        VersaoCache.objects.update_or_create(nome='catalogo', defaults={'versao': time.time_ns()})
+        self.assertEqual(self.nomes_na_vitrine(), ['Painel 700W'])
+
+
+# ------------------------------------------------------------------
+# ÍNDICE DE SIMILARIDADE
+# ------------------------------------------------------------------
+class IndiceSimilaridadeTests(TestCase):
+
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.diretorio, ignore_errors=True)
+        self.indice = IndiceSimilaridade(self.diretorio, 'falso-3')
+        self.produtos = [Produto.objects.create(name=f'Painel {i}', preco=Decimal('100.00')) for i in range(3)]
+
+    def embedding(self, produto, valores, atualizado_em):
+        # bulk_create: sem os signals de imagem (derivadas) nem de embedding
+        imagem = ProdutoImage.objects.bulk_create([ProdutoImage(produto=produto, image=f'produtos/{produto.pk}.png')])[0]
+        embedding = ProdutoImageEmbedding(imagem=imagem, modelo='falso-3')
+        embedding.definir_valores(valores)
+        ProdutoImageEmbedding.objects.bulk_create([embedding])
+        ProdutoImageEmbedding.objects.filter(pk=imagem.pk).update(atualizado_em=atualizado_em)
+        with self.captureOnCommitCallbacks(execute=True):
+            marcar_indice_desatualizado()
+
+    def test_versao_so_muda_depois_do_commit(self):
+        antes = versoes.versao('similaridade')
+        with self.captureOnCommitCallbacks() as callbacks:
+            marcar_indice_desatualizado()
+            self.assertEqual(versoes.versao('similaridade'), antes)
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertNotEqual(versoes.versao('similaridade'), antes)
+
+    def test_linha_commitada_depois_com_data_anterior_a_marca_entra_no_delta(self):
+        agora = timezone.now()
+        self.embedding(self.produtos[0], [1.0, 0.0, 0.0], agora)
+        self.assertEqual([p for p, _ in self.indice.buscar([1.0, 0.0, 0.0])], [self.produtos[0].pk])
+        self.assertEqual(self.indice.marca, agora)
+
+        # Gravada por uma transação que começou antes mas só commitou agora
+        self.embedding(self.produtos[1], [0.0, 1.0, 0.0], agora - timedelta(seconds=30))
+        self.assertEqual(self.indice.buscar([0.0, 1.0, 0.0], k=1)[0][0], self.produtos[1].pk)
+        self.assertEqual(len(self.indice.ids), 2)
+        self.assertEqual(self.indice.marca, agora)
+
+
+# ------------------------------------------------------------------
+# PIPELINE DE EMBEDDINGS
+# ------------------------------------------------------------------
+class ProvedorContador(ProvedorFalso):
+    """ProvedorFalso que registra as chamadas, a concorrência máxima e falha nas imagens indicadas."""
+
+    def __init__(self, falhar=(), **opcoes):
+        super().__init__(dimensao=8, **opcoes)
+        self.falhar = set(falhar)
+        self.chamadas = []
+        self.em_voo = self.maximo_em_voo = 0
+        self._lock = threading.Lock()
+
+    def gerar(self, produto_image):
+        with self._lock:
+            self.chamadas.append(produto_image.id)
+            self.em_voo += 1
+            self.maximo_em_voo = max(self.maximo_em_voo, self.em_voo)
+        try:
+            if produto_image.id in self.falhar:
+                raise ConnectionError('Provedor indisponível')
+            return super().gerar(produto_image)
+        finally:
+            with self._lock:
+                self.em_voo -= 1
+
+
+class PipelineEmbeddingsTests(TestCase):
+
+    def setUp(self):
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio, ignore_errors=True)
+        self.caminho_checkpoint = os.path.join(diretorio, 'checkpoint.json')
+        produto = Produto.objects.create(name='Painel', preco=Decimal('100.00'))
+        # bulk_create: sem gerar derivadas das imagens
+        imagens = ProdutoImage.objects.bulk_create(
+            [ProdutoImage(produto=produto, image=f'produtos/img{i}.png') for i in range(8)]
+        )
+        self.ids = [imagem.id for imagem in imagens]
+
+    def executar(self, provedor, **opcoes):
+        checkpoint = Checkpoint(self.caminho_checkpoint, provedor.modelo).carregar()
+        opcoes = {'workers': 4, 'requisicoes_por_segundo': 0, 'lote': 3, 'tentativas': 1, **opcoes}
+        return PipelineEmbeddings(provedor, checkpoint=checkpoint, **opcoes).executar(), checkpoint
+
+    def test_concorrencia_limitada_ao_numero_de_workers(self):
+        provedor = ProvedorContador(latencia=0.05)
+        estatisticas, _ = self.executar(provedor, workers=3)
+        self.assertEqual(estatisticas['gravados'], 8)
+        self.assertEqual(provedor.maximo_em_voo, 3)
+        self.assertEqual(ProdutoImageEmbedding.objects.filter(modelo='falso-8').count(), 8)
+
+    def test_limite_de_requisicoes_por_segundo(self):
+        # Rajada de 2 (um token por worker) e depois 20 req/s: 6 imagens >= 0,2 s
+        inicio = time.monotonic()
+        self.executar(ProvedorContador(), workers=2, requisicoes_por_segundo=20)
+        self.assertGreaterEqual(time.monotonic() - inicio, 0.19)
+
+    def test_retry_com_backoff_em_erro_transitorio(self):
+        respostas = [ConnectionError('timeout'), ConnectionError('timeout'), [1.0]]
+
+        def chamada():
+            resposta = respostas.pop(0)
+            if isinstance(resposta, Exception):
+                raise resposta
+            return resposta
+
+        dormir = mock.Mock()
+        with self.assertLogs('produtos.embeddings', 'WARNING'):
+            self.assertEqual(com_retry(chamada, tentativas=3, base=1.0, dormir=dormir), [1.0])
+        self.assertEqual(dormir.call_count, 2)
+        self.assertLessEqual(dormir.call_args_list[1].args[0], 2.0)
+
+    def test_execucao_interrompida_continua_de_onde_parou(self):
+        self.executar(ProvedorContador(), limite=3)
+
+        provedor = ProvedorContador()
+        estatisticas, checkpoint = self.executar(provedor)
+        self.assertEqual(sorted(provedor.chamadas), self.ids[3:])
+        self.assertEqual(estatisticas['gravados'], 5)
+        self.assertEqual(checkpoint.ultimo_id, self.ids[-1])
+
+    def test_falhas_sao_registradas_a_parte_e_tentadas_de_novo(self):
+        falha = self.ids[2]
+        estatisticas, checkpoint = self.executar(ProvedorContador(falhar=[falha]))
+        self.assertEqual(estatisticas['falhas'], 1)
+        self.assertEqual(checkpoint.ultimo_id, self.ids[-1])
+        self.assertEqual(checkpoint.falhas[str(falha)]['execucoes'], 1)
+
+        # Continua falhando: a contagem de execuções sobe
+        _, checkpoint = self.executar(ProvedorContador(falhar=[falha]))
+        self.assertEqual(checkpoint.falhas[str(falha)]['execucoes'], 2)
+
+        provedor = ProvedorContador()
+        estatisticas, checkpoint = self.executar(provedor)
+        self.assertEqual(provedor.chamadas, [falha])
+        self.assertEqual(estatisticas['gravados'], 1)
+        self.assertEqual(checkpoint.falhas, {})
+        self.assertEqual(checkpoint.ultimo_id, self.ids[-1])
+        self.assertTrue(ProdutoImageEmbedding.objects.filter(imagem_id=falha).exists())
+
+
+@override_settings(BUSCA_IMAGEM_TAMANHO_MAXIMO=1024, BUSCA_IMAGEM_LIMITE_POR_JANELA=2)
+class BuscaPorImagemTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.url = reverse('produtos:busca_por_imagem')
+        embedding = mock.patch('produtos.views.gerar_embedding_imagem', return_value=[1.0, 0.0, 0.0])
+        self.gerar = embedding.start()
+        self.addCleanup(embedding.stop)
+        indice = mock.patch('produtos.views.obter_indice')
+        indice.start().return_value.buscar.return_value = []
+        self.addCleanup(indice.stop)
+
+    def enviar(self, tamanho=100):
+        return self.client.post(self.url, {'imagem': SimpleUploadedFile('foto.png', b'x' * tamanho, 'image/png')})
+
+    def test_imagem_acima_do_limite_retorna_413_sem_chamar_a_api(self):
+        self.assertEqual(self.enviar(tamanho=2048).status_code, 413)
+        self.gerar.assert_not_called()
+
+    def test_limite_por_janela_retorna_429(self):
+        self.assertEqual(self.enviar().status_code, 200)
+        self.assertEqual(self.enviar().status_code, 200)
+        self.assertEqual(self.enviar().status_code, 429)
+        self.assertEqual(self.gerar.call_count, 2)
+
+    def test_similares_de_produto_inativo_retorna_404(self):
+        produto = Produto.objects.create(name='Inativo', preco=Decimal('10.00'), is_active=False)
+        resposta = self.client.get(reverse('produtos:produtos_similares', args=[produto.pk]))
+        self.assertEqual(resposta.status_code, 404)
+
+
+# ------------------------------------------------------------------
+# VARIANTES DE IMAGENS
+# ------------------------------------------------------------------
+class ImagensDerivadasTests(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = override_settings(
+            MEDIA_ROOT=self.media, TAREFAS_SINCRONAS=True, IMAGENS_LARGURAS=[100, 200], IMAGENS_LARGURA_PADRAO=150,
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.produto = Produto.objects.create(name='Inversor 5kW', preco=Decimal('3000.00'))
+
+    def png(self, largura, altura, nome='foto.png'):
+        conteudo = io.BytesIO()
+        Image.new('RGBA', (largura, altura), (0, 128, 0, 128)).save(conteudo, 'PNG')
+        return SimpleUploadedFile(nome, conteudo.getvalue(), content_type='image/png')
+
+    def criar_imagem(self, arquivo):
+        with self.captureOnCommitCallbacks(execute=True):
+            imagem = ProdutoImage.objects.create(produto=self.produto, image=arquivo, is_main=True)
+        imagem.refresh_from_db()
+        return imagem
+
+    def test_upload_gera_variantes_sem_ampliar(self):
+        imagem = self.criar_imagem(self.png(300, 150))
+        derivadas = imagem.derivadas
+        self.assertEqual((derivadas['origem'], derivadas['largura'], derivadas['altura']), (imagem.image.name, 300, 150))
+        self.assertEqual(sorted(derivadas['webp']), ['100', '200'])
+        with Image.open(default_storage.path(derivadas['jpeg']['200'])) as jpeg:
+            self.assertEqual((jpeg.format, jpeg.size), ('JPEG', (200, 100)))
+        with Image.open(default_storage.path(derivadas['webp']['100'])) as webp:
+            self.assertEqual((webp.format, webp.size), ('WEBP', (100, 50)))
+
+        pequena = self.criar_imagem(self.png(80, 40, 'pequena.png'))
+        self.assertEqual(list(pequena.derivadas['jpeg']), ['80'])
+
+    def test_arquivo_invalido_usa_o_original(self):
+        with self.assertLogs('produtos.derivadas', 'WARNING'):
+            imagem = self.criar_imagem(SimpleUploadedFile('quebrada.jpg', b'nao e imagem'))
+        self.assertEqual(imagem.derivadas, {'origem': imagem.image.name})
+        self.assertEqual(fontes_responsivas(imagem), {'src': imagem.image.url})
+
+    def test_tag_srcset_e_remocao(self):
+        imagem = self.criar_imagem(self.png(300, 150))
+        html = Template(
+            '{% load imagens_responsivas %}{% imagem_responsiva imagem alt="Inversor" sizes="50vw" %}'
+        ).render(Context({'imagem': imagem}))
+        base = imagem.image.url.rsplit('.', 1)[0]
+        self.assertIn(f'<source type="image/webp" srcset="{base}_100w.webp 100w, {base}_200w.webp 200w" sizes="50vw">', html)
+        self.assertIn(f'src="{base}_100w.jpg"', html)
+        self.assertIn('width="300" height="150"', html)
+        self.assertIn('loading="lazy"', html)
+
+        arquivos = [default_storage.path(nome) for nome in imagem.derivadas['jpeg'].values()]
+        with self.captureOnCommitCallbacks(execute=True):
+            imagem.delete()
+        self.assertFalse(any(os.path.exists(arquivo) for arquivo in arquivos))
+
+    def test_vitrine_usa_as_variantes(self):
+        self.criar_imagem(self.png(300, 150))
+        with self.assertLogs('energia_solar.instrumentacao'):
+            response = self.client.get(reverse('produtos:home'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, '_200w.jpg 200w')
+
+    def test_comando_processa_o_acervo(self):
+        nomes = [default_storage.save(f'produtos/antiga{indice}.png', self.png(300, 150)) for indice in range(3)]
+        # bulk_create não dispara os signals: simula imagens anteriores ao recurso
+        ProdutoImage.objects.bulk_create([ProdutoImage(produto=self.produto, image=nome) for nome in nomes])
+        call_command('gerar_derivadas_imagens', workers=2, stdout=io.StringIO())
+        self.assertFalse(any(pendente(imagem) for imagem in ProdutoImage.objects.all()))
+
+        saida = io.StringIO()
+        call_command('gerar_derivadas_imagens', workers=0, stdout=saida)
+        self.assertIn('0 imagens para processar', saida.getvalue())
+
+
+# ------------------------------------------------------------------
+# DOWNLOAD DE DOCUMENTOS
+# ------------------------------------------------------------------
+class DocumentoDownloadTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        self.gestor = Usuario.objects.create_user('gestor', 'gestor@example.com', 'senha', is_staff=True, is_superuser=True)
+        self.dono = Usuario.objects.create_user('maria', 'maria@example.com', 'senha', is_customer=True)
+        cliente = Cliente.objects.create(nome='Maria', email='maria@example.com', telefone='1', usuario=self.dono)
+        projeto = Projeto.objects.create(nome='Usina Maria', data_inicio=date(2025, 1, 1), cliente=cliente)
+        self.visivel = DocumentoProjeto.objects.create(
+            projeto=projeto, nome='Conta de luz', visivel_cliente=True,
+            arquivo=SimpleUploadedFile('conta luz.pdf', b'%PDF-1.4 conta'),
+        )
+        self.interno = DocumentoProjeto.objects.create(
+            projeto=projeto, nome='RG', arquivo=SimpleUploadedFile('rg.jpg', b'foto'),
+        )
+
+    def baixar(self, usuario, documento):
+        if usuario:
+            self.client.force_login(usuario)
+        with self.assertLogs('energia_solar.instrumentacao'):
+            return self.client.get(reverse('crm:baixar_documento_projeto', args=[documento.id]))
+
+    def test_sem_nginx_o_django_envia_o_arquivo(self):
+        response = self.baixar(self.gestor, self.interno)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'foto')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="RG.jpg"')
+        self.assertEqual(response['Cache-Control'], 'private, no-store')
+
+    @override_settings(ARQUIVOS_X_ACCEL_PREFIXO='/protegido/')
+    def test_com_nginx_so_autoriza(self):
+        response = self.baixar(self.dono, self.visivel)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Accel-Redirect'], '/protegido/' + self.visivel.arquivo.name.replace(' ', '%20'))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('filename="Conta de luz.pdf"', response['Content-Disposition'])
+
+    def test_acesso(self):
+        self.assertEqual(self.baixar(None, self.visivel).status_code, 302)
+        self.assertEqual(self.baixar(self.dono, self.interno).status_code, 404)
+
+        outro = Usuario.objects.create_user('joao', 'joao@example.com', 'senha', is_customer=True)
+        self.assertEqual(self.baixar(outro, self.visivel).status_code, 404)
+
+        equipe = Usuario.objects.create_user('equipe', 'equipe@example.com', 'senha', is_crm_staff=True)
+        self.assertEqual(self.baixar(equipe, self.visivel).status_code, 403)
+
+
+# ------------------------------------------------------------------
+# UPLOAD EM PARTES
+# ------------------------------------------------------------------
+class UploadEmPartesTests(TestCase):
+
+    def setUp(self):
+        for nome in ('MEDIA_ROOT', 'UPLOADS_DIR'):
+            pasta = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, pasta, ignore_errors=True)
+            configuracao = override_settings(**{nome: pasta}, UPLOADS_TAMANHO_PARTE=4)
+            configuracao.enable()
+            self.addCleanup(configuracao.disable)
+        self.gestor = Usuario.objects.create_user('gestor', 'gestor@example.com', 'senha', is_staff=True, is_superuser=True)
+        self.projeto = Projeto.objects.create(nome='Usina Leste', data_inicio=date(2025, 1, 1))
+        self.client.force_login(self.gestor)
+
+    def chamar(self, metodo, url, dados=b'', **cabecalhos):
+        with self.assertLogs('energia_solar.instrumentacao'):
+            if isinstance(dados, dict):
+                return getattr(self.client, metodo)(url, json.dumps(dados), content_type='application/json')
+            return getattr(self.client, metodo)(url, dados, content_type='application/octet-stream', **cabecalhos)
+
+    def iniciar(self, conteudo, destino='documento_projeto', destino_id=None, **extra):
+        response = self.chamar('post', reverse('crm:iniciar_upload'), {
+            'nome': 'foto poste.jpg', 'tamanho': len(conteudo), 'destino': destino,
+            'destino_id': destino_id or self.projeto.id, **extra,
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def enviar(self, upload, indice, dados, checksum=None):
+        return self.chamar(
+            'put', reverse('crm:enviar_parte_upload', args=[upload['id'], indice]), dados,
+            HTTP_X_CHECKSUM_SHA256=hashlib.sha256(dados).hexdigest() if checksum is None else checksum,
+        )
+
+    def concluir(self, upload):
+        return self.chamar('post', reverse('crm:concluir_upload', args=[upload['id']]))
+
+    def test_partes_fora_de_ordem_com_retomada(self):
+        conteudo = b'0123456789'
+        upload = self.iniciar(conteudo, sha256=hashlib.sha256(conteudo).hexdigest(),
+                              metadados={'nome': 'Foto do poste', 'visivel_cliente': True})
+        self.assertEqual(upload['total_partes'], 3)
+
+        self.assertEqual(self.enviar(upload, 2, b'89').status_code, 200)
+        self.assertEqual(self.enviar(upload, 0, b'0123').status_code, 200)
+        # Parte corrompida no caminho: rejeitada, as outras continuam valendo
+        self.assertEqual(self.enviar(upload, 1, b'4567', checksum='0' * 64).status_code, 422)
+        self.assertEqual(self.concluir(upload).status_code, 409)
+
+        status = self.chamar('get', reverse('crm:status_upload', args=[upload['id']])).json()
+        self.assertEqual((status['partes_recebidas'], status['partes_faltando']), ([0, 2], [1]))
+        self.assertEqual(self.enviar(upload, 1, b'4567').status_code, 200)
+        self.assertEqual(self.enviar(upload, 1, b'4567').status_code, 200)
+
+        resultado = self.concluir(upload).json()
+        documento = DocumentoProjeto.objects.get(pk=resultado['resultado_id'])
+        self.assertEqual((documento.projeto, documento.nome, documento.visivel_cliente), (self.projeto, 'Foto do poste', True))
+        with documento.arquivo.open('rb') as arquivo:
+            self.assertEqual(arquivo.read(), conteudo)
+        self.assertEqual(os.listdir(settings.UPLOADS_DIR), [])
+        # Concluir de novo (resposta perdida) devolve o mesmo resultado
+        self.assertEqual(self.concluir(upload).json()['resultado_id'], documento.pk)
+
+    def test_parte_com_tamanho_errado(self):
+        upload = self.iniciar(b'0123456789')
+        self.assertEqual(self.enviar(upload, 0, b'012').status_code, 400)
+        self.assertEqual(self.enviar(upload, 0, b'01234').status_code, 400)
+        self.assertEqual(self.enviar(upload, 3, b'').status_code, 416)
+
+    def test_imagem_de_produto(self):
+        produto = Produto.objects.create(name='Painel 550W', preco=Decimal('900.00'))
+        imagem = io.BytesIO()
+        Image.new('RGB', (4, 4)).save(imagem, 'PNG')
+        conteudo = imagem.getvalue()
+
+        upload = self.iniciar(conteudo, destino='imagem_produto', destino_id=produto.id, metadados={'is_main': True})
+        for indice in range(upload['total_partes']):
+            self.enviar(upload, indice, conteudo[indice * 4:(indice + 1) * 4])
+        resultado = self.concluir(upload).json()
+        self.assertEqual(ProdutoImage.objects.get(produto=produto).pk, resultado['resultado_id'])
+
+        invalido = self.iniciar(b'nada', destino='imagem_produto', destino_id=produto.id)
+        self.enviar(invalido, 0, b'nada')
+        self.assertEqual(self.concluir(invalido).status_code, 422)
+        self.assertEqual(ProdutoImage.objects.filter(produto=produto).count(), 1)
+
+    def test_permissoes_e_dono(self):
+        upload = self.iniciar(b'abc')
+        equipe = Usuario.objects.create_user('equipe', 'equipe@example.com', 'senha', is_crm_staff=True)
+        self.client.force_login(equipe)
+        response = self.chamar('post', reverse('crm:iniciar_upload'), {
+            'nome': 'rg.pdf', 'tamanho': 3, 'destino': 'documento_projeto', 'destino_id': self.projeto.id,
+        })
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.enviar(upload, 0, b'abc').status_code, 404)
+
+    def test_limpeza_de_uploads_parados(self):
+        upload = self.iniciar(b'abc')
+        UploadEmPartes.objects.update(atualizado_em=timezone.now() - timedelta(days=2))
+        call_command('limpar_uploads', stdout=io.StringIO())
+        self.assertFalse(UploadEmPartes.objects.filter(pk=upload['id']).exists())
+        self.assertEqual(os.listdir(settings.UPLOADS_DIR), [])
+
+
+# ------------------------------------------------------------------
+# FRETE
+# ------------------------------------------------------------------
+class IndiceFreteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        RegiaoFrete.objects.create(prefixo_cep='0', cidade='Grande SP', valor_frete=Decimal('70.00'), prazo_entrega=4)
+        RegiaoFrete.objects.create(prefixo_cep='010', cidade='São Paulo', valor_frete=Decimal('50.00'), prazo_entrega=3)
+        RegiaoFrete.objects.create(prefixo_cep='01310', cidade='Paulista', valor_frete=Decimal('20.00'), prazo_entrega=1)
+        RegiaoFrete.objects.create(
+            cep_inicial='20000000', cep_final='23799999', cidade='Rio de Janeiro',
+            valor_frete=Decimal('120.00'), prazo_entrega=5,
+        )
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidar_indice_frete()
+
+    def test_regiao_mais_especifica_vence(self):
+        indice = IndiceFrete.do_banco()
+        self.assertEqual(indice.buscar('01310-100').cidade, 'Paulista')
+        self.assertEqual(indice.buscar('01001-000').cidade, 'São Paulo')
+        self.assertEqual(indice.buscar('01099999').cidade, 'São Paulo')
+        self.assertEqual(indice.buscar('06010000').cidade, 'Grande SP')
+        self.assertEqual(indice.buscar('22041-001').cidade, 'Rio de Janeiro')
+        self.assertIsNone(indice.buscar('23800000'))
+        self.assertIsNone(indice.buscar('12'))
+
+    def test_faixas_sobrepostas_escolhem_a_menor(self):
+        indice = IndiceFrete([
+            (0, 99999999, 'ampla'),
+            (1000000, 1999999, 'media'),
+            (1500000, 1500099, 'estreita'),
+        ])
+        self.assertEqual(indice.buscar('01499999'), 'media')
+        self.assertEqual(indice.buscar('01500050'), 'estreita')
+        self.assertEqual(indice.buscar('01500100'), 'media')
+        self.assertEqual(indice.buscar('02000000'), 'ampla')
+
+    def test_cotacao_aquecida_nao_consulta_o_banco(self):
+        cotar_frete('01001000')
+        with self.assertNumQueries(0):
+            self.assertEqual(cotar_frete('01001000').valor_frete, Decimal('50.00'))
+
+    @override_settings(FRETE_VERSAO_INTERVALO=0)
+    def test_cotacao_le_so_a_versao_e_recarga_apos_alteracao(self):
+        cotar_frete('01001000')
+        with self.assertNumQueries(1):
+            self.assertEqual(cotar_frete('01001000').valor_frete, Decimal('50.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RegiaoFrete.objects.filter(prefixo_cep='010').get().delete()
+        self.assertEqual(cotar_frete('01001000').cidade, 'Grande SP')
+
+    def test_alteracao_em_outro_worker_recarrega_o_indice_depois_do_intervalo(self):
+        cotar_frete('01001000')
+        # Outro processo grava a região e troca a versão no banco; o cache
+        # local deste processo não participa
+        RegiaoFrete.objects.filter(prefixo_cep='010').update(valor_frete=Decimal('55.00'))
+        VersaoCache.objects.update_or_create(nome='frete', defaults={'versao': time.time_ns()})
+        cache.clear()
+        self.assertEqual(cotar_frete('01001000').valor_frete, Decimal('50.00'))
+        with override_settings(FRETE_VERSAO_INTERVALO=0):
+            self.assertEqual(cotar_frete('01001000').valor_frete, Decimal('55.00'))
+
+    def test_versao_so_muda_depois_do_commit(self):
+        antes = versoes.versao('frete')
+        with self.captureOnCommitCallbacks() as callbacks:
+            RegiaoFrete.objects.create(prefixo_cep='9', cidade='Sul', valor_frete=Decimal('90.00'), prazo_entrega=7)
+            self.assertEqual(versoes.versao('frete'), antes)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(versoes.versao('frete'), antes)
+
+    def test_calcular_frete_carrinho_grava_valor_na_sessao(self):
+        cotar_frete('01001000')
+        response = self.client.post(reverse('produtos:calcular_frete_carrinho'), {'cep': '01310-100'})
+        self.assertRedirects(response, reverse('produtos:ver_carrinho'))
+        self.assertEqual(self.client.session['valor_frete'], 20.0)
+
+
+# ------------------------------------------------------------------
+# DASHBOARD DO CLIENTE
+# ------------------------------------------------------------------
+class ClienteDashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user('cliente', 'cliente@example.com', 'senha', is_customer=True)
+        cls.cliente = Cliente.objects.create(usuario=cls.usuario, nome='Cliente', email='cliente@example.com', telefone='1')
+
+    def criar_projetos(self, quantidade):
+        for i in range(quantidade):
+            projeto = Projeto.objects.create(nome=f'Projeto {i}', data_inicio=date(2025, 1, 1), cliente=self.cliente)
+            Etapa.objects.create(projeto=projeto, nome='Projeto', data_inicio=date(2025, 1, 3), data_fim=date(2025, 1, 4))
+            Etapa.objects.create(projeto=projeto, nome='Instalação', data_inicio=date(2025, 1, 2))
+            Etapa.objects.create(projeto=projeto, nome='Homologação', data_inicio=date(2025, 1, 5))
+            for valor, status in ((Decimal('100.00'), 'pago'), (Decimal('40.00'), 'pago'), (Decimal('50.00'), 'pendente')):
+                LancamentoFinanceiro.objects.create(
+                    projeto=projeto, tipo='recebimento', descricao='Parcela',
+                    valor=valor, data=date(2025, 1, 1), status=status,
+                )
+
+    def contar_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('crm:cliente_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_numero_de_queries_nao_depende_do_numero_de_projetos(self):
+        self.client.force_login(self.usuario)
+        self.criar_projetos(1)
+        self.client.get(reverse('crm:cliente_dashboard'))  # primeira visita grava a sessão
+        com_um_projeto, _ = self.contar_queries()
+
+        self.criar_projetos(15)
+        with self.assertNumQueries(com_um_projeto):
+            response = self.client.get(reverse('crm:cliente_dashboard'))
+        self.assertEqual(len(response.context['projetos_data']), 16)
+
+    def test_totais_por_projeto(self):
+        self.client.force_login(self.usuario)
+        self.criar_projetos(2)
+        _, response = self.contar_queries()
+
+        item = response.context['projetos_data'][0]
+        self.assertEqual(item['total_etapas'], 3)
+        self.assertEqual(item['etapas_concluidas'], 1)
+        self.assertEqual(item['percentual'], 33.33)
+        self.assertEqual(item['pagos'], Decimal('140.00'))
+        self.assertEqual(item['pendentes'], Decimal('50.00'))
+        self.assertEqual([etapa.nome for etapa in item['etapas']], ['Instalação', 'Projeto', 'Homologação'])
+
+    def test_projeto_sem_lancamentos_soma_zero(self):
+        self.client.force_login(self.usuario)
+        Projeto.objects.create(nome='Novo', data_inicio=date(2025, 1, 1), cliente=self.cliente)
+        _, response = self.contar_queries()
+
+        item = response.context['projetos_data'][0]
+        self.assertEqual((item['pagos'], item['pendentes'], item['percentual']), (0, 0, 0))
+
+
+# ------------------------------------------------------------------
+# RESUMO FINANCEIRO DIÁRIO
+# ------------------------------------------------------------------
+class ResumoFinanceiroDiarioTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.projeto = Projeto.objects.create(nome='Usina A', data_inicio=date(2025, 1, 1))
+        cls.outro_projeto = Projeto.objects.create(nome='Usina B', data_inicio=date(2025, 1, 1))
+
+    def lancar(self, valor, projeto=None, status='pago', tipo='recebimento', data=date(2025, 3, 10)):
+        return LancamentoFinanceiro.objects.create(
+            projeto=projeto or self.projeto, tipo=tipo, descricao='Parcela',
+            valor=Decimal(valor), data=data, status=status,
+        )
+
+    def assertResumoConfere(self):
+        esperado = {
+            (l['data'], l['projeto_id'], l['tipo'], l['status']): (l['soma'], l['contagem'])
+            for l in LancamentoFinanceiro.objects.values('data', 'projeto_id', 'tipo', 'status')
+            .annotate(soma=Sum('valor'), contagem=Count('id')).order_by()
+        }
+        obtido = {
+            (r.data, r.projeto_id, r.tipo, r.status): (r.total, r.quantidade)
+            for r in ResumoFinanceiroDiario.objects.all()
+        }
+        self.assertEqual(obtido, esperado)
+
+    def test_signals_mantem_o_resumo(self):
+        primeiro = self.lancar('100.00')
+        self.lancar('50.00')
+        segundo_projeto = self.lancar('70.00', projeto=self.outro_projeto, status='pendente')
+        self.assertResumoConfere()
+
+        primeiro.valor = Decimal('120.00')
+        primeiro.save()
+        self.assertResumoConfere()
+
+        primeiro.status = 'atrasado'
+        primeiro.data = date(2025, 4, 1)
+        primeiro.save()
+        self.assertResumoConfere()
+
+        segundo_projeto.delete()
+        self.assertResumoConfere()
+        self.assertFalse(ResumoFinanceiroDiario.objects.filter(projeto=self.outro_projeto).exists())
+
+        self.projeto.delete()
+        self.assertFalse(ResumoFinanceiroDiario.objects.exists())
+
+    def test_troca_de_chave_aplica_os_dois_deltas_ou_nenhum(self):
+        lancamento = self.lancar('100.00')
+        chamadas = []
+
+        def primeiro_aplica_segundo_falha(*args):
+            chamadas.append(args)
+            if len(chamadas) > 1:
+                raise IntegrityError('falha no segundo delta')
+            aplicar_delta(*args)
+
+        lancamento.status = 'atrasado'
+        with mock.patch('solar.signals.aplicar_delta', side_effect=primeiro_aplica_segundo_falha):
+            with self.assertRaises(IntegrityError):
+                lancamento.save()
+
+        # A saída da chave antiga foi desfeita; o lançamento, gravado fora do
+        # atomic do signal, precisa da reconstrução para o rollup voltar a conferir
+        self.assertEqual(ResumoFinanceiroDiario.objects.get().status, 'pago')
+        reconstruir_resumo()
+        self.assertResumoConfere()
+
+    def test_reconstruir_apos_alteracao_em_massa(self):
+        self.lancar('100.00')
+        self.lancar('30.00', tipo='pagamento')
+        LancamentoFinanceiro.objects.update(status='cancelado')  # não dispara signals
+
+        reconstruir_resumo()
+        self.assertResumoConfere()
+
+    def test_dashboard_le_do_resumo(self):
+        self.lancar('100.00')
+        self.lancar('40.00', status='pendente', data=date(2025, 5, 1))
+        self.lancar('30.00', tipo='pagamento', projeto=self.outro_projeto)
+
+        admin = Usuario.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(admin)
+        with self.assertLogs('energia_solar.instrumentacao'):
+            response = self.client.get(reverse('crm:dashboard_financeiro'), {'data_fim': '2025-04-30'})
+
+        self.assertEqual(json.loads(response.context['tipo_labels']), ['Pagamento', 'Recebimento'])
+        self.assertEqual(json.loads(response.context['tipo_data']), [30.0, 100.0])
+        self.assertEqual(json.loads(response.context['projeto_labels']), ['Usina A', 'Usina B'])
@@ -0,0 +1,264 @@
+# solar/uploads.py
+"""
+Upload em partes (retomável) de documentos de projeto e imagens de produto.
+
+Em vez de um único multipart com todos os arquivos (que o Django recebe
+inteiro antes de responder e que falha por completo se a conexão cair), o
+cliente (solar/static/solar/js/upload_em_partes.js) envia cada arquivo em
+partes de settings.UPLOADS_TAMANHO_PARTE bytes:
+
+1. POST   /crm/uploads/                       cria o upload (nome, tamanho, destino)
+2. PUT    /crm/uploads/<id>/partes/<n>/       corpo bruto da parte n, com o
+                                              cabeçalho X-Checksum-SHA256
+3. GET    /crm/uploads/<id>/                  partes já recebidas (para retomar)
+4. POST   /crm/uploads/<id>/concluir/         monta e anexa ao destino
+
+Cada parte é lida do socket em blocos e escrita direto na sua posição do
+arquivo temporário, então a memória do worker não depende do tamanho do
+arquivo. Partes podem chegar fora de ordem ou ser reenviadas; uma parte com
+checksum errado é rejeitada sem afetar as outras.
+"""
+import hashlib
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+
+from produtos.models import Produto, ProdutoImage
+
+from .models import DocumentoProjeto, Projeto, UploadEmPartes
+
+logger = logging.getLogger(__name__)
+
+BLOCO = 64 * 1024
+EXTENSOES_IMAGEM = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
+
+
+class UploadInvalido(Exception):
+    """Erro do cliente; `status` é o código HTTP devolvido pela API."""
+
+    def __init__(self, mensagem, status=400):
+        super().__init__(mensagem)
+        self.status = status
+
+
+class _ArquivoMontado(File):
+    """
+    Com temporary_file_path() o FileSystemStorage move o arquivo montado para
+    MEDIA_ROOT (rename) em vez de copiá-lo.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+# --------------------------
+# Destinos
+# --------------------------
+def _anexar_documento(upload, arquivo):
+    documento = DocumentoProjeto(
+        projeto_id=upload.destino_id,
+        nome=(upload.metadados.get('nome') or upload.nome_arquivo)[:200],
+        visivel_cliente=bool(upload.metadados.get('visivel_cliente')),
+    )
+    documento.arquivo.save(upload.nome_arquivo, arquivo, save=False)
+    documento.save()
+    return documento
+
+
+def _anexar_imagem(upload, arquivo):
+    try:
+        with Image.open(arquivo.file.name) as imagem:
+            imagem.verify()
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        raise UploadInvalido("O arquivo enviado não é uma imagem válida.", status=422)
+    imagem = ProdutoImage(
+        produto_id=upload.destino_id,
+        alt_text=(upload.metadados.get('alt_text') or '')[:255] or None,
+        is_main=bool(upload.metadados.get('is_main')),
+    )
+    imagem.image.save(upload.nome_arquivo, arquivo, save=False)
+    imagem.save()
+    return imagem
+
+
+# destino: (permissão, modelo do alvo, função que cria o registro final)
+DESTINOS = {
+    'documento_projeto': ('solar.add_documentoprojeto', Projeto, _anexar_documento),
+    'imagem_produto': ('produtos.change_produto', Produto, _anexar_imagem),
+}
+
+
+# --------------------------
+# Etapas
+# --------------------------
+def iniciar(usuario, dados):
+    destino = dados.get('destino')
+    if destino not in DESTINOS:
+        raise UploadInvalido("Destino inválido.")
+    permissao, Alvo, _ = DESTINOS[destino]
+    if not usuario.has_perm(permissao):
+        raise PermissionDenied
+
+    nome = os.path.basename(str(dados.get('nome') or '')).strip()
+    if not nome:
+        raise UploadInvalido("Informe o nome do arquivo.")
+    if destino == 'imagem_produto' and os.path.splitext(nome)[1].lower() not in EXTENSOES_IMAGEM:
+        raise UploadInvalido("Formato de imagem não suportado.")
+    try:
+        tamanho = int(dados.get('tamanho'))
+        destino_id = int(dados.get('destino_id'))
+    except (TypeError, ValueError):
+        raise UploadInvalido("Tamanho e destino_id devem ser números.")
+    if not 0 < tamanho <= settings.UPLOADS_TAMANHO_MAXIMO:
+        raise UploadInvalido(f"O arquivo deve ter até {settings.UPLOADS_TAMANHO_MAXIMO // (1024 * 1024)} MB.", status=413)
+    if not Alvo.objects.filter(pk=destino_id).exists():
+        raise UploadInvalido("Destino não encontrado.", status=404)
+    sha256 = str(dados.get('sha256') or '').lower()
+    if sha256 and len(sha256) != 64:
+        raise UploadInvalido("SHA-256 inválido.")
+
+    upload = UploadEmPartes.objects.create(
+        usuario=usuario,
+        destino=destino,
+        destino_id=destino_id,
+        nome_arquivo=nome[:255],
+        tamanho=tamanho,
+        tamanho_parte=settings.UPLOADS_TAMANHO_PARTE,
+        sha256=sha256,
+        metadados=dados.get('metadados') if isinstance(dados.get('metadados'), dict) else {},
+    )
+    os.makedirs(settings.UPLOADS_DIR, exist_ok=True)
+    # Arquivo esparso do tamanho final: cada parte é escrita na sua posição
+    with open(upload.caminho_temporario, 'wb') as arquivo:
+        arquivo.truncate(tamanho)
+    return upload
+
+
+def receber_parte(upload, indice, fluxo, checksum=''):
+    """
+    Lê a parte `indice` de `fluxo` (o corpo da requisição) em blocos e grava
+    na posição correspondente do arquivo temporário.
+    """
+    if upload.status != 'recebendo':
+        raise UploadInvalido("Este upload não está mais recebendo partes.", status=409)
+    if not 0 <= indice < upload.total_partes:
+        raise UploadInvalido("Parte fora do intervalo.", status=416)
+    esperado = upload.tamanho_da_parte(indice)
+
+    digest = hashlib.sha256()
+    recebido = 0
+    try:
+        descritor = os.open(upload.caminho_temporario, os.O_WRONLY)
+    except FileNotFoundError:
+        raise UploadInvalido("Upload expirado.", status=410)
+    try:
+        posicao = indice * upload.tamanho_parte
+        while recebido < esperado:
+            bloco = fluxo.read(min(BLOCO, esperado - recebido))
+            if not bloco:
+                break
+            digest.update(bloco)
+            os.pwrite(descritor, bloco, posicao + recebido)
+            recebido += len(bloco)
+        sobra = fluxo.read(1)
+    finally:
+        os.close(descritor)
+
+    if recebido != esperado or sobra:
+        raise UploadInvalido(f"A parte {indice} deve ter {esperado} bytes.")
+    if checksum and checksum.lower() != digest.hexdigest():
+        # Os bytes ruins ficam no arquivo, mas a parte não conta como recebida
+        # e será sobrescrita no reenvio
+        raise UploadInvalido(f"Checksum da parte {indice} não confere.", status=422)
+
+    with transaction.atomic():
+        upload = UploadEmPartes.objects.select_for_update().get(pk=upload.pk)
+        if indice not in upload.partes_recebidas:
+            upload.partes_recebidas = sorted([*upload.partes_recebidas, indice])
+            upload.save(update_fields=['partes_recebidas', 'atualizado_em'])
+    return upload
+
+
+def _sha256_do_arquivo(caminho):
+    digest = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(BLOCO * 16), b''):
+            digest.update(bloco)
+    return digest.hexdigest()
+
+
+def concluir(upload):
+    """Confere as partes, anexa o arquivo ao destino e retorna o upload."""
+    with transaction.atomic():
+        upload = UploadEmPartes.objects.select_for_update().get(pk=upload.pk)
+        if upload.status == 'concluido':
+            return upload
+        if upload.status != 'recebendo':
+            raise UploadInvalido("Este upload foi cancelado.", status=409)
+        if upload.partes_faltando:
+            raise UploadInvalido(f"Faltam {len(upload.partes_faltando)} partes.", status=409)
+        caminho = upload.caminho_temporario
+        if not os.path.exists(caminho):
+            raise UploadInvalido("Upload expirado.", status=410)
+        if upload.sha256 and _sha256_do_arquivo(caminho) != upload.sha256:
+            raise UploadInvalido("O checksum do arquivo montado não confere.", status=422)
+
+        _, _, anexar = DESTINOS[upload.destino]
+        with _ArquivoMontado(open(caminho, 'rb'), name=upload.nome_arquivo) as arquivo:
+            registro = anexar(upload, arquivo)
+        upload.status = 'concluido'
+        upload.resultado_id = registro.pk
+        upload.save(update_fields=['status', 'resultado_id', 'atualizado_em'])
+    _remover_temporario(upload)
+    return upload
+
+
+def cancelar(upload):
+    if upload.status == 'recebendo':
+        upload.status = 'cancelado'
+        upload.save(update_fields=['status', 'atualizado_em'])
+    _remover_temporario(upload)
+
+
+def _remover_temporario(upload):
+    try:
+        os.remove(upload.caminho_temporario)
+    except FileNotFoundError:
+        pass
+
+
+def limpar_expirados(horas=None):
+    """Apaga os uploads parados há mais de `horas` e os seus arquivos temporários."""
+    horas = settings.UPLOADS_EXPIRACAO_HORAS if horas is None else horas
+    limite = timezone.now() - timedelta(hours=horas)
+    expirados = UploadEmPartes.objects.filter(atualizado_em__lt=limite).exclude(status='concluido')
+    total = 0
+    for upload in expirados.iterator():
+        _remover_temporario(upload)
+        upload.delete()
+        total += 1
+    # Concluídos só servem para o cliente confirmar o resultado
+    UploadEmPartes.objects.filter(atualizado_em__lt=limite, status='concluido').delete()
+    return total
+
+
+def resumo(upload):
+    return {
+        'id': str(upload.id),
+        'status': upload.status,
+        'destino': upload.destino,
+        'nome': upload.nome_arquivo,
+        'tamanho': upload.tamanho,
+        'tamanho_parte': upload.tamanho_parte,
+        'total_partes': upload.total_partes,
+        'partes_recebidas': upload.partes_recebidas,
+        'partes_faltando': upload.partes_faltando,
+        'resultado_id': upload.resultado_id,
+    }
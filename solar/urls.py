@@ -42,6 +42,13 @@ urlpatterns = [
     path('projetos/<int:pk>/excluir/', views.excluir_projeto, name='excluir_projeto'),
     path('projetos/<int:projeto_id>/upload_documento/', views.upload_documento_projeto, name='upload_documento_projeto'),
     path('projetos/<int:projeto_id>/excluir_documento/<int:doc_id>/', views.excluir_documento_projeto, name='excluir_documento_projeto'),
+    path('documentos/<int:doc_id>/baixar/', views.baixar_documento_projeto, name='baixar_documento_projeto'),
+
+    # Upload em partes (API JSON, solar/uploads.py)
+    path('uploads/', views.iniciar_upload, name='iniciar_upload'),
+    path('uploads/<uuid:upload_id>/', views.status_upload, name='status_upload'),
+    path('uploads/<uuid:upload_id>/partes/<int:indice>/', views.enviar_parte_upload, name='enviar_parte_upload'),
+    path('uploads/<uuid:upload_id>/concluir/', views.concluir_upload, name='concluir_upload'),
 
     # Materiais (CRM)
     path('materiais/', views.lista_materiais, name='lista_materiais'),
@@ -71,6 +78,12 @@ urlpatterns = [
     # Rota de ADIÇÃO MANUAL. Nome corrigido para corresponder ao template.
     path('produtos-ecommerce/adicionar/', views.adicionar_produto, name='adicionar_produto_ecommerce'), # NOME CORRIGIDO AQUI
     path('produtos-ecommerce/adicionar-ia/', views.adicionar_produto_ia, name='adicionar_produto_ia'), # PATH CORRIGIDO AQUI
+    path('produtos-ecommerce/adicionar-ia/<int:ingestao_id>/', views.acompanhar_ingestao_ia, name='acompanhar_ingestao_ia'),
+    path('produtos-ecommerce/adicionar-ia/<int:ingestao_id>/status/', views.status_ingestao_ia, name='status_ingestao_ia'),
+    path('produtos-ecommerce/adicionar-ia/<int:ingestao_id>/reprocessar/', views.reprocessar_ingestao_ia, name='reprocessar_ingestao_ia'),
+    path('exportar/<slug:nome>/', views.exportar_lista, name='exportar_lista'),
+    path('produtos-ecommerce/exportar/', views.exportar_catalogo, name='exportar_catalogo'),
+    path('produtos-ecommerce/importar/', views.importar_catalogo, name='importar_catalogo'),
     path('produtos-ecommerce/selecionar-metodo/', views.selecionar_metodo_criacao, name='selecionar_metodo_criacao'), # ROTA ADICIONADA AQUI
     path('produtos-ecommerce/editar/<int:produto_id>/', views.editar_produto_ecommerce, name='editar_produto_ecommerce'),
     path('produtos-ecommerce/excluir/<int:produto_id>/', views.excluir_produto_ecommerce, name='excluir_produto_ecommerce'),
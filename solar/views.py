@@ -1,23 +1,28 @@
 import logging
+import os
 import re
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required, user_passes_test, permission_required
 from django.contrib.auth.forms import AuthenticationForm, SetPasswordForm
-from django.db.models import Count, Sum
+from decimal import Decimal
+from django.db.models import Count, DecimalField, OuterRef, Prefetch, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.db import transaction
 from django.utils.text import slugify
-from django.http import JsonResponse, HttpResponse
-from django.utils.dateparse import parse_date
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, JsonResponse, HttpResponse, StreamingHttpResponse
 from django.contrib.auth.hashers import check_password
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_http_methods, require_POST
 import json # Adicionado para corrigir o erro no dashboard_projetos
-from django.core.paginator import Paginator
 from django.db.models import Q # Importamos o Q para buscas complexas
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from produtos.services import analisar_imagem_produto
+from energia_solar.arquivos import servir_arquivo
+from produtos.ingestao import criar_ingestao, reprocessar_falhas, resumo_ingestao
+from produtos.imagens import com_imagem_card
+from produtos.importacao import criar_importacao, exportar_linhas
 from django.urls import reverse
 from urllib.parse import urlencode
 
@@ -25,7 +30,14 @@ User = get_user_model()
 
 # Importa os modelos do app 'solar'
 from .models import Cliente, Projeto, Etapa, Material, Fornecedor, Financeiro, \
-    LancamentoFinanceiro, DocumentoProjeto, Usuario, Departamento, MenuPermissao
+    LancamentoFinanceiro, DocumentoProjeto, Usuario, Departamento, MenuPermissao, ResumoFinanceiroDiario, \
+    UploadEmPartes
+
+from .exportacao import EXPORTACOES, resposta_exportacao
+from .filtros import buscar_lancamentos, filtrar_clientes, filtrar_fornecedores, filtrar_lancamentos, \
+    filtrar_materiais, filtrar_produtos, filtrar_projetos, filtrar_usuarios
+from .listagem import paginar
+from . import uploads
 
 # Importa os formulários do app 'solar'
 from .forms import ProjetoForm, ClienteForm, EtapaForm, MaterialForm, FornecedorForm, \
@@ -33,7 +45,7 @@ from .forms import ProjetoForm, ClienteForm, EtapaForm, MaterialForm, Fornecedor
     ProdutoEcommerceForm, PerfilClienteForm
 
 # Importa os modelos do app 'produtos' para uso direto nas views
-from produtos.models import Produto, ProdutoImage, Pedido # Adicionado Pedido para a lógica de pedidos
+from produtos.models import Produto, ProdutoImage, Pedido, IngestaoProdutos, ImportacaoCatalogo # Adicionado Pedido para a lógica de pedidos
 
 logger = logging.getLogger(__name__)
 
@@ -220,7 +232,16 @@ def upload_documento_projeto(request, projeto_id):
         else:
             messages.error(request, 'Erro ao enviar documento. Verifique os campos.')
     else:
-        form = DocumentoProjetoForm()
+        form = DocumentoProjetoForm(initial={'projeto': projeto})
+    # Com JavaScript o arquivo vai em partes pela API de upload (solar/uploads.py);
+    # o POST acima continua valendo sem JavaScript
+    form.fields['arquivo'].widget.attrs.update({
+        'data-upload-em-partes': '',
+        'data-destino': 'documento_projeto',
+        'data-destino-id': projeto.id,
+        'data-metadados-campos': 'nome,visivel_cliente',
+        'data-apos-concluir': reverse('crm:detalhe_projeto', args=[projeto.id]),
+    })
     return render(request, 'solar/upload_documento_projeto.html', {'form': form, 'projeto': projeto})
 
 @login_required
@@ -236,6 +257,25 @@ def excluir_documento_projeto(request, projeto_id, doc_id):
         return redirect('crm:detalhe_projeto', pk=projeto.id)
     return render(request, 'solar/confirmar_exclusao_documento.html', {'documento': doc, 'projeto': projeto})
 
+@login_required
+def baixar_documento_projeto(request, doc_id):
+    """
+    Download de documento de projeto. A equipe do CRM precisa poder ver o
+    projeto; o cliente só baixa documentos marcados como visíveis dos seus
+    próprios projetos. O envio do arquivo fica com o nginx (X-Accel-Redirect).
+    """
+    doc = get_object_or_404(DocumentoProjeto.objects.select_related('projeto__cliente'), pk=doc_id)
+    if pode_acessar_crm(request.user):
+        if not request.user.has_perm('solar.view_projeto'):
+            raise PermissionDenied
+    else:
+        cliente = doc.projeto.cliente
+        # 404 em vez de 403: não revela a existência de documentos de terceiros
+        if not doc.visivel_cliente or cliente is None or cliente.usuario_id != request.user.id:
+            raise Http404("Documento não encontrado.")
+    extensao = os.path.splitext(doc.arquivo.name)[1]
+    return servir_arquivo(doc.arquivo, nome_download=f'{doc.nome}{extensao}')
+
 # ------------------------------------------------------------------
 # VIEWS DE CLIENTES (CRM)
 # ------------------------------------------------------------------
@@ -243,8 +283,11 @@ def excluir_documento_projeto(request, projeto_id, doc_id):
 @user_passes_test(pode_acessar_crm)
 @permission_required('solar.view_cliente', raise_exception=True)
 def lista_clientes(request):
-    clientes = Cliente.objects.all()
-    return render(request, 'solar/lista_clientes.html', {'clientes': clientes})
+    pagina = paginar(filtrar_clientes(Cliente.objects.all(), request.GET), request.GET, [
+        ('nome', 'Nome', ['nome', 'id']),
+        ('recentes', 'Mais recentes', ['-data_cadastro', '-id']),
+    ])
+    return render(request, 'solar/lista_clientes.html', {'clientes': pagina, 'pagina': pagina})
 
 @login_required
 @user_passes_test(pode_acessar_crm)
@@ -347,30 +390,22 @@ def cliente_painel_detalhe(request, pk):
 @user_passes_test(pode_acessar_crm)
 @permission_required('solar.view_projeto', raise_exception=True)
 def lista_projetos(request):
-    # 1. Começamos com a consulta otimizada, ordenando pelos mais recentes
-    queryset = Projeto.objects.select_related('cliente', 'responsavel').order_by('-data_inicio')
-
-    # 2. Aplicamos filtros baseados na URL (ex: ?status=Concluído)
-    filtro_status = request.GET.get('status')
-    if filtro_status:
-        queryset = queryset.filter(status=filtro_status)
-
-    # 3. Aplicamos a busca (ex: ?q=Solar)
-    termo_busca = request.GET.get('q')
-    if termo_busca:
-        # Busca no nome OU na descrição do projeto
-        queryset = queryset.filter(
-            Q(nome__icontains=termo_busca) | 
-            Q(descricao__icontains=termo_busca)
-        )
+    # 1. Começamos com a consulta otimizada
+    queryset = Projeto.objects.select_related('cliente', 'responsavel')
 
-    # 4. Adicionamos a paginação no final, após todos os filtros
-    paginador = Paginator(queryset, 20) # 20 projetos por página
-    numero_da_pagina = request.GET.get('page')
-    projetos = paginador.get_page(numero_da_pagina)
+    # 2. Filtro por status (?status=Concluído) e busca em nome/descrição (?q=Solar),
+    # os mesmos aplicados na exportação (solar/filtros.py)
+    queryset = filtrar_projetos(queryset, request.GET)
+
+    # 3. Paginação por cursor (solar/listagem.py), mais recentes primeiro
+    projetos = paginar(queryset, request.GET, [
+        ('recentes', 'Mais recentes', ['-data_inicio', '-id']),
+        ('nome', 'Nome', ['nome', 'id']),
+    ])
 
     context = {
         'projetos': projetos,
+        'pagina': projetos,
         'statuses': Projeto._meta.get_field('status').choices # Para popular um dropdown de filtro
     }
 
@@ -498,8 +533,10 @@ def cadastrar_etapa(request, pk):
 @user_passes_test(pode_acessar_crm)
 @permission_required('solar.view_material', raise_exception=True)
 def lista_materiais(request):
-    materiais = Material.objects.all()
-    return render(request, 'solar/lista_materiais.html', {'materiais': materiais})
+    pagina = paginar(filtrar_materiais(Material.objects.all(), request.GET), request.GET, [
+        ('nome', 'Nome', ['nome', 'id']),
+    ])
+    return render(request, 'solar/lista_materiais.html', {'materiais': pagina, 'pagina': pagina})
 
 @login_required
 @user_passes_test(pode_acessar_crm)
@@ -541,8 +578,10 @@ def editar_material(request, pk):
 @user_passes_test(pode_acessar_crm)
 @permission_required('solar.view_fornecedor', raise_exception=True)
 def lista_fornecedores(request):
-    fornecedores = Fornecedor.objects.all()
-    return render(request, 'solar/lista_fornecedores.html', {'fornecedores': fornecedores})
+    pagina = paginar(filtrar_fornecedores(Fornecedor.objects.all(), request.GET), request.GET, [
+        ('nome', 'Nome', ['nome', 'id']),
+    ])
+    return render(request, 'solar/lista_fornecedores.html', {'fornecedores': pagina, 'pagina': pagina})
 
 @login_required
 @user_passes_test(pode_acessar_crm)
@@ -584,8 +623,12 @@ def editar_fornecedor(request, pk):
 @user_passes_test(pode_acessar_crm)
 @permission_required('solar.view_lancamentofinanceiro', raise_exception=True)
 def lista_financeiro(request):
-    lancamentos = LancamentoFinanceiro.objects.select_related('projeto').order_by('-data')
-    return render(request, 'solar/lista_financeiro.html', {'lancamentos': lancamentos})
+    lancamentos = buscar_lancamentos(LancamentoFinanceiro.objects.select_related('projeto'), request.GET)
+    pagina = paginar(lancamentos, request.GET, [
+        ('recentes', 'Mais recentes', ['-data', '-id']),
+        ('antigos', 'Mais antigos', ['data', 'id']),
+    ])
+    return render(request, 'solar/lista_financeiro.html', {'lancamentos': pagina, 'pagina': pagina})
 
 @login_required
 @user_passes_test(pode_acessar_crm)
@@ -608,7 +651,9 @@ def cadastrar_lancamento(request):
 @permission_required('solar.view_lancamentofinanceiro', raise_exception=True)
 def dashboard_financeiro(request):
     projetos = Projeto.objects.all()
-    lancamentos = LancamentoFinanceiro.objects.select_related('projeto')
+    # Lê do rollup diário (solar/resumo_financeiro.py) em vez de somar todos os lançamentos
+    # Mesmo filtro da lista e da exportação de lançamentos (solar/filtros.py)
+    resumos = filtrar_lancamentos(ResumoFinanceiroDiario.objects.all(), request.GET)
 
     projeto_id = request.GET.get('projeto')
     tipo = request.GET.get('tipo')
@@ -616,22 +661,11 @@ def dashboard_financeiro(request):
     data_inicio = request.GET.get('data_inicio')
     data_fim = request.GET.get('data_fim')
 
-    if projeto_id:
-        lancamentos = lancamentos.filter(projeto_id=projeto_id)
-    if tipo:
-        lancamentos = lancamentos.filter(tipo=tipo)
-    if status:
-        lancamentos = lancamentos.filter(status=status)
-    if data_inicio:
-        lancamentos = lancamentos.filter(data__gte=parse_date(data_inicio))
-    if data_fim:
-        lancamentos = lancamentos.filter(data__lte=parse_date(data_fim))
-
-    resumo_tipos = lancamentos.values('tipo').annotate(total=Sum('valor'))
+    resumo_tipos = resumos.values('tipo').annotate(total=Sum('total')).order_by('tipo')
     tipo_labels = [r['tipo'].capitalize() for r in resumo_tipos]
     tipo_data = [float(r['total']) for r in resumo_tipos]
 
-    resumo_projetos = lancamentos.values('projeto__nome').annotate(total=Sum('valor')).order_by('-total')
+    resumo_projetos = resumos.values('projeto__nome').annotate(total=Sum('total')).order_by('-total')
     projeto_labels = [r['projeto__nome'] for r in resumo_projetos]
     projeto_data = [float(r['total']) for r in resumo_projetos]
 
@@ -651,6 +685,81 @@ def dashboard_financeiro(request):
     }
     return render(request, 'solar/dashboard_financeiro.html', context)
 
+# ------------------------------------------------------------------
+# EXPORTAÇÕES (CRM)
+# ------------------------------------------------------------------
+@login_required
+@user_passes_test(pode_acessar_crm)
+def exportar_lista(request, nome):
+    """
+    Baixa a lista em CSV ou XLSX (?formato=xlsx), com os mesmos filtros da
+    tela na query string. Gerada em streaming (solar/exportacao.py).
+    """
+    exportacao = EXPORTACOES.get(nome)
+    if exportacao is None:
+        raise Http404
+    if not request.user.has_perm(exportacao.permissao):
+        raise PermissionDenied
+    formato = 'xlsx' if request.GET.get('formato') == 'xlsx' else 'csv'
+    return resposta_exportacao(exportacao, request.GET, formato)
+
+# ------------------------------------------------------------------
+# UPLOAD EM PARTES (API JSON, solar/uploads.py)
+# ------------------------------------------------------------------
+def _erro_upload(erro):
+    return JsonResponse({'erro': str(erro)}, status=erro.status)
+
+
+@login_required
+@user_passes_test(pode_acessar_crm)
+@require_POST
+def iniciar_upload(request):
+    try:
+        dados = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'erro': 'JSON inválido.'}, status=400)
+    try:
+        upload = uploads.iniciar(request.user, dados if isinstance(dados, dict) else {})
+    except uploads.UploadInvalido as erro:
+        return _erro_upload(erro)
+    return JsonResponse(uploads.resumo(upload), status=201)
+
+
+@login_required
+@user_passes_test(pode_acessar_crm)
+@require_http_methods(['GET', 'DELETE'])
+def status_upload(request, upload_id):
+    """GET: partes já recebidas (para retomar). DELETE: cancela o envio."""
+    upload = get_object_or_404(UploadEmPartes, pk=upload_id, usuario=request.user)
+    if request.method == 'DELETE':
+        uploads.cancelar(upload)
+    return JsonResponse(uploads.resumo(upload))
+
+
+@login_required
+@user_passes_test(pode_acessar_crm)
+@require_http_methods(['PUT'])
+def enviar_parte_upload(request, upload_id, indice):
+    upload = get_object_or_404(UploadEmPartes, pk=upload_id, usuario=request.user)
+    try:
+        # Lê o corpo direto do socket, em blocos (request.body guardaria tudo em memória)
+        upload = uploads.receber_parte(upload, indice, request, request.headers.get('X-Checksum-SHA256', ''))
+    except uploads.UploadInvalido as erro:
+        return _erro_upload(erro)
+    return JsonResponse(uploads.resumo(upload))
+
+
+@login_required
+@user_passes_test(pode_acessar_crm)
+@require_POST
+def concluir_upload(request, upload_id):
+    upload = get_object_or_404(UploadEmPartes, pk=upload_id, usuario=request.user)
+    try:
+        upload = uploads.concluir(upload)
+    except uploads.UploadInvalido as erro:
+        return _erro_upload(erro)
+    return JsonResponse(uploads.resumo(upload))
+
 # ------------------------------------------------------------------
 # VIEWS DO PAINEL DO CLIENTE (E-COMMERCE)
 # ------------------------------------------------------------------
@@ -683,6 +792,17 @@ def login_cliente(request):
 
 
 
+def _soma_lancamentos(status):
+    """Subquery com a soma dos lançamentos do projeto (OuterRef) no status dado; 0 se não houver."""
+    soma = (
+        LancamentoFinanceiro.objects.filter(projeto=OuterRef('pk'), status=status)
+        .values('projeto')
+        .annotate(total=Sum('valor'))
+        .values('total')
+    )
+    return Coalesce(Subquery(soma), Value(Decimal('0')), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
 @login_required
 @user_passes_test(pode_acessar_ecommerce) # Garante que só quem pode acessar o e-commerce chegue aqui
 def cliente_dashboard(request):
@@ -713,34 +833,38 @@ def cliente_dashboard(request):
 
     # --- Lógica da Dashboard (executada APENAS se o perfil do cliente existe e não é staff/admin) ---
     # Somente mostra projetos se o perfil do cliente existe e o usuário é um cliente.
-    projetos = Projeto.objects.filter(cliente=cliente).order_by('-data_inicio')
-    pedidos = Pedido.objects.filter(usuario=request.user).order_by('-criado_em')
+    # Uma query traz os projetos já com contagem de etapas e somas dos lançamentos;
+    # o Prefetch traz as etapas ordenadas de todos eles numa segunda query.
+    projetos = list(
+        Projeto.objects.filter(cliente=cliente)
+        .annotate(
+            total_etapas=Count('etapas'),
+            etapas_concluidas=Count('etapas', filter=Q(etapas__data_fim__isnull=False)),
+            total_pago=_soma_lancamentos('pago'),
+            total_pendente=_soma_lancamentos('pendente'),
+        )
+        .prefetch_related(Prefetch('etapas', queryset=Etapa.objects.order_by('data_inicio'), to_attr='etapas_ordenadas'))
+        .order_by('-data_inicio')
+    )
+    pedidos = list(Pedido.objects.filter(usuario=request.user).order_by('-criado_em'))
 
-    cliente_tem_projetos = projetos.exists()
-    cliente_tem_pedidos = pedidos.exists()
+    cliente_tem_projetos = bool(projetos)
+    cliente_tem_pedidos = bool(pedidos)
 
     projetos_data = []
     for projeto in projetos:
-        etapas = projeto.etapas.order_by('data_inicio')
-        etapas_concluidas = etapas.exclude(data_fim__isnull=True).count()
-        total_etapas = etapas.count()
-
         percentual = 0
-        if total_etapas > 0:
-            percentual = round((etapas_concluidas / total_etapas) * 100, 2)
-
-        lancamentos = LancamentoFinanceiro.objects.filter(projeto=projeto)
-        pagos = lancamentos.filter(status='pago').aggregate(total=Sum('valor'))['total'] or 0
-        pendentes = lancamentos.filter(status='pendente').aggregate(total=Sum('valor'))['total'] or 0
+        if projeto.total_etapas > 0:
+            percentual = round((projeto.etapas_concluidas / projeto.total_etapas) * 100, 2)
 
         projetos_data.append({
             'projeto': projeto,
-            'etapas': etapas,
-            'etapas_concluidas': etapas_concluidas,
-            'total_etapas': total_etapas,
+            'etapas': projeto.etapas_ordenadas,
+            'etapas_concluidas': projeto.etapas_concluidas,
+            'total_etapas': projeto.total_etapas,
             'percentual': percentual,
-            'pagos': pagos,
-            'pendentes': pendentes,
+            'pagos': projeto.total_pago,
+            'pendentes': projeto.total_pendente,
         })
 
     # Contexto para o template
@@ -815,8 +939,10 @@ def completar_perfil_cliente(request):
 @login_required
 @user_passes_test(pode_acessar_crm)
 def lista_usuarios(request):
-    usuarios = Usuario.objects.all()
-    return render(request, 'solar/lista_usuarios.html', {'usuarios': usuarios})
+    pagina = paginar(filtrar_usuarios(Usuario.objects.select_related('departamento'), request.GET), request.GET, [
+        ('username', 'Usuário', ['username', 'id']),
+    ])
+    return render(request, 'solar/lista_usuarios.html', {'usuarios': pagina, 'pagina': pagina})
 
 @login_required
 @user_passes_test(pode_acessar_crm)
@@ -888,13 +1014,60 @@ def excluir_usuario(request, usuario_id):
 @user_passes_test(pode_acessar_crm)
 @permission_required('produtos.view_produto', raise_exception=True)
 def lista_produtos_ecommerce(request):
-    produtos = Produto.objects.all().prefetch_related('images')
+    produtos = paginar(filtrar_produtos(com_imagem_card(Produto.objects.all()), request.GET), request.GET, [
+        ('nome', 'Nome', ['name', 'id']),
+        ('recentes', 'Mais recentes', ['-created_at', '-id']),
+    ])
     context = {
         'produtos': produtos,
+        'pagina': produtos,
         'titulo': 'Gerenciar Produtos do E-commerce',
     }
     return render(request, 'solar/lista_produtos_ecommerce.html', context)
 
+
+@login_required
+@user_passes_test(pode_acessar_crm)
+@permission_required('produtos.view_produto', raise_exception=True)
+def exportar_catalogo(request):
+    """Baixa o catálogo em CSV ou JSONL, gerado linha a linha (memória constante)."""
+    formato = 'jsonl' if request.GET.get('formato') == 'jsonl' else 'csv'
+    produtos = Produto.objects.all()
+    if request.GET.get('ativos'):
+        produtos = produtos.filter(is_active=True)
+    response = StreamingHttpResponse(
+        exportar_linhas(formato, produtos),
+        content_type='application/x-ndjson; charset=utf-8' if formato == 'jsonl' else 'text/csv; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="catalogo.{formato}"'
+    return response
+
+
+@login_required
+@user_passes_test(pode_acessar_crm)
+@permission_required('produtos.add_produto', raise_exception=True)
+@permission_required('produtos.change_produto', raise_exception=True)
+def importar_catalogo(request):
+    if request.method == 'POST':
+        arquivo = request.FILES.get('arquivo')
+        if not arquivo or not arquivo.name.lower().endswith(('.csv', '.jsonl', '.ndjson', '.json')):
+            messages.error(request, 'Envie um arquivo .csv ou .jsonl.')
+            return redirect('crm:importar_catalogo')
+        imagens = request.FILES.get('imagens')
+        if imagens and not imagens.name.lower().endswith('.zip'):
+            messages.error(request, 'As imagens devem ser enviadas num arquivo .zip.')
+            return redirect('crm:importar_catalogo')
+
+        # O upsert roda em segundo plano (produtos/importacao.py); aqui só gravamos os arquivos
+        importacao = criar_importacao(arquivo, imagens, request.user)
+        messages.info(request, f'Importação #{importacao.id} enviada. Acompanhe o andamento abaixo.')
+        return redirect('crm:importar_catalogo')
+
+    return render(request, 'solar/importar_catalogo.html', {
+        'importacoes': ImportacaoCatalogo.objects.select_related('criado_por')[:20],
+        'titulo': 'Importar / Exportar Catálogo',
+    })
+
 @login_required
 @user_passes_test(pode_acessar_crm)
 @permission_required('produtos.add_produto', raise_exception=True)
@@ -947,50 +1120,45 @@ def adicionar_produto_ia(request):
             messages.error(request, 'Nenhuma imagem foi enviada.')
             return redirect('crm:adicionar_produto_ia')
 
-        sucessos = 0
-        falhas = 0
+        # A análise roda em segundo plano (produtos/ingestao.py); aqui só gravamos os arquivos
+        ingestao = criar_ingestao(imagens, request.user)
+        messages.info(request, f'{len(imagens)} imagem(ns) enviada(s). A análise está em andamento.')
+        return redirect('crm:acompanhar_ingestao_ia', ingestao_id=ingestao.id)
 
-        # Loop para processar e SALVAR cada imagem
-        for imagem in imagens:
-            try:
-                # 1. Análise da Imagem
-                dados_produto = analisar_imagem_produto(imagem)
+    return render(request, 'solar/adicionar_produto_ia.html')
 
-                if 'error' in dados_produto:
-                    print(f"Falha na IA para a imagem {imagem.name}: {dados_produto['error']}")
-                    falhas += 1
-                    continue
 
-                # 2. Criação do Formulário com dados da IA
-                form = ProdutoEcommerceForm(dados_produto)
-                
-                if form.is_valid():
-                    with transaction.atomic():
-                        # Salva o produto (o 'revisado=False' é automático se for o padrão do campo)
-                        produto_novo = form.save() 
-                        # Salva a imagem associada
-                        ProdutoImage.objects.create(produto=produto_novo, image=imagem, is_main=True)
-                        sucessos += 1
-                else:
-                    # Melhoria: Incluir a imagem na mensagem de erro para debug
-                    print(f"Dados da IA inválidos para {imagem.name}: {form.errors.as_json()}") 
-                    falhas += 1
+@login_required
+@user_passes_test(pode_acessar_crm)
+@permission_required('produtos.add_produto', raise_exception=True)
+def acompanhar_ingestao_ia(request, ingestao_id):
+    ingestao = get_object_or_404(IngestaoProdutos, id=ingestao_id)
+    return render(request, 'solar/acompanhar_ingestao_ia.html', {
+        'ingestao': ingestao,
+        'resumo': resumo_ingestao(ingestao),
+    })
 
-            except Exception as e:
-                # Melhoria: Capturar e logar o erro, e continuar o loop
-                print(f"Erro inesperado ao processar {imagem.name}: {e}")
-                falhas += 1
 
-        # Mensagem de resumo final
-        if sucessos > 0:
-            messages.success(request, f'{sucessos} produto(s) foram criados e estão aguardando revisão.')
-        if falhas > 0:
-            messages.warning(request, f'{falhas} imagem(ns) não puderam ser processadas.')
+@login_required
+@user_passes_test(pode_acessar_crm)
+@permission_required('produtos.add_produto', raise_exception=True)
+def status_ingestao_ia(request, ingestao_id):
+    ingestao = get_object_or_404(IngestaoProdutos, id=ingestao_id)
+    return JsonResponse(resumo_ingestao(ingestao))
 
-        # Redireciona para a lista de produtos
-        return redirect('crm:lista_produtos_ecommerce')
 
-    return render(request, 'solar/adicionar_produto_ia.html')
+@login_required
+@user_passes_test(pode_acessar_crm)
+@permission_required('produtos.add_produto', raise_exception=True)
+@require_POST
+def reprocessar_ingestao_ia(request, ingestao_id):
+    ingestao = get_object_or_404(IngestaoProdutos, id=ingestao_id)
+    reabertas = reprocessar_falhas(ingestao)
+    if reabertas:
+        messages.info(request, f'{reabertas} imagem(ns) enviada(s) novamente para análise.')
+    else:
+        messages.warning(request, 'Não há imagens com falha para reprocessar, ou a análise ainda está em andamento.')
+    return redirect('crm:acompanhar_ingestao_ia', ingestao_id=ingestao.id)
 
 
 @login_required